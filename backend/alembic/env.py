@@ -14,7 +14,8 @@ from app.core.config import settings
 # 导入所有模型以确保它们被注册
 from app.models import (
     user, instagram_account, proxy, schedule, 
-    message, auto_reply, search_task, collected_user_data
+    message, auto_reply, search_task, collected_user_data, direct_sync,
+    collection_job
 )
 
 # this is the Alembic Config object, which provides
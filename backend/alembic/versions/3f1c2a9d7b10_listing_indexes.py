@@ -0,0 +1,49 @@
+"""listing indexes for keyset pagination
+
+Revision ID: 3f1c2a9d7b10
+Revises: 
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from typing import Optional
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# 表此前由 create_tables() 建立，新库建表时已带这些索引，这里只补建缺少的
+INDEXES = [
+    ("message_logs", "ix_message_logs_account_thread_created", ["instagram_account_id", "thread_id", "created_at"]),
+    ("message_logs", "ix_message_logs_user_created", ["user_id", "created_at"]),
+    ("collected_user_data", "ix_collected_user_data_task_id", ["search_task_id", "id"]),
+    ("search_tasks", "ix_search_tasks_user_status_created", ["user_id", "status", "created_at"]),
+    ("search_tasks", "ix_search_tasks_user_created", ["user_id", "created_at"]),
+    ("post_schedules", "ix_post_schedules_user_status_created", ["user_id", "status", "created_at"]),
+    ("post_schedules", "ix_post_schedules_user_created", ["user_id", "created_at"]),
+]
+
+
+def _existing(table: str) -> Optional[set]:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    for table, name, columns in INDEXES:
+        existing = _existing(table)
+        if existing is not None and name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for table, name, columns in reversed(INDEXES):
+        existing = _existing(table)
+        if existing is not None and name in existing:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,109 @@
+"""search task summary columns
+
+Revision ID: 8b4e6d2c1a55
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d2c1a55'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column("query_count", sa.Integer(), nullable=False, server_default="0", comment="搜索词数"),
+    sa.Column("account_ids", sa.String(500), nullable=True, comment="任务组账号ID（逗号分隔）"),
+    sa.Column("limit_per_query", sa.Integer(), nullable=True, comment="每个搜索词采集上限"),
+    sa.Column("download_media", sa.Boolean(), nullable=False, server_default=sa.false(), comment="是否下载媒体"),
+    sa.Column("keep_hours", sa.Integer(), nullable=True, comment="媒体保留小时数"),
+    sa.Column("users_collected", sa.Integer(), nullable=False, server_default="0", comment="已采集用户数"),
+    sa.Column("media_items", sa.Integer(), nullable=False, server_default="0", comment="媒体条目数"),
+    sa.Column("error_count", sa.Integer(), nullable=False, server_default="0", comment="失败的搜索词数"),
+]
+
+BATCH_SIZE = 500
+
+
+def _loads(raw) -> dict:
+    if raw is None:
+        return {}
+    if isinstance(raw, dict):
+        return raw
+    value = raw
+    # 创建接口把 JSON 字符串写进了 JSON 列，读出来可能要解析两次
+    for _ in range(2):
+        if not isinstance(value, (str, bytes)):
+            break
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def _summary(row) -> dict:
+    """与 SearchTask.apply_params_summary / apply_results_summary 相同的规则"""
+    params = _loads(row.search_params)
+    results = _loads(row.results)
+    queries = params.get("assigned_queries") or params.get("search_queries") or (
+        row.search_query.split(";") if row.search_query else []
+    )
+    account_ids = params.get("account_ids") or ([row.instagram_account_id] if row.instagram_account_id else [])
+    return {
+        "query_count": len(queries),
+        "account_ids": ",".join(str(account_id) for account_id in account_ids),
+        "limit_per_query": params.get("limit_per_query"),
+        "download_media": bool(params.get("download_media")),
+        "keep_hours": params.get("keep_hours"),
+        "users_collected": int(results.get("users_collected") or 0),
+        "media_items": int(results.get("media_items") or 0),
+        "error_count": len(results.get("errors") or []),
+    }
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("search_tasks"):
+        return
+    existing = {column["name"] for column in inspector.get_columns("search_tasks")}
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column("search_tasks", column.copy())
+
+    # 回填已有任务的摘要（按 id 分批）
+    tasks = sa.table(
+        "search_tasks",
+        sa.column("id", sa.Integer), sa.column("instagram_account_id", sa.Integer),
+        sa.column("search_query", sa.String), sa.column("search_params", sa.Text),
+        sa.column("results", sa.Text), *[sa.column(column.name) for column in COLUMNS],
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                tasks.c.id, tasks.c.instagram_account_id, tasks.c.search_query,
+                tasks.c.search_params, tasks.c.results,
+            ).where(tasks.c.id > last_id).order_by(tasks.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            bind.execute(tasks.update().where(tasks.c.id == row.id).values(**_summary(row)))
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("search_tasks"):
+        return
+    existing = {column["name"] for column in inspector.get_columns("search_tasks")}
+    for column in reversed(COLUMNS):
+        if column.name in existing:
+            op.drop_column("search_tasks", column.name)
@@ -0,0 +1,68 @@
+"""collection jobs owning per-account search task shards
+
+Revision ID: c7d91e4f2b36
+Revises: 8b4e6d2c1a55
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d91e4f2b36'
+down_revision = '8b4e6d2c1a55'
+branch_labels = None
+depends_on = None
+
+# 与模型中 Enum(SearchType) / Enum(TaskStatus) 一致（按枚举名存储）
+SEARCH_TYPE = sa.Enum("HASHTAG", "LOCATION", "USERNAME", "KEYWORD", name="searchtype")
+TASK_STATUS = sa.Enum("PENDING", "RUNNING", "COMPLETED", "FAILED", "CANCELLED", name="taskstatus")
+
+COUNTERS = (
+    "shard_count", "shards_started", "shards_done", "shards_failed",
+    "query_count", "queries_done", "users_collected", "media_items", "error_count",
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("collection_jobs"):
+        op.create_table(
+            "collection_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False, comment="用户ID"),
+            sa.Column("task_name", sa.String(100), nullable=False, comment="任务名称"),
+            sa.Column("search_type", SEARCH_TYPE, nullable=False, comment="搜索类型"),
+            sa.Column("status", TASK_STATUS, nullable=False, comment="作业状态"),
+            *[sa.Column(name, sa.Integer(), nullable=False, server_default="0") for name in COUNTERS],
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=True, comment="开始时间"),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True, comment="完成时间"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), comment="创建时间"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), comment="更新时间"),
+        )
+        op.create_index("ix_collection_jobs_id", "collection_jobs", ["id"])
+        op.create_index("ix_collection_jobs_user_created", "collection_jobs", ["user_id", "created_at"])
+
+    if inspector.has_table("search_tasks"):
+        columns = {column["name"] for column in inspector.get_columns("search_tasks")}
+        if "job_id" not in columns:
+            op.add_column("search_tasks", sa.Column("job_id", sa.Integer(), nullable=True, comment="所属采集作业ID"))
+            op.create_index("ix_search_tasks_job_id", "search_tasks", ["job_id"])
+            if op.get_bind().dialect.name != "sqlite":
+                op.create_foreign_key(
+                    "fk_search_tasks_job_id", "search_tasks", "collection_jobs", ["job_id"], ["id"]
+                )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("search_tasks"):
+        columns = {column["name"] for column in inspector.get_columns("search_tasks")}
+        if "job_id" in columns:
+            if op.get_bind().dialect.name != "sqlite":
+                op.drop_constraint("fk_search_tasks_job_id", "search_tasks", type_="foreignkey")
+            op.drop_index("ix_search_tasks_job_id", table_name="search_tasks")
+            op.drop_column("search_tasks", "job_id")
+    if inspector.has_table("collection_jobs"):
+        op.drop_table("collection_jobs")
@@ -0,0 +1,38 @@
+"""post schedule due index for the sweep
+
+Revision ID: d2a8f5c31e47
+Revises: c7d91e4f2b36
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from typing import Optional
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8f5c31e47'
+down_revision = 'c7d91e4f2b36'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "ix_post_schedules_status_scheduled"
+
+
+def _existing() -> Optional[set]:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("post_schedules"):
+        return None
+    return {index["name"] for index in inspector.get_indexes("post_schedules")}
+
+
+def upgrade() -> None:
+    existing = _existing()
+    if existing is not None and INDEX_NAME not in existing:
+        op.create_index(INDEX_NAME, "post_schedules", ["status", "scheduled_time"])
+
+
+def downgrade() -> None:
+    existing = _existing()
+    if existing is not None and INDEX_NAME in existing:
+        op.drop_index(INDEX_NAME, table_name="post_schedules")
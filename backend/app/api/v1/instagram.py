@@ -2,19 +2,25 @@ import json
 from datetime import datetime
 from typing import List, Optional
 
-import requests
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from instagrapi.exceptions import ChallengeParked
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 import logging
 
+from ...core.config import settings
 from ...core.database import get_db
 from ...models.instagram_account import InstagramAccount, LoginStatus
 from ...models.instagram_account_stat import InstagramAccountStat
 from ...models.proxy import ProxyConfig, ProxyType
-from ...utils.decorators import get_current_user
+from ...utils.decorators import get_current_user, rate_limit
 from ...utils.limits import enforce_api_quota, ensure_account_quota
 from ...services.instagram_wrapper import instagram_account_manager, instagram_operations
+from ...services.account_heartbeat import account_heartbeat_service
+from ...services.account_challenge import account_challenge_store, challenge_view
+from ...services.scheduler_service import celery_app, direct_campaign_task
+from ...services.realtime_service import realtime_service
+from ...services.proxy_health import proxy_health_service, build_proxy_url, compute_score, is_quarantined
 
 router = APIRouter(dependencies=[Depends(enforce_api_quota)])
 logger = logging.getLogger(__name__)
@@ -25,6 +31,7 @@ class InstagramAccountCreate(BaseModel):
     password: str
     two_factor_secret: Optional[str] = None
     proxy_id: Optional[int] = None
+    auto_proxy: bool = False  # 未指定 proxy_id 时自动绑定评分最高的代理
     is_active: bool = True
 
 
@@ -76,6 +83,7 @@ class ProxyConfigResponse(BaseModel):
     proxy_type: str
     is_active: bool
     created_at: Optional[str] = None
+    health: Optional[dict] = None
 
 
 class ProxyTestRequest(BaseModel):
@@ -92,6 +100,11 @@ class LoginRequest(BaseModel):
     totp_code: Optional[str] = None
 
 
+class ChallengeCodeRequest(BaseModel):
+    """提交验证码请求体（change_password 步骤填写新密码）"""
+    code: str
+
+
 class BulkDeleteRequest(BaseModel):
     ids: List[int]
 
@@ -110,6 +123,12 @@ class DirectMessageRequest(BaseModel):
     text: str
 
 
+class DirectCampaignRequest(BaseModel):
+    account_ids: List[int]
+    usernames: List[str]
+    text: str
+
+
 def _serialize_account(account: InstagramAccount) -> InstagramAccountResponse:
     two_factor_secret = None
     try:
@@ -154,6 +173,7 @@ def _serialize_proxy(proxy: ProxyConfig) -> ProxyConfigResponse:
         proxy_type=proxy.proxy_type.value if hasattr(proxy.proxy_type, "value") else proxy.proxy_type,
         is_active=proxy.is_active,
         created_at=proxy.created_at.isoformat() if proxy.created_at else None,
+        health=proxy.health.to_dict() if proxy.health else None,
     )
 
 
@@ -195,6 +215,11 @@ async def add_instagram_account(
         ).first()
         if not proxy:
             raise HTTPException(status_code=404, detail="?????????")
+    elif account_data.auto_proxy:
+        proxy = proxy_health_service.pick_best_proxy(db, current_user.id)
+        if not proxy:
+            raise HTTPException(status_code=400, detail="没有可用的代理")
+        account_data.proxy_id = proxy.id
 
     session_blob = json.dumps({"two_factor_secret": account_data.two_factor_secret}) if account_data.two_factor_secret else None
 
@@ -266,6 +291,7 @@ async def update_instagram_account(
     return _serialize_account(account)
 
 @router.post("/accounts/{account_id}/login")
+@rate_limit(max_requests=5, window_seconds=300)
 async def login_instagram_account(
     account_id: int,
     login_req: LoginRequest = None,
@@ -292,7 +318,22 @@ async def login_instagram_account(
         await instagram_account_manager.add_account(account, proxy, totp_code=totp_code)
         db.commit()
         db.refresh(account)
-        status = await instagram_account_manager.check_login_status(account.id)
+        status = await account_heartbeat_service.check_now(account.id)
+    except ChallengeParked as exc:
+        # 需要验证码：账号已挂起，通过 /challenge 接口提交验证码后继续
+        db.refresh(account)
+        record = account_challenge_store.get(account.id)
+        return {
+            "accountId": account_id,
+            "status": {
+                "account_id": account.id,
+                "username": account.username,
+                "logged_in": False,
+                "status": LoginStatus.CHALLENGE_REQUIRED.value,
+                "message": str(exc),
+            },
+            "challenge": challenge_view(record) if record else None,
+        }
     except Exception as exc:
         account.login_status = LoginStatus.LOGGED_OUT.value
         db.commit()
@@ -300,9 +341,74 @@ async def login_instagram_account(
         # 将底层错误直接抛给前端，便于排查代理/网络问题
         raise HTTPException(status_code=500, detail=f"登录失败: {exc}")
 
+    if settings.DM_REALTIME_ENABLED:
+        # 新登录的客户端替换了旧客户端，实时连接随之重建
+        await realtime_service.restart_account(account.id)
     return {"accountId": account_id, "status": status}
 
 
+def _owned_account(account_id: int, current_user, db: Session) -> InstagramAccount:
+    account = db.query(InstagramAccount).filter(
+        InstagramAccount.id == account_id,
+        InstagramAccount.user_id == current_user.id,
+    ).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="账户不存在")
+    return account
+
+
+@router.get("/accounts/{account_id}/challenge")
+async def get_account_challenge(
+    account_id: int,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """查看账号等待中的验证（步骤、验证方式、挂起时间）"""
+    account = _owned_account(account_id, current_user, db)
+    record = account_challenge_store.get(account.id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="账号没有等待中的验证")
+    return challenge_view(record)
+
+
+@router.post("/accounts/{account_id}/challenge")
+@rate_limit(max_requests=5, window_seconds=300)
+async def submit_account_challenge(
+    account_id: int,
+    payload: ChallengeCodeRequest,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """提交验证码完成验证，账号重新登录并恢复等待验证的任务"""
+    account = _owned_account(account_id, current_user, db)
+    try:
+        await instagram_account_manager.submit_challenge_code(account, payload.code.strip())
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ChallengeParked as exc:
+        # 验证码错误或又触发了新的验证，账号保持挂起
+        raise HTTPException(status_code=400, detail=f"验证未完成: {exc}")
+    except Exception as exc:
+        logger.exception("提交验证码失败")
+        raise HTTPException(status_code=500, detail=f"提交验证码失败: {exc}")
+    status = await account_heartbeat_service.check_now(account.id)
+    if settings.DM_REALTIME_ENABLED:
+        await realtime_service.restart_account(account.id)
+    return {"accountId": account_id, "status": status}
+
+
+@router.delete("/accounts/{account_id}/challenge")
+async def discard_account_challenge(
+    account_id: int,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """放弃等待中的验证（验证码收不到等），之后可以重新登录"""
+    account = _owned_account(account_id, current_user, db)
+    account_challenge_store.clear(account.id)
+    return {"message": f"账户 {account_id} 的验证已放弃"}
+
+
 @router.get("/accounts/{account_id}/status")
 async def check_account_status(
     account_id: int,
@@ -315,7 +421,16 @@ async def check_account_status(
     ).first()
     if not account:
         raise HTTPException(status_code=404, detail="账户不存在")
-    status = await instagram_account_manager.check_login_status(account.id)
+    # 只读心跳缓存，不请求 Instagram；尚未检查过时返回数据库中的状态
+    status = account_heartbeat_service.get_status(account.id)
+    if status is None:
+        status = {
+            "account_id": account.id,
+            "username": account.username,
+            "logged_in": account.login_status == LoginStatus.LOGGED_IN.value,
+            "status": account.login_status,
+            "message": "尚未检查",
+        }
     return status
 
 
@@ -370,6 +485,8 @@ async def delete_instagram_account(
     if not account:
         raise HTTPException(status_code=404, detail="账户不存在")
     await instagram_account_manager.remove_account(account.id)
+    await realtime_service.remove_account(account.id)
+    account_heartbeat_service.forget(account.id)
     db.delete(account)
     db.commit()
     return {"message": f"账户 {account_id} 已删除"}
@@ -390,6 +507,8 @@ async def bulk_delete_accounts(
     count = 0
     for acc in accounts:
         await instagram_account_manager.remove_account(acc.id)
+        await realtime_service.remove_account(acc.id)
+        account_heartbeat_service.forget(acc.id)
         db.delete(acc)
         count += 1
     db.commit()
@@ -504,17 +623,8 @@ async def ping_account(
     except Exception as exc:
         # 保持异常信息，便于前端提示
         raise HTTPException(status_code=400, detail=str(exc))
-    status = await instagram_account_manager.check_login_status(account.id)
-    # 同步状态到 login_status 字段
-    try:
-        await instagram_account_manager._update_login_status(
-            account.id,
-            status.get("logged_in", False),
-            status.get("message"),
-            LoginStatus.LOGGED_IN.value if status.get("logged_in") else status.get("status") or LoginStatus.LOGGED_OUT.value,
-        )
-    except Exception:
-        pass
+    # 立即做一次心跳检查，登录状态与统计由心跳服务写回
+    status = await account_heartbeat_service.check_now(account.id)
     return status
 
 
@@ -549,6 +659,41 @@ async def send_direct_message(
     return result
 
 
+@router.post("/direct-campaigns")
+async def create_direct_campaign(
+    payload: DirectCampaignRequest,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    批量私信：收件人分配给多个账号，由后台任务按每账号配额节奏发送
+    """
+    if not payload.text or not payload.text.strip():
+        raise HTTPException(status_code=400, detail="消息内容不能为空")
+    if not payload.usernames:
+        raise HTTPException(status_code=400, detail="收件人列表不能为空")
+    owned = db.query(InstagramAccount.id).filter(
+        InstagramAccount.id.in_(payload.account_ids),
+        InstagramAccount.user_id == current_user.id,
+    ).count()
+    if not payload.account_ids or owned != len(set(payload.account_ids)):
+        raise HTTPException(status_code=404, detail="账户不存在")
+
+    task = direct_campaign_task.delay(current_user.id, payload.account_ids, payload.usernames, payload.text)
+    return {"task_id": task.id, "recipients": len(payload.usernames), "accounts": payload.account_ids}
+
+
+@router.get("/direct-campaigns/{task_id}")
+async def get_direct_campaign(task_id: str, current_user=Depends(get_current_user)):
+    """批量私信任务状态；完成后返回各结果计数与失败明细"""
+    result = celery_app.AsyncResult(task_id)
+    return {
+        "task_id": task_id,
+        "status": result.status,
+        "result": result.result if result.successful() else None,
+    }
+
+
 # 代理管理
 @router.get("/proxies", response_model=List[ProxyConfigResponse])
 async def get_proxy_configs(
@@ -627,31 +772,98 @@ async def bulk_delete_proxies(
 
 
 @router.post("/proxies/test")
+@rate_limit(max_requests=20, window_seconds=60)
 async def test_proxy_config(
     proxy_data: ProxyTestRequest,
     current_user=Depends(get_current_user)
 ):
-    proxy_auth = ""
-    if proxy_data.username:
-        proxy_auth = f"{proxy_data.username}:{proxy_data.password or ''}@"
     # 仅允许 https 目标，避免 SSRF
     if not proxy_data.test_url.lower().startswith("https://"):
         raise HTTPException(status_code=400, detail="仅允许 https 测试地址")
-    proxy_url = f"{proxy_data.proxy_type}://{proxy_auth}{proxy_data.host}:{proxy_data.port}"
-    proxies = {"http": proxy_url, "https": proxy_url}
-    try:
-        resp = requests.get(proxy_data.test_url, proxies=proxies, timeout=8, verify=True)
-        resp.raise_for_status()
-        return {
-            "success": True,
-            "message": "代理测试成功",
-            "host": proxy_data.host,
-            "port": proxy_data.port,
-            "proxy_type": proxy_data.proxy_type,
-            "status_code": resp.status_code,
-        }
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"代理测试失败: {exc}")
+    proxy_url = build_proxy_url(proxy_data.proxy_type, proxy_data.host, proxy_data.port, proxy_data.username, proxy_data.password)
+    result = await proxy_health_service.probe(0, proxy_url, proxy_data.proxy_type, test_url=proxy_data.test_url)
+    if not result.success:
+        raise HTTPException(status_code=400, detail=f"代理测试失败: {result.error}")
+    return {
+        "success": True,
+        "message": "代理测试成功",
+        "host": proxy_data.host,
+        "port": proxy_data.port,
+        "proxy_type": proxy_data.proxy_type,
+        "status_code": result.status_code,
+        "latency_ms": round(result.latency_ms, 1),
+        "bandwidth_kbps": round(result.bandwidth_kbps, 1) if result.bandwidth_kbps is not None else None,
+    }
+
+
+@router.get("/proxies/health")
+async def get_proxy_health(
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """代理健康评分，按评分从高到低排序"""
+    proxies = db.query(ProxyConfig).filter(ProxyConfig.user_id == current_user.id).all()
+    items = []
+    for proxy in proxies:
+        items.append({
+            "id": proxy.id,
+            "name": proxy.name,
+            "host": proxy.host,
+            "port": proxy.port,
+            "is_active": proxy.is_active,
+            "score": round(compute_score(proxy.health), 1),
+            "quarantined": is_quarantined(proxy.health),
+            "accounts": len(proxy.instagram_accounts),
+            "health": proxy.health.to_dict() if proxy.health else None,
+        })
+    items.sort(key=lambda item: (item["quarantined"], -item["score"]))
+    return {"proxies": items}
+
+
+@router.post("/proxies/probe")
+@rate_limit(max_requests=5, window_seconds=60)
+async def probe_proxies(
+    current_user=Depends(get_current_user),
+):
+    """立即并发探测当前用户的全部代理"""
+    result = await proxy_health_service.probe_all(user_id=current_user.id)
+    if not result.get("success"):
+        raise HTTPException(status_code=409, detail=result.get("error", "代理探测失败"))
+    return result
+
+
+@router.get("/proxies/best", response_model=ProxyConfigResponse)
+async def get_best_proxy(
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """评分最高且未被隔离的代理"""
+    proxy = proxy_health_service.pick_best_proxy(db, current_user.id)
+    if not proxy:
+        raise HTTPException(status_code=404, detail="没有可用的代理")
+    return _serialize_proxy(proxy)
+
+
+@router.post("/accounts/{account_id}/rebind-proxy", response_model=InstagramAccountResponse)
+async def rebind_account_proxy(
+    account_id: int,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """把账号切换到评分最高的其他代理，已登录的客户端保留会话换到新代理，实时连接随之重建"""
+    account = db.query(InstagramAccount).filter(
+        InstagramAccount.id == account_id,
+        InstagramAccount.user_id == current_user.id,
+    ).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="账号不存在")
+    proxy = proxy_health_service.rebind_account(db, account)
+    if not proxy:
+        raise HTTPException(status_code=400, detail="没有可用的代理")
+    db.commit()
+    db.refresh(account)
+    await proxy_health_service.rebind_client(account.id, proxy)
+    return _serialize_account(account)
 
 
 # 其余端点保留兼容，不实现业务细节
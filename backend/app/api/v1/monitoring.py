@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Response, status, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
-import json
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
 import asyncio
+import time
 
+from sqlalchemy import func, text
+
+from ...core.config import settings
 from ...core.database import get_db
+from ...core.metrics import (
+    registry,
+    collect_process_metrics,
+    collect_queue_metrics,
+    HTTP_REQUEST_DURATION,
+    DB_QUERY_DURATION,
+    INSTAGRAM_OPERATION_DURATION,
+    INSTAGRAM_OPERATIONS_TOTAL,
+)
 from ...utils.decorators import get_current_user
 from ...core.security import get_current_user_websocket
 from ...models.user import User
+from ...models.instagram_account import InstagramAccount, LoginStatus
+from ...models.message import MessageLog as MessageLogModel
 from ...utils.limits import enforce_api_quota
+from ...utils import json_codec
+from ...utils.pagination import DEFAULT_PAGE_SIZE, keyset_page
+from ...services.account_heartbeat import account_heartbeat_service
 
 # 创建路由器（全部接口默认需要鉴权）
 router = APIRouter(dependencies=[Depends(get_current_user), Depends(enforce_api_quota)])
@@ -92,44 +109,50 @@ manager = ConnectionManager()
 # 获取消息日志
 @router.get("/messages", response_model=List[MessageLog])
 async def get_message_logs(
+    response: Response,
     account_id: Optional[int] = None,
     thread_id: Optional[str] = None,
-    limit: int = 100,
-    skip: int = 0,
-    current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    """获取消息日志"""
-    # 这里应该从数据库获取消息日志
-    return [
-        MessageLog(
-            id=1,
-            thread_id="thread123",
-            sender_username="user1",
-            message_content="你好",
-            message_type="text",
-            is_incoming=True,
-            is_auto_reply=False,
-            created_at="2025-12-09T00:00:00Z"
-        )
-    ]
+    """获取消息日志（收件箱同步与发送记录），按时间倒序，下一页游标见响应头 X-Next-Cursor"""
+    query = db.query(MessageLogModel).filter(MessageLogModel.user_id == current_user.id)
+    if account_id is not None:
+        query = query.filter(MessageLogModel.instagram_account_id == account_id)
+    if thread_id is not None:
+        query = query.filter(MessageLogModel.thread_id == thread_id)
+    messages, _ = keyset_page(query, MessageLogModel.created_at, MessageLogModel.id, cursor, limit, response)
+    return [_serialize_message(message) for message in messages]
 
 
 @router.get("/messages/{message_id}")
 async def get_message_detail(
     message_id: int,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """获取消息详情"""
-    # 这里应该从数据库获取消息详情
+    message = db.query(MessageLogModel).filter(
+        MessageLogModel.id == message_id,
+        MessageLogModel.user_id == current_user.id
+    ).first()
+    if not message:
+        raise HTTPException(status_code=404, detail="消息不存在")
+    return _serialize_message(message)
+
+
+def _serialize_message(message: MessageLogModel) -> MessageLog:
     return MessageLog(
-        id=message_id,
-        thread_id="thread123",
-        sender_username="user1",
-        message_content="你好",
-        message_type="text",
-        is_incoming=True,
-        is_auto_reply=False,
-        created_at="2025-12-09T00:00:00Z"
+        id=message.id,
+        thread_id=message.thread_id,
+        sender_username=message.sender_username,
+        message_content=message.message_content,
+        message_type=message.message_type.value,
+        is_incoming=message.is_incoming,
+        is_auto_reply=message.is_auto_reply,
+        created_at=message.created_at.isoformat() if message.created_at else ""
     )
 
 
@@ -156,81 +179,156 @@ async def get_auto_reply_logs(
     ]
 
 
-# 获取账号状态
-@router.get("/account-status", response_model=List[AccountStatus])
-async def get_account_status(current_user: User = Depends(get_current_user)):
-    """获取Instagram账号状态"""
-    # 这里应该从数据库获取账号状态
-    return [
-        AccountStatus(
-            account_id=1,
-            username="example_user",
-            login_status="logged_in",
-            last_activity="2025-12-09T00:00:00Z",
-            is_online=True,
+# 获取账号状态（只读心跳缓存，不触发 Instagram 请求）
+def _account_status(account: InstagramAccount, cached: Optional[Dict]) -> AccountStatus:
+    if cached is None:
+        return AccountStatus(
+            account_id=account.id,
+            username=account.username,
+            login_status=account.login_status,
+            last_activity=account.last_login.isoformat() if account.last_login else None,
+            is_online=False,
             error_count=0
         )
-    ]
+    return AccountStatus(
+        account_id=account.id,
+        username=account.username,
+        login_status=cached.get("status") or account.login_status,
+        last_activity=cached.get("last_success_at") or cached.get("checked_at"),
+        is_online=bool(cached.get("logged_in") and cached.get("reachable")),
+        error_count=int(cached.get("error_count") or 0)
+    )
+
+
+@router.get("/account-status", response_model=List[AccountStatus])
+async def get_account_status(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取Instagram账号状态"""
+    accounts = db.query(InstagramAccount).filter(
+        InstagramAccount.user_id == current_user.id
+    ).order_by(InstagramAccount.id).all()
+    cached = account_heartbeat_service.get_statuses([account.id for account in accounts])
+    return [_account_status(account, cached.get(account.id)) for account in accounts]
 
 
 @router.get("/account-status/{account_id}", response_model=AccountStatus)
 async def get_single_account_status(
     account_id: int,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """获取特定账号状态"""
-    # 这里应该从数据库获取特定账号状态
-    return AccountStatus(
-        account_id=account_id,
-        username="example_user",
-        login_status="logged_in",
-        last_activity="2025-12-09T00:00:00Z",
-        is_online=True,
-        error_count=0
-    )
+    account = db.query(InstagramAccount).filter(
+        InstagramAccount.id == account_id,
+        InstagramAccount.user_id == current_user.id
+    ).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="账号不存在")
+    return _account_status(account, account_heartbeat_service.get_status(account.id))
+
+
+def _instagram_error_rate() -> Dict[str, float]:
+    """根据 Instagram 操作计数估算错误率"""
+    total = 0.0
+    failed = 0.0
+    for labels, value in INSTAGRAM_OPERATIONS_TOTAL.items():
+        total += value
+        # failure：Instagram 正常返回但操作未成功（{'success': False}）
+        if labels.get("outcome") in ("error", "challenge", "failure"):
+            failed += value
+    return {"total": total, "failed": failed, "error_rate": (failed / total) if total else 0.0}
 
 
 # 获取系统状态
 @router.get("/system-status", response_model=List[SystemStatus])
-async def get_system_status(current_user: User = Depends(get_current_user)):
+async def get_system_status(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """获取系统服务状态"""
-    # 这里应该检查各个服务的状态
-    return [
-        SystemStatus(
+    now = datetime.utcnow().isoformat()
+    statuses: List[SystemStatus] = []
+
+    try:
+        start = time.perf_counter()
+        db.execute(text("SELECT 1"))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        statuses.append(SystemStatus(
             service_name="数据库",
-            status="healthy",
-            last_check="2025-12-09T00:00:00Z"
-        ),
-        SystemStatus(
-            service_name="Redis缓存",
-            status="healthy",
-            last_check="2025-12-09T00:00:00Z"
-        ),
-        SystemStatus(
-            service_name="Instagram API",
-            status="healthy",
-            last_check="2025-12-09T00:00:00Z"
-        ),
-        SystemStatus(
-            service_name="MQTT客户端",
-            status="healthy",
-            last_check="2025-12-09T00:00:00Z"
-        )
-    ]
+            status="healthy" if elapsed_ms < 500 else "degraded",
+            last_check=now,
+            error_message=None if elapsed_ms < 500 else f"响应 {elapsed_ms:.0f}ms"
+        ))
+    except Exception as exc:
+        statuses.append(SystemStatus(service_name="数据库", status="unhealthy", last_check=now, error_message=str(exc)))
+
+    queue_info = await asyncio.to_thread(collect_queue_metrics, settings.REDIS_URL, settings.CELERY_BROKER_URL)
+    if queue_info.get("redis_error"):
+        statuses.append(SystemStatus(service_name="Redis缓存", status="unhealthy", last_check=now, error_message=queue_info["redis_error"]))
+    else:
+        statuses.append(SystemStatus(service_name="Redis缓存", status="healthy", last_check=now))
+
+    if queue_info.get("broker_error"):
+        statuses.append(SystemStatus(service_name="任务队列", status="unhealthy", last_check=now, error_message=queue_info["broker_error"]))
+    else:
+        statuses.append(SystemStatus(service_name="任务队列", status="healthy", last_check=now))
+
+    ig = _instagram_error_rate()
+    if ig["total"] == 0:
+        ig_status, ig_error = "unknown", "暂无调用记录"
+    elif ig["error_rate"] > 0.5:
+        ig_status, ig_error = "unhealthy", f"错误率 {ig['error_rate']:.0%}"
+    elif ig["error_rate"] > 0.1:
+        ig_status, ig_error = "degraded", f"错误率 {ig['error_rate']:.0%}"
+    else:
+        ig_status, ig_error = "healthy", None
+    statuses.append(SystemStatus(service_name="Instagram API", status=ig_status, last_check=now, error_message=ig_error))
+
+    return statuses
 
 
 # 获取实时统计
 @router.get("/realtime-stats")
-async def get_realtime_stats(current_user: User = Depends(get_current_user)):
+async def get_realtime_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """获取实时统计信息"""
-    # 这里应该从缓存或数据库获取实时统计
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    account_counts = dict(
+        db.query(InstagramAccount.login_status, func.count(InstagramAccount.id))
+        .filter(InstagramAccount.user_id == current_user.id, InstagramAccount.is_active == True)
+        .group_by(InstagramAccount.login_status)
+        .all()
+    )
+    message_query = db.query(MessageLogModel).filter(
+        MessageLogModel.user_id == current_user.id,
+        MessageLogModel.created_at >= today_start
+    )
+    pending_cutoff = datetime.utcnow() - timedelta(minutes=30)
+    # 登录失败会把账号状态写为未登录/需要验证并刷新 updated_at，今天变为这些状态的账号即今天登录失败的账号
+    failed_logins = db.query(func.count(InstagramAccount.id)).filter(
+        InstagramAccount.user_id == current_user.id,
+        InstagramAccount.is_active == True,
+        InstagramAccount.login_status != LoginStatus.LOGGED_IN.value,
+        InstagramAccount.updated_at >= today_start
+    ).scalar() or 0
+
     return {
-        "active_accounts": 5,
-        "online_accounts": 4,
-        "pending_messages": 12,
-        "auto_replies_today": 25,
-        "failed_logins_today": 1,
-        "total_messages_today": 156
+        "active_accounts": sum(account_counts.values()),
+        "online_accounts": account_counts.get(LoginStatus.LOGGED_IN.value, 0),
+        "pending_messages": db.query(func.count(MessageLogModel.id)).filter(
+            MessageLogModel.user_id == current_user.id,
+            MessageLogModel.is_incoming == True,
+            MessageLogModel.is_auto_reply == False,
+            MessageLogModel.created_at >= pending_cutoff
+        ).scalar() or 0,
+        "auto_replies_today": message_query.filter(MessageLogModel.is_auto_reply == True).count(),
+        "failed_logins_today": failed_logins,
+        "total_messages_today": message_query.count()
     }
 
 
@@ -278,14 +376,14 @@ async def websocket_endpoint(
         while True:
             # 接收客户端消息
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = json_codec.loads(data)
             
             # 处理不同类型的消息
             if message_data.get("type") == "ping":
-                await websocket.send_text(json.dumps({"type": "pong", "timestamp": datetime.utcnow().isoformat()}))
+                await websocket.send_text(json_codec.dumps({"type": "pong", "timestamp": datetime.utcnow().isoformat()}))
             elif message_data.get("type") == "subscribe":
                 # 订阅特定类型的通知
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(json_codec.dumps({
                     "type": "subscribed",
                     "channel": message_data.get("channel"),
                     "timestamp": datetime.utcnow().isoformat()
@@ -313,7 +411,7 @@ async def send_notification(
         "timestamp": datetime.utcnow().isoformat()
     }
     
-    await manager.send_personal_message(json.dumps(notification), user_id)
+    await manager.send_personal_message(json_codec.dumps(notification), user_id)
     return {"message": "通知已发送"}
 
 
@@ -334,28 +432,27 @@ async def broadcast_system_message(
         "timestamp": datetime.utcnow().isoformat()
     }
     
-    await manager.broadcast(json.dumps(system_message))
+    await manager.broadcast(json_codec.dumps(system_message))
     return {"message": "系统消息已广播", "recipients": len(manager.active_connections)}
 
 
 # 获取性能指标
 @router.get("/performance-metrics")
 async def get_performance_metrics(current_user: User = Depends(get_current_user)):
-    """获取系统性能指标"""
-    # 这里应该从监控系统获取性能数据
+    """获取系统性能指标（进程内聚合器快照）"""
+    queue_info = await asyncio.to_thread(collect_queue_metrics, settings.REDIS_URL, settings.CELERY_BROKER_URL)
+    endpoint_metric = registry.get("instagram_endpoint_duration_seconds")
     return {
-        "cpu_usage": 45.2,
-        "memory_usage": 62.8,
-        "disk_usage": 35.1,
-        "network_io": {
-            "bytes_sent": 1024000,
-            "bytes_received": 2048000
-        },
-        "response_times": {
-            "api_avg": 120.5,
-            "db_avg": 45.2,
-            "cache_avg": 8.1
+        "process": collect_process_metrics(),
+        "http": HTTP_REQUEST_DURATION.summary(),
+        "database": DB_QUERY_DURATION.summary(),
+        "instagram": {
+            "latency": INSTAGRAM_OPERATION_DURATION.summary(),
+            "calls": [dict(labels, count=int(value)) for labels, value in INSTAGRAM_OPERATIONS_TOTAL.items()],
+            "endpoints": endpoint_metric.summary() if endpoint_metric else [],
         },
+        "redis": {"ping_ms": queue_info.get("redis_ping_ms"), "error": queue_info.get("redis_error")},
+        "queues": queue_info.get("queues", {}),
         "active_connections": len(manager.active_connections),
         "last_updated": datetime.utcnow().isoformat()
     }
@@ -1,9 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Response
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 from typing import List, Optional
 from enum import Enum
-import json
 from datetime import datetime
 import uuid
 
@@ -17,12 +16,18 @@ SEARCH_ID_SEQ = 0
 from ...core.database import get_db
 from ...services.scheduler_service import task_scheduler
 from ...services.data_collector import data_collector, data_analyzer
+from ...services.job_progress import job_progress_service
 from ...models.schedule import PostSchedule, PostStatus, RepeatType as ModelRepeatType
-from ...models.search_task import SearchTask, TaskStatus as ModelTaskStatus
+from ...models.search_task import SearchTask, SearchType as ModelSearchType, TaskStatus as ModelTaskStatus
+from ...models.collected_user_data import CollectedUserData
+from ...models.collection_job import CollectionJob
 from ...models.instagram_account import InstagramAccount
 from ...models.user import User
-from ...utils.decorators import get_current_user
+from ...utils.decorators import get_current_user, rate_limit
 from ...utils.limits import enforce_api_quota
+from ...utils import json_codec
+from ...utils.json_codec import CodecJSONResponse
+from ...utils.pagination import DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_page
 
 # 创建路由器
 router = APIRouter(dependencies=[Depends(enforce_api_quota)])
@@ -108,42 +113,64 @@ class SearchTaskResponse(BaseModel):
     started_at: Optional[str] = None
     completed_at: Optional[str] = None
     results: Optional[dict] = None
+    job_id: Optional[int] = None
+    query_count: Optional[int] = None
+    users_collected: Optional[int] = None
+    media_items: Optional[int] = None
+    error_count: Optional[int] = None
 
 
-def _safe_json(raw):
-    if raw is None:
-        return {}
-    if isinstance(raw, dict):
-        return raw
-    try:
-        return json.loads(raw)
-    except Exception:
-        return {}
-
-
-def _extract_queries(task: SearchTask) -> List[str]:
-    params = _safe_json(task.search_params)
-    if params.get("assigned_queries"):
-        return params.get("assigned_queries") or []
-    if params.get("search_queries"):
-        return params.get("search_queries") or []
-    if getattr(task, "search_query", None):
-        return [task.search_query]
-    return []
+class CollectionJobResponse(BaseModel):
+    id: int
+    task_name: str
+    search_type: SearchType
+    status: TaskStatus
+    shard_count: int
+    shards_started: int
+    shards_done: int
+    shards_failed: int
+    query_count: int
+    queries_done: int
+    users_collected: int
+    media_items: int
+    error_count: int
+    progress_percentage: int
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    created_at: Optional[str] = None
 
 
-def _extract_account_ids(task: SearchTask) -> List[int]:
-    params = _safe_json(task.search_params)
-    if params.get("account_ids"):
-        return params.get("account_ids") or []
-    if getattr(task, "instagram_account_id", None):
-        return [task.instagram_account_id]
-    return []
+# 列表只读取这些列，不加载 search_params / results
+SEARCH_TASK_SUMMARY_COLUMNS = (
+    SearchTask.id, SearchTask.job_id, SearchTask.task_name, SearchTask.search_type, SearchTask.search_query,
+    SearchTask.status, SearchTask.created_at, SearchTask.started_at, SearchTask.completed_at,
+    SearchTask.query_count, SearchTask.account_ids, SearchTask.limit_per_query,
+    SearchTask.download_media, SearchTask.keep_hours, SearchTask.users_collected,
+    SearchTask.media_items, SearchTask.error_count,
+)
 
 
-def _extract_param(task: SearchTask, key: str):
-    params = _safe_json(task.search_params)
-    return params.get(key)
+def _summary_response(task: SearchTask) -> SearchTaskResponse:
+    """由摘要列构造响应（不含 results）"""
+    return SearchTaskResponse(
+        id=task.id,
+        task_name=task.task_name,
+        search_type=task.search_type,
+        search_queries=task.search_query.split(";") if task.search_query else [],
+        account_ids=task.account_id_list(),
+        limit_per_query=task.limit_per_query,
+        download_media=task.download_media,
+        keep_hours=task.keep_hours,
+        status=task.status,
+        created_at=task.created_at.isoformat() if task.created_at else None,
+        started_at=task.started_at.isoformat() if task.started_at else None,
+        completed_at=task.completed_at.isoformat() if task.completed_at else None,
+        query_count=task.query_count,
+        users_collected=task.users_collected,
+        job_id=task.job_id,
+        media_items=task.media_items,
+        error_count=task.error_count,
+    )
 
 
 def _extract_results(task: SearchTask):
@@ -152,7 +179,7 @@ def _extract_results(task: SearchTask):
     if isinstance(task.results, dict):
         return task.results
     try:
-        return json.loads(task.results)
+        return json_codec.loads(task.results)
     except Exception:
         return task.results
 
@@ -160,16 +187,21 @@ def _extract_results(task: SearchTask):
 # 发帖计划相关API
 @router.get("/schedules", response_model=List[ScheduleResponse])
 async def get_schedules(
+    response: Response,
+    status_filter: Optional[PostStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取定时发帖计划列表"""
+    """获取定时发帖计划列表（按创建时间倒序，下一页游标见响应头 X-Next-Cursor）"""
     if USE_MEMORY:
         return MEM_SCHEDULES
     try:
-        schedules = db.query(PostSchedule).filter(
-            PostSchedule.user_id == current_user.id
-        ).all()
+        query = db.query(PostSchedule).filter(PostSchedule.user_id == current_user.id)
+        if status_filter is not None:
+            query = query.filter(PostSchedule.status == status_filter)
+        schedules, _ = keyset_page(query, PostSchedule.created_at, PostSchedule.id, cursor, limit, response)
         
         return [
             ScheduleResponse(
@@ -184,6 +216,8 @@ async def get_schedules(
             )
             for schedule in schedules
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -311,40 +345,33 @@ async def delete_schedule(
 # 搜索任务相关API
 @router.get("/search-tasks", response_model=List[SearchTaskResponse])
 async def get_search_tasks(
+    response: Response,
+    status_filter: Optional[ModelTaskStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取搜索任务列表"""
+    """获取搜索任务列表（按创建时间倒序，下一页游标见响应头 X-Next-Cursor）"""
     if USE_MEMORY:
         return MEM_SEARCH_TASKS
     try:
-        tasks = db.query(SearchTask).filter(
-        SearchTask.user_id == current_user.id
-        ).all()
+        query = db.query(SearchTask).options(load_only(*SEARCH_TASK_SUMMARY_COLUMNS)).filter(
+            SearchTask.user_id == current_user.id
+        )
+        if status_filter is not None:
+            query = query.filter(SearchTask.status == status_filter)
+        tasks, _ = keyset_page(query, SearchTask.created_at, SearchTask.id, cursor, limit, response)
         
-        return [
-            SearchTaskResponse(
-                id=task.id,
-                task_name=task.task_name,
-                search_type=task.search_type,
-                search_queries=_extract_queries(task),
-                account_ids=_extract_account_ids(task),
-                limit_per_query=_extract_param(task, "limit_per_query"),
-                download_media=_extract_param(task, "download_media"),
-                keep_hours=_extract_param(task, "keep_hours"),
-                status=task.status,
-                created_at=task.created_at.isoformat() if task.created_at else None,
-                started_at=task.started_at.isoformat() if task.started_at else None,
-                completed_at=task.completed_at.isoformat() if task.completed_at else None,
-                results=_extract_results(task)
-            )
-            for task in tasks
-        ]
+        return [_summary_response(task) for task in tasks]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/search-tasks", response_model=SearchTaskResponse)
+@rate_limit(max_requests=10, window_seconds=60)
 async def create_search_task(
     task_data: SearchTaskCreate,
     current_user: User = Depends(get_current_user),
@@ -420,6 +447,17 @@ async def create_search_task(
             target_acc = accounts[idx % len(accounts)]
             assignments[target_acc.id].append(query)
 
+        # 一次请求对应一个采集作业，每个账号一个分片
+        job = CollectionJob(
+            user_id=current_user.id,
+            task_name=task_data.task_name,
+            search_type=ModelSearchType(task_data.search_type.value),
+            status=ModelTaskStatus.PENDING,
+            query_count=len(cleaned_queries),
+        )
+        db.add(job)
+        db.flush()
+
         for acc in accounts:
             assigned_queries = assignments.get(acc.id, [])
             if not assigned_queries:
@@ -440,12 +478,14 @@ async def create_search_task(
                 user_id=current_user.id,
                 instagram_account_id=acc.id,
                 task_name=task_data.task_name,
-                search_type=task_data.search_type,
+                search_type=ModelSearchType(task_data.search_type.value),
+                job_id=job.id,
                 search_query=";".join(assigned_queries),
-                search_params=json.dumps(params_payload),
+                search_params=json_codec.dumps(params_payload),
                 status=ModelTaskStatus.PENDING,
                 total_items=len(assigned_queries) * (task_data.limit_per_query or 0)
             )
+            search_task.apply_params_summary(params_payload)
             db.add(search_task)
             db.flush()
             created_tasks.append(search_task)
@@ -453,25 +493,14 @@ async def create_search_task(
                 data_collector.collect_user_data,
                 search_task.id
             )
-        db.commit()
         if not created_tasks:
             raise HTTPException(status_code=400, detail="没有可创建的任务，检查搜索词与账号分配")
-        first = created_tasks[0]
-        return SearchTaskResponse(
-            id=first.id,
-            task_name=first.task_name,
-            search_type=first.search_type,
-            search_queries=_extract_queries(first),
-            account_ids=_extract_account_ids(first),
-            limit_per_query=_extract_param(first, "limit_per_query"),
-            download_media=_extract_param(first, "download_media"),
-            keep_hours=_extract_param(first, "keep_hours"),
-            status=first.status,
-            created_at=first.created_at.isoformat() if first.created_at else None,
-            started_at=None,
-            completed_at=None,
-            results=None
-        )
+        job.shard_count = len(created_tasks)
+        db.commit()
+        job_progress_service.init_job(job)
+        return _summary_response(created_tasks[0])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -491,24 +520,36 @@ async def get_search_task(
     if not task:
         raise HTTPException(status_code=404, detail="搜索任务不存在")
     
-    return SearchTaskResponse(
-        id=task.id,
-        task_name=task.task_name,
-        search_type=task.search_type,
-        search_queries=_extract_queries(task),
-        account_ids=_extract_account_ids(task),
-        limit_per_query=_extract_param(task, "limit_per_query"),
-        download_media=_extract_param(task, "download_media"),
-        keep_hours=_extract_param(task, "keep_hours"),
-        status=task.status,
-        created_at=task.created_at.isoformat() if task.created_at else None,
-        started_at=task.started_at.isoformat() if task.started_at else None,
-        completed_at=task.completed_at.isoformat() if task.completed_at else None,
-        results=_extract_results(task)
-    )
+    detail = _summary_response(task)
+    detail.results = _extract_results(task)
+    return detail
+
+
+@router.get("/search-tasks/{task_id}/users")
+async def get_search_task_users(
+    task_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """分页获取搜索任务采集到的用户（按 id 倒序，下一页游标见响应头 X-Next-Cursor）"""
+    task = db.query(SearchTask.id).filter(
+        SearchTask.id == task_id,
+        SearchTask.user_id == current_user.id
+    ).first()
+    
+    if not task:
+        raise HTTPException(status_code=404, detail="搜索任务不存在")
+    
+    query = db.query(CollectedUserData).filter(CollectedUserData.search_task_id == task_id)
+    users, next_cursor = keyset_page(query, CollectedUserData.id, CollectedUserData.id, cursor, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return CodecJSONResponse(content=[user.to_dict() for user in users], headers=headers)
 
 
 @router.post("/search-tasks/{task_id}/export")
+@rate_limit(max_requests=10, window_seconds=60)
 async def export_search_data(
     task_id: int,
     format_type: str = "json",
@@ -538,7 +579,8 @@ async def export_search_data(
         if not result.get('success'):
             raise HTTPException(status_code=500, detail=result.get('error'))
         
-        return result
+        # 导出结果可能很大，直接用 JSON 编解码序列化，跳过逐项 jsonable_encoder
+        return CodecJSONResponse(content=result)
         
     except HTTPException:
         raise
@@ -583,7 +625,8 @@ async def get_search_analysis(
         if not result.get('success'):
             raise HTTPException(status_code=500, detail=result.get('error'))
         
-        return result
+        # 导出结果可能很大，直接用 JSON 编解码序列化，跳过逐项 jsonable_encoder
+        return CodecJSONResponse(content=result)
         
     except HTTPException:
         raise
@@ -591,6 +634,74 @@ async def get_search_analysis(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# 采集作业（多账号搜索任务的聚合进度）
+@router.get("/jobs", response_model=List[CollectionJobResponse])
+async def get_collection_jobs(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取采集作业列表（按创建时间倒序，下一页游标见响应头 X-Next-Cursor）"""
+    query = db.query(CollectionJob).filter(CollectionJob.user_id == current_user.id)
+    jobs, _ = keyset_page(query, CollectionJob.created_at, CollectionJob.id, cursor, limit, response)
+    return [
+        job_progress_service.snapshot(job)
+        if job.status in (ModelTaskStatus.PENDING, ModelTaskStatus.RUNNING) else job.to_dict()
+        for job in jobs
+    ]
+
+
+@router.get("/jobs/{job_id}", response_model=CollectionJobResponse)
+async def get_collection_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取采集作业的聚合进度（实时更新通过 WebSocket task_update 推送）"""
+    job = db.query(CollectionJob).filter(
+        CollectionJob.id == job_id,
+        CollectionJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="采集作业不存在")
+    
+    return job_progress_service.snapshot(job)
+
+
+@router.get("/jobs/{job_id}/shards", response_model=List[SearchTaskResponse])
+async def get_collection_job_shards(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取采集作业的各账号分片"""
+    tasks = db.query(SearchTask).options(load_only(*SEARCH_TASK_SUMMARY_COLUMNS)).filter(
+        SearchTask.job_id == job_id,
+        SearchTask.user_id == current_user.id
+    ).order_by(SearchTask.id).all()
+    
+    if not tasks:
+        raise HTTPException(status_code=404, detail="采集作业不存在")
+    
+    return [_summary_response(task) for task in tasks]
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_collection_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """取消采集作业（运行中的分片在下一个请求前停止）"""
+    result = await task_scheduler.cancel_job(job_id, current_user.id)
+    if not result.get('success'):
+        status_code = 404 if result.get('error') == '采集作业不存在' else 400
+        raise HTTPException(status_code=status_code, detail=result.get('error'))
+    return result
+
+
 # 任务管理API
 @router.post("/tasks/{task_id}/cancel")
 async def cancel_task(
@@ -600,7 +711,7 @@ async def cancel_task(
 ):
     """取消任务"""
     try:
-        result = await task_scheduler.cancel_task(task_id, task_type)
+        result = await task_scheduler.cancel_task(task_id, task_type, current_user.id)
         
         if not result.get('success'):
             raise HTTPException(status_code=400, detail=result.get('error'))
@@ -18,6 +18,101 @@ class Settings(BaseSettings):
     # Redis配置
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Celery配置
+    CELERY_BROKER_URL: str = "redis://localhost:6379/1"
+    CELERY_RESULT_BACKEND: str = "redis://localhost:6379/2"
+    
+    # Instagram API 端点（压测时指向本地替身服务，例如 127.0.0.1:8765 + http）
+    INSTAGRAM_API_DOMAIN: Optional[str] = None
+    INSTAGRAM_API_SCHEME: str = "https"
+    # 所有账号共享的 instagrapi 连接池（按 代理+主机 复用连接）
+    INSTAGRAM_POOL_CONNECTIONS: int = 20
+    INSTAGRAM_POOL_MAXSIZE: int = 16
+    INSTAGRAM_POOL_IDLE_TIMEOUT: float = 300.0
+    # 空闲客户端休眠：只保留压缩后的 get_settings() 数据，下次使用时无需重新登录即可恢复
+    INSTAGRAM_CLIENT_IDLE_SECONDS: int = 900
+    INSTAGRAM_MAX_ACTIVE_CLIENTS: int = 200
+
+    # 媒体预处理：进程池大小（0 表示 CPU 核数）、产物缓存目录（留空为 app/media_cache）与保留时长
+    MEDIA_PREP_WORKERS: int = 0
+    MEDIA_PREP_CACHE_DIR: str = ""
+    MEDIA_PREP_CACHE_HOURS: int = 72
+
+    # 定时发帖：计划时间前多久预上传媒体，upload_id 在 Redis 中的保留时长，发布时等待进行中的预上传的最长时间，
+    # 发布抢占与 configure 重试
+    POST_PREPARE_LEAD_SECONDS: int = 900
+    POST_PREPARED_TTL_SECONDS: int = 6 * 3600
+    POST_PREPARE_WAIT_SECONDS: float = 120.0
+    POST_PUBLISH_CLAIM_SECONDS: int = 900
+    POST_CONFIGURE_ATTEMPTS: int = 10
+    POST_CONFIGURE_RETRY_SECONDS: float = 3.0
+    
+    # 延时任务（Redis 有序集合）：是否在 API 进程内运行分发循环、每批取出数量、空闲时最长等待、分发失败重试间隔；
+    # 兜底扫描 post_schedules 补回丢失任务的间隔
+    DELAYED_JOBS_ENABLED: bool = True
+    DELAYED_JOBS_BATCH_SIZE: int = 500
+    DELAYED_JOBS_MAX_WAIT: float = 1.0
+    DELAYED_JOBS_RETRY_SECONDS: int = 5
+    POST_SWEEP_INTERVAL: int = 600
+
+    # 批量私信：每账号每小时上限与发送间隔、用户名/会话缓存时长、发送记录批量写入条数
+    DM_MAX_PER_HOUR: int = 40
+    DM_MIN_INTERVAL_SECONDS: float = 15.0
+    DM_MAX_INTERVAL_SECONDS: float = 45.0
+    DM_USERNAME_CACHE_TTL: int = 30 * 86400
+    DM_USERNAME_MISSING_TTL: int = 86400
+    DM_THREAD_CACHE_TTL: int = 30 * 86400
+    DM_LOG_BATCH_SIZE: int = 100
+
+    # 收件箱增量同步：轮询间隔、单次最多翻页数（收件箱/单个会话）、同步锁时长
+    DM_SYNC_INTERVAL: int = 60
+    DM_SYNC_MAX_PAGES: int = 10
+    DM_SYNC_MAX_THREAD_PAGES: int = 5
+    DM_SYNC_LOCK_SECONDS: int = 300
+
+    # 私信实时推送（MQTToT）：是否在 API 进程内建立长连接、网关地址（留空使用 instagrapi 默认值）、心跳键有效期
+    DM_REALTIME_ENABLED: bool = False
+    DM_REALTIME_HOST: str = ""
+    DM_REALTIME_PORT: int = 0
+    DM_REALTIME_SSL: bool = True
+    DM_REALTIME_HEARTBEAT_TTL: int = 90
+    
+    # 采集作业进度：Redis 计数写回数据库的间隔、计数保留时长
+    JOB_PROGRESS_FLUSH_INTERVAL: int = 10
+    JOB_PROGRESS_TTL: int = 7 * 86400
+    
+    # 任务取消与超时：采集分片最长运行时间（0 不限制）、取消标记的检查间隔与保留时长
+    SEARCH_TASK_TIMEOUT_SECONDS: int = 3600
+    TASK_CANCEL_POLL_INTERVAL: float = 1.0
+    TASK_CANCEL_TTL: int = 86400
+    
+    # 账号心跳：是否在 API 进程内运行、检查间隔（秒，按 ±抖动比例打散）、并发上限、调度循环间隔
+    ACCOUNT_HEARTBEAT_ENABLED: bool = True
+    ACCOUNT_HEARTBEAT_INTERVAL: int = 600
+    ACCOUNT_HEARTBEAT_JITTER: float = 0.2
+    ACCOUNT_HEARTBEAT_CONCURRENCY: int = 4
+    ACCOUNT_HEARTBEAT_TICK: float = 5.0
+    
+    # 账号验证挂起：验证上下文与等待验证的任务保留时长（秒），过期后需重新登录
+    CHALLENGE_STATE_TTL: int = 86400
+
+    # 代理健康探测
+    PROXY_PROBE_URL: str = "https://www.instagram.com/robots.txt"
+    PROXY_PROBE_INTERVAL: int = 300  # 秒
+    PROXY_PROBE_TIMEOUT: float = 8.0
+    PROXY_PROBE_CONCURRENCY: int = 50
+    PROXY_QUARANTINE_FAILURES: int = 3  # 连续失败多少次进入隔离
+    PROXY_QUARANTINE_MIN_SUCCESS_RATE: float = 0.5
+    PROXY_QUARANTINE_SECONDS: int = 600  # 首次隔离时长，之后逐次翻倍
+    PROXY_QUARANTINE_MAX_SECONDS: int = 6 * 3600
+    PROXY_AUTO_REBIND: bool = False  # 探测后把绑定在隔离代理上的账号切换到最佳代理
+
+    # JSON 编解码：auto（装了 orjson 就用）/ orjson / json
+    JSON_CODEC: str = "auto"
+    
+    # Prometheus /metrics：设置后抓取需携带 Authorization: Bearer <令牌>，留空不校验
+    METRICS_TOKEN: Optional[str] = None
+
     # JWT配置
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .metrics import instrument_engine
 
 # 创建数据库引擎（关闭 SQL 回显，避免日志噪音和文件 flush 异常）
 if settings.DATABASE_URL.startswith("sqlite"):
@@ -17,6 +18,9 @@ else:
         echo=False
     )
 
+# 统计 SQL 执行耗时
+instrument_engine(engine)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,436 @@
+"""
+进程内指标采集
+
+- Counter / Gauge / Histogram 三种聚合器，全部在内存中按标签累加，写入开销是一次加锁和几次加法
+- Histogram 使用固定桶，既能输出 Prometheus 文本格式，也能估算 p50/p95/p99 供 JSON 接口使用
+- 采集入口：HTTP 中间件（按路由模板）、SQLAlchemy 引擎事件、Instagram 操作、Redis/Celery 队列、进程 CPU/RSS
+"""
+
+import os
+import resource
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认延迟桶（秒），覆盖从 1ms 的数据库查询到数十秒的 Instagram 上传
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def items(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            snapshot = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in snapshot]
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in self.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, list(labels.values()))} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """固定桶直方图"""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [bucket_counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels):
+        """上下文管理器：统计代码块耗时"""
+        return _Timer(self, labels)
+
+    def _quantile(self, state: List[float], q: float) -> float:
+        count = state[-1]
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for index, bound in enumerate(self.buckets):
+            bucket_count = state[index]
+            if cumulative + bucket_count >= rank:
+                if bound == float("inf"):
+                    return lower
+                if not bucket_count:
+                    return bound
+                return lower + (bound - lower) * ((rank - cumulative) / bucket_count)
+            cumulative += bucket_count
+            lower = bound
+        return lower
+
+    def summary(self) -> List[Dict]:
+        """JSON 友好的汇总（次数、均值、分位数，单位毫秒）"""
+        with self._lock:
+            snapshot = [(key, list(state)) for key, state in self._values.items()]
+        result = []
+        for key, state in snapshot:
+            count = state[-1]
+            item = dict(zip(self.labelnames, key))
+            item.update({
+                "count": int(count),
+                "avg_ms": round(state[-2] / count * 1000, 2) if count else 0.0,
+                "p50_ms": round(self._quantile(state, 0.50) * 1000, 2),
+                "p95_ms": round(self._quantile(state, 0.95) * 1000, 2),
+                "p99_ms": round(self._quantile(state, 0.99) * 1000, 2),
+            })
+            result.append(item)
+        return result
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            snapshot = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in snapshot:
+            cumulative = 0
+            for index, bound in enumerate(self.buckets):
+                cumulative += state[index]
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(state[-1])}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        # 抓取时才计算的指标（进程、队列深度等）
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def register_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                continue
+
+    def render_prometheus(self) -> str:
+        self.collect()
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（按路由模板）", ("method", "route", "status")
+)
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "SQL 执行耗时（按语句类型）", ("operation",)
+)
+INSTAGRAM_OPERATION_DURATION = registry.histogram(
+    "instagram_operation_duration_seconds", "Instagram 业务操作耗时", ("operation",)
+)
+INSTAGRAM_OPERATIONS_TOTAL = registry.counter(
+    "instagram_operations_total", "Instagram 业务操作次数", ("operation", "outcome")
+)
+QUEUE_DEPTH = registry.gauge("queue_depth", "队列积压长度", ("queue",))
+REDIS_PING_SECONDS = registry.gauge("redis_ping_seconds", "Redis PING 往返耗时")
+PROCESS_CPU_SECONDS = registry.gauge("process_cpu_seconds_total", "进程累计 CPU 时间（秒）")
+PROCESS_CPU_PERCENT = registry.gauge("process_cpu_percent", "两次采样之间的进程 CPU 占用率")
+PROCESS_RSS_BYTES = registry.gauge("process_resident_memory_bytes", "进程常驻内存（字节）")
+PROCESS_OPEN_FDS = registry.gauge("process_open_fds", "进程打开的文件描述符数")
+
+
+# ===== 进程指标 =====
+_cpu_sample = {"wall": time.monotonic(), "cpu": 0.0}
+
+
+def _read_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # 非 Linux 平台退化为峰值 RSS（Linux 单位 KB，macOS 单位字节）
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if maxrss > 1 << 32 else maxrss * 1024
+
+
+def _count_open_fds() -> int:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return 0
+
+
+def collect_process_metrics() -> Dict:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_total = usage.ru_utime + usage.ru_stime
+    now = time.monotonic()
+    elapsed = now - _cpu_sample["wall"]
+    cpu_percent = 0.0
+    if elapsed > 0:
+        cpu_percent = max(0.0, (cpu_total - _cpu_sample["cpu"]) / elapsed * 100)
+    _cpu_sample.update(wall=now, cpu=cpu_total)
+
+    rss = _read_rss_bytes()
+    fds = _count_open_fds()
+    PROCESS_CPU_SECONDS.set(cpu_total)
+    PROCESS_CPU_PERCENT.set(round(cpu_percent, 2))
+    PROCESS_RSS_BYTES.set(rss)
+    PROCESS_OPEN_FDS.set(fds)
+    return {
+        "cpu_seconds": round(cpu_total, 3),
+        "cpu_percent": round(cpu_percent, 2),
+        "rss_bytes": rss,
+        "open_fds": fds,
+    }
+
+
+# ===== Redis / Celery =====
+# 按 URL 复用的客户端（自带连接池），避免每次抓取都重新建连
+_queue_clients: Dict[str, object] = {}
+
+
+def _queue_client(url: str):
+    import redis
+
+    client = _queue_clients.get(url)
+    if client is None:
+        client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        _queue_clients[url] = client
+    return client
+
+
+def collect_queue_metrics(redis_url: str, broker_url: str, queues: Sequence[str] = ("celery",)) -> Dict:
+    """PING Redis 并读取 Celery 队列长度（Redis broker 下队列即列表）"""
+    result: Dict = {"redis_ping_ms": None, "queues": {}}
+    try:
+        client = _queue_client(redis_url)
+        start = time.perf_counter()
+        client.ping()
+        ping = time.perf_counter() - start
+        REDIS_PING_SECONDS.set(ping)
+        result["redis_ping_ms"] = round(ping * 1000, 2)
+    except Exception as exc:
+        result["redis_error"] = str(exc)
+
+    try:
+        broker = _queue_client(broker_url)
+        for queue in queues:
+            depth = broker.llen(queue)
+            QUEUE_DEPTH.set(depth, queue=queue)
+            result["queues"][queue] = depth
+    except Exception as exc:
+        result["broker_error"] = str(exc)
+    return result
+
+
+# ===== SQLAlchemy =====
+def instrument_engine(engine):
+    """挂载 SQLAlchemy 引擎事件，按语句类型统计 SQL 耗时"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_metrics_query_start")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_DURATION.observe(elapsed, operation=operation)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None:
+            stack = conn.info.get("_metrics_query_start")
+            if stack:
+                stack.pop()
+
+
+# ===== HTTP =====
+class MetricsMiddleware:
+    """ASGI 中间件：按 方法 + 路由模板 + 状态码 统计请求耗时"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_holder = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # 使用路由模板而不是原始路径，避免 /accounts/1、/accounts/2 产生无限标签
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope.get("method", ""),
+                route=route_path,
+                status=str(status_holder["code"]),
+            )
+
+
+# ===== Instagram 操作 =====
+def track_operation(operation: str):
+    """装饰 InstagramOperations 的异步方法，记录耗时和成功/失败"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(*args, **kwargs)
+                if isinstance(result, dict):
+                    if result.get("challenge_required"):
+                        outcome = "challenge"
+                    else:
+                        outcome = "success" if result.get("success") else "failure"
+                else:
+                    outcome = "success"
+                return result
+            finally:
+                INSTAGRAM_OPERATION_DURATION.observe(time.perf_counter() - start, operation=operation)
+                INSTAGRAM_OPERATIONS_TOTAL.inc(operation=operation, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+registry.register_collector(collect_process_metrics)
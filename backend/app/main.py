@@ -1,12 +1,19 @@
+import asyncio
+import secrets
+from typing import Optional
+
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 import uvicorn
 
 from .core.config import settings
 from .core.database import get_db, create_tables
+from .core.metrics import MetricsMiddleware, registry, collect_queue_metrics
 from .core.security import verify_token
+from .utils.pagination import NEXT_CURSOR_HEADER
 from . import models  # noqa: F401  # ensure all models are loaded for mapper configuration
 from .api.v1 import auth, users, instagram, scheduler, monitoring, websocket, admin_limits
 
@@ -26,6 +33,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
+)
+
+# 请求耗时统计（放在最外层，包含 CORS 处理时间）
+app.add_middleware(MetricsMiddleware)
+
+# 抓取 /metrics 时顺带刷新 Redis / Celery 队列指标
+registry.register_collector(
+    lambda: collect_queue_metrics(settings.REDIS_URL, settings.CELERY_BROKER_URL)
 )
 
 # JWT认证方案
@@ -60,12 +76,30 @@ async def startup_event():
     """应用启动时执行"""
     # 创建数据库表
     create_tables()
+    if settings.DM_REALTIME_ENABLED:
+        from .services.realtime_service import realtime_service
+        await realtime_service.start()
+    if settings.DELAYED_JOBS_ENABLED:
+        from .services.delayed_jobs import delayed_job_queue
+        await delayed_job_queue.start()
+    if settings.ACCOUNT_HEARTBEAT_ENABLED:
+        from .services.account_heartbeat import account_heartbeat_service
+        await account_heartbeat_service.start()
     print("Instagram API started")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时执行"""
+    if settings.DM_REALTIME_ENABLED:
+        from .services.realtime_service import realtime_service
+        await realtime_service.stop()
+    if settings.DELAYED_JOBS_ENABLED:
+        from .services.delayed_jobs import delayed_job_queue
+        await delayed_job_queue.stop()
+    if settings.ACCOUNT_HEARTBEAT_ENABLED:
+        from .services.account_heartbeat import account_heartbeat_service
+        await account_heartbeat_service.stop()
     print("Instagram API stopped")
 
 
@@ -87,6 +121,28 @@ async def health_check():
     return {"status": "healthy", "service": settings.PROJECT_NAME}
 
 
+# Prometheus 指标
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """Prometheus 文本格式指标；配置了 METRICS_TOKEN 时需携带该令牌"""
+    if settings.METRICS_TOKEN:
+        token = credentials.credentials if credentials else ""
+        if not secrets.compare_digest(token, settings.METRICS_TOKEN):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="无效的指标令牌",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    # 采集器会同步访问 Redis、读取 /proc，放到线程里执行，避免阻塞事件循环
+    body = await asyncio.to_thread(registry.render_prometheus)
+    return PlainTextResponse(
+        body,
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # 注册API路由
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["认证"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["用户管理"])
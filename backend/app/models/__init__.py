@@ -5,11 +5,13 @@ references can be resolved when the mappers are configured.
 
 from .user import User
 from .instagram_account import InstagramAccount
-from .proxy import ProxyConfig
+from .proxy import ProxyConfig, ProxyHealth
 from .schedule import PostSchedule
 from .message import MessageLog
+from .direct_sync import DirectInboxState, DirectThreadState
 from .auto_reply import AutoReplyRule
 from .search_task import SearchTask
+from .collection_job import CollectionJob
 from .collected_user_data import CollectedUserData
 from .instagram_account_stat import InstagramAccountStat
 
@@ -18,9 +20,13 @@ __all__ = [
     "InstagramAccount",
     "InstagramAccountStat",
     "ProxyConfig",
+    "ProxyHealth",
     "PostSchedule",
     "MessageLog",
+    "DirectInboxState",
+    "DirectThreadState",
     "AutoReplyRule",
     "SearchTask",
+    "CollectionJob",
     "CollectedUserData",
 ]
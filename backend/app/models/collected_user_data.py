@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..core.database import Base
@@ -7,6 +7,10 @@ from ..core.database import Base
 class CollectedUserData(Base):
     """用户数据采集表"""
     __tablename__ = "collected_user_data"
+    __table_args__ = (
+        # 按搜索任务读取采集结果（按 id 游标分页）
+        Index("ix_collected_user_data_task_id", "search_task_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
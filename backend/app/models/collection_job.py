@@ -0,0 +1,72 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from ..core.database import Base
+from .search_task import SearchType, TaskStatus
+
+
+class CollectionJob(Base):
+    """采集作业：一次多账号搜索请求，按账号拆成若干 SearchTask 分片"""
+    __tablename__ = "collection_jobs"
+    __table_args__ = (
+        Index("ix_collection_jobs_user_created", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    task_name = Column(String(100), nullable=False, comment="任务名称")
+    search_type = Column(Enum(SearchType), nullable=False, comment="搜索类型")
+    status = Column(Enum(TaskStatus), default=TaskStatus.PENDING, nullable=False, comment="作业状态")
+    # 聚合进度：运行中以 Redis 计数为准，定期写回
+    shard_count = Column(Integer, default=0, nullable=False, comment="分片数")
+    shards_started = Column(Integer, default=0, nullable=False, comment="已开始分片数")
+    shards_done = Column(Integer, default=0, nullable=False, comment="已完成分片数")
+    shards_failed = Column(Integer, default=0, nullable=False, comment="失败分片数")
+    query_count = Column(Integer, default=0, nullable=False, comment="搜索词总数")
+    queries_done = Column(Integer, default=0, nullable=False, comment="已处理搜索词数")
+    users_collected = Column(Integer, default=0, nullable=False, comment="已采集用户数")
+    media_items = Column(Integer, default=0, nullable=False, comment="媒体条目数")
+    error_count = Column(Integer, default=0, nullable=False, comment="失败的搜索词数")
+    started_at = Column(DateTime(timezone=True), nullable=True, comment="开始时间")
+    completed_at = Column(DateTime(timezone=True), nullable=True, comment="完成时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    # 关系
+    shards = relationship("SearchTask", back_populates="job")
+
+    def __repr__(self):
+        return f"<CollectionJob(id={self.id}, name='{self.task_name}', status='{self.status.value}')>"
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "task_name": self.task_name,
+            "search_type": self.search_type.value,
+            "status": self.status.value,
+            "shard_count": self.shard_count,
+            "shards_started": self.shards_started,
+            "shards_done": self.shards_done,
+            "shards_failed": self.shards_failed,
+            "query_count": self.query_count,
+            "queries_done": self.queries_done,
+            "users_collected": self.users_collected,
+            "media_items": self.media_items,
+            "error_count": self.error_count,
+            "progress_percentage": self.progress_percentage(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def progress_percentage(self):
+        """按已处理搜索词计算进度"""
+        if self.query_count:
+            return int(min(self.queries_done, self.query_count) * 100 / self.query_count)
+        return 100 if self.is_finished() else 0
+
+    def is_finished(self):
+        """所有分片都已结束"""
+        return self.shard_count > 0 and self.shards_done + self.shards_failed >= self.shard_count
@@ -0,0 +1,41 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class DirectInboxState(Base):
+    """私信收件箱同步状态（每个 Instagram 账号一行）"""
+    __tablename__ = "direct_inbox_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    instagram_account_id = Column(Integer, ForeignKey("instagram_accounts.id"), nullable=False, unique=True, comment="Instagram账号ID")
+    seq_id = Column(BigInteger, nullable=True, comment="收件箱序列号（实时推送从此处续接）")
+    snapshot_at_ms = Column(BigInteger, nullable=True, comment="收件箱快照时间（毫秒）")
+    last_activity_at = Column(BigInteger, nullable=True, comment="已同步会话的最新活动时间（微秒）")
+    oldest_cursor = Column(String(200), nullable=True, comment="收件箱翻页游标")
+    last_synced_at = Column(DateTime(timezone=True), nullable=True, comment="最后同步时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<DirectInboxState(account_id={self.instagram_account_id}, seq_id={self.seq_id})>"
+
+
+class DirectThreadState(Base):
+    """私信会话同步游标"""
+    __tablename__ = "direct_thread_states"
+    __table_args__ = (
+        UniqueConstraint("instagram_account_id", "thread_id", name="uq_direct_thread_state"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    instagram_account_id = Column(Integer, ForeignKey("instagram_accounts.id"), nullable=False, index=True, comment="Instagram账号ID")
+    thread_id = Column(String(100), nullable=False, comment="会话ID")
+    last_item_id = Column(String(100), nullable=True, comment="已同步的最新消息ID")
+    last_item_timestamp = Column(BigInteger, nullable=True, comment="已同步的最新消息时间（微秒）")
+    last_activity_at = Column(BigInteger, nullable=True, comment="会话最新活动时间（微秒）")
+    oldest_cursor = Column(String(200), nullable=True, comment="会话翻页游标")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<DirectThreadState(account_id={self.instagram_account_id}, thread='{self.thread_id}')>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -16,6 +16,11 @@ class MessageType(enum.Enum):
 class MessageLog(Base):
     """消息记录表"""
     __tablename__ = "message_logs"
+    __table_args__ = (
+        # 会话消息列表 / 按用户的消息日志（游标分页）
+        Index("ix_message_logs_account_thread_created", "instagram_account_id", "thread_id", "created_at"),
+        Index("ix_message_logs_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Float
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -39,6 +39,7 @@ class ProxyConfig(Base):
     # 关系
     user = relationship("User", back_populates="proxy_configs")
     instagram_accounts = relationship("InstagramAccount", back_populates="proxy")
+    health = relationship("ProxyHealth", back_populates="proxy", uselist=False, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<ProxyConfig(id={self.id}, name='{self.name}', type='{self.proxy_type.value}')>"
@@ -76,3 +77,40 @@ class ProxyConfig(Base):
     def password_decrypted(self):
         """兼容旧逻辑的解密占位，当前直接返回存储值"""
         return self.password_encrypted
+
+
+class ProxyHealth(Base):
+    """代理健康状态表（由 proxy_health 探测服务维护）"""
+    __tablename__ = "proxy_health"
+
+    id = Column(Integer, primary_key=True, index=True)
+    proxy_id = Column(Integer, ForeignKey("proxy_configs.id", ondelete="CASCADE"), nullable=False, unique=True, comment="代理配置ID")
+    latency_ms = Column(Float, nullable=True, comment="延迟滑动均值(ms)")
+    success_rate = Column(Float, nullable=True, comment="成功率滑动均值(0-1)")
+    bandwidth_kbps = Column(Float, nullable=True, comment="带宽滑动均值(KB/s)")
+    score = Column(Float, nullable=True, comment="综合评分(0-100)")
+    probes_total = Column(Integer, default=0, nullable=False, comment="探测次数")
+    failures_total = Column(Integer, default=0, nullable=False, comment="失败次数")
+    consecutive_failures = Column(Integer, default=0, nullable=False, comment="连续失败次数")
+    quarantine_count = Column(Integer, default=0, nullable=False, comment="累计隔离次数")
+    quarantined_until = Column(DateTime(timezone=True), nullable=True, comment="隔离截止时间")
+    last_error = Column(String(255), nullable=True, comment="最近一次错误")
+    last_checked_at = Column(DateTime(timezone=True), nullable=True, comment="最近探测时间")
+
+    proxy = relationship("ProxyConfig", back_populates="health")
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "proxy_id": self.proxy_id,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "success_rate": round(self.success_rate, 3) if self.success_rate is not None else None,
+            "bandwidth_kbps": round(self.bandwidth_kbps, 1) if self.bandwidth_kbps is not None else None,
+            "score": round(self.score, 1) if self.score is not None else None,
+            "probes_total": self.probes_total,
+            "failures_total": self.failures_total,
+            "consecutive_failures": self.consecutive_failures,
+            "quarantined_until": self.quarantined_until.isoformat() if self.quarantined_until else None,
+            "last_error": self.last_error,
+            "last_checked_at": self.last_checked_at.isoformat() if self.last_checked_at else None,
+        }
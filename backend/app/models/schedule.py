@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -24,6 +24,13 @@ class RepeatType(enum.Enum):
 class PostSchedule(Base):
     """定时发帖表"""
     __tablename__ = "post_schedules"
+    __table_args__ = (
+        # 用户列表（可按状态筛选），按创建时间游标分页
+        Index("ix_post_schedules_user_status_created", "user_id", "status", "created_at"),
+        Index("ix_post_schedules_user_created", "user_id", "created_at"),
+        # 兜底扫描：待发布且即将到期
+        Index("ix_post_schedules_status_scheduled", "status", "scheduled_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -25,10 +25,16 @@ class TaskStatus(enum.Enum):
 class SearchTask(Base):
     """搜索任务表"""
     __tablename__ = "search_tasks"
+    __table_args__ = (
+        # 用户列表（可按状态筛选），按创建时间游标分页
+        Index("ix_search_tasks_user_status_created", "user_id", "status", "created_at"),
+        Index("ix_search_tasks_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
     instagram_account_id = Column(Integer, ForeignKey("instagram_accounts.id"), nullable=False, comment="Instagram账号ID")
+    job_id = Column(Integer, ForeignKey("collection_jobs.id"), nullable=True, index=True, comment="所属采集作业ID")
     task_name = Column(String(100), nullable=False, comment="任务名称")
     search_type = Column(Enum(SearchType), nullable=False, comment="搜索类型")
     search_query = Column(String(255), nullable=False, comment="搜索查询")
@@ -41,6 +47,15 @@ class SearchTask(Base):
     progress_percentage = Column(Integer, default=0, nullable=False, comment="进度百分比")
     total_items = Column(Integer, default=0, nullable=False, comment="总项目数")
     processed_items = Column(Integer, default=0, nullable=False, comment="已处理项目数")
+    # 列表摘要（创建/开始/结束时写入，列表页不再解析 search_params / results）
+    query_count = Column(Integer, default=0, nullable=False, comment="搜索词数")
+    account_ids = Column(String(500), nullable=True, comment="任务组账号ID（逗号分隔）")
+    limit_per_query = Column(Integer, nullable=True, comment="每个搜索词采集上限")
+    download_media = Column(Boolean, default=False, nullable=False, comment="是否下载媒体")
+    keep_hours = Column(Integer, nullable=True, comment="媒体保留小时数")
+    users_collected = Column(Integer, default=0, nullable=False, comment="已采集用户数")
+    media_items = Column(Integer, default=0, nullable=False, comment="媒体条目数")
+    error_count = Column(Integer, default=0, nullable=False, comment="失败的搜索词数")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
 
@@ -48,6 +63,7 @@ class SearchTask(Base):
     user = relationship("User", back_populates="search_tasks")
     instagram_account = relationship("InstagramAccount", back_populates="search_tasks")
     collected_data = relationship("CollectedUserData", back_populates="search_task")
+    job = relationship("CollectionJob", back_populates="shards")
 
     def __repr__(self):
         return f"<SearchTask(id={self.id}, name='{self.task_name}', status='{self.status.value}')>"
@@ -58,6 +74,7 @@ class SearchTask(Base):
             "id": self.id,
             "user_id": self.user_id,
             "instagram_account_id": self.instagram_account_id,
+            "job_id": self.job_id,
             "task_name": self.task_name,
             "search_type": self.search_type.value,
             "search_query": self.search_query,
@@ -70,10 +87,40 @@ class SearchTask(Base):
             "progress_percentage": self.progress_percentage,
             "total_items": self.total_items,
             "processed_items": self.processed_items,
+            "query_count": self.query_count,
+            "account_ids": self.account_id_list(),
+            "limit_per_query": self.limit_per_query,
+            "download_media": self.download_media,
+            "keep_hours": self.keep_hours,
+            "users_collected": self.users_collected,
+            "media_items": self.media_items,
+            "error_count": self.error_count,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def apply_params_summary(self, params: dict):
+        """从搜索参数写入摘要列"""
+        queries = params.get("assigned_queries") or params.get("search_queries") or (
+            self.search_query.split(";") if self.search_query else []
+        )
+        account_ids = params.get("account_ids") or ([self.instagram_account_id] if self.instagram_account_id else [])
+        self.query_count = len(queries)
+        self.account_ids = ",".join(str(account_id) for account_id in account_ids)
+        self.limit_per_query = params.get("limit_per_query")
+        self.download_media = bool(params.get("download_media"))
+        self.keep_hours = params.get("keep_hours")
+
+    def apply_results_summary(self, results: dict):
+        """从采集结果写入摘要列"""
+        self.users_collected = int(results.get("users_collected") or 0)
+        self.media_items = int(results.get("media_items") or 0)
+        self.error_count = len(results.get("errors") or [])
+
+    def account_id_list(self):
+        """摘要列中的账号ID列表"""
+        return [int(account_id) for account_id in self.account_ids.split(",") if account_id] if self.account_ids else []
+
     def start_task(self):
         """开始任务"""
         from datetime import datetime, timezone
@@ -89,6 +136,7 @@ class SearchTask(Base):
         self.progress_percentage = 100
         if results is not None:
             self.results = results
+            self.apply_results_summary(results)
 
     def fail_task(self, error_message):
         """任务失败"""
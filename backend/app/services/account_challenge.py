@@ -0,0 +1,142 @@
+"""
+账号验证挂起
+instagrapi 客户端开启 challenge_park：登录或请求触发需要验证码（邮箱/短信）或新密码的验证时，
+不再在 worker 里等待 challenge_code_handler（input()，或每 5 秒问一次共 2 分钟），而是抛出 ChallengeParked。
+验证上下文（challenge_url、步骤、表单 cookies 等）连同客户端设置与代理存入 Redis challenge:{账号ID}，
+账号标记为 CHALLENGE_REQUIRED，之后该账号的登录直接失败、不再请求 Instagram；
+需要该账号的延时任务（发帖）记入 challenge:deferred:{账号ID}。
+通过接口提交验证码后用同一会话完成验证，重新登录，再把挂起的任务按当前时间重新调度。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+import redis
+
+from app.core.config import settings
+from app.services.delayed_jobs import delayed_job_queue
+from app.utils import json_codec
+
+logger = logging.getLogger(__name__)
+
+CHALLENGE_KEY = "challenge:{}"
+DEFERRED_KEY = "challenge:deferred:{}"
+
+
+def challenge_view(record: Dict) -> Dict:
+    """对外展示的验证信息（不含 cookies、会话设置）"""
+    state = record.get("state") or {}
+    return {
+        "account_id": record.get("account_id"),
+        "step_name": state.get("step_name") or state.get("flow"),
+        "choice": state.get("choice"),
+        "message": record.get("message"),
+        "parked_at": record.get("parked_at"),
+        "needs_password": state.get("step_name") == "change_password",
+    }
+
+
+class AccountChallengeStore:
+    """挂起的验证上下文与等待验证的任务"""
+
+    def __init__(self):
+        self._client: Optional[redis.Redis] = None
+        # 本进程的副本，Redis 不可用时使用
+        self.local: Dict[int, Dict] = {}
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    def park(self, account_id: int, state: Dict, client_settings: Dict, proxy: Optional[str] = None,
+             message: Optional[str] = None, replace: bool = True) -> Dict:
+        """保存验证上下文；replace=False 时保留已挂起的上下文（验证码对应最早那次请求）"""
+        if not replace:
+            existing = self.get(account_id)
+            if existing is not None:
+                return existing
+        record = {
+            "account_id": account_id,
+            "state": state,
+            "settings": client_settings,
+            "proxy": proxy,
+            "message": message,
+            "parked_at": datetime.utcnow().isoformat(),
+        }
+        self.local[account_id] = record
+        try:
+            self._redis().set(
+                CHALLENGE_KEY.format(account_id), json_codec.dumps(record, default=str),
+                ex=settings.CHALLENGE_STATE_TTL,
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Redis 不可用，账号 {account_id} 的验证上下文只保存在本进程: {e}")
+        logger.warning(f"账号 {account_id} 等待验证码: {message}")
+        return record
+
+    def get(self, account_id: int) -> Optional[Dict]:
+        """读取挂起的验证上下文，没有或已过期时返回 None"""
+        try:
+            raw = self._redis().get(CHALLENGE_KEY.format(account_id))
+        except redis.RedisError:
+            return self.local.get(account_id)
+        if not raw:
+            self.local.pop(account_id, None)
+            return None
+        return json_codec.loads(raw)
+
+    def clear(self, account_id: int):
+        """验证完成或账号删除后清除上下文"""
+        self.local.pop(account_id, None)
+        try:
+            self._redis().delete(CHALLENGE_KEY.format(account_id))
+        except redis.RedisError:
+            pass
+
+    def defer(self, account_id: int, kind: str, object_id: int) -> bool:
+        """记录等待该账号验证的延时任务（类型同 delayed_job_queue）"""
+        key = DEFERRED_KEY.format(account_id)
+        try:
+            pipe = self._redis().pipeline()
+            pipe.sadd(key, f"{kind}:{object_id}")
+            pipe.expire(key, settings.CHALLENGE_STATE_TTL)
+            pipe.execute()
+            return True
+        except redis.RedisError as e:
+            logger.error(f"记录等待验证的任务失败 {kind}:{object_id}: {e}")
+            return False
+
+    def resume(self, account_id: int) -> int:
+        """验证完成后把等待的任务按当前时间重新调度，返回任务数"""
+        key = DEFERRED_KEY.format(account_id)
+        try:
+            pipe = self._redis().pipeline()
+            pipe.smembers(key)
+            pipe.delete(key)
+            members = pipe.execute()[0]
+        except redis.RedisError as e:
+            logger.error(f"恢复账号 {account_id} 等待验证的任务失败: {e}")
+            return 0
+        now = datetime.utcnow()
+        count = 0
+        for member in members:
+            kind, _, object_id = member.rpartition(":")
+            if delayed_job_queue.schedule(kind, int(object_id), now):
+                count += 1
+        if count:
+            logger.info(f"账号 {account_id} 验证完成，恢复 {count} 个任务")
+        return count
+
+    def forget(self, account_id: int):
+        """账号删除后清除上下文与等待的任务"""
+        self.clear(account_id)
+        try:
+            self._redis().delete(DEFERRED_KEY.format(account_id))
+        except redis.RedisError:
+            pass
+
+
+# 全局实例
+account_challenge_store = AccountChallengeStore()
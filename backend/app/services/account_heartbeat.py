@@ -0,0 +1,273 @@
+"""
+账号心跳
+API 进程内的后台循环按账号打散的时间表（间隔 ±抖动）检查内存中活跃客户端的登录状态：
+每个账号一个已登录接口请求（users/{自己}/info/，不经用户名缓存），并发受信号量限制，
+一轮结果在一个数据库事务里批量写回登录状态与当日粉丝/帖子统计，同时写入 Redis 哈希 account:heartbeat。
+监控页和账号状态接口只读这份缓存，不会触发 Instagram 请求；休眠的账号不检查，保留休眠前最后一次结果。
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import redis
+from instagrapi import Client
+from instagrapi.exceptions import ChallengeParked, ChallengeRequired, LoginRequired
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.metrics import registry
+from app.models.instagram_account import InstagramAccount, LoginStatus
+from app.models.instagram_account_stat import InstagramAccountStat
+from app.services.account_challenge import account_challenge_store
+from app.services.instagram_wrapper import instagram_account_manager
+from app.utils import json_codec
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_HEARTBEATS_TOTAL = registry.counter(
+    "account_heartbeats_total", "账号心跳检查次数", ("outcome",)
+)
+
+HEARTBEAT_KEY = "account:heartbeat"
+HEARTBEAT_LOCK_KEY = "account:heartbeat:lock:{}"
+
+
+class AccountHeartbeatService:
+    """账号登录状态心跳"""
+
+    def __init__(self):
+        self.next_due: Dict[int, float] = {}
+        # 本进程的状态副本，Redis 不可用时使用
+        self.cache: Dict[int, Dict] = {}
+        self._client: Optional[redis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    def _interval(self) -> float:
+        jitter = settings.ACCOUNT_HEARTBEAT_JITTER
+        return settings.ACCOUNT_HEARTBEAT_INTERVAL * random.uniform(1 - jitter, 1 + jitter)
+
+    def _due_accounts(self) -> List[int]:
+        """到期的活跃账号；新出现的账号在一个间隔内随机排期，避免同时检查"""
+        now = time.monotonic()
+        active = set(instagram_account_manager.active_clients)
+        for account_id in list(self.next_due):
+            if account_id not in active:
+                del self.next_due[account_id]
+        due = []
+        for account_id in active:
+            if account_id not in self.next_due:
+                self.next_due[account_id] = now + random.uniform(0, settings.ACCOUNT_HEARTBEAT_INTERVAL)
+            elif self.next_due[account_id] <= now:
+                due.append(account_id)
+        return due
+
+    def _claim(self, account_id: int) -> bool:
+        """多个进程持有同一账号客户端时只由一个进程检查"""
+        try:
+            return bool(self._redis().set(
+                HEARTBEAT_LOCK_KEY.format(account_id), "1", nx=True,
+                ex=max(int(settings.ACCOUNT_HEARTBEAT_INTERVAL / 2), 1),
+            ))
+        except redis.RedisError:
+            return True
+
+    def get_statuses(self, account_ids: Iterable[int]) -> Dict[int, Dict]:
+        """读取缓存的账号状态（不访问 Instagram）"""
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {}
+        try:
+            raw = self._redis().hmget(HEARTBEAT_KEY, [str(account_id) for account_id in account_ids])
+            return {
+                account_id: json_codec.loads(value)
+                for account_id, value in zip(account_ids, raw) if value
+            }
+        except redis.RedisError:
+            return {account_id: self.cache[account_id] for account_id in account_ids if account_id in self.cache}
+
+    def get_status(self, account_id: int) -> Optional[Dict]:
+        return self.get_statuses([account_id]).get(account_id)
+
+    def forget(self, account_id: int):
+        """账号移除后清掉排期与缓存"""
+        self.next_due.pop(account_id, None)
+        self.cache.pop(account_id, None)
+        try:
+            self._redis().hdel(HEARTBEAT_KEY, str(account_id))
+        except redis.RedisError:
+            pass
+
+    def _probe(self, account_id: int, client: Client, previous: Optional[Dict]) -> Dict:
+        """检查一个账号（在线程中执行，一个已登录接口请求）"""
+        previous = previous or {}
+        status = {
+            "account_id": account_id,
+            "username": previous.get("username") or client.username,
+            "checked_at": datetime.utcnow().isoformat(),
+        }
+        try:
+            user = client.user_info_v1(client.user_id)
+        except LoginRequired as e:
+            outcome = LoginStatus.LOGGED_OUT.value
+            status.update(logged_in=False, status=outcome, message=str(e))
+        except ChallengeRequired as e:
+            outcome = LoginStatus.CHALLENGE_REQUIRED.value
+            status.update(logged_in=False, status=outcome, message=str(e))
+            if isinstance(e, ChallengeParked) and e.state:
+                account_challenge_store.park(
+                    account_id, e.state, client.get_settings(), client.proxy, message=str(e), replace=False
+                )
+        except Exception as e:
+            # 网络/代理/限流错误不代表掉线，保留上次的登录状态，只累计错误次数
+            ACCOUNT_HEARTBEATS_TOTAL.inc(outcome="error")
+            return {
+                **previous, **status,
+                "logged_in": previous.get("logged_in", False),
+                "status": previous.get("status"),
+                "message": str(e),
+                "error_count": int(previous.get("error_count") or 0) + 1,
+                "reachable": False,
+            }
+        else:
+            outcome = LoginStatus.LOGGED_IN.value
+            status.update(
+                logged_in=True, status=outcome, message=None,
+                username=user.username, full_name=user.full_name,
+                followers=user.follower_count, following=user.following_count,
+                posts=user.media_count, last_success_at=status["checked_at"],
+            )
+        ACCOUNT_HEARTBEATS_TOTAL.inc(outcome=outcome)
+        return {**previous, **status, "error_count": 0, "reachable": True}
+
+    def _write(self, statuses: List[Dict]):
+        """一个事务内写回登录状态与当日统计，然后刷新缓存"""
+        if not statuses:
+            return
+        account_ids = [status["account_id"] for status in statuses]
+        db = next(get_db())
+        try:
+            accounts = {
+                account.id: account
+                for account in db.query(InstagramAccount).filter(InstagramAccount.id.in_(account_ids)).all()
+            }
+            today = datetime.utcnow().date()
+            stats = {
+                stat.account_id: stat
+                for stat in db.query(InstagramAccountStat).filter(
+                    InstagramAccountStat.account_id.in_(account_ids),
+                    InstagramAccountStat.stat_date == today
+                ).all()
+            }
+            for status in statuses:
+                account = accounts.get(status["account_id"])
+                if account is None:
+                    continue
+                status["username"] = account.username
+                if not status["reachable"]:
+                    continue
+                if account.login_status != status["status"]:
+                    account.login_status = status["status"]
+                if not status["logged_in"] or status.get("followers") is None:
+                    continue
+                stat = stats.get(account.id)
+                if stat is None:
+                    stat = InstagramAccountStat(account_id=account.id, stat_date=today)
+                    db.add(stat)
+                    stats[account.id] = stat
+                stat.followers_count = status["followers"]
+                stat.posts_count = status.get("posts") or 0
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"写回账号心跳失败: {e}")
+        finally:
+            db.close()
+
+        for status in statuses:
+            self.cache[status["account_id"]] = status
+        try:
+            self._redis().hset(HEARTBEAT_KEY, mapping={
+                str(status["account_id"]): json_codec.dumps(status) for status in statuses
+            })
+        except redis.RedisError as e:
+            logger.warning(f"账号心跳缓存写入失败: {e}")
+
+    def _drop_challenged(self, statuses: List[Dict]):
+        """触发验证的账号移出活跃客户端，等待提交验证码后重新登录"""
+        for status in statuses:
+            if status.get("status") == LoginStatus.CHALLENGE_REQUIRED.value:
+                instagram_account_manager.discard_client(status["account_id"])
+
+    async def run_once(self) -> int:
+        """检查一轮到期账号，返回检查数量"""
+        due = [account_id for account_id in self._due_accounts() if self._claim(account_id)]
+        if not due:
+            return 0
+        previous = self.get_statuses(due)
+        semaphore = asyncio.Semaphore(settings.ACCOUNT_HEARTBEAT_CONCURRENCY)
+
+        async def check(account_id: int) -> Optional[Dict]:
+            client = instagram_account_manager.active_clients.get(account_id)
+            if client is None:
+                return None
+            async with semaphore:
+                with instagram_account_manager.lease(account_id):
+                    return await asyncio.to_thread(self._probe, account_id, client, previous.get(account_id))
+
+        results = [status for status in await asyncio.gather(*[check(account_id) for account_id in due]) if status]
+        await asyncio.to_thread(self._write, results)
+        self._drop_challenged(results)
+        for account_id in due:
+            self.next_due[account_id] = time.monotonic() + self._interval()
+        return len(due)
+
+    async def check_now(self, account_id: int) -> Dict:
+        """立即检查一个账号（登录后、手动探活），结果同样写回并缓存"""
+        client = await instagram_account_manager.get_client(account_id)
+        if client is None:
+            return {
+                "account_id": account_id,
+                "logged_in": False,
+                "status": LoginStatus.LOGGED_OUT.value,
+                "message": "客户端未初始化",
+            }
+        with instagram_account_manager.lease(account_id):
+            status = await asyncio.to_thread(self._probe, account_id, client, self.get_status(account_id))
+        await asyncio.to_thread(self._write, [status])
+        self._drop_challenged([status])
+        self.next_due[account_id] = time.monotonic() + self._interval()
+        return status
+
+    async def _run_loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"账号心跳异常: {e}")
+            await asyncio.sleep(settings.ACCOUNT_HEARTBEAT_TICK)
+
+    async def start(self):
+        """启动心跳循环"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_loop())
+            logger.info("账号心跳已启动")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# 全局实例
+account_heartbeat_service = AccountHeartbeatService()
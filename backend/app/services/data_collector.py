@@ -4,7 +4,6 @@
 """
 
 import asyncio
-import json
 import logging
 import re
 import shutil
@@ -16,14 +15,20 @@ from datetime import datetime, timedelta
 from urllib.parse import urlparse
 import ipaddress
 
+from instagrapi.exceptions import DeadlineExceeded, RequestCancelled
+
+from app.core.config import settings
 from app.services.instagram_wrapper import instagram_operations, instagram_account_manager
 from app.models.search_task import SearchTask, TaskStatus
 from app.models.instagram_account import InstagramAccount
 from app.models.proxy import ProxyConfig
 from app.models.collected_user_data import CollectedUserData
+from app.services.job_progress import job_progress_service
+from app.services.task_cancellation import task_cancellation_service
 from app.core.database import get_db
 from sqlalchemy.orm import Session
 from app.utils.limits import add_collect_count
+from app.utils import json_codec
 
 logger = logging.getLogger(__name__)
 
@@ -40,10 +45,19 @@ class DataCollector:
     async def collect_user_data(self, search_task_id: int) -> Dict:
         """采集用户数据"""
         db = next(get_db())
+        search_task = None
+        job_id = None
+        shard_finished = False
+        token = None
         try:
             search_task = db.query(SearchTask).filter(SearchTask.id == search_task_id).first()
             if not search_task:
                 return {'success': False, 'error': '搜索任务不存在'}
+            job_id = search_task.job_id
+            if search_task.status == TaskStatus.CANCELLED:
+                # 开始前已被取消
+                shard_finished = await self._finish_shard(job_id, failed=True)
+                return {'success': False, 'error': '任务已取消'}
             
             search_type = search_task.search_type.value if hasattr(search_task.search_type, "value") else search_task.search_type
             params = self._parse_params(search_task.search_params)
@@ -59,26 +73,32 @@ class DataCollector:
                 proxy = db.query(ProxyConfig).filter(ProxyConfig.id == account.proxy_id).first()
 
             # 确保客户端可用
+            client = None
             if account:
                 try:
-                    if not await instagram_account_manager.get_client(account_id):
-                        await instagram_account_manager.add_account(account, proxy)
+                    client = await instagram_account_manager.get_client(account_id)
+                    if not client:
+                        client = await instagram_account_manager.add_account(account, proxy)
                 except Exception as exc:
                     search_task.status = TaskStatus.FAILED
                     search_task.error_message = str(exc)
                     search_task.completed_at = datetime.utcnow()
                     db.commit()
+                    shard_finished = await self._finish_shard(job_id, failed=True)
                     return {'success': False, 'error': f'账号初始化失败: {exc}'}
             else:
                 search_task.status = TaskStatus.FAILED
                 search_task.error_message = '账号不存在'
                 search_task.completed_at = datetime.utcnow()
                 db.commit()
+                shard_finished = await self._finish_shard(job_id, failed=True)
                 return {'success': False, 'error': '账号不存在'}
 
             search_task.status = TaskStatus.RUNNING
             search_task.started_at = datetime.utcnow()
+            search_task.apply_params_summary(params)
             db.commit()
+            await job_progress_service.report(job_id, shards_started=1)
 
             self._cleanup_old_downloads(keep_hours)
 
@@ -86,31 +106,52 @@ class DataCollector:
             all_media: List[Dict[str, Any]] = []
             errors: List[Dict[str, str]] = []
 
-            for query in queries:
-                if search_type == 'hashtag':
-                    result = await self._collect_from_hashtag(account_id, query, params, limit)
-                elif search_type == 'location':
-                    result = await self._collect_from_location(account_id, query, params, limit)
-                elif search_type == 'username':
-                    result = await self._collect_from_username(account_id, query, params, limit)
-                elif search_type == 'keyword':
-                    result = await self._collect_by_keyword(account_id, query, params, limit)
-                else:
-                    result = {'success': False, 'error': f'不支持的搜索类型: {search_type}'}
+            # 取消/超时令牌挂到客户端上：分页循环和重试等待都会检查，取消后最多再发一个请求；
+            # 采集期间持有客户端租约，不被休眠
+            token = task_cancellation_service.token(
+                "search", search_task_id, timeout=settings.SEARCH_TASK_TIMEOUT_SECONDS or None
+            )
+            interrupted = None
+            try:
+                with instagram_account_manager.lease(account_id), client.cancellable(token):
+                    for query in queries:
+                        token.check()
+                        if search_type == 'hashtag':
+                            result = await self._collect_from_hashtag(account_id, query, params, limit)
+                        elif search_type == 'location':
+                            result = await self._collect_from_location(account_id, query, params, limit)
+                        elif search_type == 'username':
+                            result = await self._collect_from_username(account_id, query, params, limit)
+                        elif search_type == 'keyword':
+                            result = await self._collect_by_keyword(account_id, query, params, limit)
+                        else:
+                            result = {'success': False, 'error': f'不支持的搜索类型: {search_type}'}
 
-                if not result.get('success'):
-                    errors.append({"query": query, "error": result.get("error", "未知错误")})
-                    continue
+                        if not result.get('success'):
+                            # 封装层会把 RequestCancelled 变成失败结果，先确认不是被取消
+                            token.check()
+                            errors.append({"query": query, "error": result.get("error", "未知错误")})
+                            await job_progress_service.report(job_id, queries_done=1, error_count=1)
+                            if result.get('challenge_required'):
+                                # 账号触发验证已挂起，剩余搜索词不再请求，保留已采集的结果
+                                break
+                            continue
 
-                users = result.get('users') or []
-                posts = result.get('posts') or []
-                all_users.extend(users)
+                        users = result.get('users') or []
+                        posts = result.get('posts') or []
+                        all_users.extend(users)
 
-                if download_media and posts:
-                    downloaded = await self._download_media_batch(posts, search_task_id, proxy)
-                    all_media.extend(downloaded)
-                else:
-                    all_media.extend(posts)
+                        if download_media and posts:
+                            media = await self._download_media_batch(posts, search_task_id, proxy)
+                        else:
+                            media = posts
+                        all_media.extend(media)
+                        await job_progress_service.report(
+                            job_id, queries_done=1, users_collected=len(users), media_items=len(media)
+                        )
+            except RequestCancelled as exc:
+                # 取消或超时：保留已采集的部分结果
+                interrupted = exc
 
             if all_users:
                 # 采集限额校验/计数
@@ -118,7 +159,13 @@ class DataCollector:
                 await self._save_collected_data(search_task.user_id, search_task_id, all_users)
 
             search_task.completed_at = datetime.utcnow()
-            if errors and len(errors) == len(queries):
+            if isinstance(interrupted, DeadlineExceeded):
+                search_task.status = TaskStatus.FAILED
+                search_task.error_message = f'采集超时（超过 {settings.SEARCH_TASK_TIMEOUT_SECONDS} 秒）'
+            elif interrupted is not None:
+                search_task.status = TaskStatus.CANCELLED
+                search_task.error_message = str(interrupted)
+            elif errors and len(errors) == len(queries):
                 search_task.status = TaskStatus.FAILED
                 search_task.error_message = errors[-1].get("error")
             else:
@@ -132,8 +179,10 @@ class DataCollector:
                 "download_media": download_media,
                 "errors": errors,
             }
+            search_task.apply_results_summary(search_task.results)
 
             db.commit()
+            shard_finished = await self._finish_shard(job_id, failed=search_task.status != TaskStatus.COMPLETED)
             return {
                 "success": search_task.status == TaskStatus.COMPLETED,
                 "users": len(all_users),
@@ -150,18 +199,30 @@ class DataCollector:
                 search_task.error_message = str(e)
                 search_task.completed_at = datetime.utcnow()
                 db.commit()
+            if not shard_finished:
+                await self._finish_shard(job_id, failed=True)
             
             return {'success': False, 'error': str(e)}
         finally:
+            if token is not None:
+                task_cancellation_service.release(token)
             db.close()
 
+    async def _finish_shard(self, job_id: Optional[int], failed: bool) -> bool:
+        """分片结束：上报并立即写回所属作业的进度"""
+        if not job_id:
+            return False
+        await job_progress_service.report(job_id, **{"shards_failed" if failed else "shards_done": 1})
+        job_progress_service.flush([job_id])
+        return True
+
     def _parse_params(self, raw) -> Dict:
         if raw is None:
             return {}
         if isinstance(raw, dict):
             return raw
         try:
-            return json.loads(raw)
+            return json_codec.loads(raw)
         except Exception:
             return {}
 
@@ -468,7 +529,7 @@ class DataCollector:
                     phone=user_data.get('phone'),
                     profile_pic_url=user_data.get('profile_pic_url'),
                     external_url=user_data.get('external_url'),
-                    collected_data=json.dumps(user_data.get('collected_data', {}))
+                    collected_data=json_codec.dumps(user_data.get('collected_data', {}))
                 )
                 db.add(collected_user)
             
@@ -508,7 +569,7 @@ class DataCollector:
                         'phone': item.phone,
                         'profile_pic_url': item.profile_pic_url,
                         'external_url': item.external_url,
-                        'collected_data': json.loads(item.collected_data) if item.collected_data else {},
+                        'collected_data': json_codec.loads(item.collected_data) if item.collected_data else {},
                         'created_at': item.created_at.isoformat() if item.created_at else None
                     })
                 
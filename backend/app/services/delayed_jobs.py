@@ -0,0 +1,177 @@
+"""
+延时任务调度
+到点执行的任务（发帖的预上传/发布）写入 Redis 有序集合 delayed:jobs，成员为 "{类型}:{ID}"，
+分值为触发时间（Unix 秒）。分发循环用 Lua 脚本原子地取出到期成员（ZRANGEBYSCORE + ZREM），
+交给注册的处理函数（提交对应的 Celery 任务），没有到期成员时睡到下一个触发时间，最长 DELAYED_JOBS_MAX_WAIT 秒。
+取出是原子的，多个 API 进程同时运行分发循环也不会重复触发；
+长延时任务只占 Redis 一个成员，不再以 countdown/eta 形式压在 worker 内存里。
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DELAYED_JOBS_DISPATCHED_TOTAL = registry.counter(
+    "delayed_jobs_dispatched_total", "已分发的延时任务数", ("kind", "outcome")
+)
+DELAYED_JOBS_LAG = registry.histogram(
+    "delayed_jobs_lag_seconds", "延时任务实际分发时间与计划时间之差", ("kind",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0),
+)
+
+DELAYED_JOBS_KEY = "delayed:jobs"
+
+# 取出不晚于 ARGV[1] 的至多 ARGV[2] 个成员并删除，返回 [成员, 分值, ...]
+POP_DUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+local members = {}
+for i = 1, #items, 2 do
+    members[#members + 1] = items[i]
+end
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+return items
+"""
+
+
+def fire_timestamp(value: datetime) -> float:
+    """计划时间转 Unix 秒（无时区的按 UTC 处理）"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class DelayedJobQueue:
+    """基于 Redis 有序集合的延时任务队列"""
+
+    def __init__(self):
+        self.handlers: Dict[str, Callable[[int], None]] = {}
+        self._sync_client: Optional[redis.Redis] = None
+        self._redis: Optional[aioredis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _sync_redis(self) -> redis.Redis:
+        if self._sync_client is None:
+            self._sync_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._sync_client
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+
+    def register(self, kind: str, handler: Callable[[int], None]):
+        """注册任务类型的处理函数（在线程中调用，参数为对象ID）"""
+        self.handlers[kind] = handler
+
+    def schedule(self, kind: str, object_id: int, fire_at: datetime, only_new: bool = False) -> bool:
+        """在 fire_at 触发任务；同一任务重复调度会改到新时间，only_new 时保留已有的触发时间"""
+        try:
+            added = self._sync_redis().zadd(
+                DELAYED_JOBS_KEY, {f"{kind}:{object_id}": fire_timestamp(fire_at)}, nx=only_new
+            )
+            return bool(added) or not only_new
+        except redis.RedisError as e:
+            logger.error(f"写入延时任务失败 {kind}:{object_id}: {e}")
+            return False
+
+    def unschedule(self, kind: str, object_id: int):
+        """移除尚未触发的任务"""
+        try:
+            self._sync_redis().zrem(DELAYED_JOBS_KEY, f"{kind}:{object_id}")
+        except redis.RedisError as e:
+            logger.warning(f"移除延时任务失败 {kind}:{object_id}: {e}")
+
+    def fire_time(self, kind: str, object_id: int) -> Optional[float]:
+        """已调度任务的触发时间（Unix 秒）"""
+        try:
+            return self._sync_redis().zscore(DELAYED_JOBS_KEY, f"{kind}:{object_id}")
+        except redis.RedisError:
+            return None
+
+    async def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """原子地取出已到期的任务"""
+        items = await self.redis.eval(
+            POP_DUE_SCRIPT, 1, DELAYED_JOBS_KEY,
+            time.time() if now is None else now, limit or settings.DELAYED_JOBS_BATCH_SIZE,
+        )
+        return [(items[i], float(items[i + 1])) for i in range(0, len(items), 2)]
+
+    def _dispatch(self, items: List[Tuple[str, float]]) -> List[str]:
+        """执行处理函数，返回失败需要重试的成员"""
+        failed = []
+        now = time.time()
+        for member, score in items:
+            kind, _, object_id = member.rpartition(":")
+            handler = self.handlers.get(kind)
+            if handler is None:
+                logger.error(f"未注册的延时任务类型: {member}")
+                DELAYED_JOBS_DISPATCHED_TOTAL.inc(kind=kind, outcome="unknown")
+                continue
+            try:
+                handler(int(object_id))
+            except Exception as e:
+                logger.error(f"分发延时任务失败 {member}: {e}")
+                DELAYED_JOBS_DISPATCHED_TOTAL.inc(kind=kind, outcome="error")
+                failed.append(member)
+                continue
+            DELAYED_JOBS_DISPATCHED_TOTAL.inc(kind=kind, outcome="success")
+            DELAYED_JOBS_LAG.observe(max(now - score, 0), kind=kind)
+        return failed
+
+    async def run_once(self) -> int:
+        """分发一批到期任务，返回分发数量"""
+        items = await self.pop_due()
+        if not items:
+            return 0
+        failed = await asyncio.to_thread(self._dispatch, items)
+        if failed:
+            retry_at = time.time() + settings.DELAYED_JOBS_RETRY_SECONDS
+            await self.redis.zadd(DELAYED_JOBS_KEY, {member: retry_at for member in failed})
+        return len(items)
+
+    async def _next_wait(self) -> float:
+        head = await self.redis.zrange(DELAYED_JOBS_KEY, 0, 0, withscores=True)
+        if not head:
+            return settings.DELAYED_JOBS_MAX_WAIT
+        return min(max(head[0][1] - time.time(), 0), settings.DELAYED_JOBS_MAX_WAIT)
+
+    async def _run_loop(self):
+        while True:
+            try:
+                # 满批说明还有积压，立即继续
+                if await self.run_once() >= settings.DELAYED_JOBS_BATCH_SIZE:
+                    continue
+                await asyncio.sleep(await self._next_wait())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"延时任务分发异常: {e}")
+                await asyncio.sleep(5)
+
+    async def start(self):
+        """启动分发循环"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_loop())
+            logger.info("延时任务分发已启动")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# 全局实例
+delayed_job_queue = DelayedJobQueue()
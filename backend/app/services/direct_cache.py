@@ -0,0 +1,158 @@
+"""
+私信收件人缓存
+- 用户名 -> pk：全局共享（pk 与账号无关），长期保存在 Redis，不存在的用户名短期负缓存
+- 收件人 pk -> 会话 thread_id：按发送账号缓存，命中后直接按 thread_ids 发送
+Redis 不可用时退化为进程内缓存
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import redis.asyncio as aioredis
+from instagrapi import Client
+from instagrapi.exceptions import UserNotFound
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DM_RECIPIENT_LOOKUPS_TOTAL = registry.counter(
+    "dm_recipient_lookups_total", "私信收件人解析次数", ("source",)
+)
+
+USERNAME_KEY = "ig:username_pk:{}"
+THREAD_KEY = "ig:dm_threads:{}"
+MISSING = "0"
+# 进程内回退缓存的最大条目数
+LOCAL_CACHE_MAX_ENTRIES = 50000
+
+
+def normalize_username(username: str) -> str:
+    return username.strip().lstrip("@").lower()
+
+
+class DirectRecipientCache:
+    """用户名解析与会话缓存"""
+
+    def __init__(self, redis_url: str):
+        self.redis_url = redis_url
+        self._redis: Optional[aioredis.Redis] = None
+        self._loop = None
+        self._local: "OrderedDict[str, str]" = OrderedDict()
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        # Celery 任务每次用 asyncio.run 新建事件循环，连接不能跨循环复用
+        loop = asyncio.get_running_loop()
+        if self._redis is None or self._loop is not loop:
+            self._redis = aioredis.Redis.from_url(self.redis_url, decode_responses=True)
+            self._loop = loop
+        return self._redis
+
+    def _remember(self, key: str, value: str):
+        self._local[key] = value
+        self._local.move_to_end(key)
+        if len(self._local) > LOCAL_CACHE_MAX_ENTRIES:
+            self._local.popitem(last=False)
+
+    async def get_pks(self, usernames: Iterable[str]) -> Dict[str, Optional[int]]:
+        """批量查缓存：命中返回 pk，负缓存返回 None，未缓存的用户名不出现在结果中"""
+        names = list(dict.fromkeys(normalize_username(u) for u in usernames))
+        keys = [USERNAME_KEY.format(name) for name in names]
+        values: List[Optional[str]] = [self._local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            try:
+                fetched = await self.redis.mget([keys[i] for i in missing])
+            except Exception as e:
+                logger.warning(f"用户名缓存读取失败，使用进程内缓存: {e}")
+                fetched = [None] * len(missing)
+            for i, value in zip(missing, fetched):
+                if value is not None:
+                    values[i] = value
+                    self._remember(keys[i], value)
+        return {
+            name: (int(value) if value != MISSING else None)
+            for name, value in zip(names, values)
+            if value is not None
+        }
+
+    async def set_pk(self, username: str, pk: Optional[int]):
+        """保存解析结果；pk 为 None 表示用户名不存在（短期负缓存）"""
+        key = USERNAME_KEY.format(normalize_username(username))
+        value = str(pk) if pk else MISSING
+        ttl = settings.DM_USERNAME_CACHE_TTL if pk else settings.DM_USERNAME_MISSING_TTL
+        self._remember(key, value)
+        try:
+            await self.redis.set(key, value, ex=ttl)
+        except Exception as e:
+            logger.warning(f"用户名缓存写入失败: {e}")
+
+    async def resolve(self, client: Client, username: str) -> Optional[int]:
+        """解析单个用户名，未命中缓存时通过该客户端查询一次并缓存"""
+        cached = await self.get_pks([username])
+        name = normalize_username(username)
+        if name in cached:
+            DM_RECIPIENT_LOOKUPS_TOTAL.inc(source="cache")
+            return cached[name]
+        return await self._lookup(client, name)
+
+    async def _lookup(self, client: Client, name: str) -> Optional[int]:
+        DM_RECIPIENT_LOOKUPS_TOTAL.inc(source="api")
+        try:
+            pk = int(await asyncio.to_thread(client.user_id_from_username, name))
+        except UserNotFound:
+            pk = None
+        await self.set_pk(name, pk)
+        return pk
+
+    async def resolve_many(self, client: Client, usernames: List[str]) -> Dict[str, Optional[int]]:
+        """批量解析：一次 MGET 取缓存，只对未命中的用户名逐个查询"""
+        resolved = await self.get_pks(usernames)
+        DM_RECIPIENT_LOOKUPS_TOTAL.inc(len(resolved), source="cache")
+        for username in usernames:
+            name = normalize_username(username)
+            if name not in resolved:
+                resolved[name] = await self._lookup(client, name)
+        return resolved
+
+    async def get_thread(self, account_id: int, pk: int) -> Optional[str]:
+        key = THREAD_KEY.format(account_id)
+        local_key = f"{key}:{pk}"
+        thread_id = self._local.get(local_key)
+        if thread_id:
+            return thread_id
+        try:
+            thread_id = await self.redis.hget(key, str(pk))
+        except Exception as e:
+            logger.warning(f"会话缓存读取失败: {e}")
+            return None
+        if thread_id:
+            self._remember(local_key, thread_id)
+        return thread_id
+
+    async def set_thread(self, account_id: int, pk: int, thread_id: str):
+        key = THREAD_KEY.format(account_id)
+        self._remember(f"{key}:{pk}", thread_id)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hset(key, str(pk), thread_id)
+            pipe.expire(key, settings.DM_THREAD_CACHE_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"会话缓存写入失败: {e}")
+
+    async def drop_thread(self, account_id: int, pk: int):
+        key = THREAD_KEY.format(account_id)
+        self._local.pop(f"{key}:{pk}", None)
+        try:
+            await self.redis.hdel(key, str(pk))
+        except Exception:
+            pass
+
+
+# 全局实例
+direct_recipient_cache = DirectRecipientCache(settings.REDIS_URL)
@@ -0,0 +1,250 @@
+"""
+批量私信发送
+收件人按账号分配到各自的发送队列，每个账号按配额节奏（GCRA）独立发送，多个账号并发执行；
+用户名解析与会话走 direct_recipient_cache，发送结果分批写入 message_logs
+"""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from instagrapi import Client
+from instagrapi.exceptions import (
+    ChallengeRequired,
+    DirectThreadNotFound,
+    FeedbackRequired,
+    LoginRequired,
+    PleaseWaitFewMinutes,
+)
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.metrics import registry
+from app.models.instagram_account import InstagramAccount
+from app.models.message import MessageLog, MessageType
+from app.models.proxy import ProxyConfig
+from app.services.direct_cache import direct_recipient_cache, normalize_username
+from app.services.instagram_wrapper import instagram_account_manager
+from app.utils.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+DM_DELIVERIES_TOTAL = registry.counter(
+    "dm_deliveries_total", "批量私信发送结果", ("outcome",)
+)
+
+# 出现这些异常说明账号已被限制，停止该账号的队列
+ACCOUNT_BLOCKING_ERRORS = (ChallengeRequired, FeedbackRequired, PleaseWaitFewMinutes, LoginRequired)
+
+
+@dataclass
+class DeliveryOutcome:
+    """单个收件人的发送结果"""
+    username: str
+    account_id: int
+    outcome: str  # sent / not_found / failed / skipped
+    thread_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class AccountSender:
+    """单个发送账号的队列与状态"""
+    account: InstagramAccount
+    client: Client
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    blocked: Optional[str] = None
+
+
+class MessageLogBuffer:
+    """缓冲发送记录，凑够 DM_LOG_BATCH_SIZE 条后一次批量插入"""
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.rows: List[Dict] = []
+        self.written = 0
+
+    async def add(self, row: Dict):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        await asyncio.to_thread(self._insert, rows)
+        self.written += len(rows)
+
+    @staticmethod
+    def _insert(rows: List[Dict]):
+        db = next(get_db())
+        try:
+            db.bulk_insert_mappings(MessageLog, rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"批量写入私信记录失败（{len(rows)} 条）: {e}")
+        finally:
+            db.close()
+
+
+class DirectDispatchService:
+    """批量私信：收件人解析缓存 + 每账号发送队列 + 跨账号并发"""
+
+    async def _client_for(self, db, account: InstagramAccount) -> Client:
+        client = await instagram_account_manager.get_client(account.id)
+        if client:
+            return client
+        proxy = None
+        if account.proxy_id:
+            proxy = db.query(ProxyConfig).filter(ProxyConfig.id == account.proxy_id).first()
+        return await instagram_account_manager.add_account(account, proxy)
+
+    async def _wait_for_budget(self, account_id: int):
+        """按账号配额节奏发送：超出 DM_MAX_PER_HOUR 时等待，之后再加随机间隔"""
+        while True:
+            result = await rate_limiter.hit(
+                rate_limiter.build_key("direct_send", str(account_id)),
+                settings.DM_MAX_PER_HOUR,
+                3600,
+            )
+            if result.allowed:
+                break
+            await asyncio.sleep(result.retry_after)
+        await asyncio.sleep(random.uniform(settings.DM_MIN_INTERVAL_SECONDS, settings.DM_MAX_INTERVAL_SECONDS))
+
+    async def _send_one(self, sender: AccountSender, pk: int, text: str) -> str:
+        """有缓存会话时按 thread_ids 发送，否则按 user_ids 发送并缓存返回的会话"""
+        account_id = sender.account.id
+        thread_id = await direct_recipient_cache.get_thread(account_id, pk)
+        if thread_id:
+            try:
+                await asyncio.to_thread(sender.client.direct_send, text, thread_ids=[int(thread_id)])
+                return thread_id
+            except DirectThreadNotFound:
+                await direct_recipient_cache.drop_thread(account_id, pk)
+        message = await asyncio.to_thread(sender.client.direct_send, text, user_ids=[pk])
+        thread_id = str(message.thread_id)
+        await direct_recipient_cache.set_thread(account_id, pk, thread_id)
+        return thread_id
+
+    async def _run_sender(
+        self, sender: AccountSender, text: str, user_id: int,
+        buffer: MessageLogBuffer, outcomes: List[DeliveryOutcome],
+    ):
+        account = sender.account
+        while not sender.queue.empty():
+            username = sender.queue.get_nowait()
+            if sender.blocked:
+                outcomes.append(DeliveryOutcome(username, account.id, "skipped", error=sender.blocked))
+                continue
+            try:
+                pk = await direct_recipient_cache.resolve(sender.client, username)
+                if pk is None:
+                    outcomes.append(DeliveryOutcome(username, account.id, "not_found", error="用户不存在"))
+                    continue
+                await self._wait_for_budget(account.id)
+                thread_id = await self._send_one(sender, pk, text)
+            except ACCOUNT_BLOCKING_ERRORS as e:
+                sender.blocked = f"账号受限: {type(e).__name__}"
+                logger.warning(f"账号 {account.username} 批量私信中止: {e}")
+                if isinstance(e, ChallengeRequired):
+                    await instagram_account_manager.park_challenge(account.id, sender.client, e)
+                outcomes.append(DeliveryOutcome(username, account.id, "failed", error=str(e)))
+                continue
+            except Exception as e:
+                logger.warning(f"账号 {account.username} 发送私信给 {username} 失败: {e}")
+                outcomes.append(DeliveryOutcome(username, account.id, "failed", error=str(e)))
+                continue
+            outcomes.append(DeliveryOutcome(username, account.id, "sent", thread_id=thread_id))
+            await buffer.add({
+                "user_id": user_id,
+                "instagram_account_id": account.id,
+                "thread_id": thread_id,
+                "sender_username": account.username,
+                "message_content": text,
+                "message_type": MessageType.TEXT,
+                "is_incoming": False,
+                "is_auto_reply": False,
+                "created_at": datetime.utcnow(),
+            })
+
+    async def run_campaign(self, user_id: int, account_ids: List[int], usernames: List[str], text: str) -> Dict:
+        """
+        向 usernames 批量发送 text：收件人轮流分配给 account_ids 中可用的账号
+        返回各结果的计数与失败明细
+        """
+        recipients = list(dict.fromkeys(normalize_username(u) for u in usernames if u and u.strip()))
+        if not recipients:
+            return {'success': False, 'error': '收件人列表不能为空'}
+
+        db = next(get_db())
+        try:
+            accounts = db.query(InstagramAccount).filter(
+                InstagramAccount.id.in_(account_ids),
+                InstagramAccount.user_id == user_id,
+                InstagramAccount.is_active == True,
+            ).all()
+            senders: List[AccountSender] = []
+            for account in accounts:
+                try:
+                    client = await self._client_for(db, account)
+                except Exception as e:
+                    logger.warning(f"账号 {account.username} 无法用于批量私信: {e}")
+                    continue
+                # 发送期间持有客户端租约，不被休眠
+                instagram_account_manager.acquire(account.id)
+                senders.append(AccountSender(account, client))
+        finally:
+            db.close()
+        if not senders:
+            return {'success': False, 'error': '没有可用的发送账号'}
+
+        started = datetime.utcnow()
+        buffer = MessageLogBuffer(settings.DM_LOG_BATCH_SIZE)
+        outcomes: List[DeliveryOutcome] = []
+
+        try:
+            # 一次 MGET 预热解析缓存，已知不存在的用户名不再分配给账号
+            cached = await direct_recipient_cache.get_pks(recipients)
+            pending = []
+            for username in recipients:
+                if username in cached and cached[username] is None:
+                    outcomes.append(DeliveryOutcome(username, 0, "not_found", error="用户不存在"))
+                else:
+                    pending.append(username)
+            for index, username in enumerate(pending):
+                senders[index % len(senders)].queue.put_nowait(username)
+
+            await asyncio.gather(*(
+                self._run_sender(sender, text, user_id, buffer, outcomes) for sender in senders
+            ))
+        finally:
+            await buffer.flush()
+            for sender in senders:
+                instagram_account_manager.release(sender.account.id)
+
+        counts: Dict[str, int] = {}
+        for outcome in outcomes:
+            counts[outcome.outcome] = counts.get(outcome.outcome, 0) + 1
+            DM_DELIVERIES_TOTAL.inc(outcome=outcome.outcome)
+        return {
+            'success': True,
+            'total': len(recipients),
+            'accounts': [sender.account.id for sender in senders],
+            'counts': counts,
+            'logged': buffer.written,
+            'duration_seconds': (datetime.utcnow() - started).total_seconds(),
+            'failures': [
+                {'username': o.username, 'account_id': o.account_id, 'outcome': o.outcome, 'error': o.error}
+                for o in outcomes if o.outcome != 'sent'
+            ],
+        }
+
+
+# 全局实例
+direct_dispatch_service = DirectDispatchService()
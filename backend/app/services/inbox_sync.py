@@ -0,0 +1,315 @@
+"""
+私信收件箱增量同步
+按账号保存收件箱游标（seq_id、snapshot_at_ms、最新活动时间）与会话游标（最新消息 ID/时间），
+每次只翻到上次同步过的会话为止，只拉取新增消息，收到的消息批量写入 message_logs，
+并把新收到的消息交给自动回复规则匹配。
+请求量与新消息量成正比，与收件箱大小无关；直接读取原始 JSON，不构造 DirectThread 模型。
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from instagrapi import Client
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.metrics import registry
+from app.models.auto_reply import AutoReplyRule
+from app.models.direct_sync import DirectInboxState, DirectThreadState
+from app.models.instagram_account import InstagramAccount
+from app.models.message import MessageLog, MessageType
+from app.models.proxy import ProxyConfig
+from app.services.instagram_wrapper import instagram_account_manager
+
+logger = logging.getLogger(__name__)
+
+INBOX_SYNC_MESSAGES_TOTAL = registry.counter(
+    "inbox_sync_messages_total", "收件箱同步写入的新消息数"
+)
+INBOX_SYNC_REQUESTS_TOTAL = registry.counter(
+    "inbox_sync_requests_total", "收件箱同步发出的请求数", ("endpoint",)
+)
+
+SYNC_LOCK_KEY = "dm:inbox_sync:{}"
+
+INBOX_PARAMS = {
+    "visual_message_return_type": "unseen",
+    "thread_message_limit": "10",
+    "persistentBadging": "true",
+    "limit": "20",
+    "is_prefetching": "false",
+}
+THREAD_PARAMS = {
+    "visual_message_return_type": "unseen",
+    "direction": "older",
+    "limit": "20",
+}
+
+
+def item_timestamp(item: Dict) -> int:
+    return int(item.get("timestamp") or 0)
+
+
+def item_to_row(item: Dict) -> Tuple[str, MessageType, Optional[str]]:
+    """原始消息 -> (内容, 类型, 媒体URL)"""
+    item_type = item.get("item_type")
+    if item_type == "text":
+        return item.get("text") or "", MessageType.TEXT, None
+    if item_type == "link":
+        link = item.get("link") or {}
+        return link.get("text") or "", MessageType.LINK, (link.get("link_context") or {}).get("link_url")
+    if item_type == "media":
+        media = item.get("media") or {}
+        if media.get("media_type") == 2:
+            versions = media.get("video_versions") or [{}]
+            return "[视频]", MessageType.VIDEO, versions[0].get("url")
+        candidates = (media.get("image_versions2") or {}).get("candidates") or [{}]
+        return "[图片]", MessageType.IMAGE, candidates[0].get("url")
+    return f"[{item_type}]", MessageType.TEXT, None
+
+
+class InboxSyncService:
+    """私信收件箱增量同步"""
+
+    def _claim(self, account_id: int) -> bool:
+        """同一账号同一时间只允许一个同步；Redis 不可用时放行"""
+        try:
+            r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+            return bool(r.set(SYNC_LOCK_KEY.format(account_id), "1", nx=True, ex=settings.DM_SYNC_LOCK_SECONDS))
+        except redis.RedisError as e:
+            logger.warning(f"Redis 不可用，跳过同步锁: {e}")
+            return True
+
+    def _release(self, account_id: int):
+        try:
+            redis.Redis.from_url(settings.REDIS_URL, decode_responses=True).delete(SYNC_LOCK_KEY.format(account_id))
+        except redis.RedisError:
+            pass
+
+    async def _client_for(self, db, account: InstagramAccount) -> Client:
+        client = await instagram_account_manager.get_client(account.id)
+        if client:
+            return client
+        proxy = None
+        if account.proxy_id:
+            proxy = db.query(ProxyConfig).filter(ProxyConfig.id == account.proxy_id).first()
+        return await instagram_account_manager.add_account(account, proxy)
+
+    async def _request(self, client: Client, endpoint: str, params: Dict, label: str) -> Dict:
+        INBOX_SYNC_REQUESTS_TOTAL.inc(endpoint=label)
+        return await asyncio.to_thread(client.private_request, endpoint, params=params)
+
+    async def fetch_updated_threads(self, client: Client, since: Optional[int]) -> Tuple[List[Dict], Dict]:
+        """
+        从最新的会话开始翻页，遇到最新活动时间不晚于 since 的会话即停止
+        首次同步（since 为 None）只取第一页作为基线
+        """
+        threads: List[Dict] = []
+        meta: Dict = {}
+        cursor = None
+        for page in range(settings.DM_SYNC_MAX_PAGES):
+            params = dict(INBOX_PARAMS)
+            if cursor:
+                params.update({"cursor": cursor, "direction": "older", "fetch_reason": "page_scroll"})
+            result = await self._request(client, "direct_v2/inbox/", params, "inbox")
+            inbox = result.get("inbox") or {}
+            if page == 0:
+                meta = {"seq_id": result.get("seq_id"), "snapshot_at_ms": result.get("snapshot_at_ms")}
+            reached = False
+            for thread in inbox.get("threads", []):
+                if since is not None and int(thread.get("last_activity_at") or 0) <= since:
+                    reached = True
+                    break
+                threads.append(thread)
+            cursor = inbox.get("oldest_cursor")
+            meta["oldest_cursor"] = cursor
+            if reached or since is None or not inbox.get("has_older") or not cursor:
+                break
+        return threads, meta
+
+    async def new_items(self, client: Client, thread: Dict, state: Optional[DirectThreadState], baseline: bool) -> List[Dict]:
+        """会话中上次同步之后的消息（从旧到新）；收件箱里附带的消息不够时向前翻页补齐"""
+        last_ts = state.last_item_timestamp if state and state.last_item_timestamp else None
+        items = sorted(thread.get("items", []), key=item_timestamp)
+        if last_ts is not None:
+            items = [item for item in items if item_timestamp(item) > last_ts]
+        # 首次同步只以收件箱附带的消息为基线；新会话或有遗漏时翻页
+        need_older = (
+            not baseline
+            and thread.get("has_older")
+            and len(items) == len(thread.get("items", []))
+        )
+        cursor = thread.get("oldest_cursor")
+        pages = 0
+        while need_older and cursor and pages < settings.DM_SYNC_MAX_THREAD_PAGES:
+            params = dict(THREAD_PARAMS, cursor=cursor)
+            result = await self._request(client, f"direct_v2/threads/{thread['thread_id']}/", params, "thread")
+            page = result.get("thread") or {}
+            pages += 1
+            older = page.get("items", [])
+            if last_ts is not None:
+                fresh = [item for item in older if item_timestamp(item) > last_ts]
+                need_older = len(fresh) == len(older) and page.get("has_older")
+                older = fresh
+            else:
+                need_older = page.get("has_older")
+            items = sorted(older, key=item_timestamp) + items
+            cursor = page.get("oldest_cursor")
+        return items
+
+    async def sync_account(self, account_id: int) -> Dict:
+        """同步单个账号的收件箱，返回新增消息统计"""
+        if not self._claim(account_id):
+            return {'success': False, 'error': '该账号正在同步中'}
+        leased = False
+        db = next(get_db())
+        try:
+            account = db.query(InstagramAccount).filter(InstagramAccount.id == account_id).first()
+            if not account:
+                return {'success': False, 'error': 'Instagram账号不存在'}
+            client = await self._client_for(db, account)
+            # 同步期间持有客户端租约，不被休眠
+            instagram_account_manager.acquire(account_id)
+            leased = True
+            own_pk = str(client.user_id)
+
+            inbox_state = db.query(DirectInboxState).filter(DirectInboxState.instagram_account_id == account_id).first()
+            if inbox_state is None:
+                inbox_state = DirectInboxState(instagram_account_id=account_id)
+                db.add(inbox_state)
+            baseline = inbox_state.last_activity_at is None
+
+            threads, meta = await self.fetch_updated_threads(client, inbox_state.last_activity_at)
+            thread_ids = [str(thread["thread_id"]) for thread in threads]
+            thread_states = {
+                state.thread_id: state
+                for state in db.query(DirectThreadState).filter(
+                    DirectThreadState.instagram_account_id == account_id,
+                    DirectThreadState.thread_id.in_(thread_ids),
+                ).all()
+            } if thread_ids else {}
+
+            rows: List[Dict] = []
+            incoming: Dict[str, Dict] = {}  # thread_id -> 最新一条收到的消息
+            for thread in threads:
+                thread_id = str(thread["thread_id"])
+                state = thread_states.get(thread_id)
+                items = await self.new_items(client, thread, state, baseline)
+                usernames = {str(u.get("pk")): u.get("username") for u in thread.get("users", [])}
+                for item in items:
+                    sender_pk = str(item.get("user_id"))
+                    if sender_pk == own_pk:
+                        # 本账号发出的消息已由发送方记录；会话里已经回复过就不再自动回复
+                        incoming.pop(thread_id, None)
+                        continue
+                    content, message_type, media_url = item_to_row(item)
+                    rows.append({
+                        "user_id": account.user_id,
+                        "instagram_account_id": account_id,
+                        "thread_id": thread_id,
+                        "sender_username": usernames.get(sender_pk, sender_pk),
+                        "message_content": content,
+                        "message_type": message_type,
+                        "is_incoming": True,
+                        "is_auto_reply": False,
+                        "media_url": media_url,
+                        "created_at": datetime.utcfromtimestamp(item_timestamp(item) / 1_000_000),
+                    })
+                    if message_type == MessageType.TEXT:
+                        incoming[thread_id] = rows[-1]
+
+                if state is None:
+                    state = DirectThreadState(instagram_account_id=account_id, thread_id=thread_id)
+                    db.add(state)
+                if items:
+                    state.last_item_id = str(items[-1].get("item_id"))
+                    state.last_item_timestamp = item_timestamp(items[-1])
+                state.last_activity_at = int(thread.get("last_activity_at") or 0)
+                state.oldest_cursor = thread.get("oldest_cursor")
+
+            if rows:
+                db.bulk_insert_mappings(MessageLog, rows)
+            if threads:
+                inbox_state.last_activity_at = max(
+                    int(thread.get("last_activity_at") or 0) for thread in threads
+                )
+            elif baseline:
+                inbox_state.last_activity_at = 0
+            if meta.get("seq_id") is not None:
+                inbox_state.seq_id = int(meta["seq_id"])
+            if meta.get("snapshot_at_ms") is not None:
+                inbox_state.snapshot_at_ms = int(meta["snapshot_at_ms"])
+            inbox_state.oldest_cursor = meta.get("oldest_cursor")
+            inbox_state.last_synced_at = datetime.utcnow()
+            db.commit()
+
+            INBOX_SYNC_MESSAGES_TOTAL.inc(len(rows))
+
+            # 首次同步的历史消息不触发自动回复
+            replies = 0 if baseline else await self.apply_auto_replies(db, account, client, list(incoming.values()))
+            return {
+                'success': True,
+                'threads': len(threads),
+                'messages': len(rows),
+                'auto_replies': replies,
+                'baseline': baseline,
+            }
+        except Exception as e:
+            db.rollback()
+            logger.error(f"同步账号 {account_id} 收件箱失败: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            if leased:
+                instagram_account_manager.release(account_id)
+            self._release(account_id)
+            db.close()
+
+    async def apply_auto_replies(self, db, account: InstagramAccount, client: Client, messages: List[Dict]) -> int:
+        """对每个会话最新收到的消息匹配自动回复规则（按优先级），命中则按规则延迟回复"""
+        if not messages:
+            return 0
+        rules = db.query(AutoReplyRule).filter(
+            AutoReplyRule.instagram_account_id == account.id,
+            AutoReplyRule.is_active == True,
+        ).order_by(AutoReplyRule.priority.desc()).all()
+        if not rules:
+            return 0
+
+        async def reply(message: Dict, rule: AutoReplyRule) -> Optional[Dict]:
+            if rule.delay_seconds:
+                await asyncio.sleep(rule.delay_seconds)
+            try:
+                await asyncio.to_thread(client.direct_send, rule.reply_message, thread_ids=[int(message["thread_id"])])
+            except Exception as e:
+                logger.warning(f"自动回复失败（会话 {message['thread_id']}）: {e}")
+                return None
+            return {
+                "user_id": account.user_id,
+                "instagram_account_id": account.id,
+                "thread_id": message["thread_id"],
+                "sender_username": account.username,
+                "message_content": rule.reply_message,
+                "message_type": MessageType.TEXT,
+                "is_incoming": False,
+                "is_auto_reply": True,
+                "created_at": datetime.utcnow(),
+            }
+
+        pending = []
+        for message in messages:
+            rule = next((r for r in rules if r.matches_message(message["message_content"])), None)
+            if rule is not None:
+                rule.increment_reply_count()
+                pending.append(reply(message, rule))
+        rows = [row for row in await asyncio.gather(*pending) if row]
+        if rows:
+            db.bulk_insert_mappings(MessageLog, rows)
+        db.commit()
+        return len(rows)
+
+
+# 全局实例
+inbox_sync_service = InboxSyncService()
@@ -6,12 +6,19 @@ Instagram服务包装器
 import asyncio
 import json
 import logging
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
 from instagrapi import Client
+from instagrapi import config as instagrapi_config
+from instagrapi.pool import ConnectionPoolRegistry
 from instagrapi.exceptions import (
     LoginRequired,
+    ChallengeParked,
     ChallengeRequired,
     RecaptchaChallengeForm,
     FeedbackRequired,
@@ -22,20 +29,83 @@ from instagrapi.exceptions import (
 )
 
 from app.models.instagram_account import InstagramAccount, LoginStatus
-from app.models.instagram_account_stat import InstagramAccountStat
 from app.models.proxy import ProxyConfig
 from app.core.database import get_db
+from app.core.config import settings as app_settings
+from app.core.metrics import registry, track_operation
+from app.services.account_challenge import account_challenge_store
+from app.services.direct_cache import direct_recipient_cache
+from app.services.media_prep import media_prep_service
+from app.utils import json_codec
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
+INSTAGRAM_LOGINS_TOTAL = registry.counter(
+    "instagram_logins_total", "Instagram 账号登录次数", ("outcome",)
+)
+INSTAGRAM_CLIENTS = registry.gauge(
+    "instagram_clients", "内存中的 Instagram 客户端数量", ("state",)
+)
+INSTAGRAM_CLIENT_TRANSITIONS_TOTAL = registry.counter(
+    "instagram_client_transitions_total", "客户端休眠/恢复次数", ("transition",)
+)
+INSTAGRAM_ENDPOINT_DURATION = registry.histogram(
+    "instagram_endpoint_duration_seconds", "Instagram 私有接口耗时（按端点模板）", ("endpoint", "status")
+)
+
+# 全部账号共用连接池：同一代理下的账号复用 TCP/TLS 连接，cookie 与请求头仍按客户端隔离
+instagram_connection_pools = ConnectionPoolRegistry(
+    pool_connections=app_settings.INSTAGRAM_POOL_CONNECTIONS,
+    pool_maxsize=app_settings.INSTAGRAM_POOL_MAXSIZE,
+    idle_timeout=app_settings.INSTAGRAM_POOL_IDLE_TIMEOUT,
+)
+
+# 私有接口地址取自 instagrapi 的模块级配置，进程启动（API 与 Celery worker 导入本模块）时设置一次
+if app_settings.INSTAGRAM_API_DOMAIN:
+    instagrapi_config.API_SCHEME = app_settings.INSTAGRAM_API_SCHEME
+    instagrapi_config.API_DOMAIN = app_settings.INSTAGRAM_API_DOMAIN
+
+
+def _create_client() -> Client:
+    """创建 instagrapi 客户端；配置了 INSTAGRAM_API_DOMAIN 时指向替身服务"""
+    client = Client(pool_registry=instagram_connection_pools)
+    if app_settings.INSTAGRAM_API_DOMAIN:
+        scheme = app_settings.INSTAGRAM_API_SCHEME
+        domain = app_settings.INSTAGRAM_API_DOMAIN
+        client.domain = domain
+        client.PUBLIC_API_URL = f"{scheme}://{domain}/public/"
+        client.GRAPHQL_PUBLIC_API_URL = f"{scheme}://{domain}/public/graphql/query/"
+        client.request_timeout = 0
+    # 需要验证码时抛出 ChallengeParked，不在 worker 里等待输入
+    client.challenge_park = True
+    client.add_request_hook(after=_observe_instagram_request)
+    return client
+
+
+def _observe_instagram_request(client: Client, event) -> None:
+    """instagrapi after_response 钩子：把单次请求耗时写入进程内指标"""
+    status = str(event.status_code) if event.status_code else (event.error or "error")
+    if event.latency is not None:
+        INSTAGRAM_ENDPOINT_DURATION.observe(event.latency, endpoint=event.template, status=status)
+    if event.failed or event.retries:
+        logger.debug(
+            f"Instagram 请求 {event.method} {event.template} 状态 {status} "
+            f"耗时 {event.latency or 0:.3f}s 重试 {event.retries} 代理 {event.proxy}"
+        )
+
 
 class InstagramAccountManager:
     """Instagram账号管理器"""
     
     def __init__(self):
         self.active_clients: Dict[int, Client] = {}
-        self.login_status_cache: Dict[int, Dict] = {}
+        # 休眠账号：zlib 压缩的 {settings, username, proxy}，每个不到 1KB
+        self.dormant_clients: Dict[int, bytes] = {}
+        self.last_used: Dict[int, float] = {}
+        # 使用中的客户端（租约计数）：长时间持有客户端的任务期间不休眠，避免同一账号出现两个会话
+        self.leases: Dict[int, int] = {}
+        self._last_sweep = time.monotonic()
 
     def _generate_totp(self, secret: Optional[str]) -> Optional[str]:
         """根据 TOTP 秘钥生成验证码"""
@@ -60,8 +130,11 @@ class InstagramAccountManager:
         
     async def add_account(self, account: InstagramAccount, proxy: Optional[ProxyConfig] = None, totp_code: Optional[str] = None) -> Client:
         """??Instagram??????"""
+        if account_challenge_store.get(account.id) is not None:
+            # 等待验证码的账号不重新登录（会再次触发验证），直接失败
+            raise ChallengeParked(f"账号 {account.username} 等待提交验证码")
+        client = _create_client()
         try:
-            client = Client()
 
             # ????
             if proxy:
@@ -81,7 +154,7 @@ class InstagramAccountManager:
                             client.set_settings(settings)
                             session_id = settings.get("session_id") or settings.get("sessionid")
                             if session_id:
-                                client.login_by_sessionid(session_id)
+                                await asyncio.to_thread(client.login_by_sessionid, session_id)
                                 logger.info(f"?? {account.username} ??????")
                             else:
                                 await self._login_account(client, account, two_factor_secret=stored_secret, totp_code=totp_code)
@@ -89,24 +162,91 @@ class InstagramAccountManager:
                             await self._login_account(client, account, two_factor_secret=stored_secret, totp_code=totp_code)
                     else:
                         await self._login_account(client, account, two_factor_secret=stored_secret, totp_code=totp_code)
+                except ChallengeParked:
+                    raise
                 except Exception as e:
                     logger.warning(f"????????????: {e}")
                     await self._login_account(client, account, two_factor_secret=stored_secret, totp_code=totp_code)
             else:
                 await self._login_account(client, account, two_factor_secret=None, totp_code=totp_code)
 
-            # ?????
-            self.active_clients[account.id] = client
-
-            # ??????
-            await self._update_login_status(account.id, True, None)
-
+            await self._activate(account.id, client)
             return client
 
+        except ChallengeParked as e:
+            INSTAGRAM_LOGINS_TOTAL.inc(outcome="challenge")
+            await self.park_challenge(account.id, client, e)
+            raise
         except Exception as e:
             logger.error(f"登录 {account.username} 失败: {e}")
-            await self._update_login_status(account.id, False, str(e))
+            INSTAGRAM_LOGINS_TOTAL.inc(outcome="failure")
+            status = LoginStatus.CHALLENGE_REQUIRED.value if isinstance(e, ChallengeRequired) else None
+            await self._update_login_status(account.id, False, str(e), status)
+            raise
+
+    async def _activate(self, account_id: int, client: Client):
+        """登录成功的客户端放入活跃列表并更新登录状态"""
+        self.dormant_clients.pop(account_id, None)
+        self.active_clients[account_id] = client
+        self._touch(account_id)
+        self.maybe_hibernate()
+        INSTAGRAM_LOGINS_TOTAL.inc(outcome="success")
+        await self._update_login_status(account_id, True, None)
+
+    async def park_challenge(self, account_id: int, client: Client, error: ChallengeRequired):
+        """账号触发验证：保存可以稍后提交验证码的上下文，移除客户端，标记 CHALLENGE_REQUIRED"""
+        if isinstance(error, ChallengeParked) and error.state:
+            account_challenge_store.park(
+                account_id, error.state, client.get_settings(), client.proxy,
+                message=str(error), replace=False,
+            )
+        self.discard_client(account_id)
+        # 断开私信实时连接（只在持有连接的 API 进程内生效）；延迟导入避免循环依赖
+        from app.services.realtime_service import realtime_service
+        await realtime_service.remove_account(account_id)
+        await self._update_login_status(account_id, False, str(error), LoginStatus.CHALLENGE_REQUIRED.value)
+
+    async def submit_challenge_code(self, account: InstagramAccount, code: str) -> Client:
+        """
+        提交验证码（change_password 步骤为新密码）完成挂起的验证，
+        用同一会话重新登录，并恢复等待该账号验证的任务
+        验证码错误时保留挂起状态并抛出 ChallengeParked，可以重新提交
+        """
+        record = account_challenge_store.get(account.id)
+        if record is None:
+            raise ValueError("账号没有等待中的验证")
+        client = _create_client()
+        if record.get("proxy"):
+            client.set_proxy(record["proxy"])
+        client.set_settings(record["settings"])
+        client.username = account.username
+        try:
+            await asyncio.to_thread(client.challenge_resume, record["state"], code)
+        except ChallengeParked as e:
+            account_challenge_store.park(
+                account.id, e.state, client.get_settings(), client.proxy, message=str(e)
+            )
+            raise
+
+        account_challenge_store.clear(account.id)
+        if record["state"].get("step_name") == "change_password":
+            db = next(get_db())
+            try:
+                db.query(InstagramAccount).filter(InstagramAccount.id == account.id).update(
+                    {InstagramAccount.password_encrypted: code}, synchronize_session=False
+                )
+                db.commit()
+            finally:
+                db.close()
+            account.password_encrypted = code
+        try:
+            await self._login_account(client, account)
+        except ChallengeParked as e:
+            await self.park_challenge(account.id, client, e)
             raise
+        await self._activate(account.id, client)
+        account_challenge_store.resume(account.id)
+        return client
 
     async def _login_account(self, client: Client, account: InstagramAccount, two_factor_secret: Optional[str] = None, totp_code: Optional[str] = None) -> bool:
         """??Instagram??"""
@@ -125,7 +265,8 @@ class InstagramAccountManager:
                 verification_code = self._generate_totp(secret_source)
 
             # ????
-            client.login(
+            await asyncio.to_thread(
+                client.login,
                 username=account.username,
                 password=account.password_decrypted,
                 verification_code=verification_code
@@ -148,6 +289,8 @@ class InstagramAccountManager:
 
             return True
 
+        except ChallengeParked:
+            raise
         except ChallengeRequired as e:
             logger.error(f"登录 {account.username} 时触发验证: {e}")
             await self._update_login_status(account.id, False, str(e), LoginStatus.CHALLENGE_REQUIRED.value)
@@ -156,56 +299,139 @@ class InstagramAccountManager:
             logger.error(f"登录 {account.username} 失败: {e}")
             raise
 
-    async def check_login_status(self, account_id: int) -> Dict:
-        """????????"""
-        if account_id in self.login_status_cache:
-            cache_time = self.login_status_cache[account_id].get('timestamp')
-            if cache_time and (datetime.utcnow() - cache_time).seconds < 300:  # 5????
-                return self.login_status_cache[account_id]
-        
+    async def get_client(self, account_id: int) -> Optional[Client]:
+        """获取Instagram客户端（休眠中的账号从设置数据恢复，不走网络登录）"""
         client = self.active_clients.get(account_id)
-        if not client:
-            return {
-                'logged_in': False,
-                'status': 'logged_out',
-                'message': '???????'
-            }
-        
+        if client is None and account_id in self.dormant_clients:
+            client = self._rehydrate(account_id)
+        if client is not None:
+            self._touch(account_id)
+            self.maybe_hibernate()
+        return client
+
+    def _touch(self, account_id: int):
+        self.last_used[account_id] = time.monotonic()
+
+    def acquire(self, account_id: int):
+        """标记客户端使用中，与 release 成对调用"""
+        self.leases[account_id] = self.leases.get(account_id, 0) + 1
+        self._touch(account_id)
+
+    def release(self, account_id: int):
+        count = self.leases.get(account_id, 0) - 1
+        if count > 0:
+            self.leases[account_id] = count
+        else:
+            self.leases.pop(account_id, None)
+        self._touch(account_id)
+
+    @contextmanager
+    def lease(self, account_id: int):
+        """在 with 块内持有客户端租约"""
+        self.acquire(account_id)
         try:
-            # ??????????????????????????
-            if hasattr(client, "user_info_by_username"):
-                user_info = client.user_info_by_username(client.username)
-            else:
-                user_info = client.user_info_from_username(client.username)
-            status = {
-                'logged_in': True,
-                'status': 'logged_in',
-                'username': user_info.username,
-                'full_name': user_info.full_name,
-                'followers': user_info.follower_count,
-                'following': user_info.following_count,
-                'posts': getattr(user_info, "media_count", None),
-                'timestamp': datetime.utcnow()
-            }
-            try:
-                await self._record_stats(account_id, user_info.follower_count, getattr(user_info, "media_count", 0))
-            except Exception as stat_exc:
-                logger.warning(f"??????: {stat_exc}")
+            yield
+        finally:
+            self.release(account_id)
+
+    def _update_client_gauges(self):
+        INSTAGRAM_CLIENTS.set(len(self.active_clients), state="active")
+        INSTAGRAM_CLIENTS.set(len(self.dormant_clients), state="dormant")
+
+    def hibernate(self, account_id: int) -> bool:
+        """把客户端序列化为压缩的设置数据并释放内存中的对象（使用中的客户端不休眠）"""
+        client = self.active_clients.get(account_id)
+        if client is None or self.leases.get(account_id):
+            return False
+        try:
+            blob = zlib.compress(json_codec.dumps_bytes({
+                "settings": client.get_settings(),
+                "username": client.username,
+                "proxy": client.proxy,
+            }, default=str))
         except Exception as e:
-            status = {
-                'logged_in': False,
-                'status': 'logged_out',
-                'message': str(e),
-                'timestamp': datetime.utcnow()
-            }
-        
-        self.login_status_cache[account_id] = status
-        return status
+            logger.warning(f"账号 {account_id} 休眠失败，保持活跃: {e}")
+            return False
+        del self.active_clients[account_id]
+        self.dormant_clients[account_id] = blob
+        INSTAGRAM_CLIENT_TRANSITIONS_TOTAL.inc(transition="hibernate")
+        self._update_client_gauges()
+        return True
+
+    def _rehydrate(self, account_id: int) -> Optional[Client]:
+        """从休眠数据重建客户端（cookies、设备信息、授权头全部恢复）"""
+        blob = self.dormant_clients.pop(account_id)
+        try:
+            data = json_codec.loads(zlib.decompress(blob))
+            client = _create_client()
+            if data.get("proxy"):
+                client.set_proxy(data["proxy"])
+            client.set_settings(data["settings"])
+            client.username = data.get("username")
+        except Exception as e:
+            logger.error(f"账号 {account_id} 恢复失败，需要重新登录: {e}")
+            self.last_used.pop(account_id, None)
+            self._update_client_gauges()
+            return None
+        self.active_clients[account_id] = client
+        INSTAGRAM_CLIENT_TRANSITIONS_TOTAL.inc(transition="rehydrate")
+        self._update_client_gauges()
+        return client
+
+    def maybe_hibernate(self):
+        """每隔半个空闲周期，或活跃客户端超过上限时，执行一次休眠清理"""
+        idle_seconds = app_settings.INSTAGRAM_CLIENT_IDLE_SECONDS
+        over_limit = len(self.active_clients) > app_settings.INSTAGRAM_MAX_ACTIVE_CLIENTS
+        if not over_limit and (not idle_seconds or time.monotonic() - self._last_sweep < idle_seconds / 2):
+            return
+        self.hibernate_idle()
+
+    def hibernate_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """休眠空闲超过 idle_seconds 的客户端，超出上限时再按最近最少使用休眠（跳过使用中的），返回休眠数量"""
+        now = time.monotonic()
+        self._last_sweep = now
+        if idle_seconds is None:
+            idle_seconds = app_settings.INSTAGRAM_CLIENT_IDLE_SECONDS
+        by_age = sorted(self.active_clients, key=lambda account_id: self.last_used.get(account_id, 0))
+        excess = len(by_age) - app_settings.INSTAGRAM_MAX_ACTIVE_CLIENTS
+        count = 0
+        for account_id in by_age:
+            idle = idle_seconds and now - self.last_used.get(account_id, 0) >= idle_seconds
+            if (idle or count < excess) and self.hibernate(account_id):
+                count += 1
+        if count:
+            logger.info(f"休眠 {count} 个空闲 Instagram 客户端，活跃 {len(self.active_clients)}，休眠 {len(self.dormant_clients)}")
+        return count
+
+    def rebind_proxy(self, account_id: int, proxy_url: Optional[str]) -> bool:
+        """更换代理：用当前（或休眠）客户端的设置数据在新代理上重建客户端，会话保留、不重新登录；
+        内存中没有该账号的客户端时返回 False"""
+        client = self.active_clients.get(account_id)
+        if client is None and account_id in self.dormant_clients:
+            client = self._rehydrate(account_id)
+        if client is None:
+            return False
+        try:
+            rebound = _create_client()
+            rebound.set_proxy(proxy_url)
+            rebound.set_settings(client.get_settings())
+            rebound.username = client.username
+        except Exception as e:
+            logger.error(f"账号 {account_id} 切换代理失败，需要重新登录: {e}")
+            self.discard_client(account_id)
+            return False
+        self.active_clients[account_id] = rebound
+        self._touch(account_id)
+        self._update_client_gauges()
+        return True
+
+    def discard_client(self, account_id: int):
+        """丢弃内存中的客户端（含休眠数据），下次使用时重新登录"""
+        self.active_clients.pop(account_id, None)
+        self.dormant_clients.pop(account_id, None)
+        self.last_used.pop(account_id, None)
+        self._update_client_gauges()
 
-    async def get_client(self, account_id: int) -> Optional[Client]:
-        """获取Instagram客户端"""
-        return self.active_clients.get(account_id)
-    
     async def remove_account(self, account_id: int):
         """移除账号"""
         if account_id in self.active_clients:
@@ -214,10 +440,8 @@ class InstagramAccountManager:
                 client.logout()
             except:
                 pass
-            del self.active_clients[account_id]
-        
-        if account_id in self.login_status_cache:
-            del self.login_status_cache[account_id]
+        self.discard_client(account_id)
+        account_challenge_store.forget(account_id)
     
     async def _update_login_status(self, account_id: int, is_logged_in: bool, error_message: str = None, login_status_value: Optional[str] = None):
         """更新登录状态到数据库"""
@@ -235,46 +459,24 @@ class InstagramAccountManager:
             db.close()
 
 
-    async def _record_stats(self, account_id: int, followers: int, posts: int):
-        """?????????????"""
-        db = next(get_db())
-        try:
-            today = datetime.utcnow().date()
-            stat = (
-                db.query(InstagramAccountStat)
-                .filter(InstagramAccountStat.account_id == account_id, InstagramAccountStat.stat_date == today)
-                .first()
-            )
-            if stat:
-                stat.followers_count = followers
-                stat.posts_count = posts
-            else:
-                stat = InstagramAccountStat(
-                    account_id=account_id,
-                    stat_date=today,
-                    followers_count=followers,
-                    posts_count=posts,
-                )
-                db.add(stat)
-            db.commit()
-        finally:
-            db.close()
-
-
 class InstagramOperations:
     """Instagram操作服务"""
     
     def __init__(self, account_manager: InstagramAccountManager):
         self.account_manager = account_manager
     
+    @track_operation("post_photo")
     async def post_photo(self, account_id: int, photo_path: str, caption: str) -> Dict:
         """发布照片"""
         client = await self.account_manager.get_client(account_id)
         if not client:
             raise ValueError(f"账号 {account_id} 的客户端未初始化")
         
+        self.account_manager.acquire(account_id)
         try:
-            media = client.photo_upload(photo_path, caption)
+            # 缩放/裁剪在进程池中完成，相同文件只处理一次
+            prepared = await media_prep_service.prepare_photo(photo_path)
+            media = client.photo_upload(Path(prepared.path), caption)
             return {
                 'success': True,
                 'media_id': media.id,
@@ -282,7 +484,7 @@ class InstagramOperations:
                 'caption': caption
             }
         except ChallengeRequired as e:
-            await self.account_manager._update_login_status(account_id, False, str(e), LoginStatus.CHALLENGE_REQUIRED.value)
+            await self.account_manager.park_challenge(account_id, client, e)
             return {'success': False, 'challenge_required': True, 'error': '需要人工验证/挑战'}
         except Exception as e:
             logger.error(f"发布照片失败: {e}")
@@ -290,15 +492,20 @@ class InstagramOperations:
                 'success': False,
                 'error': str(e)
             }
+        finally:
+            self.account_manager.release(account_id)
     
+    @track_operation("post_video")
     async def post_video(self, account_id: int, video_path: str, caption: str) -> Dict:
         """发布视频"""
         client = await self.account_manager.get_client(account_id)
         if not client:
             raise ValueError(f"账号 {account_id} 的客户端未初始化")
         
+        self.account_manager.acquire(account_id)
         try:
-            media = client.video_upload(video_path, caption)
+            prepared = await media_prep_service.prepare_video(video_path)
+            media = client.video_upload(Path(prepared.path), caption, thumbnail=Path(prepared.thumbnail_path))
             return {
                 'success': True,
                 'media_id': media.id,
@@ -311,7 +518,10 @@ class InstagramOperations:
                 'success': False,
                 'error': str(e)
             }
+        finally:
+            self.account_manager.release(account_id)
     
+    @track_operation("user_info")
     async def get_user_info(self, account_id: int, username: str) -> Dict:
         """获取用户信息"""
         client = await self.account_manager.get_client(account_id)
@@ -343,7 +553,7 @@ class InstagramOperations:
                 }
             }
         except ChallengeRequired as e:
-            await self.account_manager._update_login_status(account_id, False, str(e), LoginStatus.CHALLENGE_REQUIRED.value)
+            await self.account_manager.park_challenge(account_id, client, e)
             return {'success': False, 'challenge_required': True, 'error': '需要人工验证/挑战'}
         except UserNotFound:
             return {
@@ -357,6 +567,7 @@ class InstagramOperations:
                 'error': str(e)
             }
     
+    @track_operation("hashtag_medias")
     async def search_hashtag_posts(self, account_id: int, hashtag: str, amount: int = 20) -> Dict:
         """搜索标签帖子"""
         client = await self.account_manager.get_client(account_id)
@@ -391,6 +602,9 @@ class InstagramOperations:
                 'total': len(posts)
             }
             
+        except ChallengeRequired as e:
+            await self.account_manager.park_challenge(account_id, client, e)
+            return {'success': False, 'challenge_required': True, 'error': '需要人工验证/挑战'}
         except Exception as e:
             logger.error(f"搜索标签帖子失败: {e}")
             return {
@@ -398,6 +612,7 @@ class InstagramOperations:
                 'error': str(e)
             }
     
+    @track_operation("user_medias")
     async def get_user_medias(self, account_id: int, username: str, amount: int = 20) -> Dict:
         """获取用户媒体"""
         client = await self.account_manager.get_client(account_id)
@@ -428,6 +643,9 @@ class InstagramOperations:
                 'total': len(posts)
             }
             
+        except ChallengeRequired as e:
+            await self.account_manager.park_challenge(account_id, client, e)
+            return {'success': False, 'challenge_required': True, 'error': '需要人工验证/挑战'}
         except UserNotFound:
             return {
                 'success': False,
@@ -445,6 +663,7 @@ class InstagramOperations:
                 'error': str(e)
             }
     
+    @track_operation("follow")
     async def follow_user(self, account_id: int, username: str) -> Dict:
         """关注用户"""
         client = await self.account_manager.get_client(account_id)
@@ -459,7 +678,7 @@ class InstagramOperations:
                 'message': f"成功关注用户 {username}"
             }
         except ChallengeRequired as e:
-            await self.account_manager._update_login_status(account_id, False, str(e), LoginStatus.CHALLENGE_REQUIRED.value)
+            await self.account_manager.park_challenge(account_id, client, e)
             return {'success': False, 'challenge_required': True, 'error': '需要人工验证/挑战'}
         except UserNotFound:
             return {
@@ -473,6 +692,7 @@ class InstagramOperations:
                 'error': str(e)
             }
     
+    @track_operation("unfollow")
     async def unfollow_user(self, account_id: int, username: str) -> Dict:
         """取消关注用户"""
         client = await self.account_manager.get_client(account_id)
@@ -498,6 +718,7 @@ class InstagramOperations:
                 'error': str(e)
             }
 
+    @track_operation("direct_send")
     async def send_direct_message(self, account_id: int, usernames: List[str], text: str) -> Dict:
         """发送私信/Direct Message"""
         client = await self.account_manager.get_client(account_id)
@@ -505,9 +726,13 @@ class InstagramOperations:
             raise ValueError(f"账号 {account_id} 的客户端未初始化")
         if not usernames:
             return {'success': False, 'error': '收件人列表不能为空'}
+        self.account_manager.acquire(account_id)
         try:
-            user_ids = [client.user_id_from_username(u) for u in usernames]
-            dm = client.direct_send(text=text, user_ids=user_ids)
+            resolved = await direct_recipient_cache.resolve_many(client, usernames)
+            missing = [name for name, pk in resolved.items() if pk is None]
+            if missing:
+                raise UserNotFound(", ".join(missing))
+            dm = await asyncio.to_thread(client.direct_send, text, user_ids=list(resolved.values()))
             return {
                 'success': True,
                 'thread_id': getattr(dm, "thread_id", None) or getattr(dm, "id", None),
@@ -515,7 +740,7 @@ class InstagramOperations:
                 'recipients': usernames,
             }
         except ChallengeRequired as e:
-            await self.account_manager._update_login_status(account_id, False, str(e), LoginStatus.CHALLENGE_REQUIRED.value)
+            await self.account_manager.park_challenge(account_id, client, e)
             return {'success': False, 'challenge_required': True, 'error': '需要人工验证挑战'}
         except UserNotFound as e:
             return {'success': False, 'error': f"收件人不存在: {e}"}
@@ -525,6 +750,8 @@ class InstagramOperations:
                 'success': False,
                 'error': str(e)
             }
+        finally:
+            self.account_manager.release(account_id)
 
 
 # 全局实例
@@ -0,0 +1,182 @@
+"""
+采集作业进度聚合
+分片（SearchTask）每处理完一个搜索词就对所属作业的 Redis 计数哈希做 HINCRBY（原子），
+作业 ID 记入脏集合，由定时任务和分片结束时批量写回 collection_jobs；
+查询接口与 WebSocket 推送直接读这一份计数，不再逐行汇总分片。
+Redis 不可用时退回数据库原子更新（UPDATE ... SET x = x + n）。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.collection_job import CollectionJob
+from app.models.search_task import TaskStatus
+from app.services.websocket_service import websocket_service
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    "shards_started", "shards_done", "shards_failed",
+    "queries_done", "users_collected", "media_items", "error_count",
+)
+PROGRESS_KEY = "job:progress:{}"
+DIRTY_KEY = "job:progress:dirty"
+
+
+def apply_status(job: CollectionJob):
+    """由计数推导作业状态"""
+    if job.status == TaskStatus.CANCELLED:
+        return
+    if job.is_finished():
+        job.status = TaskStatus.FAILED if job.shards_failed >= job.shard_count else TaskStatus.COMPLETED
+        job.completed_at = job.completed_at or datetime.utcnow()
+    elif job.shards_started:
+        job.status = TaskStatus.RUNNING
+        job.started_at = job.started_at or datetime.utcnow()
+
+
+class JobProgressService:
+    """采集作业进度计数"""
+
+    def _redis(self) -> redis.Redis:
+        return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    def init_job(self, job: CollectionJob):
+        """作业创建后写入初始计数"""
+        key = PROGRESS_KEY.format(job.id)
+        try:
+            pipe = self._redis().pipeline()
+            pipe.hset(key, mapping={
+                "user_id": job.user_id,
+                "shard_count": job.shard_count,
+                "query_count": job.query_count,
+                **{name: 0 for name in COUNTERS},
+            })
+            pipe.expire(key, settings.JOB_PROGRESS_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Redis 不可用，作业 {job.id} 进度直接写数据库: {e}")
+
+    def _counts(self, job_id: int) -> Optional[Dict[str, int]]:
+        try:
+            raw = self._redis().hgetall(PROGRESS_KEY.format(job_id))
+        except redis.RedisError:
+            return None
+        return {name: int(value) for name, value in raw.items()} if raw else None
+
+    async def report(self, job_id: Optional[int], **deltas: int) -> Optional[Dict]:
+        """分片上报增量（shards_started=1、queries_done=1、users_collected=n ...），返回并推送最新聚合进度"""
+        if not job_id:
+            return None
+        deltas = {name: int(value) for name, value in deltas.items() if name in COUNTERS and value}
+        counts = None
+        try:
+            key = PROGRESS_KEY.format(job_id)
+            r = self._redis()
+            if r.exists(key):
+                pipe = r.pipeline()
+                for name, value in deltas.items():
+                    pipe.hincrby(key, name, value)
+                pipe.sadd(DIRTY_KEY, job_id)
+                pipe.hgetall(key)
+                counts = {name: int(value) for name, value in pipe.execute()[-1].items()}
+        except redis.RedisError as e:
+            logger.warning(f"Redis 不可用，作业 {job_id} 进度直接写数据库: {e}")
+
+        db = next(get_db())
+        try:
+            if counts is None:
+                if deltas:
+                    db.query(CollectionJob).filter(CollectionJob.id == job_id).update(
+                        {getattr(CollectionJob, name): getattr(CollectionJob, name) + value for name, value in deltas.items()},
+                        synchronize_session=False,
+                    )
+                    db.commit()
+                job = db.query(CollectionJob).filter(CollectionJob.id == job_id).first()
+                if job is None:
+                    return None
+                apply_status(job)
+                db.commit()
+                snapshot = job.to_dict()
+            else:
+                job = db.query(CollectionJob).filter(CollectionJob.id == job_id).first()
+                if job is None:
+                    return None
+                snapshot = self.snapshot(job, counts)
+        finally:
+            db.close()
+
+        await websocket_service.send_task_status_update({"kind": "collection_job", **snapshot}, [snapshot["user_id"]])
+        return snapshot
+
+    def snapshot(self, job: CollectionJob, counts: Optional[Dict[str, int]] = None) -> Dict:
+        """作业当前聚合进度（运行中以 Redis 计数为准，不修改数据库行）"""
+        if counts is None:
+            counts = self._counts(job.id)
+        if not counts:
+            return job.to_dict()
+        view = CollectionJob(
+            id=job.id, user_id=job.user_id, task_name=job.task_name, search_type=job.search_type,
+            status=job.status, shard_count=job.shard_count, query_count=job.query_count,
+            started_at=job.started_at, completed_at=job.completed_at, created_at=job.created_at,
+            **{name: counts.get(name, getattr(job, name)) for name in COUNTERS},
+        )
+        apply_status(view)
+        return view.to_dict()
+
+    def flush(self, job_ids: Optional[Iterable[int]] = None) -> int:
+        """把脏作业的 Redis 计数写回数据库；已结束的作业写回后删除计数"""
+        try:
+            r = self._redis()
+            if job_ids is None:
+                job_ids = r.smembers(DIRTY_KEY)
+            job_ids = [int(job_id) for job_id in job_ids]
+            if not job_ids:
+                return 0
+            # 先移出脏集合再读计数，期间的新增量会重新标脏，下次写回
+            r.srem(DIRTY_KEY, *job_ids)
+            pipe = r.pipeline()
+            for job_id in job_ids:
+                pipe.hgetall(PROGRESS_KEY.format(job_id))
+            counts = dict(zip(job_ids, pipe.execute()))
+        except redis.RedisError as e:
+            logger.warning(f"写回作业进度失败: {e}")
+            return 0
+
+        flushed = 0
+        finished = []
+        db = next(get_db())
+        try:
+            for job in db.query(CollectionJob).filter(CollectionJob.id.in_(job_ids)).all():
+                raw = counts.get(job.id)
+                if not raw:
+                    continue
+                for name in COUNTERS:
+                    setattr(job, name, int(raw.get(name, 0)))
+                apply_status(job)
+                if job.is_finished():
+                    finished.append(job.id)
+                flushed += 1
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"写回作业进度失败: {e}")
+            return 0
+        finally:
+            db.close()
+
+        if finished:
+            try:
+                self._redis().delete(*[PROGRESS_KEY.format(job_id) for job_id in finished])
+            except redis.RedisError:
+                pass
+        return flushed
+
+
+# 全局实例
+job_progress_service = JobProgressService()
@@ -0,0 +1,290 @@
+"""
+媒体预处理服务
+在独立进程池中执行 prepare_image / prepare_video（PIL、moviepy 转码），按内容哈希缓存产物：
+同一源文件排期到多个账号时只处理一次；已符合 Instagram 要求的视频直接复用，不解码不转码。
+守护进程（Celery prefork worker）不能创建子进程，在其中改用线程池
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from instagrapi.image_util import calc_crop, calc_resize
+from instagrapi.video_probe import extract_frame, ffmpeg_exe
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREP_DURATION = registry.histogram(
+    "media_prep_duration_seconds", "媒体预处理耗时", ("kind", "outcome")
+)
+
+# 与 instagrapi.image_util 的默认值一致
+PHOTO_DEFAULTS = {"max_size": (1080, 1350), "aspect_ratios": (4.0 / 5.0, 90.0 / 47.0), "min_size": (320, 167)}
+VIDEO_DEFAULTS = {
+    "max_size": (1080, 1350),
+    "aspect_ratios": (4.0 / 5.0, 90.0 / 47.0),
+    "min_size": (612, 320),
+    "max_duration": 60.0,
+    "thumbnail_frame_ts": 0.0,
+}
+MAX_VIDEO_BYTES = 50 * 1024 * 1000
+# Instagram 直接接受的封装/编码，满足时可跳过转码
+PASSTHROUGH_CONTAINERS = {".mp4", ".mov", ".m4v"}
+PASSTHROUGH_AUDIO = {None, "aac"}
+
+DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+VIDEO_STREAM_RE = re.compile(r"Stream #\S+.*?: Video: (\w+)[^,]*, (\w+)[^,]*(?:\([^)]*\))?, (\d+)x(\d+)")
+AUDIO_STREAM_RE = re.compile(r"Stream #\S+.*?: Audio: (\w+)")
+ROTATE_RE = re.compile(r"rotate\s*:\s*(-?\d+)|rotation of (-?\d+)")
+
+
+@dataclass
+class PreparedMedia:
+    """预处理产物"""
+    kind: str
+    content_hash: str
+    path: str
+    width: int
+    height: int
+    thumbnail_path: Optional[str] = None
+    duration: Optional[float] = None
+    reencoded: bool = False
+    cached: bool = False
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def probe_video(path: str) -> Optional[Dict]:
+    """只读容器头（ffmpeg -i，不解码），返回编码、像素格式、尺寸、时长；失败返回 None"""
+    try:
+        proc = subprocess.run(
+            [ffmpeg_exe(), "-hide_banner", "-i", path],
+            capture_output=True, text=True, timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"视频探测失败 {path}: {e}")
+        return None
+    output = proc.stderr
+    video = VIDEO_STREAM_RE.search(output)
+    duration = DURATION_RE.search(output)
+    if not video or not duration:
+        return None
+    audio = AUDIO_STREAM_RE.search(output)
+    hours, minutes, seconds = duration.groups()
+    return {
+        "video_codec": video.group(1),
+        "pix_fmt": video.group(2),
+        "width": int(video.group(3)),
+        "height": int(video.group(4)),
+        "audio_codec": audio.group(1) if audio else None,
+        "rotated": bool(ROTATE_RE.search(output)),
+        "duration": int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+    }
+
+
+def can_skip_reencoding(path: str, info: Optional[Dict], params: Dict) -> bool:
+    """
+    视频无需裁剪、缩放、截断且编码为 H.264/yuv420p + AAC 时可直接上传
+    （即 prepare_video(skip_reencoding=True) 会原样复制的情况）
+    """
+    if not info or Path(path).suffix.lower() not in PASSTHROUGH_CONTAINERS:
+        return False
+    size = (info["width"], info["height"])
+    return (
+        info["video_codec"] == "h264"
+        and info["pix_fmt"] == "yuv420p"
+        and info["audio_codec"] in PASSTHROUGH_AUDIO
+        and not info["rotated"]
+        and 3.0 <= info["duration"] <= params["max_duration"]
+        and params["thumbnail_frame_ts"] <= info["duration"]
+        and not (params["aspect_ratios"] and calc_crop(params["aspect_ratios"], size))
+        and not calc_resize(params["max_size"], size, min_size=params["min_size"])
+        and os.path.getsize(path) <= MAX_VIDEO_BYTES
+    )
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _prepare_image_job(source: str, target: str, params: Dict) -> Tuple[int, int]:
+    """进程池任务：缩放/裁剪图片并保存为 JPEG"""
+    from instagrapi.image_util import prepare_image
+
+    content, size = prepare_image(source, **params)
+    with open(target, "wb") as fp:
+        fp.write(content)
+    return size
+
+
+def _prepare_video_job(source: str, target: str, thumbnail: str, params: Dict) -> Tuple[int, int, float]:
+    """进程池任务：用 moviepy 转码视频并生成封面"""
+    from instagrapi.image_util import prepare_video
+
+    _, size, duration, thumbnail_content = prepare_video(
+        source, save_path=target, save_only=True, **params
+    )
+    with open(thumbnail, "wb") as fp:
+        fp.write(thumbnail_content)
+    return size[0], size[1], duration
+
+
+def in_daemon_process() -> bool:
+    """当前进程是否为守护进程（multiprocessing 或 Celery 使用的 billiard）"""
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        from billiard.process import current_process as billiard_current_process
+    except ImportError:
+        return False
+    return bool(billiard_current_process().daemon)
+
+
+class MediaPrepService:
+    """媒体预处理：进程池 + 内容哈希缓存 + 同内容任务合并"""
+
+    def __init__(self, cache_dir: Optional[str] = None, workers: Optional[int] = None):
+        self.cache_dir = Path(
+            cache_dir or settings.MEDIA_PREP_CACHE_DIR or Path(__file__).resolve().parent.parent / "media_cache"
+        )
+        self.workers = workers or settings.MEDIA_PREP_WORKERS or os.cpu_count() or 1
+        self._executor: Optional[Executor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if in_daemon_process():
+                logger.info("守护进程中无法创建进程池，媒体预处理改用线程池")
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="media-prep")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _cache_key(self, content_hash: str, kind: str, params: Dict) -> str:
+        params_hash = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+        return f"{content_hash}_{kind}_{params_hash}"
+
+    def _load_cached(self, key: str) -> Optional[PreparedMedia]:
+        meta = self.cache_dir / f"{key}.json"
+        if not meta.exists():
+            return None
+        try:
+            media = PreparedMedia(**json.loads(meta.read_text()))
+        except Exception:
+            return None
+        if not Path(media.path).exists():
+            return None
+        os.utime(meta)  # 供缓存清理判断最近使用时间
+        media.cached = True
+        return media
+
+    def _store(self, key: str, media: PreparedMedia) -> PreparedMedia:
+        # 元数据最后写入并原子替换，存在即代表产物完整
+        meta = self.cache_dir / f"{key}.json"
+        tmp = meta.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(media.to_dict()))
+        os.replace(tmp, meta)
+        return media
+
+    async def prepare_photo(self, path: str, **params) -> PreparedMedia:
+        """预处理照片（参数同 prepare_image），返回缓存中的 JPEG"""
+        return await self._prepare("photo", path, {**PHOTO_DEFAULTS, **params})
+
+    async def prepare_video(self, path: str, **params) -> PreparedMedia:
+        """预处理视频（参数同 prepare_video），返回缓存中的 MP4 与封面"""
+        return await self._prepare("video", path, {**VIDEO_DEFAULTS, **params})
+
+    async def _prepare(self, kind: str, path: str, params: Dict) -> PreparedMedia:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        content_hash = await asyncio.to_thread(file_sha256, path)
+        key = self._cache_key(content_hash, kind, params)
+        cached = self._load_cached(key)
+        if cached:
+            return cached
+        # 相同内容的并发任务只处理一次
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(kind, path, params, key, content_hash))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _run(self, kind: str, path: str, params: Dict, key: str, content_hash: str) -> PreparedMedia:
+        started = time.perf_counter()
+        outcome = "failure"
+        loop = asyncio.get_running_loop()
+        try:
+            if kind == "photo":
+                target = str(self.cache_dir / f"{key}.jpg")
+                width, height = await loop.run_in_executor(self.executor, _prepare_image_job, path, target, params)
+                media = PreparedMedia(kind, content_hash, target, width, height, reencoded=True)
+            else:
+                media = await self._run_video(loop, path, params, key, content_hash)
+            outcome = "passthrough" if kind == "video" and not media.reencoded else "success"
+            return self._store(key, media)
+        finally:
+            MEDIA_PREP_DURATION.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+
+    async def _run_video(self, loop, path: str, params: Dict, key: str, content_hash: str) -> PreparedMedia:
+        target = str(self.cache_dir / f"{key}.mp4")
+        thumbnail = str(self.cache_dir / f"{key}.jpg")
+        info = await asyncio.to_thread(probe_video, path)
+        if can_skip_reencoding(path, info, params):
+            await asyncio.to_thread(shutil.copyfile, path, target)
+            if await asyncio.to_thread(extract_frame, path, thumbnail, params["thumbnail_frame_ts"]):
+                logger.info(f"视频 {path} 符合要求，跳过转码")
+                return PreparedMedia(
+                    "video", content_hash, target, info["width"], info["height"],
+                    thumbnail_path=thumbnail, duration=info["duration"], reencoded=False,
+                )
+            logger.warning(f"视频 {path} 截取封面失败，改为转码")
+        width, height, duration = await loop.run_in_executor(
+            self.executor, _prepare_video_job, path, target, thumbnail, params
+        )
+        return PreparedMedia(
+            "video", content_hash, target, width, height,
+            thumbnail_path=thumbnail, duration=duration, reencoded=True,
+        )
+
+    def cleanup_cache(self, keep_hours: int) -> int:
+        """删除超过 keep_hours 未使用的缓存产物，返回删除的条目数"""
+        if not self.cache_dir.exists():
+            return 0
+        cutoff = time.time() - keep_hours * 3600
+        removed = 0
+        for meta in self.cache_dir.glob("*.json"):
+            if meta.stat().st_mtime >= cutoff:
+                continue
+            for path in self.cache_dir.glob(f"{meta.stem}.*"):
+                path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局实例
+media_prep_service = MediaPrepService()
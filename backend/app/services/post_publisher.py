@@ -0,0 +1,302 @@
+"""
+两阶段发帖
+准备阶段（计划时间前 POST_PREPARE_LEAD_SECONDS 内）：预处理媒体并 rupload，拿到 upload_id 存入 Redis；
+发布阶段（计划时间）：只调用 *_configure，没有准备好的帖子回退为完整上传
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import redis
+from instagrapi import Client
+from instagrapi.exceptions import ChallengeRequired
+from instagrapi.extractors import extract_media_v1
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.metrics import registry
+from app.models.instagram_account import InstagramAccount
+from app.models.proxy import ProxyConfig
+from app.models.schedule import PostSchedule, PostStatus
+from app.services.account_challenge import account_challenge_store
+from app.services.instagram_wrapper import instagram_account_manager
+from app.services.media_prep import media_prep_service
+from app.utils import json_codec
+
+logger = logging.getLogger(__name__)
+
+POST_PUBLISH_LAG = registry.histogram(
+    "post_publish_lag_seconds", "实际发布时间与计划时间的差值", ("prepared",)
+)
+POST_PHASE_TOTAL = registry.counter(
+    "post_phase_total", "发帖各阶段执行次数", ("phase", "outcome")
+)
+
+PREPARED_KEY = "post:prepared:{}"
+PREPARING_KEY = "post:preparing:{}"
+PUBLISHING_KEY = "post:publishing:{}"
+
+VIDEO_SUFFIXES = {".mp4", ".mov", ".m4v"}
+
+
+def parse_media_files(raw) -> List[Dict]:
+    """media_files 可能是 JSON 列（list）或历史数据中的 JSON 字符串"""
+    if not raw:
+        return []
+    if isinstance(raw, (str, bytes)):
+        raw = json_codec.loads(raw)
+    return [item for item in raw if isinstance(item, dict) and item.get("path")]
+
+
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """统一为无时区的 UTC 时间，与 datetime.utcnow() 比较"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _media_kind(item: Dict) -> str:
+    kind = item.get("type")
+    if kind in ("photo", "video"):
+        return kind
+    return "video" if Path(item["path"]).suffix.lower() in VIDEO_SUFFIXES else "photo"
+
+
+class PostPublisher:
+    """定时帖子的提前上传与准点发布"""
+
+    def _redis(self) -> redis.Redis:
+        return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    def _claim(self, key: str, ttl: int) -> bool:
+        """Redis SET NX 抢占，避免同一帖子被重复准备/发布；Redis 不可用时放行"""
+        try:
+            return bool(self._redis().set(key, "1", nx=True, ex=ttl))
+        except redis.RedisError as e:
+            logger.warning(f"Redis 不可用，跳过抢占 {key}: {e}")
+            return True
+
+    def _release(self, key: str):
+        try:
+            self._redis().delete(key)
+        except redis.RedisError:
+            pass
+
+    def load_prepared(self, schedule_id: int) -> Optional[Dict]:
+        try:
+            raw = self._redis().get(PREPARED_KEY.format(schedule_id))
+        except redis.RedisError as e:
+            logger.warning(f"读取预上传状态失败: {e}")
+            return None
+        return json_codec.loads(raw) if raw else None
+
+    def _save_prepared(self, schedule_id: int, state: Dict):
+        try:
+            self._redis().set(
+                PREPARED_KEY.format(schedule_id),
+                json_codec.dumps(state, default=str),
+                ex=settings.POST_PREPARED_TTL_SECONDS,
+            )
+        except redis.RedisError as e:
+            logger.warning(f"保存预上传状态失败，发布时将完整上传: {e}")
+
+    def _drop_prepared(self, schedule_id: int):
+        self._release(PREPARED_KEY.format(schedule_id))
+
+    def _is_preparing(self, schedule_id: int) -> bool:
+        try:
+            return bool(self._redis().exists(PREPARING_KEY.format(schedule_id)))
+        except redis.RedisError:
+            return False
+
+    async def _wait_prepared(self, schedule_id: int) -> Optional[Dict]:
+        """读取预上传状态；预上传仍在进行时最多等 POST_PREPARE_WAIT_SECONDS，避免同一媒体上传两次"""
+        state = self.load_prepared(schedule_id)
+        if state is None and self._is_preparing(schedule_id):
+            logger.info(f"帖子 {schedule_id} 正在预上传，等待其完成")
+            deadline = time.monotonic() + settings.POST_PREPARE_WAIT_SECONDS
+            while state is None and self._is_preparing(schedule_id) and time.monotonic() < deadline:
+                await asyncio.sleep(1.0)
+                state = self.load_prepared(schedule_id)
+        return state
+
+    def is_preparing_or_prepared(self, schedule_id: int) -> bool:
+        try:
+            r = self._redis()
+            return bool(r.exists(PREPARED_KEY.format(schedule_id), PREPARING_KEY.format(schedule_id)))
+        except redis.RedisError:
+            return False
+
+    async def _client_for(self, db, schedule: PostSchedule) -> Client:
+        client = await instagram_account_manager.get_client(schedule.instagram_account_id)
+        if client:
+            return client
+        account = db.query(InstagramAccount).filter(InstagramAccount.id == schedule.instagram_account_id).first()
+        if not account:
+            raise ValueError("Instagram账号不存在")
+        proxy = None
+        if account.proxy_id:
+            proxy = db.query(ProxyConfig).filter(ProxyConfig.id == account.proxy_id).first()
+        return await instagram_account_manager.add_account(account, proxy)
+
+    async def upload_media(self, client: Client, media_files: List[Dict]) -> Dict:
+        """预处理（进程池 + 缓存）后 rupload，返回发布阶段需要的全部参数"""
+        prepared = []
+        for item in media_files:
+            if _media_kind(item) == "video":
+                prepared.append(await media_prep_service.prepare_video(item["path"]))
+            else:
+                prepared.append(await media_prep_service.prepare_photo(item["path"]))
+
+        if len(prepared) > 1:
+            children = await asyncio.to_thread(client.album_rupload, [Path(m.path) for m in prepared])
+            return {"kind": "album", "children": children}
+        media = prepared[0]
+        if media.kind == "video":
+            upload_id, width, height, duration, thumbnail = await asyncio.to_thread(
+                client.video_rupload, Path(media.path), Path(media.thumbnail_path)
+            )
+            return {
+                "kind": "video", "upload_id": upload_id, "width": width, "height": height,
+                "duration": duration, "thumbnail": str(thumbnail),
+            }
+        upload_id, width, height = await asyncio.to_thread(client.photo_rupload, Path(media.path))
+        return {"kind": "photo", "upload_id": upload_id, "width": width, "height": height}
+
+    def configure(self, client: Client, state: Dict, caption: str):
+        """只执行 *_configure；视频未转码完成时短暂重试"""
+        for attempt in range(settings.POST_CONFIGURE_ATTEMPTS):
+            try:
+                if state["kind"] == "photo":
+                    configured = client.photo_configure(state["upload_id"], state["width"], state["height"], caption)
+                elif state["kind"] == "video":
+                    configured = client.video_configure(
+                        state["upload_id"], state["width"], state["height"], state["duration"],
+                        Path(state["thumbnail"]), caption,
+                    )
+                else:
+                    configured = client.album_configure(state["children"], caption)
+            except Exception as e:
+                if "Transcode not finished yet" not in str(e):
+                    raise
+                configured = None
+            if configured:
+                media = configured.get("media") if isinstance(configured, dict) else None
+                if media is None:
+                    media = client.last_json.get("media")
+                return extract_media_v1(media)
+            time.sleep(settings.POST_CONFIGURE_RETRY_SECONDS)
+        raise RuntimeError(f"发布失败：{settings.POST_CONFIGURE_ATTEMPTS} 次 configure 均未成功")
+
+    async def prepare(self, schedule_id: int) -> Dict:
+        """准备阶段：预处理并上传媒体，保存 upload_id"""
+        if not self._claim(PREPARING_KEY.format(schedule_id), settings.POST_PREPARE_LEAD_SECONDS):
+            return {'success': False, 'error': '帖子正在准备中'}
+        db = next(get_db())
+        client = None
+        try:
+            schedule = db.query(PostSchedule).filter(PostSchedule.id == schedule_id).first()
+            if not schedule or schedule.status != PostStatus.PENDING:
+                return {'success': False, 'error': '调度计划不存在或不是待发布状态'}
+            if self.load_prepared(schedule_id):
+                return {'success': True, 'message': '已准备'}
+            media_files = parse_media_files(schedule.media_files)
+            if not media_files:
+                return {'success': False, 'error': '没有媒体文件'}
+            client = await self._client_for(db, schedule)
+            with instagram_account_manager.lease(schedule.instagram_account_id):
+                state = await self.upload_media(client, media_files)
+            state["prepared_at"] = datetime.utcnow().isoformat()
+            self._save_prepared(schedule_id, state)
+            # 发布等不及预上传、已完整上传并结束时，这份状态不会再被使用
+            db.refresh(schedule)
+            if schedule.status != PostStatus.PENDING:
+                self._drop_prepared(schedule_id)
+                POST_PHASE_TOTAL.inc(phase="prepare", outcome="late")
+                return {'success': False, 'error': f'任务状态为 {schedule.status.value}，放弃预上传结果'}
+            POST_PHASE_TOTAL.inc(phase="prepare", outcome="success")
+            logger.info(f"帖子 {schedule_id} 已预上传（{state['kind']}），计划 {schedule.scheduled_time} 发布")
+            return {'success': True, 'kind': state["kind"], 'scheduled_time': schedule.scheduled_time.isoformat()}
+        except Exception as e:
+            if isinstance(e, ChallengeRequired) and client is not None:
+                await instagram_account_manager.park_challenge(schedule.instagram_account_id, client, e)
+            # 准备失败不影响发布：到点后按完整上传重试
+            POST_PHASE_TOTAL.inc(phase="prepare", outcome="failure")
+            logger.warning(f"帖子 {schedule_id} 预上传失败，将在发布时完整上传: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            self._release(PREPARING_KEY.format(schedule_id))
+            db.close()
+
+    async def publish(self, schedule_id: int) -> Dict:
+        """发布阶段：有预上传状态时只 configure，否则完整上传"""
+        if not self._claim(PUBLISHING_KEY.format(schedule_id), settings.POST_PUBLISH_CLAIM_SECONDS):
+            return {'success': False, 'error': '帖子正在发布中'}
+        db = next(get_db())
+        try:
+            schedule = db.query(PostSchedule).filter(PostSchedule.id == schedule_id).first()
+            if not schedule:
+                return {'success': False, 'error': '调度计划不存在'}
+            if schedule.status != PostStatus.PENDING:
+                return {'success': False, 'error': f'任务状态为 {schedule.status.value}'}
+            client = None
+            try:
+                client = await self._client_for(db, schedule)
+                state = await self._wait_prepared(schedule_id)
+                prepared = state is not None
+                with instagram_account_manager.lease(schedule.instagram_account_id):
+                    if state is None:
+                        media_files = parse_media_files(schedule.media_files)
+                        if not media_files:
+                            raise ValueError("没有媒体文件")
+                        state = await self.upload_media(client, media_files)
+                    media = await asyncio.to_thread(self.configure, client, state, schedule.content)
+            except ChallengeRequired as e:
+                if client is not None:
+                    await instagram_account_manager.park_challenge(schedule.instagram_account_id, client, e)
+                if account_challenge_store.get(schedule.instagram_account_id) is None:
+                    # 无法提交验证码的验证（人机验证等）按失败处理
+                    POST_PHASE_TOTAL.inc(phase="publish", outcome="failure")
+                    schedule.status = PostStatus.FAILED
+                    schedule.error_message = str(e)
+                    db.commit()
+                    return {'success': False, 'error': str(e)}
+                # 账号等待验证码：保持待发布，验证完成后重新发布
+                account_challenge_store.defer(schedule.instagram_account_id, 'post_publish', schedule_id)
+                POST_PHASE_TOTAL.inc(phase="publish", outcome="deferred")
+                schedule.error_message = f"账号等待验证码，验证后发布: {e}"
+                db.commit()
+                # 释放发布抢占，否则验证完成后恢复的任务会被挡在 POST_PUBLISH_CLAIM_SECONDS 之外
+                self._release(PUBLISHING_KEY.format(schedule_id))
+                return {'success': False, 'deferred': True, 'error': schedule.error_message}
+            except Exception as e:
+                logger.error(f"帖子 {schedule_id} 发布失败: {e}")
+                POST_PHASE_TOTAL.inc(phase="publish", outcome="failure")
+                schedule.status = PostStatus.FAILED
+                schedule.error_message = str(e)
+                db.commit()
+                return {'success': False, 'error': str(e)}
+            schedule.status = PostStatus.POSTED
+            schedule.posted_at = datetime.utcnow()
+            schedule.error_message = None
+            db.commit()
+            # 先提交状态再删除：晚到的预上传保存后会看到 POSTED 并自行删除
+            self._drop_prepared(schedule_id)
+            POST_PHASE_TOTAL.inc(phase="publish", outcome="success")
+            scheduled_time = utc_naive(schedule.scheduled_time)
+            if scheduled_time:
+                POST_PUBLISH_LAG.observe(
+                    max((datetime.utcnow() - scheduled_time).total_seconds(), 0.0),
+                    prepared=str(prepared).lower(),
+                )
+            return {'success': True, 'media_id': media.id, 'prepared': prepared}
+        finally:
+            db.close()
+
+
+# 全局实例
+post_publisher = PostPublisher()
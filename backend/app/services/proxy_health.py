@@ -0,0 +1,310 @@
+"""
+代理健康探测服务
+并发探测所有代理，维护延迟/成功率/带宽滑动评分，自动隔离失效代理，并为账号挑选最佳代理
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+import httpx
+import requests
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.metrics import registry
+from app.models.instagram_account import InstagramAccount
+from app.models.proxy import ProxyConfig, ProxyHealth, ProxyType
+from app.services.instagram_wrapper import instagram_account_manager
+
+logger = logging.getLogger(__name__)
+
+PROXY_PROBE_DURATION = registry.histogram(
+    "proxy_probe_duration_seconds", "代理探测耗时", ("outcome",)
+)
+PROXY_QUARANTINED = registry.gauge("proxy_quarantined", "处于隔离状态的代理数量")
+
+# 滑动均值权重：新样本占比
+EWMA_ALPHA = 0.3
+# 带宽达到该值（KB/s）即视为满分
+BANDWIDTH_TARGET_KBPS = 500.0
+# 从未探测过的代理的默认评分，排在健康代理之后、隔离代理之前
+UNPROBED_SCORE = 10.0
+
+
+@dataclass
+class ProbeResult:
+    """单次探测结果"""
+    proxy_id: int
+    success: bool
+    latency_ms: Optional[float] = None
+    bandwidth_kbps: Optional[float] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "proxy_id": self.proxy_id,
+            "success": self.success,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "bandwidth_kbps": round(self.bandwidth_kbps, 1) if self.bandwidth_kbps is not None else None,
+            "status_code": self.status_code,
+            "error": self.error,
+        }
+
+
+def build_proxy_url(proxy_type: str, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None) -> str:
+    """拼接代理 URL（含认证信息）"""
+    auth = f"{username}:{password or ''}@" if username else ""
+    return f"{proxy_type}://{auth}{host}:{port}"
+
+
+def _ewma(previous: Optional[float], sample: float) -> float:
+    if previous is None:
+        return sample
+    return previous * (1 - EWMA_ALPHA) + sample * EWMA_ALPHA
+
+
+def compute_score(health: Optional[ProxyHealth]) -> float:
+    """
+    综合评分 0-100：成功率 × 延迟因子 × 带宽因子
+    延迟 0s 记 1，1s 记 0.5；带宽达到 BANDWIDTH_TARGET_KBPS 记 1，最低 0.5
+    """
+    if health is None or health.success_rate is None:
+        return UNPROBED_SCORE
+    latency_factor = 1.0 / (1.0 + (health.latency_ms or 0.0) / 1000.0)
+    bandwidth_factor = 0.5 + 0.5 * min(1.0, (health.bandwidth_kbps or 0.0) / BANDWIDTH_TARGET_KBPS)
+    return 100.0 * health.success_rate * latency_factor * bandwidth_factor
+
+
+def is_quarantined(health: Optional[ProxyHealth], now: Optional[datetime] = None) -> bool:
+    if health is None or health.quarantined_until is None:
+        return False
+    return health.quarantined_until > (now or datetime.utcnow())
+
+
+class ProxyHealthService:
+    """代理健康探测与评分"""
+
+    def __init__(self):
+        # 正在进行的批量探测：用户 ID，定时全量探测为 None；各用户、全量探测互不阻塞
+        self._probing: Set[Optional[int]] = set()
+
+    async def probe(self, proxy_id: int, proxy_url: str, proxy_type: str, test_url: Optional[str] = None,
+                    timeout: Optional[float] = None) -> ProbeResult:
+        """通过代理请求测试地址，测量首包延迟和下载带宽"""
+        test_url = test_url or settings.PROXY_PROBE_URL
+        timeout = timeout or settings.PROXY_PROBE_TIMEOUT
+        started = time.perf_counter()
+        try:
+            if proxy_type == ProxyType.SOCKS4.value:
+                # httpx 不支持 socks4，回退到 requests + PySocks（放到线程池，避免阻塞事件循环）
+                status_code, latency, size = await asyncio.to_thread(
+                    self._probe_blocking, proxy_url, test_url, timeout
+                )
+            else:
+                transport = httpx.AsyncHTTPTransport(proxy=proxy_url, retries=0)
+                async with httpx.AsyncClient(transport=transport, timeout=timeout, follow_redirects=True) as client:
+                    async with client.stream("GET", test_url) as response:
+                        latency = time.perf_counter() - started
+                        size = 0
+                        async for chunk in response.aiter_raw():
+                            size += len(chunk)
+                        status_code = response.status_code
+            total = time.perf_counter() - started
+            transfer = max(total - latency, 1e-3)
+            success = status_code < 400
+            result = ProbeResult(
+                proxy_id=proxy_id,
+                success=success,
+                latency_ms=latency * 1000,
+                bandwidth_kbps=(size / 1024) / transfer if size else None,
+                status_code=status_code,
+                error=None if success else f"HTTP {status_code}",
+            )
+        except Exception as exc:
+            result = ProbeResult(proxy_id=proxy_id, success=False, error=f"{exc.__class__.__name__}: {exc}"[:255])
+        PROXY_PROBE_DURATION.observe(time.perf_counter() - started, outcome="success" if result.success else "failure")
+        return result
+
+    @staticmethod
+    def _probe_blocking(proxy_url: str, test_url: str, timeout: float):
+        started = time.perf_counter()
+        proxies = {"http": proxy_url, "https": proxy_url}
+        with requests.get(test_url, proxies=proxies, timeout=timeout, stream=True) as response:
+            latency = time.perf_counter() - started
+            size = sum(len(chunk) for chunk in response.iter_content(16 * 1024))
+            return response.status_code, latency, size
+
+    def record(self, db: Session, result: ProbeResult, now: Optional[datetime] = None) -> ProxyHealth:
+        """把探测结果合入滑动评分，并按规则隔离/解除隔离"""
+        now = now or datetime.utcnow()
+        health = db.query(ProxyHealth).filter(ProxyHealth.proxy_id == result.proxy_id).first()
+        if health is None:
+            health = ProxyHealth(
+                proxy_id=result.proxy_id, probes_total=0, failures_total=0,
+                consecutive_failures=0, quarantine_count=0,
+            )
+            db.add(health)
+        health.probes_total += 1
+        health.last_checked_at = now
+        health.success_rate = _ewma(health.success_rate, 1.0 if result.success else 0.0)
+        if result.success:
+            health.consecutive_failures = 0
+            health.last_error = None
+            health.latency_ms = _ewma(health.latency_ms, result.latency_ms)
+            if result.bandwidth_kbps is not None:
+                health.bandwidth_kbps = _ewma(health.bandwidth_kbps, result.bandwidth_kbps)
+            if health.quarantined_until is not None:
+                logger.info(f"代理 {result.proxy_id} 探测恢复，解除隔离")
+                health.quarantined_until = None
+        else:
+            health.failures_total += 1
+            health.consecutive_failures += 1
+            health.last_error = result.error
+            should_quarantine = (
+                health.consecutive_failures >= settings.PROXY_QUARANTINE_FAILURES
+                or (health.probes_total >= 5 and health.success_rate < settings.PROXY_QUARANTINE_MIN_SUCCESS_RATE)
+            )
+            if should_quarantine and not is_quarantined(health, now):
+                health.quarantine_count += 1
+                seconds = min(
+                    settings.PROXY_QUARANTINE_SECONDS * 2 ** (health.quarantine_count - 1),
+                    settings.PROXY_QUARANTINE_MAX_SECONDS,
+                )
+                health.quarantined_until = now + timedelta(seconds=seconds)
+                logger.warning(f"代理 {result.proxy_id} 连续失败 {health.consecutive_failures} 次，隔离 {seconds} 秒: {result.error}")
+        health.score = compute_score(health)
+        return health
+
+    async def probe_all(self, user_id: Optional[int] = None) -> Dict:
+        """并发探测全部启用的代理（可按用户过滤）并落库"""
+        if user_id in self._probing:
+            return {'success': False, 'error': '代理探测正在进行中'}
+        self._probing.add(user_id)
+        try:
+            db = next(get_db())
+            try:
+                query = db.query(ProxyConfig).filter(ProxyConfig.is_active == True)  # noqa: E712
+                if user_id is not None:
+                    query = query.filter(ProxyConfig.user_id == user_id)
+                targets = [
+                    (p.id, build_proxy_url(p.proxy_type.value, p.host, p.port, p.username, p.password_decrypted), p.proxy_type.value)
+                    for p in query.all()
+                ]
+            finally:
+                db.close()
+
+            semaphore = asyncio.Semaphore(settings.PROXY_PROBE_CONCURRENCY)
+
+            async def bounded(target):
+                async with semaphore:
+                    return await self.probe(*target)
+
+            results: List[ProbeResult] = await asyncio.gather(*(bounded(t) for t in targets))
+
+            db = next(get_db())
+            try:
+                for result in results:
+                    self.record(db, result)
+                db.commit()
+                rebound = await self.rebind_quarantined_accounts(db) if settings.PROXY_AUTO_REBIND else []
+                PROXY_QUARANTINED.set(self._quarantined_count(db))
+            finally:
+                db.close()
+        finally:
+            self._probing.discard(user_id)
+
+        healthy = sum(1 for r in results if r.success)
+        logger.info(f"代理探测完成: {healthy}/{len(results)} 可用")
+        return {
+            "success": True,
+            "probed": len(results),
+            "healthy": healthy,
+            "failed": len(results) - healthy,
+            "rebound_accounts": rebound,
+            "results": [r.to_dict() for r in results],
+        }
+
+    def _quarantined_count(self, db: Session) -> int:
+        return db.query(ProxyHealth).filter(ProxyHealth.quarantined_until > datetime.utcnow()).count()
+
+    def rank_proxies(self, db: Session, user_id: int, exclude_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        """按评分排序的可用代理（排除隔离中的代理），评分相同时优先绑定账号少的"""
+        exclude = set(exclude_ids or [])
+        now = datetime.utcnow()
+        bound = dict(
+            db.query(InstagramAccount.proxy_id, func.count(InstagramAccount.id))
+            .filter(InstagramAccount.user_id == user_id, InstagramAccount.proxy_id.isnot(None))
+            .group_by(InstagramAccount.proxy_id)
+            .all()
+        )
+        ranked = []
+        proxies = db.query(ProxyConfig).filter(
+            ProxyConfig.user_id == user_id,
+            ProxyConfig.is_active == True,  # noqa: E712
+        ).all()
+        for proxy in proxies:
+            if proxy.id in exclude or is_quarantined(proxy.health, now):
+                continue
+            ranked.append({
+                "proxy": proxy,
+                "score": compute_score(proxy.health),
+                "accounts": bound.get(proxy.id, 0),
+            })
+        ranked.sort(key=lambda item: (-item["score"], item["accounts"], item["proxy"].id))
+        return ranked
+
+    def pick_best_proxy(self, db: Session, user_id: int, exclude_ids: Optional[Iterable[int]] = None) -> Optional[ProxyConfig]:
+        """挑选评分最高的可用代理"""
+        ranked = self.rank_proxies(db, user_id, exclude_ids)
+        return ranked[0]["proxy"] if ranked else None
+
+    def rebind_account(self, db: Session, account: InstagramAccount) -> Optional[ProxyConfig]:
+        """把账号切换到最佳代理（不提交事务）"""
+        proxy = self.pick_best_proxy(db, account.user_id, exclude_ids=[account.proxy_id] if account.proxy_id else None)
+        if proxy is None:
+            return None
+        logger.info(f"账号 {account.username} 代理切换: {account.proxy_id} -> {proxy.id}")
+        account.proxy_id = proxy.id
+        return proxy
+
+    async def rebind_client(self, account_id: int, proxy: ProxyConfig):
+        """已登录的客户端沿用会话切换到新代理，实时连接随之在新代理上重建"""
+        proxy_url = proxy.get_proxy_url_with_auth(proxy.password_decrypted) if proxy.password_decrypted else proxy.get_proxy_url()
+        if not instagram_account_manager.rebind_proxy(account_id, proxy_url):
+            return
+        if settings.DM_REALTIME_ENABLED:
+            from app.services.realtime_service import realtime_service
+            await realtime_service.restart_account(account_id)
+
+    async def rebind_quarantined_accounts(self, db: Session) -> List[Dict]:
+        """把绑定在隔离代理上的账号切换到同一用户的最佳代理"""
+        now = datetime.utcnow()
+        accounts = (
+            db.query(InstagramAccount)
+            .join(ProxyHealth, ProxyHealth.proxy_id == InstagramAccount.proxy_id)
+            .filter(InstagramAccount.is_active == True, ProxyHealth.quarantined_until > now)  # noqa: E712
+            .all()
+        )
+        rebound = []
+        proxies = {}
+        for account in accounts:
+            previous = account.proxy_id
+            proxy = self.rebind_account(db, account)
+            if proxy is not None:
+                rebound.append({"account_id": account.id, "from": previous, "to": proxy.id})
+                proxies[account.id] = proxy
+        db.commit()
+        for account_id, proxy in proxies.items():
+            await self.rebind_client(account_id, proxy)
+        return rebound
+
+
+# 全局实例
+proxy_health_service = ProxyHealthService()
@@ -0,0 +1,259 @@
+"""
+私信实时推送
+每个已登录账号保持一条 MQTToT 长连接（instagrapi.realtime），新消息到达即写入 message_logs、
+推送 WebSocket 通知并匹配自动回复，空闲时只有 MQTT 心跳，没有 HTTP 请求。
+持有连接的进程定期续期 Redis 心跳键，收件箱轮询（sync_direct_inboxes）会跳过这些账号，
+连接断开、心跳过期后自动回退为轮询。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import Dict, Optional
+
+import redis.asyncio as aioredis
+from instagrapi.realtime import RealtimeClient
+from instagrapi.types import DirectMessage
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.metrics import registry
+from app.models.direct_sync import DirectInboxState, DirectThreadState
+from app.models.instagram_account import InstagramAccount, LoginStatus
+from app.models.message import MessageLog
+from app.models.proxy import ProxyConfig
+from app.services.inbox_sync import inbox_sync_service, item_to_row
+from app.services.instagram_wrapper import instagram_account_manager
+from app.services.websocket_service import websocket_service
+
+logger = logging.getLogger(__name__)
+
+REALTIME_CONNECTIONS = registry.gauge(
+    "dm_realtime_connections", "私信实时推送连接数"
+)
+REALTIME_MESSAGES_TOTAL = registry.counter(
+    "dm_realtime_messages_total", "实时推送收到的私信数"
+)
+REALTIME_LATENCY = registry.histogram(
+    "dm_realtime_latency_seconds", "私信发送到本地处理完成的延迟"
+)
+
+REALTIME_OWNER_KEY = "dm:realtime:{}"
+
+
+class RealtimeService:
+    """按账号管理 MQTToT 连接"""
+
+    def __init__(self):
+        self.connections: Dict[int, RealtimeClient] = {}
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._redis: Optional[aioredis.Redis] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        # 会话成员用户名：thread_id -> {pk: username}，与轮询同步写入的 sender_username 一致
+        self.thread_usernames: Dict[str, Dict[str, str]] = {}
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+
+    async def _claim(self, account_id: int) -> bool:
+        """多个 API 进程时每个账号只由一个进程持有连接"""
+        key = REALTIME_OWNER_KEY.format(account_id)
+        try:
+            if await self.redis.set(key, self.owner, nx=True, ex=settings.DM_REALTIME_HEARTBEAT_TTL):
+                return True
+            return await self.redis.get(key) == self.owner
+        except Exception as e:
+            logger.warning(f"Redis 不可用，直接建立实时连接: {e}")
+            return True
+
+    async def _heartbeat_loop(self):
+        """只为已连接的账号续期心跳；断线期间心跳过期，轮询自动接管"""
+        while True:
+            await asyncio.sleep(settings.DM_REALTIME_HEARTBEAT_TTL / 3)
+            REALTIME_CONNECTIONS.set(sum(1 for rt in self.connections.values() if rt.connected.is_set()))
+            for account_id, realtime in list(self.connections.items()):
+                if not realtime.connected.is_set():
+                    continue
+                try:
+                    await self.redis.set(
+                        REALTIME_OWNER_KEY.format(account_id), self.owner, ex=settings.DM_REALTIME_HEARTBEAT_TTL
+                    )
+                except Exception as e:
+                    logger.warning(f"实时连接心跳续期失败: {e}")
+
+    async def start(self):
+        """为所有已登录账号建立连接"""
+        db = next(get_db())
+        try:
+            account_ids = [
+                account_id for (account_id,) in db.query(InstagramAccount.id).filter(
+                    InstagramAccount.is_active == True,
+                    InstagramAccount.login_status == LoginStatus.LOGGED_IN.value
+                ).all()
+            ]
+        finally:
+            db.close()
+        for account_id in account_ids:
+            await self.add_account(account_id)
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"私信实时推送已启动，{len(self.tasks)} 个账号")
+
+    async def add_account(self, account_id: int) -> bool:
+        if account_id in self.tasks or not await self._claim(account_id):
+            return False
+        db = next(get_db())
+        try:
+            account = db.query(InstagramAccount).filter(InstagramAccount.id == account_id).first()
+            if not account:
+                return False
+            client = await instagram_account_manager.get_client(account_id)
+            if client is None:
+                proxy = None
+                if account.proxy_id:
+                    proxy = db.query(ProxyConfig).filter(ProxyConfig.id == account.proxy_id).first()
+                client = await instagram_account_manager.add_account(account, proxy)
+            state = db.query(DirectInboxState).filter(DirectInboxState.instagram_account_id == account_id).first()
+            seq_id = state.seq_id if state else None
+            snapshot_at_ms = state.snapshot_at_ms if state else None
+            user_id, username = account.user_id, account.username
+        except Exception as e:
+            logger.warning(f"账号 {account_id} 无法建立实时连接: {e}")
+            return False
+        finally:
+            db.close()
+
+        async def on_message(thread_id: str, message: DirectMessage):
+            # 回调在读循环里执行，自动回复可能有延迟，放到独立任务
+            asyncio.create_task(self.handle_message(account_id, user_id, username, thread_id, message))
+
+        realtime = RealtimeClient(
+            client,
+            on_message=on_message,
+            host=settings.DM_REALTIME_HOST or None,
+            port=settings.DM_REALTIME_PORT or None,
+            use_ssl=settings.DM_REALTIME_SSL,
+        )
+        self.connections[account_id] = realtime
+        self.tasks[account_id] = asyncio.create_task(realtime.run_forever(seq_id, snapshot_at_ms))
+        # 连接期间持有客户端租约，不被休眠
+        instagram_account_manager.acquire(account_id)
+        return True
+
+    async def remove_account(self, account_id: int):
+        """断开账号的连接（账号删除、触发验证时）；本进程没有该账号的连接时什么也不做"""
+        realtime = self.connections.pop(account_id, None)
+        task = self.tasks.pop(account_id, None)
+        if realtime is None and task is None:
+            return
+        if realtime is not None:
+            await realtime.close()
+            instagram_account_manager.release(account_id)
+        if task is not None:
+            task.cancel()
+        try:
+            await self.redis.delete(REALTIME_OWNER_KEY.format(account_id))
+        except Exception:
+            pass
+
+    async def restart_account(self, account_id: int) -> bool:
+        """重新登录后用新的客户端重建连接"""
+        await self.remove_account(account_id)
+        return await self.add_account(account_id)
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for account_id in list(self.tasks):
+            await self.remove_account(account_id)
+
+    async def _sender_username(self, client, thread_id: str, sender_pk: str) -> str:
+        """发送者用户名；未见过的会话取一次会话信息（只取 1 条消息），失败时退回 pk"""
+        usernames = self.thread_usernames.get(thread_id)
+        if usernames is None or sender_pk not in usernames:
+            try:
+                result = await inbox_sync_service._request(
+                    client, f"direct_v2/threads/{thread_id}/", {"limit": "1"}, "thread"
+                )
+            except Exception as e:
+                logger.warning(f"获取会话 {thread_id} 成员失败: {e}")
+                return sender_pk
+            users = (result.get("thread") or {}).get("users", [])
+            usernames = {str(u.get("pk")): u.get("username") for u in users}
+            # 已离开会话的发送者不再重复请求
+            usernames.setdefault(sender_pk, sender_pk)
+            self.thread_usernames[thread_id] = usernames
+        return usernames[sender_pk]
+
+    async def handle_message(self, account_id: int, user_id: int, username: str, thread_id: str, message: DirectMessage):
+        """记录消息、推送通知、匹配自动回复；同时推进同步游标，避免轮询重复写入"""
+        realtime = self.connections.get(account_id)
+        if realtime is None:
+            return
+        client = realtime.client
+        timestamp = round(message.timestamp.timestamp() * 1_000_000)
+        db = next(get_db())
+        try:
+            thread_state = db.query(DirectThreadState).filter(
+                DirectThreadState.instagram_account_id == account_id,
+                DirectThreadState.thread_id == thread_id,
+            ).first()
+            if thread_state is None:
+                thread_state = DirectThreadState(instagram_account_id=account_id, thread_id=thread_id)
+                db.add(thread_state)
+            if thread_state.last_item_timestamp and thread_state.last_item_timestamp >= timestamp:
+                return
+            thread_state.last_item_id = message.id
+            thread_state.last_item_timestamp = timestamp
+            inbox_state = db.query(DirectInboxState).filter(DirectInboxState.instagram_account_id == account_id).first()
+            if inbox_state is not None and realtime.seq_id:
+                inbox_state.seq_id = realtime.seq_id
+
+            if str(message.user_id) == str(client.user_id):
+                db.commit()
+                return
+            content, message_type, media_url = item_to_row(message.model_dump(mode="json"))
+            sender_username = await self._sender_username(client, thread_id, str(message.user_id))
+            row = MessageLog(
+                user_id=user_id,
+                instagram_account_id=account_id,
+                thread_id=thread_id,
+                sender_username=sender_username,
+                message_content=content,
+                message_type=message_type,
+                is_incoming=True,
+                is_auto_reply=False,
+                media_url=media_url,
+                created_at=datetime.utcfromtimestamp(timestamp / 1_000_000),
+            )
+            db.add(row)
+            db.commit()
+            REALTIME_MESSAGES_TOTAL.inc()
+            REALTIME_LATENCY.observe(max(datetime.now().timestamp() - message.timestamp.timestamp(), 0.0))
+
+            await websocket_service.send_new_message_notification(row.to_dict(), [user_id])
+            account = db.query(InstagramAccount).filter(InstagramAccount.id == account_id).first()
+            replied = await inbox_sync_service.apply_auto_replies(db, account, client, [{
+                "thread_id": thread_id,
+                "message_content": content,
+            }])
+            if replied:
+                await websocket_service.send_auto_reply_notification(
+                    {"account_id": account_id, "thread_id": thread_id, "sender_username": username}, [user_id]
+                )
+        except Exception as e:
+            db.rollback()
+            logger.error(f"处理实时私信失败（账号 {account_id}）: {e}")
+        finally:
+            db.close()
+
+
+# 全局实例
+realtime_service = RealtimeService()
@@ -4,18 +4,30 @@
 """
 
 import asyncio
-import json
 import logging
+import redis
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from celery import Celery
 from celery.schedules import crontab
 
 from app.services.instagram_wrapper import instagram_operations, instagram_account_manager
-from app.models.schedule import PostSchedule
-from app.models.instagram_account import InstagramAccount
-from app.models.search_task import SearchTask
+from app.services.proxy_health import proxy_health_service
+from app.services.direct_dispatch import direct_dispatch_service
+from app.services.inbox_sync import inbox_sync_service
+from app.services.job_progress import job_progress_service
+from app.services.delayed_jobs import delayed_job_queue
+from app.services.task_cancellation import task_cancellation_service
+from app.services.realtime_service import REALTIME_OWNER_KEY
+from app.services.media_prep import media_prep_service
+from app.services.post_publisher import post_publisher, utc_naive
+from app.models.schedule import PostSchedule, PostStatus
+from app.models.instagram_account import InstagramAccount, LoginStatus
+from app.models.search_task import SearchTask, TaskStatus
+from app.models.collection_job import CollectionJob
+from app.core.config import settings
 from app.core.database import get_db
+from app.utils import json_codec
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
@@ -23,8 +35,8 @@ logger = logging.getLogger(__name__)
 # Celery配置
 celery_app = Celery(
     'instagram_scheduler',
-    broker='redis://localhost:6379/1',
-    backend='redis://localhost:6379/2',
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
     include=['app.services.scheduler_service']
 )
 
@@ -38,12 +50,24 @@ celery_app.conf.update(
     beat_schedule={
         'check-pending-posts': {
             'task': 'app.services.scheduler_service.check_pending_posts',
-            'schedule': 60.0,  # 每60秒检查一次
+            'schedule': float(settings.POST_SWEEP_INTERVAL),  # 兜底扫描，按时触发由延时任务队列负责
         },
         'check-pending-search-tasks': {
             'task': 'app.services.scheduler_service.check_pending_search_tasks',
             'schedule': 120.0,  # 每120秒检查一次
         },
+        'sync-direct-inboxes': {
+            'task': 'app.services.scheduler_service.sync_direct_inboxes',
+            'schedule': float(settings.DM_SYNC_INTERVAL),
+        },
+        'flush-job-progress': {
+            'task': 'app.services.scheduler_service.flush_job_progress',
+            'schedule': float(settings.JOB_PROGRESS_FLUSH_INTERVAL),
+        },
+        'probe-proxies': {
+            'task': 'app.services.scheduler_service.probe_proxies',
+            'schedule': float(settings.PROXY_PROBE_INTERVAL),
+        },
         'cleanup-completed-tasks': {
             'task': 'app.services.scheduler_service.cleanup_completed_tasks',
             'schedule': crontab(hour=2, minute=0),  # 每天凌晨2点清理
@@ -59,41 +83,35 @@ class TaskScheduler:
         self.running_tasks: Dict[int, str] = {}  # task_id -> celery_task_id
         
     async def schedule_post(self, schedule_id: int) -> Dict:
-        """调度发帖任务"""
+        """调度发帖任务：写入延时任务队列，计划时间前 POST_PREPARE_LEAD_SECONDS 预上传，计划时间整点发布"""
         db = next(get_db())
         try:
             schedule = db.query(PostSchedule).filter(PostSchedule.id == schedule_id).first()
             if not schedule:
                 return {'success': False, 'error': '调度计划不存在'}
             
-            if schedule.status != 'pending':
-                return {'success': False, 'error': f'任务状态为 {schedule.status}'}
+            if schedule.status != PostStatus.PENDING:
+                return {'success': False, 'error': f'任务状态为 {schedule.status.value}'}
             
             # 计算延迟时间
             now = datetime.utcnow()
-            if schedule.scheduled_time <= now:
-                delay = 0
-            else:
-                delay = (schedule.scheduled_time - now).total_seconds()
-            
-            # 提交Celery任务
-            task = post_media_task.apply_async(
-                args=[schedule_id],
-                countdown=delay,
-                expires=schedule.scheduled_time + timedelta(hours=1)  # 1小时后过期
+            scheduled_time = utc_naive(schedule.scheduled_time)
+            delay = max((scheduled_time - now).total_seconds(), 0)
+            prepare_delay = max(delay - settings.POST_PREPARE_LEAD_SECONDS, 0)
+            
+            # 准备与发布各占一个有序集合成员，到点由分发循环提交 Celery 任务
+            scheduled = (
+                delayed_job_queue.schedule('post_prepare', schedule_id, now + timedelta(seconds=prepare_delay))
+                and delayed_job_queue.schedule('post_publish', schedule_id, scheduled_time)
             )
-            
-            self.running_tasks[schedule_id] = task.id
-            
-            # 更新状态
-            schedule.status = 'pending'
-            db.commit()
+            if not scheduled:
+                return {'success': False, 'error': '写入延时任务失败，将由兜底扫描补回'}
             
             return {
                 'success': True,
-                'task_id': task.id,
                 'scheduled_time': schedule.scheduled_time.isoformat(),
-                'delay_seconds': delay
+                'delay_seconds': delay,
+                'prepare_delay_seconds': prepare_delay
             }
             
         except Exception as e:
@@ -136,36 +154,47 @@ class TaskScheduler:
         finally:
             db.close()
     
-    async def cancel_task(self, task_id: int, task_type: str) -> Dict:
-        """取消任务"""
+    async def cancel_task(self, task_id: int, task_type: str, user_id: Optional[int] = None) -> Dict:
+        """取消任务（运行中的采集通过取消标记协作退出，最多再发一个请求）"""
         try:
-            if task_id not in self.running_tasks:
-                return {'success': False, 'error': '任务不在运行队列中'}
-            
-            celery_task_id = self.running_tasks[task_id]
-            
-            # 撤销Celery任务
-            celery_app.control.revoke(celery_task_id, terminate=True)
-            
-            # 更新数据库状态
             db = next(get_db())
             try:
                 if task_type == 'post':
-                    schedule = db.query(PostSchedule).filter(PostSchedule.id == task_id).first()
-                    if schedule:
-                        schedule.status = 'cancelled'
-                        db.commit()
+                    query = db.query(PostSchedule).filter(PostSchedule.id == task_id)
+                    if user_id is not None:
+                        query = query.filter(PostSchedule.user_id == user_id)
+                    schedule = query.first()
+                    if not schedule:
+                        return {'success': False, 'error': '发帖计划不存在'}
+                    if schedule.status != PostStatus.PENDING:
+                        return {'success': False, 'error': f'任务状态为 {schedule.status.value}'}
+                    schedule.status = PostStatus.CANCELLED
+                    db.commit()
+                    delayed_job_queue.unschedule('post_prepare', task_id)
+                    delayed_job_queue.unschedule('post_publish', task_id)
                 elif task_type == 'search':
-                    search_task = db.query(SearchTask).filter(SearchTask.id == task_id).first()
-                    if search_task:
-                        search_task.status = 'cancelled'
-                        search_task.completed_at = datetime.utcnow()
-                        db.commit()
+                    query = db.query(SearchTask).filter(SearchTask.id == task_id)
+                    if user_id is not None:
+                        query = query.filter(SearchTask.user_id == user_id)
+                    search_task = query.first()
+                    if not search_task:
+                        return {'success': False, 'error': '搜索任务不存在'}
+                    if search_task.is_completed():
+                        return {'success': False, 'error': f'任务状态为 {search_task.status.value}'}
+                    task_cancellation_service.cancel('search', task_id)
+                    search_task.status = TaskStatus.CANCELLED
+                    search_task.completed_at = datetime.utcnow()
+                    db.commit()
+                else:
+                    return {'success': False, 'error': f'不支持的任务类型: {task_type}'}
             finally:
                 db.close()
             
-            # 从运行任务列表中移除
-            del self.running_tasks[task_id]
+            # 还在 Celery 队列中的任务直接撤销（不终止执行中的 worker）；
+            # 搜索分片不撤销：执行中的靠取消令牌停止，排队的开始后看到已取消状态，都会保存结果并上报作业进度
+            celery_task_id = self.running_tasks.pop(task_id, None)
+            if celery_task_id and task_type != 'search':
+                celery_app.control.revoke(celery_task_id)
             
             return {'success': True, 'message': '任务已取消'}
             
@@ -173,6 +202,41 @@ class TaskScheduler:
             logger.error(f"取消任务失败: {e}")
             return {'success': False, 'error': str(e)}
     
+    async def cancel_job(self, job_id: int, user_id: int) -> Dict:
+        """取消采集作业：给所有未结束的分片写取消标记"""
+        db = next(get_db())
+        try:
+            job = db.query(CollectionJob).filter(
+                CollectionJob.id == job_id,
+                CollectionJob.user_id == user_id
+            ).first()
+            if not job:
+                return {'success': False, 'error': '采集作业不存在'}
+            if job.status in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED):
+                return {'success': False, 'error': f'作业状态为 {job.status.value}'}
+            
+            shards = db.query(SearchTask).filter(
+                SearchTask.job_id == job_id,
+                SearchTask.status.in_([TaskStatus.PENDING, TaskStatus.RUNNING])
+            ).all()
+            now = datetime.utcnow()
+            for shard in shards:
+                task_cancellation_service.cancel('search', shard.id)
+                shard.status = TaskStatus.CANCELLED
+                shard.completed_at = now
+            job.status = TaskStatus.CANCELLED
+            job.completed_at = now
+            db.commit()
+            
+            return {'success': True, 'message': '作业已取消', 'cancelled_shards': len(shards)}
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"取消采集作业失败: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            db.close()
+    
     def get_task_status(self, task_id: int) -> Dict:
         """获取任务状态"""
         if task_id not in self.running_tasks:
@@ -190,80 +254,35 @@ class TaskScheduler:
 
 # Celery任务定义
 @celery_app.task(bind=True)
-def post_media_task(self, schedule_id: int) -> Dict:
-    """发帖任务"""
+def prepare_post_task(self, schedule_id: int) -> Dict:
+    """准备任务：预处理并上传媒体，发布任务已在延时任务队列中按计划时间等待"""
+    logger.info(f"开始准备发帖任务: {schedule_id}")
+    result = asyncio.run(post_publisher.prepare(schedule_id))
+    
+    # 准备失败也会发布，发布时回退为完整上传；确认发布任务仍在队列中（已有时不改触发时间）
+    db = next(get_db())
     try:
-        logger.info(f"开始执行发帖任务: {schedule_id}")
-        
-        db = next(get_db())
-        try:
-            schedule = db.query(PostSchedule).filter(PostSchedule.id == schedule_id).first()
-            if not schedule:
-                return {'success': False, 'error': '调度计划不存在'}
-            
-            # 获取Instagram账号
-            account = db.query(InstagramAccount).filter(
-                InstagramAccount.id == schedule.instagram_account_id
-            ).first()
-            
-            if not account:
-                return {'success': False, 'error': 'Instagram账号不存在'}
-            
-            # 执行发帖
-            media_files = json.loads(schedule.media_files) if schedule.media_files else []
-            
-            if not media_files:
-                return {'success': False, 'error': '没有媒体文件'}
-            
-            # 简单处理：只发布第一个媒体文件
-            media_file = media_files[0]
-            media_path = media_file.get('path')
-            media_type = media_file.get('type', 'photo')
-            
-            # 这里需要在实际环境中实现文件路径处理
-            result = None
-            if media_type == 'photo':
-                # result = asyncio.run(instagram_operations.post_photo(
-                #     account.id, media_path, schedule.content
-                # ))
-                result = {'success': True, 'message': '照片发布成功'}  # 临时返回
-            elif media_type == 'video':
-                # result = asyncio.run(instagram_operations.post_video(
-                #     account.id, media_path, schedule.content
-                # ))
-                result = {'success': True, 'message': '视频发布成功'}  # 临时返回
-            
-            # 更新状态
-            if result.get('success'):
-                schedule.status = 'posted'
-                schedule.posted_at = datetime.utcnow()
-                schedule.error_message = None
-            else:
-                schedule.status = 'failed'
-                schedule.error_message = result.get('error', '未知错误')
-            
-            db.commit()
-            
-            return result
-            
-        finally:
-            db.close()
-            
-    except Exception as e:
-        logger.error(f"发帖任务执行失败: {e}")
-        
-        # 更新数据库状态
-        db = next(get_db())
-        try:
-            schedule = db.query(PostSchedule).filter(PostSchedule.id == schedule_id).first()
-            if schedule:
-                schedule.status = 'failed'
-                schedule.error_message = str(e)
-                db.commit()
-        finally:
-            db.close()
-        
-        return {'success': False, 'error': str(e)}
+        schedule = db.query(PostSchedule).filter(PostSchedule.id == schedule_id).first()
+        if schedule and schedule.status == PostStatus.PENDING:
+            delayed_job_queue.schedule('post_publish', schedule_id, utc_naive(schedule.scheduled_time), only_new=True)
+    finally:
+        db.close()
+    
+    return result
+
+
+@celery_app.task(bind=True)
+def post_media_task(self, schedule_id: int) -> Dict:
+    """发帖任务：已预上传时只需 configure"""
+    logger.info(f"开始执行发帖任务: {schedule_id}")
+    return asyncio.run(post_publisher.publish(schedule_id))
+
+
+@celery_app.task(bind=True)
+def direct_campaign_task(self, user_id: int, account_ids: List[int], usernames: List[str], text: str) -> Dict:
+    """批量私信任务"""
+    logger.info(f"开始批量私信: {len(usernames)} 个收件人, 账号 {account_ids}")
+    return asyncio.run(direct_dispatch_service.run_campaign(user_id, account_ids, usernames, text))
 
 
 @celery_app.task(bind=True)
@@ -288,7 +307,7 @@ def search_task_executor(self, task_id: int) -> Dict:
             
             # 执行搜索
             result = None
-            search_params = json.loads(search_task.search_params) if search_task.search_params else {}
+            search_params = json_codec.loads(search_task.search_params) if search_task.search_params else {}
             amount = search_params.get('amount', 20)
             
             if search_task.search_type == 'hashtag':
@@ -307,7 +326,7 @@ def search_task_executor(self, task_id: int) -> Dict:
             # 更新状态
             if result.get('success'):
                 search_task.status = 'completed'
-                search_task.results = json.dumps(result.get('data', []))
+                search_task.results = json_codec.dumps(result.get('data', []))
                 search_task.completed_at = datetime.utcnow()
                 search_task.error_message = None
             else:
@@ -342,26 +361,34 @@ def search_task_executor(self, task_id: int) -> Dict:
 
 @celery_app.task
 def check_pending_posts() -> Dict:
-    """检查待发帖任务"""
+    """兜底扫描：把到期或即将到期、但不在延时任务队列中的待发帖任务补回队列（Redis 数据丢失、调度失败时）"""
     try:
         db = next(get_db())
         try:
-            # 查找需要立即发布的待发帖任务
+            # 只扫 (status, scheduled_time) 索引范围，不再全表扫描
             now = datetime.utcnow()
-            pending_posts = db.query(PostSchedule).filter(
-                PostSchedule.status == 'pending',
-                PostSchedule.scheduled_time <= now
+            posts = db.query(PostSchedule.id, PostSchedule.scheduled_time).filter(
+                PostSchedule.status == PostStatus.PENDING,
+                PostSchedule.scheduled_time <= now + timedelta(seconds=settings.POST_SWEEP_INTERVAL + settings.POST_PREPARE_LEAD_SECONDS)
             ).all()
             
-            for post in pending_posts:
-                # 立即执行发帖
-                post_media_task.delay(post.id)
-                logger.info(f"立即执行发帖任务: {post.id}")
+            restored_count = 0
+            prepared_count = 0
+            for schedule_id, scheduled_time in posts:
+                # 已在队列中的保留原触发时间；逾期的补回后立即触发（发布抢占去重）
+                if delayed_job_queue.schedule('post_publish', schedule_id, utc_naive(scheduled_time), only_new=True):
+                    restored_count += 1
+                if post_publisher.is_preparing_or_prepared(schedule_id):
+                    continue
+                prepare_at = max(utc_naive(scheduled_time) - timedelta(seconds=settings.POST_PREPARE_LEAD_SECONDS), now)
+                if delayed_job_queue.schedule('post_prepare', schedule_id, prepare_at, only_new=True):
+                    prepared_count += 1
             
             return {
                 'success': True,
-                'processed_count': len(pending_posts),
-                'message': f'处理了 {len(pending_posts)} 个待发帖任务'
+                'processed_count': restored_count,
+                'prepared_count': prepared_count,
+                'message': f'补回 {restored_count} 个发布任务，{prepared_count} 个准备任务'
             }
             
         finally:
@@ -401,6 +428,68 @@ def check_pending_search_tasks() -> Dict:
         return {'success': False, 'error': str(e)}
 
 
+@celery_app.task
+def sync_inbox_task(account_id: int) -> Dict:
+    """增量同步单个账号的私信收件箱"""
+    return asyncio.run(inbox_sync_service.sync_account(account_id))
+
+
+@celery_app.task
+def sync_direct_inboxes() -> Dict:
+    """为所有已登录账号提交收件箱同步任务"""
+    try:
+        db = next(get_db())
+        try:
+            account_ids = [
+                account_id for (account_id,) in db.query(InstagramAccount.id).filter(
+                    InstagramAccount.is_active == True,
+                    InstagramAccount.login_status == LoginStatus.LOGGED_IN.value
+                ).all()
+            ]
+        finally:
+            db.close()
+        
+        # 已有实时推送连接（心跳未过期）的账号不再轮询
+        if settings.DM_REALTIME_ENABLED and account_ids:
+            try:
+                client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+                live = client.mget([REALTIME_OWNER_KEY.format(account_id) for account_id in account_ids])
+                account_ids = [account_id for account_id, owner in zip(account_ids, live) if not owner]
+            except Exception as e:
+                logger.warning(f"读取实时推送心跳失败，全部轮询: {e}")
+        
+        for account_id in account_ids:
+            sync_inbox_task.delay(account_id)
+        
+        return {'success': True, 'dispatched_count': len(account_ids)}
+        
+    except Exception as e:
+        logger.error(f"提交收件箱同步任务失败: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+@celery_app.task
+def flush_job_progress() -> Dict:
+    """把采集作业的 Redis 进度计数写回数据库"""
+    try:
+        return {'success': True, 'flushed': job_progress_service.flush()}
+    except Exception as e:
+        logger.error(f"写回作业进度失败: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+@celery_app.task
+def probe_proxies() -> Dict:
+    """并发探测全部代理并更新健康评分"""
+    try:
+        result = asyncio.run(proxy_health_service.probe_all())
+        result.pop('results', None)
+        return result
+    except Exception as e:
+        logger.error(f"代理探测失败: {e}")
+        return {'success': False, 'error': str(e)}
+
+
 @celery_app.task
 def cleanup_completed_tasks() -> Dict:
     """清理已完成的任务"""
@@ -423,11 +512,14 @@ def cleanup_completed_tasks() -> Dict:
             
             # 这里可以选择删除或归档旧数据
             # 为了安全，我们只标记为已归档
+
+            media_cleaned = media_prep_service.cleanup_cache(settings.MEDIA_PREP_CACHE_HOURS)
             
             return {
                 'success': True,
                 'posts_cleaned': len(completed_posts),
                 'tasks_cleaned': len(completed_tasks),
+                'media_cache_cleaned': media_cleaned,
                 'message': f'清理了 {len(completed_posts)} 个发帖记录和 {len(completed_tasks)} 个搜索任务'
             }
             
@@ -439,5 +531,10 @@ def cleanup_completed_tasks() -> Dict:
         return {'success': False, 'error': str(e)}
 
 
+# 延时任务到点后提交对应的 Celery 任务
+delayed_job_queue.register('post_prepare', prepare_post_task.delay)
+delayed_job_queue.register('post_publish', post_media_task.delay)
+
+
 # 全局实例
 task_scheduler = TaskScheduler()
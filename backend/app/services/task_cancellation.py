@@ -0,0 +1,101 @@
+"""
+任务取消与超时
+取消接口在 Redis 写入取消标记 task:cancel:{类型}:{ID}，执行中的采集把 TaskCancelToken 挂到
+instagrapi 客户端上（client.cancellable），每个请求前和每次等待中按间隔检查标记与截止时间，
+取消后最多再发一个请求就抛出 RequestCancelled，账号立即空出来。
+Redis 不可用时只对本进程内的令牌生效。
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import redis
+from instagrapi.cancellation import CancelToken
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CANCEL_KEY = "task:cancel:{}:{}"
+DEFAULT_REASON = "任务已取消"
+
+
+class TaskCancelToken(CancelToken):
+    """从 Redis 取消标记获知取消的令牌"""
+
+    def __init__(self, service: "TaskCancellationService", task_type: str, task_id: int, timeout: Optional[float] = None):
+        super().__init__(timeout=timeout, poll_interval=settings.TASK_CANCEL_POLL_INTERVAL)
+        self.service = service
+        self.task_type = task_type
+        self.task_id = task_id
+        self.key = CANCEL_KEY.format(task_type, task_id)
+        self._next_poll = 0.0
+
+    def poll(self):
+        if self._event.is_set():
+            return
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.poll_interval
+        reason = self.service.flag(self.key)
+        if reason is not None:
+            self.cancel(reason or DEFAULT_REASON)
+
+
+class TaskCancellationService:
+    """任务取消标记"""
+
+    def __init__(self):
+        self._client: Optional[redis.Redis] = None
+        self._tokens: Dict[str, TaskCancelToken] = {}
+        self._lock = threading.Lock()
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._client
+
+    def flag(self, key: str) -> Optional[str]:
+        """读取取消标记，未取消或 Redis 不可用时返回 None"""
+        try:
+            return self._redis().get(key)
+        except redis.RedisError:
+            return None
+
+    def token(self, task_type: str, task_id: int, timeout: Optional[float] = None) -> TaskCancelToken:
+        """为执行中的任务创建令牌（timeout 秒后视为超时）"""
+        token = TaskCancelToken(self, task_type, task_id, timeout=timeout)
+        with self._lock:
+            self._tokens[token.key] = token
+        return token
+
+    def release(self, token: TaskCancelToken):
+        """任务结束后注销令牌并清除取消标记"""
+        with self._lock:
+            if self._tokens.get(token.key) is token:
+                del self._tokens[token.key]
+        try:
+            self._redis().delete(token.key)
+        except redis.RedisError:
+            pass
+
+    def cancel(self, task_type: str, task_id: int, reason: str = DEFAULT_REASON) -> bool:
+        """写入取消标记；返回任务是否正在本进程内执行"""
+        key = CANCEL_KEY.format(task_type, task_id)
+        try:
+            self._redis().set(key, reason, ex=settings.TASK_CANCEL_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Redis 不可用，取消标记只对本进程生效: {e}")
+        with self._lock:
+            token = self._tokens.get(key)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+
+# 全局实例
+task_cancellation_service = TaskCancellationService()
@@ -10,6 +10,8 @@ from typing import Dict, List, Set, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
 
+from app.utils import json_codec
+
 logger = logging.getLogger(__name__)
 
 class ConnectionManager:
@@ -72,7 +74,7 @@ class ConnectionManager:
     async def send_personal_message(self, message: dict, user_id: int, websocket_id: Optional[str] = None):
         """发送个人消息"""
         try:
-            message_str = json.dumps(message, ensure_ascii=False, default=str)
+            message_str = json_codec.dumps(message, default=str)
             
             if websocket_id and user_id in self.active_connections:
                 # 发送到指定WebSocket
@@ -129,7 +131,7 @@ class WebSocketService:
     async def handle_message(self, websocket: WebSocket, user_id: int, websocket_id: str, message: str):
         """处理接收到的WebSocket消息"""
         try:
-            data = json.loads(message)
+            data = json_codec.loads(message)
             message_type = data.get("type")
             
             if message_type == "ping":
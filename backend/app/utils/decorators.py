@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from ..core.database import get_db
 from ..core.security import verify_token
 from ..models.user import User
+from .rate_limiter import rate_limiter
 
 # JWT认证方案
 security = HTTPBearer()
@@ -100,13 +101,28 @@ def require_roles(roles: list):
     return decorator
 
 
-def rate_limit(max_requests: int, window_seconds: int = 3600):
-    """API限流装饰器"""
+def rate_limit(max_requests: int, window_seconds: int = 3600, scope: Optional[str] = None):
+    """
+    API限流装饰器（GCRA，Redis 单次 Lua 调用）
+
+    按 用户 + 路由 维度计数，窗口内最多 max_requests 次（允许一次性突发到上限），
+    超限返回 429 并携带 Retry-After。被装饰的接口需声明 current_user 参数。
+    """
     def decorator(func):
+        route = scope or func.__name__
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # 这里可以实现Redis基础的限流逻辑
-            # 暂时只是一个占位符
+            current_user = kwargs.get('current_user')
+            identity = str(getattr(current_user, "id", None) or "anonymous")
+            key = rate_limiter.build_key(route, identity)
+            result = await rate_limiter.hit(key, max_requests, window_seconds)
+            if not result.allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="请求过于频繁，请稍后再试",
+                    headers={"Retry-After": rate_limiter.retry_after_header(result)},
+                )
             return await func(*args, **kwargs)
         return wrapper
     return decorator
@@ -0,0 +1,49 @@
+"""
+JSON 编解码
+直接复用 instagrapi.json_codec（安装了 orjson 时使用 orjson，否则回退到标准库 json，
+超过 64 位的整数交给标准库解析），后端与 instagrapi 共用同一套实现与当前选择；
+可通过 JSON_CODEC 配置强制指定
+"""
+
+import logging
+from typing import Any, Callable, Optional
+
+from fastapi.responses import JSONResponse
+from instagrapi import json_codec as _codec
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CODECS = _codec.CODECS
+codec_name = _codec.codec_name
+loads = _codec.loads
+
+
+def set_codec(name: str) -> str:
+    """切换编解码实现：json / orjson / auto"""
+    try:
+        return _codec.set_codec(name)
+    except ValueError:
+        logger.warning(f"JSON 编解码 {name} 不可用，使用标准库 json")
+        return _codec.set_codec("json")
+
+
+def dumps(obj, default: Optional[Callable] = None) -> str:
+    """序列化为字符串（紧凑格式，不转义非 ASCII 字符），用于数据库 JSON 文本列和 WebSocket 消息"""
+    return _codec.dumps(obj, default, ensure_ascii=False)
+
+
+def dumps_bytes(obj, default: Optional[Callable] = None) -> bytes:
+    """序列化为 UTF-8 字节"""
+    return dumps(obj, default).encode("utf-8")
+
+
+class CodecJSONResponse(JSONResponse):
+    """用当前编解码实现序列化的 JSONResponse，适合大结果集（跳过 jsonable_encoder）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content, default=str)
+
+
+set_codec(settings.JSON_CODEC)
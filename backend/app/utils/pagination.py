@@ -0,0 +1,72 @@
+"""
+游标（keyset）分页
+按 (排序列, id) 倒序翻页，游标是上一页最后一行的这两个值，下一页直接从索引定位，
+不再 OFFSET 扫描前面的行；列表响应体保持不变，下一页游标放在响应头 X-Next-Cursor 中。
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+from app.utils import json_codec
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    raw = json_codec.dumps_bytes([value, row_id])
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json_codec.loads(raw)
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["dt"])
+        return value, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="分页游标无效")
+
+
+def keyset_page(
+    query: Query,
+    sort_column,
+    id_column,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    response: Optional[Response] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """按 (sort_column, id_column) 倒序取一页，返回 (行, 下一页游标)；传入 response 时同时写入响应头"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        if sort_column is id_column:
+            query = query.filter(id_column < row_id)
+        else:
+            query = query.filter(or_(
+                sort_column < value,
+                and_(sort_column == value, id_column < row_id),
+            ))
+    if sort_column is id_column:
+        query = query.order_by(id_column.desc())
+    else:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    if response is not None and next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows, next_cursor
@@ -0,0 +1,132 @@
+"""
+基于 Redis 的 GCRA 限流器
+
+- 每次判定只执行一次 Lua 脚本（EVALSHA），使用 Redis 服务器时间，避免多实例时钟漂移
+- 进程内维护一份"已被限流"的快速拒绝缓存，处于冷却期的客户端无需再访问 Redis
+- Redis 不可用时放行（fail-open），只记录告警，避免限流组件拖垮业务接口
+"""
+
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import redis.asyncio as aioredis
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# GCRA（Generic Cell Rate Algorithm）：
+#   emission_interval = window / max_requests
+#   burst_tolerance   = window - emission_interval
+# Redis 中只保存一个值：TAT（理论到达时间，毫秒）
+# 返回 {allowed, retry_after_ms, remaining}
+GCRA_LUA = """
+local key = KEYS[1]
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tat = tonumber(redis.call('GET', key))
+if tat == nil or tat < now then
+    tat = now
+end
+local new_tat = tat + emission
+local allow_at = new_tat - tolerance - emission
+if now < allow_at then
+    return {0, allow_at - now, 0}
+end
+redis.call('SET', key, new_tat, 'PX', math.ceil(new_tat - now))
+local remaining = math.floor((tolerance + emission - (new_tat - now)) / emission)
+return {1, 0, remaining}
+"""
+
+# 快速拒绝缓存的最大条目数，超过后清理已过期条目
+LOCAL_CACHE_MAX_ENTRIES = 10000
+
+
+@dataclass
+class RateLimitResult:
+    """单次限流判定结果"""
+    allowed: bool
+    retry_after: float = 0.0
+    remaining: Optional[int] = None
+
+
+class GCRARateLimiter:
+    """GCRA 限流器（Redis + 进程内快速拒绝缓存）"""
+
+    def __init__(self, redis_url: str, prefix: str = "ratelimit"):
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._redis: Optional[aioredis.Redis] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._script = None
+        # key -> 冷却结束时间（time.monotonic）
+        self._blocked_until: Dict[str, float] = {}
+
+    def _get_script(self):
+        # Celery 任务每次用 asyncio.run 新建事件循环，连接不能跨循环复用
+        loop = asyncio.get_running_loop()
+        if self._script is None or self._loop is not loop:
+            self._redis = aioredis.Redis.from_url(self.redis_url, decode_responses=True)
+            self._script = self._redis.register_script(GCRA_LUA)
+            self._loop = loop
+        return self._script
+
+    def build_key(self, route: str, identity: str) -> str:
+        return f"{self.prefix}:{route}:{identity}"
+
+    def _local_check(self, key: str, now: float) -> Optional[RateLimitResult]:
+        blocked_until = self._blocked_until.get(key)
+        if blocked_until is None:
+            return None
+        if now < blocked_until:
+            return RateLimitResult(allowed=False, retry_after=blocked_until - now, remaining=0)
+        self._blocked_until.pop(key, None)
+        return None
+
+    def _remember_block(self, key: str, now: float, retry_after: float):
+        if len(self._blocked_until) >= LOCAL_CACHE_MAX_ENTRIES:
+            expired = [k for k, until in self._blocked_until.items() if until <= now]
+            for k in expired:
+                del self._blocked_until[k]
+            if len(self._blocked_until) >= LOCAL_CACHE_MAX_ENTRIES:
+                self._blocked_until.clear()
+        self._blocked_until[key] = now + retry_after
+
+    async def hit(self, key: str, max_requests: int, window_seconds: float) -> RateLimitResult:
+        """记录一次请求并返回是否放行"""
+        now = time.monotonic()
+        cached = self._local_check(key, now)
+        if cached is not None:
+            return cached
+
+        emission_ms = window_seconds * 1000.0 / max_requests
+        tolerance_ms = window_seconds * 1000.0 - emission_ms
+        try:
+            script = self._get_script()
+            allowed, retry_after_ms, remaining = await script(
+                keys=[key], args=[emission_ms, tolerance_ms]
+            )
+        except Exception as exc:
+            logger.warning(f"限流器 Redis 调用失败，放行请求: {exc}")
+            return RateLimitResult(allowed=True)
+
+        if int(allowed) == 1:
+            return RateLimitResult(allowed=True, remaining=int(remaining))
+
+        retry_after = float(retry_after_ms) / 1000.0
+        self._remember_block(key, now, retry_after)
+        return RateLimitResult(allowed=False, retry_after=retry_after, remaining=0)
+
+    @staticmethod
+    def retry_after_header(result: RateLimitResult) -> str:
+        return str(max(1, math.ceil(result.retry_after)))
+
+
+# 全局实例
+rate_limiter = GCRARateLimiter(settings.REDIS_URL)
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for extractors and paginated flows.
+
+Run ``python -m benchmarks`` from the repository root; see
+``docs/development-guide.md`` for comparing results across commits.
+"""
@@ -0,0 +1,58 @@
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from . import fixtures
+from .runner import compare, run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Offline extractor and pagination benchmarks",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=7)
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("-c", "--compare", help="baseline JSON produced by --output")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="percent of slowdown/peak memory growth reported as a regression",
+    )
+    parser.add_argument("-k", "--only", action="append", help="substring filter")
+    parser.add_argument("--fixtures", help="directory with recorded JSON fixtures")
+    parser.add_argument(
+        "--dump-fixtures", metavar="DIR", help="write synthetic fixtures and exit"
+    )
+    args = parser.parse_args(argv)
+
+    if args.dump_fixtures:
+        for path in fixtures.dump(args.dump_fixtures):
+            print(path)
+        return 0
+
+    # FixtureClient logs every pagination step otherwise
+    logging.getLogger("instagrapi").setLevel(logging.WARNING)
+    report = run(repeat=args.repeat, fixtures_dir=args.fixtures, only=args.only)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        lines, regressions = compare(baseline, report, args.threshold)
+        print()
+        print(
+            "baseline %s -> %s"
+            % (baseline["meta"].get("revision"), report["meta"].get("revision"))
+        )
+        print("\n".join(lines))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
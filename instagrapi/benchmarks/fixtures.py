@@ -0,0 +1,378 @@
+"""
+Private API payload fixtures for the offline benchmark suite.
+
+Every fixture is a plain JSON-compatible dict shaped like the corresponding
+Private API response.  Recorded payloads take precedence: put a file named
+``<fixture>.json`` into the fixtures directory (``--fixtures`` or
+``benchmarks/fixtures/``) and it is used instead of the deterministic
+synthetic payload generated here.  ``python -m benchmarks --dump-fixtures DIR``
+writes the synthetic set, which is also a template for anonymised recordings.
+"""
+import json
+import random
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+SEED = 1903424587
+USER_ID = 1903424587
+BASE_TS = 1_700_000_000
+CDN = "https://scontent.cdninstagram.com/v/t51.2885-15"
+
+
+def _rnd(*key) -> random.Random:
+    return random.Random("%s:%s" % (SEED, ":".join(map(str, key))))
+
+
+def _candidates(pk, count=4):
+    return [
+        {
+            "width": 1080 // (i + 1),
+            "height": 1350 // (i + 1),
+            "url": f"{CDN}/{pk}_{i}_n.jpg?stp=dst-jpg_e35&_nc_ht=scontent&oh=00_{pk:x}&oe=65A1B2C3",
+            "scans_profile": "e35",
+            "estimated_scans_sizes": [8431, 16862, 25293, 33724, 42155],
+        }
+        for i in range(count)
+    ]
+
+
+def user_short(i):
+    pk = 10_000_000 + i
+    return {
+        "pk": str(pk),
+        "pk_id": str(pk),
+        "id": str(pk),
+        "username": f"user_{i}",
+        "full_name": f"User Number {i}",
+        "is_private": bool(i % 3 == 0),
+        "is_verified": bool(i % 11 == 0),
+        "profile_pic_id": f"{pk}_{pk}",
+        "profile_pic_url": f"{CDN}/{pk}_profile.jpg?_nc_ht=scontent&oh=00_{pk:x}",
+        "has_anonymous_profile_picture": False,
+        "latest_reel_media": BASE_TS + i,
+        "fbid_v2": str(17841400000000000 + pk),
+    }
+
+
+def user_info(i=0):
+    rnd = _rnd("user", i)
+    data = user_short(i)
+    data.update(
+        {
+            "media_count": rnd.randint(0, 5000),
+            "follower_count": rnd.randint(0, 10**6),
+            "following_count": rnd.randint(0, 7500),
+            "biography": "Bio line with emoji ✨ and #hashtag @mention " * 3,
+            "external_url": f"https://example.com/{i}",
+            "bio_links": [
+                {"link_id": str(1000 + j), "url": f"https://example.com/{i}/{j}"}
+                for j in range(3)
+            ],
+            "account_type": 2,
+            "is_business": bool(i % 2),
+            "category": "Artist",
+            "public_email": f"user_{i}@example.com",
+            "contact_phone_number": "",
+            "city_name": "Berlin",
+            "latitude": 52.52,
+            "longitude": 13.405,
+            "hd_profile_pic_versions": [
+                {"width": 320, "height": 320, "url": f"{CDN}/{i}_320.jpg"},
+                {"width": 640, "height": 640, "url": f"{CDN}/{i}_640.jpg"},
+            ],
+            "pinned_channels_info": {
+                "pinned_channels_list": [],
+                "has_public_channels": False,
+            },
+        }
+    )
+    return {"user": data, "status": "ok"}
+
+
+def media(i, media_type=None):
+    rnd = _rnd("media", i)
+    pk = 3_000_000_000_000_000_000 + i
+    media_type = media_type or (1, 2, 8)[i % 3]
+    data = {
+        "pk": pk,
+        "id": f"{pk}_{USER_ID}",
+        "code": f"C{i:010d}",
+        "taken_at": BASE_TS - i * 3600,
+        "media_type": media_type,
+        "product_type": "clips" if media_type == 2 else "feed",
+        "image_versions2": {"candidates": _candidates(pk)},
+        "user": user_short(i % 50),
+        "comment_count": rnd.randint(0, 500),
+        "like_count": rnd.randint(0, 100000),
+        "has_liked": False,
+        "caption": {
+            "pk": str(pk + 1),
+            "text": "Caption %d " % i + "#tag%d " % rnd.randint(0, 99) * 10,
+            "created_at": BASE_TS - i * 3600,
+        },
+        "usertags": {
+            "in": [
+                {"user": user_short(100 + j), "position": [0.1 * j, 0.2 * j]}
+                for j in range(i % 4)
+            ]
+        },
+        "location": {
+            "pk": 213385402,
+            "name": "Berlin, Germany",
+            "address": "",
+            "city": "",
+            "lng": 13.405,
+            "lat": 52.52,
+            "external_source": "facebook_places",
+            "facebook_places_id": 111175118906315,
+        }
+        if i % 5 == 0
+        else None,
+        "sponsor_tags": [],
+        "coauthor_producers": [],
+        "play_count": rnd.randint(0, 10**6),
+    }
+    if media_type == 2:
+        data["video_duration"] = rnd.uniform(3, 90)
+        data["view_count"] = rnd.randint(0, 10**6)
+        data["video_versions"] = [
+            {
+                "width": 720 // (j + 1),
+                "height": 1280 // (j + 1),
+                "type": 101 + j,
+                "url": f"{CDN}/{pk}_{j}.mp4?_nc_ht=scontent",
+            }
+            for j in range(3)
+        ]
+    if media_type == 8:
+        data["carousel_media"] = [
+            {
+                "pk": str(pk + 100 + j),
+                "id": f"{pk + 100 + j}_{USER_ID}",
+                "media_type": 1,
+                "image_versions2": {"candidates": _candidates(pk + 100 + j, 3)},
+            }
+            for j in range(4)
+        ]
+    return data
+
+
+def comment(i):
+    return {
+        "pk": str(17_900_000_000_000_000 + i),
+        "text": "Nice shot! \U0001f525 " * (1 + i % 5),
+        "user": user_short(200 + i % 80),
+        "created_at_utc": BASE_TS - i * 60,
+        "content_type": "comment",
+        "status": "Active",
+        "comment_like_count": i % 17,
+        "has_liked_comment": False,
+    }
+
+
+def story(i):
+    pk = 3_100_000_000_000_000_000 + i
+    data = {
+        "pk": pk,
+        "id": f"{pk}_{USER_ID}",
+        "code": f"S{i:010d}",
+        "taken_at": BASE_TS - i * 600,
+        "media_type": 2 if i % 2 else 1,
+        "image_versions2": {"candidates": _candidates(pk, 2)},
+        "user": user_short(0),
+        "video_duration": 15.0,
+        "reel_mentions": [
+            {
+                "user": user_short(300 + i),
+                "x": 0.5,
+                "y": 0.5,
+                "width": 0.4,
+                "height": 0.1,
+            }
+        ],
+        "story_hashtags": [],
+        "story_locations": [],
+        "story_cta": [{"links": [{"webUri": f"https://example.com/story/{i}"}]}],
+        "sponsor_tags": [],
+    }
+    if i % 2:
+        data["video_versions"] = [
+            {"width": 720, "height": 1280, "url": f"{CDN}/{pk}.mp4"}
+        ]
+    return data
+
+
+def direct_message(thread, i):
+    item = {
+        "item_id": str(30_000_000_000_000_000_000_000_000 + thread * 1000 + i),
+        "user_id": 10_000_000 + (i % 2),
+        "timestamp": (BASE_TS - i * 30) * 1_000_000,
+        "item_type": "text",
+        "is_sent_by_viewer": bool(i % 2),
+        "text": "Message %d in thread %d" % (i, thread),
+        "client_context": str(7_000_000_000_000_000_000 + i),
+    }
+    if i % 7 == 3:
+        item["item_type"] = "media_share"
+        item["media_share"] = media(thread * 100 + i, media_type=1)
+    return item
+
+
+def direct_thread(i, messages=20):
+    thread_id = str(340282366841710300949128000000000000000 + i)
+    return {
+        "thread_id": thread_id,
+        "thread_v2_id": str(17_840_000_000_000_000 + i),
+        "users": [user_short(400 + i)],
+        "inviter": user_short(0),
+        "admin_user_ids": [],
+        "last_activity_at": (BASE_TS - i * 60) * 1_000_000,
+        "muted": False,
+        "is_pin": False,
+        "named": False,
+        "canonical": True,
+        "pending": False,
+        "archived": False,
+        "thread_type": "private",
+        "thread_title": f"user_{400 + i}",
+        "folder": 0,
+        "vc_muted": False,
+        "is_group": False,
+        "mentions_muted": False,
+        "approval_required_for_new_members": False,
+        "input_mode": 0,
+        "business_thread_folder": 0,
+        "read_state": 0,
+        "is_close_friend_thread": False,
+        "assigned_admin_id": 0,
+        "shh_mode_enabled": False,
+        "last_seen_at": {
+            str(10_000_000 + 400 + i): {
+                "item_id": str(30_000_000_000_000_000_000_000_000 + i * 1000),
+                "timestamp": str((BASE_TS - i * 60) * 1_000_000),
+                "created_at": str((BASE_TS - i * 60) * 1_000_000),
+                "shh_seen_state": {},
+            }
+        },
+        "items": [direct_message(i, j) for j in range(messages)],
+    }
+
+
+def _cursor(page, pages):
+    return f"page-{page + 1}" if page + 1 < pages else None
+
+
+def feed_user_page(page, pages=10, per_page=33):
+    return {
+        "items": [media(page * per_page + i) for i in range(per_page)],
+        "num_results": per_page,
+        "more_available": page + 1 < pages,
+        "next_max_id": _cursor(page, pages),
+        "status": "ok",
+    }
+
+
+def followers_page(page, pages=10, per_page=200):
+    return {
+        "users": [user_short(page * per_page + i) for i in range(per_page)],
+        "big_list": True,
+        "page_size": per_page,
+        "next_max_id": _cursor(page, pages),
+        "status": "ok",
+    }
+
+
+def comments_page(page, pages=10, per_page=50):
+    return {
+        "comments": [comment(page * per_page + i) for i in range(per_page)],
+        "comment_count": pages * per_page,
+        "has_more_comments": page + 1 < pages,
+        "next_max_id": _cursor(page, pages),
+        "status": "ok",
+    }
+
+
+def inbox_page(page, pages=5, per_page=20):
+    return {
+        "inbox": {
+            "threads": [direct_thread(page * per_page + i) for i in range(per_page)],
+            "has_older": page + 1 < pages,
+            "oldest_cursor": _cursor(page, pages),
+        },
+        "status": "ok",
+    }
+
+
+def story_reel(items=30):
+    return {
+        "reel": {"id": USER_ID, "items": [story(i) for i in range(items)]},
+        "status": "ok",
+    }
+
+
+def sample(name, count):
+    """List of single objects fed to one extractor"""
+    builders = {
+        "media": media,
+        "user": lambda i: user_info(i)["user"],
+        "user_short": user_short,
+        "comment": comment,
+        "story": story,
+        "direct_thread": direct_thread,
+    }
+    return [builders[name](i) for i in range(count)]
+
+
+# fixture name -> (builder, number of pages)
+PAGED_FIXTURES = {
+    "feed_user": (feed_user_page, 10),
+    "followers": (followers_page, 10),
+    "comments": (comments_page, 10),
+    "direct_inbox": (inbox_page, 5),
+}
+
+
+def load(name, page=None, fixtures_dir=None):
+    """
+    Recorded fixture if present, otherwise the synthetic one
+
+    ``page`` selects a page of a paginated fixture; recorded pages are stored
+    as ``<name>.<page>.json``.
+    """
+    filename = f"{name}.json" if page is None else f"{name}.{page}.json"
+    path = Path(fixtures_dir or FIXTURES_DIR) / filename
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    if name == "story_reel":
+        return story_reel()
+    if name == "user_info":
+        return user_info()
+    builder, pages = PAGED_FIXTURES[name]
+    return builder(page or 0, pages)
+
+
+def pages(name, fixtures_dir=None):
+    """All pages of a paginated fixture, following recorded files when present"""
+    path = Path(fixtures_dir or FIXTURES_DIR)
+    recorded = sorted(path.glob(f"{name}.*.json"), key=lambda p: int(p.suffixes[0][1:]))
+    if recorded:
+        return [json.loads(p.read_text(encoding="utf-8")) for p in recorded]
+    builder, count = PAGED_FIXTURES[name]
+    return [builder(page, count) for page in range(count)]
+
+
+def dump(fixtures_dir):
+    """Write the synthetic fixture set as JSON files"""
+    path = Path(fixtures_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    written = []
+    for name, payload in (("user_info", user_info()), ("story_reel", story_reel())):
+        target = path / f"{name}.json"
+        target.write_text(json.dumps(payload), encoding="utf-8")
+        written.append(target)
+    for name, (builder, count) in PAGED_FIXTURES.items():
+        for page in range(count):
+            target = path / f"{name}.{page}.json"
+            target.write_text(json.dumps(builder(page, count)), encoding="utf-8")
+            written.append(target)
+    return written
@@ -0,0 +1,185 @@
+"""
+Concurrent load driver against the Instagram stand-in server.
+
+Every worker owns a logged-in Client and runs a weighted mix of the
+operations the backend performs (profile lookups, user feeds, hashtag
+collection, follow/unfollow, direct messages).
+
+    python -m benchmarks.load --workers 200 --duration 30 --throttle-rate 0.01
+
+Without ``--address`` an in-process stand-in server is started.
+"""
+import argparse
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from instagrapi import Client
+from instagrapi.exceptions import ChallengeError
+
+from .mock_server import MockInstagram, MockServer, configure_client
+
+OPERATIONS = {
+    "user_info_by_username": (
+        30,
+        lambda cl, rnd: cl.user_info_by_username_v1(f"user_{rnd.randint(0, 10**5)}"),
+    ),
+    "user_medias": (
+        20,
+        lambda cl, rnd: cl.user_medias_v1(10_000_000 + rnd.randint(0, 10**5), 24),
+    ),
+    "hashtag_medias_recent": (
+        20,
+        lambda cl, rnd: cl.hashtag_medias_recent_v1(f"tag{rnd.randint(0, 500)}", 27),
+    ),
+    "user_follow": (
+        10,
+        lambda cl, rnd: cl.user_follow(str(10_000_000 + rnd.randint(0, 10**5))),
+    ),
+    "direct_send": (
+        20,
+        lambda cl, rnd: cl.direct_send(
+            "hello", user_ids=[10_000_000 + rnd.randint(0, 10**5)]
+        ),
+    ),
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoadRun:
+    def __init__(self, address, workers, duration, seed=None):
+        self.address = address
+        self.workers = workers
+        self.duration = duration
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self.endpoints = defaultdict(list)
+
+    def worker(self, index):
+        rnd = random.Random(None if self.seed is None else self.seed + index)
+        cl = configure_client(Client(), self.address)
+        cl.login(f"user_{index}", "password")
+        names = list(OPERATIONS)
+        weights = [OPERATIONS[name][0] for name in names]
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            name = rnd.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                OPERATIONS[name][1](cl, rnd)
+                outcome = "success"
+            except ChallengeError:
+                outcome = "challenge"
+            except Exception as e:
+                outcome = e.__class__.__name__
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.latencies[name].append(elapsed)
+                self.outcomes[name][outcome] += 1
+        with self.lock:
+            for template, stats in cl.endpoint_stats().items():
+                self.endpoints[template].append(stats)
+
+    def run(self):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for future in [pool.submit(self.worker, i) for i in range(self.workers)]:
+                future.result()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        operations = {}
+        for name, values in self.latencies.items():
+            operations[name] = {
+                "count": len(values),
+                "per_s": round(len(values) / elapsed, 2),
+                "mean_ms": round(statistics.fmean(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "outcomes": dict(self.outcomes[name]),
+            }
+        endpoints = {}
+        for template, snapshots in self.endpoints.items():
+            count = sum(s["count"] for s in snapshots)
+            endpoints[template] = {
+                "count": count,
+                "errors": sum(s["errors"] for s in snapshots),
+                # per-client p95 averaged; exact merge needs raw samples
+                "p95_ms": round(
+                    statistics.fmean(
+                        s["p95"] for s in snapshots if s["p95"] is not None
+                    )
+                    * 1000,
+                    2,
+                ),
+            }
+        total = sum(op["count"] for op in operations.values())
+        return {
+            "workers": self.workers,
+            "elapsed_s": round(elapsed, 2),
+            "operations_per_s": round(total / elapsed, 2),
+            "operations": operations,
+            "endpoints": endpoints,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument("--address", help="host:port of a running stand-in server")
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--challenge-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("-o", "--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("instagrapi").setLevel(logging.ERROR)
+    logging.getLogger("private_request").setLevel(logging.ERROR)
+    logging.getLogger("public_request").setLevel(logging.ERROR)
+    server = None
+    address = args.address
+    if not address:
+        app = MockInstagram(
+            latency=args.latency,
+            jitter=args.jitter,
+            throttle_rate=args.throttle_rate,
+            challenge_rate=args.challenge_rate,
+            seed=args.seed,
+        )
+        server = MockServer(("127.0.0.1", 0), app).start()
+        address = server.address
+    try:
+        report = LoadRun(address, args.workers, args.duration, args.seed).run()
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    if server:
+        report["server"] = server.app.stats()["injected"]
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Local stand-in for the Instagram endpoints the backend relies on.
+
+It serves the private API (``/api/v1/...``) and the rupload endpoints with
+synthetic payloads from :mod:`benchmarks.fixtures`. Latency, 429 throttling
+and ``challenge_required`` responses can be injected. Public (web) endpoints
+answer 404, so clients fall back to the private API just like they do when
+the web API refuses anonymous requests.
+
+    python -m benchmarks.mock_server --port 8765 --latency 0.05 --throttle-rate 0.02
+
+A client is pointed at it with ``configure_client(client, "127.0.0.1:8765")``,
+which sets ``config.API_SCHEME``/``config.API_DOMAIN``.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from instagrapi import config
+from instagrapi.metrics import normalize_endpoint
+
+from . import fixtures
+
+PUBLIC_PREFIX = "/public/"
+LOGIN_FLOW_ENDPOINTS = (
+    "accounts/login",
+    "qe/sync",
+    "challenge/",
+    "launcher/sync",
+    "feed/reels_tray",
+    "feed/timeline",
+)
+# RSA key served by qe/sync/ for password_encrypt(); generated once per process
+_PASSWORD_KEY = None
+_PASSWORD_KEY_LOCK = threading.Lock()
+
+
+def password_public_key():
+    global _PASSWORD_KEY
+    with _PASSWORD_KEY_LOCK:
+        if _PASSWORD_KEY is None:
+            from Cryptodome.PublicKey import RSA
+
+            key = RSA.generate(2048).publickey().export_key()
+            _PASSWORD_KEY = base64.b64encode(key).decode()
+    return _PASSWORD_KEY
+
+
+def configure_client(client, address, scheme="http"):
+    """
+    Point a Client (and instagrapi.config) at the stand-in server
+
+    Parameters
+    ----------
+    client: Client
+    address: str
+        "host:port" of the stand-in server
+    scheme: str, optional
+        "http" unless the server runs behind a TLS terminator
+
+    Returns
+    -------
+    Client
+    """
+    config.API_SCHEME = scheme
+    config.API_DOMAIN = address
+    client.domain = address
+    client.PUBLIC_API_URL = f"{scheme}://{address}{PUBLIC_PREFIX}"
+    client.GRAPHQL_PUBLIC_API_URL = f"{scheme}://{address}{PUBLIC_PREFIX}graphql/query/"
+    client.request_timeout = 0
+    return client
+
+
+def user_index(value):
+    """Stable synthetic user index for a pk or username"""
+    value = str(value)
+    if value.isdigit():
+        return max(0, int(value) - 10_000_000)
+    match = re.match(r"^user_(\d+)$", value)
+    if match:
+        return int(match.group(1))
+    return zlib.crc32(value.encode()) % 1_000_000
+
+
+def page_index(cursor):
+    if cursor and str(cursor).startswith("page-"):
+        return int(str(cursor)[5:])
+    return 0
+
+
+def parse_body(raw: bytes) -> dict:
+    """Form body, including signed_body=SIGNATURE.{json} payloads"""
+    if not raw:
+        return {}
+    data = {k: v[-1] for k, v in parse_qs(raw.decode("utf8", "replace")).items()}
+    signed = data.pop("signed_body", None)
+    if signed and "." in signed:
+        try:
+            data.update(json.loads(signed.split(".", 1)[1]))
+        except ValueError:
+            pass
+    return data
+
+
+class MockInstagram:
+    """
+    Request router and fault injector of the stand-in server
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        throttle_rate=0.0,
+        challenge_rate=0.0,
+        feed_pages=5,
+        follower_pages=5,
+        hashtag_pages=5,
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.challenge_rate = challenge_rate
+        self.feed_pages = feed_pages
+        self.follower_pages = follower_pages
+        self.hashtag_pages = hashtag_pages
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.injected = Counter()
+        self.routes = [
+            ("POST", r"^accounts/login/$", self.login),
+            ("GET", r"^qe/sync/$", self.qe_sync),
+            ("POST", r"^qe/sync/$", self.qe_sync),
+            ("*", r"^challenge/", self.challenge_step),
+            ("GET", r"^users/(?P<user>\d+)/info/$", self.user_info),
+            ("GET", r"^users/(?P<user>[^/]+)/usernameinfo/$", self.user_info),
+            ("GET", r"^feed/user/(?P<user>\d+)/story/$", self.user_story),
+            ("GET", r"^feed/user/(?P<user>\d+)/$", self.user_feed),
+            ("*", r"^tags/(?P<name>[^/]+)/sections/$", self.hashtag_sections),
+            ("POST", r"^friendships/create/(?P<user>\d+)/$", self.follow),
+            ("POST", r"^friendships/destroy/(?P<user>\d+)/$", self.unfollow),
+            ("GET", r"^friendships/(?P<user>\d+)/follow(ers|ing)/$", self.followers),
+            ("*", r"^media/(?P<media>[^/]+)/comments/$", self.comments),
+            ("GET", r"^direct_v2/inbox/$", self.inbox),
+            ("POST", r"^direct_v2/threads/broadcast/(?P<kind>\w+)/$", self.direct_send),
+            ("POST", r"^media/configure[^/]*/$", self.configure),
+        ]
+        self.routes = [(m, re.compile(p), h) for m, p, h in self.routes]
+
+    # transport -----------------------------------------------------------
+
+    def handle(self, method, path, query, body):
+        """
+        Returns
+        -------
+        Tuple[int, dict, dict]
+            status, extra headers and JSON payload
+        """
+        delay = self.latency + (
+            self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0
+        )
+        if delay > 0:
+            time.sleep(delay)
+        with self.lock:
+            self.requests[normalize_endpoint(path)] += 1
+        if path.startswith(PUBLIC_PREFIX):
+            return (
+                404,
+                {},
+                {"message": "public API is not served by the mock", "status": "fail"},
+            )
+        if path.startswith("/rupload_ig"):
+            return self.rupload(method, path)
+        if not path.startswith("/api/v1/"):
+            return 404, {}, {"message": "not found", "status": "fail"}
+        endpoint = path[len("/api/v1/") :]
+        params = dict(query, **parse_body(body))
+        fault = self.fault(endpoint)
+        if fault:
+            return fault
+        for route_method, pattern, handler in self.routes:
+            if route_method not in ("*", method):
+                continue
+            match = pattern.match(endpoint)
+            if match:
+                return handler(params, **match.groupdict())
+        return 200, {}, {"status": "ok"}
+
+    def fault(self, endpoint):
+        # the login flow itself is never faulted, workers need a session to start
+        if endpoint.startswith(LOGIN_FLOW_ENDPOINTS):
+            return None
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            with self.lock:
+                self.injected["throttled"] += 1
+            return (
+                429,
+                {},
+                {
+                    "message": "Please wait a few minutes before you try again.",
+                    "status": "fail",
+                },
+            )
+        if roll < self.throttle_rate + self.challenge_rate:
+            with self.lock:
+                self.injected["challenge"] += 1
+            return (
+                400,
+                {},
+                {
+                    "message": "challenge_required",
+                    "challenge": {
+                        "url": "https://i.instagram.com/challenge/",
+                        "api_path": "/challenge/1903424587/mock/",
+                        "hide_webview_header": True,
+                        "lock": True,
+                        "logout": False,
+                        "native_flow": True,
+                    },
+                    "status": "fail",
+                },
+            )
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "injected": dict(self.injected)}
+
+    # endpoints -----------------------------------------------------------
+
+    def login(self, params):
+        index = user_index(params.get("username") or 0)
+        user = fixtures.user_info(index)["user"]
+        if params.get("username"):
+            user["username"] = params["username"]
+        auth = {"ds_user_id": user["pk"], "sessionid": f"{user['pk']}%3Amock%3A1"}
+        token = base64.b64encode(json.dumps(auth).encode()).decode()
+        headers = {
+            "ig-set-authorization": f"Bearer IGT:2:{token}",
+            "ig-set-x-mid": "mock-mid",
+        }
+        return 200, headers, {"logged_in_user": user, "status": "ok"}
+
+    def qe_sync(self, params):
+        headers = {
+            "ig-set-password-encryption-key-id": "41",
+            "ig-set-password-encryption-pub-key": password_public_key(),
+        }
+        return 200, headers, {"experiments": [], "status": "ok"}
+
+    def challenge_step(self, params):
+        # challenge_resolve_simple raises ChallengeUnknownStep for it
+        return 200, {}, {"step_name": "mock_challenge", "status": "ok"}
+
+    def user_info(self, params, user):
+        data = fixtures.user_info(user_index(user))
+        if not str(user).isdigit():
+            data["user"]["username"] = user
+        return 200, {}, data
+
+    def user_story(self, params, user):
+        return 200, {}, fixtures.story_reel(10)
+
+    def user_feed(self, params, user):
+        page = page_index(params.get("max_id"))
+        return 200, {}, fixtures.feed_user_page(page, self.feed_pages, per_page=12)
+
+    def hashtag_sections(self, params, name):
+        page = page_index(params.get("max_id"))
+        medias = fixtures.feed_user_page(page, self.hashtag_pages, per_page=9)["items"]
+        more = page + 1 < self.hashtag_pages
+        return (
+            200,
+            {},
+            {
+                "sections": [
+                    {
+                        "layout_type": "media_grid",
+                        "layout_content": {
+                            "medias": [{"media": m} for m in medias[i : i + 3]]
+                        },
+                    }
+                    for i in range(0, len(medias), 3)
+                ],
+                "more_available": more,
+                "next_max_id": f"page-{page + 1}" if more else None,
+                "next_media_ids": [],
+                "next_page": page + 1,
+                "status": "ok",
+            },
+        )
+
+    def follow(self, params, user):
+        return (
+            200,
+            {},
+            {
+                "friendship_status": {"following": True, "outgoing_request": False},
+                "status": "ok",
+            },
+        )
+
+    def unfollow(self, params, user):
+        return (
+            200,
+            {},
+            {
+                "friendship_status": {"following": False, "outgoing_request": False},
+                "status": "ok",
+            },
+        )
+
+    def followers(self, params, user):
+        page = page_index(params.get("max_id"))
+        return 200, {}, fixtures.followers_page(page, self.follower_pages)
+
+    def comments(self, params, media):
+        page = page_index(params.get("max_id"))
+        return 200, {}, fixtures.comments_page(page, 3)
+
+    def inbox(self, params):
+        page = page_index(params.get("cursor"))
+        return 200, {}, fixtures.inbox_page(page, 2)
+
+    def direct_send(self, params, kind):
+        item = fixtures.direct_message(0, 0)
+        item["timestamp"] = int(time.time() * 1_000_000)
+        item["text"] = params.get("text") or params.get("link_text")
+        return (
+            200,
+            {},
+            {
+                "action": "item_ack",
+                "status_code": "200",
+                "payload": item,
+                "status": "ok",
+            },
+        )
+
+    def configure(self, params):
+        upload_id = str(params.get("upload_id") or int(time.time() * 1000))
+        media = fixtures.media(
+            int(upload_id) % 1_000_000, media_type=2 if "video" in params else 1
+        )
+        media["caption"]["text"] = params.get("caption", "")
+        return 200, {}, {"media": media, "upload_id": upload_id, "status": "ok"}
+
+    def rupload(self, method, path):
+        upload_name = path.rstrip("/").rsplit("/", 1)[-1]
+        upload_id = upload_name.split("_", 1)[0]
+        if method == "GET":  # video upload offset probe
+            return 200, {}, {"offset": 0}
+        return 200, {}, {"upload_id": upload_id, "xsharing_nonces": {}, "status": "ok"}
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "instagrapi-mock"
+
+    def _dispatch(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if url.path == "/__mock__/stats":
+            status, headers, payload = 200, {}, self.server.app.stats()
+        else:
+            status, headers, payload = self.server.app.handle(
+                self.command, url.path, query, body
+            )
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    do_GET = _dispatch
+    do_POST = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, app: MockInstagram):
+        self.app = app
+        super().__init__(address, MockRequestHandler)
+
+    @property
+    def address(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        """Serve from a daemon thread, returns self"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.mock_server",
+        description="Local Instagram API stand-in for load testing",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every response"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="+/- seconds of random latency"
+    )
+    parser.add_argument(
+        "--throttle-rate", type=float, default=0.0, help="share of 429 responses"
+    )
+    parser.add_argument(
+        "--challenge-rate", type=float, default=0.0, help="share of challenge_required"
+    )
+    parser.add_argument("--feed-pages", type=int, default=5)
+    parser.add_argument("--hashtag-pages", type=int, default=5)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    app = MockInstagram(
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        challenge_rate=args.challenge_rate,
+        feed_pages=args.feed_pages,
+        hashtag_pages=args.hashtag_pages,
+        seed=args.seed,
+    )
+    server = MockServer((args.host, args.port), app)
+    print(
+        f"Serving Instagram stand-in on http://{server.address} (stats: /__mock__/stats)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Local stand-in for the MQTToT realtime gateway.
+
+It accepts plain TCP connections, decodes the Thrift CONNECT payload,
+answers CONNACK, PUBACK, PINGRESP and the Iris subscription, and pushes
+``/ig_message_sync`` patches on demand, so a :class:`RealtimeClient` can be
+exercised end to end without Instagram.  The broker itself lives in
+``instagrapi.realtime_broker``; this script serves it from the command line:
+
+    python -m benchmarks.mqtt_broker --port 8883 --interval 1
+
+pushes a synthetic message to every connected client each second.  A client
+is pointed at it with ``RealtimeClient(cl, host="127.0.0.1", port=8883,
+use_ssl=False)``.
+"""
+
+import argparse
+import asyncio
+
+from instagrapi.realtime_broker import MqttStandIn, text_item
+
+
+async def serve(host, port, interval):
+    broker = await MqttStandIn(host, port).start()
+    print("MQTToT stand-in listening on %s:%s" % (host, broker.port))
+    counter = 0
+    while True:
+        await asyncio.sleep(interval)
+        if broker.writers:
+            counter += 1
+            await broker.push(
+                "340282366841710300949128100000000001",
+                text_item(counter, 1, "message %s" % counter),
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8883)
+    parser.add_argument(
+        "--interval", type=float, default=1.0, help="seconds between pushed messages"
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
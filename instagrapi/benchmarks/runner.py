@@ -0,0 +1,340 @@
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from instagrapi import Client, extractors, json_codec
+from instagrapi.metrics import normalize_endpoint
+
+from . import fixtures
+
+USER_ID = fixtures.USER_ID
+MEDIA_ID = f"3000000000000000000_{USER_ID}"
+
+
+class FixtureClient(Client):
+    """
+    Client whose private_request is served from fixture pages
+
+    Pages are kept serialized, so every flow pays for JSON decoding the same
+    way it does with a live response.
+    """
+
+    def __init__(self, routes):
+        super().__init__()
+        self.authorization_data = {"ds_user_id": str(USER_ID), "sessionid": ""}
+        self.routes = {}
+        for template, pages in routes.items():
+            cursors = {"": 0}
+            for index, page in enumerate(pages):
+                cursor = next_cursor(page)
+                if cursor:
+                    cursors[str(cursor)] = index + 1
+            self.routes[normalize_endpoint(template)] = (
+                [json.dumps(page) for page in pages],
+                cursors,
+            )
+
+    def private_request(self, endpoint, data=None, params=None, **kwargs):
+        self.private_requests_count += 1
+        pages, cursors = self.routes[normalize_endpoint(endpoint)]
+        # media_comments passes its cursor positionally, i.e. as POST data
+        query = params or (data if isinstance(data, dict) else {})
+        cursor = query.get("max_id") or query.get("cursor") or ""
+        self.last_json = json.loads(pages[cursors[str(cursor)]])
+        return self.last_json
+
+
+def next_cursor(page):
+    return page.get("next_max_id") or (page.get("inbox") or {}).get("oldest_cursor")
+
+
+def fixture_client(fixtures_dir=None):
+    load = fixtures.load
+    return FixtureClient(
+        {
+            f"users/{USER_ID}/info/": [load("user_info", fixtures_dir=fixtures_dir)],
+            f"feed/user/{USER_ID}/story/": [
+                load("story_reel", fixtures_dir=fixtures_dir)
+            ],
+            f"feed/user/{USER_ID}/": fixtures.pages("feed_user", fixtures_dir),
+            f"friendships/{USER_ID}/followers/": fixtures.pages(
+                "followers", fixtures_dir
+            ),
+            f"media/{MEDIA_ID}/comments/": fixtures.pages("comments", fixtures_dir),
+            "direct_v2/inbox/": fixtures.pages("direct_inbox", fixtures_dir),
+        }
+    )
+
+
+def extractor_cases(fixtures_dir=None):
+    """name -> (callable over fresh input, input factory, items per call)"""
+    feed = [
+        m for page in fixtures.pages("feed_user", fixtures_dir) for m in page["items"]
+    ]
+    followers = [
+        u for page in fixtures.pages("followers", fixtures_dir) for u in page["users"]
+    ]
+    comments = [
+        c for page in fixtures.pages("comments", fixtures_dir) for c in page["comments"]
+    ]
+    threads = [
+        t
+        for page in fixtures.pages("direct_inbox", fixtures_dir)
+        for t in page["inbox"]["threads"]
+    ]
+    stories = fixtures.load("story_reel", fixtures_dir=fixtures_dir)["reel"]["items"]
+    users = fixtures.sample("user", 300)
+    cases = {}
+    for name, extract, items in (
+        ("extract_media_v1", extractors.extract_media_v1, feed),
+        ("extract_user_v1", extractors.extract_user_v1, users),
+        ("extract_user_short", extractors.extract_user_short, followers),
+        ("extract_comment", extractors.extract_comment, comments),
+        ("extract_story_v1", extractors.extract_story_v1, stories),
+        ("extract_direct_thread", extractors.extract_direct_thread, threads),
+    ):
+        blob = json.dumps(items)
+        cases[name] = (
+            lambda data, extract=extract: [extract(item) for item in data],
+            lambda blob=blob: json.loads(blob),
+            len(items),
+        )
+    return cases
+
+
+def flow_cases(fixtures_dir=None):
+    """name -> (callable over client, client factory, items per call)"""
+    make = lambda: fixture_client(fixtures_dir)  # noqa: E731
+    flows = {
+        "user_info_v1": lambda cl: [cl.user_info_v1(USER_ID)],
+        "user_medias_v1": lambda cl: cl.user_medias_v1(USER_ID, 0),
+        "user_followers_v1": lambda cl: cl.user_followers_v1(USER_ID, 0),
+        "media_comments": lambda cl: cl.media_comments(MEDIA_ID, 0),
+        "direct_threads": lambda cl: cl.direct_threads(0),
+        "user_stories_v1": lambda cl: cl.user_stories_v1(USER_ID),
+    }
+    cases = {}
+    for name, flow in flows.items():
+        items = len(flow(make()))
+        cases[name] = (flow, make, items)
+    return cases
+
+
+def codec_cases(fixtures_dir=None):
+    """name -> (decode/encode callable, input factory, payloads per call), per installed codec"""
+    payloads = {
+        "user_info": fixtures.load("user_info", fixtures_dir=fixtures_dir),
+        "story_reel": fixtures.load("story_reel", fixtures_dir=fixtures_dir),
+    }
+    for name in fixtures.PAGED_FIXTURES:
+        payloads[name] = fixtures.pages(name, fixtures_dir)[0]
+    # a signed POST body, captions carry non-ASCII text that has to be escaped
+    body = {
+        "caption": "Caption with emoji \U0001f525 and #tags " * 10,
+        "upload_id": "1700000000000",
+        "usertags": json.dumps(
+            {
+                "in": [
+                    {"user_id": str(10_000_000 + i), "position": [0.5, 0.5]}
+                    for i in range(5)
+                ]
+            }
+        ),
+        "device": {
+            "manufacturer": "OnePlus",
+            "model": "6T Dev",
+            "android_version": 26,
+            "android_release": "8.0.0",
+        },
+        "_uid": str(USER_ID),
+        "_uuid": "8e5b3bd6-4e8f-4b5b-a9c2-5b43c3c6a0f1",
+    }
+    cases = {}
+    for codec, (loads, dumps) in json_codec.CODECS.items():
+        for name, payload in payloads.items():
+            blob = json.dumps(payload).encode()
+            cases[f"decode_{name}[{codec}]"] = (loads, lambda blob=blob: blob, 1)
+        cases[f"encode_signed_body[{codec}]"] = (dumps, lambda: body, 1)
+    return cases
+
+
+# modules only upload, story building and video analysis need
+LAZY_MODULES = ("PIL", "moviepy", "numpy", "imageio")
+
+
+def import_cases(fixtures_dir=None):
+    """name -> cold import in a fresh interpreter, fails if one of LAZY_MODULES gets loaded"""
+    cases = {}
+    for name, modules in (
+        ("interpreter", []),
+        ("instagrapi", ["instagrapi"]),
+        ("instagrapi_story", ["instagrapi", "instagrapi.story"]),
+    ):
+        code = (
+            "import sys\n%s\nloaded = sorted({m.split('.')[0] for m in sys.modules} & set(%r))\n"
+            % (
+                "\n".join("import %s" % module for module in modules),
+                LAZY_MODULES,
+            )
+            + "assert not loaded, 'loaded at import time: %s' % loaded"
+        )
+
+        def cold_import(args, code=code):
+            subprocess.run(
+                [sys.executable, "-c", code],
+                check=True,
+                cwd=Path(__file__).parent.parent,
+            )
+
+        cases[f"import_{name}"] = (cold_import, lambda: None, 1)
+    return cases
+
+
+def measure(func, setup, items, repeat=7):
+    """
+    Wall time over ``repeat`` runs, then one traced run for memory
+
+    Returns
+    -------
+    dict
+        Timings in seconds, memory in KiB, throughput in items per second
+    """
+    timings = []
+    gc_enabled = gc.isenabled()
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            func(args)
+            timings.append(time.perf_counter() - started)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    args = setup()
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        result = func(args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    retained_blocks = sys.getallocatedblocks() - blocks
+    del result
+    median = statistics.median(timings)
+    return {
+        "items": items,
+        "repeat": repeat,
+        "min_s": min(timings),
+        "median_s": median,
+        "mean_s": statistics.fmean(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "items_per_s": items / median if median else None,
+        "peak_kib": round(peak / 1024, 1),
+        "retained_kib": round(current / 1024, 1),
+        "retained_blocks": retained_blocks,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat=7, fixtures_dir=None, only=None, log=print):
+    results = {}
+    for kind, cases in (
+        ("extractor", extractor_cases(fixtures_dir)),
+        ("flow", flow_cases(fixtures_dir)),
+        ("codec", codec_cases(fixtures_dir)),
+        ("import", import_cases(fixtures_dir)),
+    ):
+        for name, (func, setup, items) in cases.items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            results[name] = dict(kind=kind, **measure(func, setup, items, repeat))
+            log(format_result(name, results[name]))
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "repeat": repeat,
+            "json_codec": json_codec.codec_name(),
+            "fixtures": str(fixtures_dir or fixtures.FIXTURES_DIR),
+        },
+        "results": results,
+    }
+
+
+def format_result(name, result):
+    return "%-28s %6d items  median %9.2f ms  %10.0f items/s  peak %8.1f KiB" % (
+        name,
+        result["items"],
+        result["median_s"] * 1000,
+        result["items_per_s"] or 0,
+        result["peak_kib"],
+    )
+
+
+def compare(baseline, current, threshold=10.0):
+    """
+    Compare two result documents
+
+    Returns
+    -------
+    Tuple[List[str], List[str]]
+        Report lines and names of benchmarks slower (or heavier) than
+        ``threshold`` percent
+    """
+    lines = [
+        "%-28s %12s %12s %8s %8s" % ("benchmark", "base ms", "now ms", "time", "peak")
+    ]
+    regressions = []
+    for name, now in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            lines.append(
+                "%-28s %12s %12.2f %8s %8s"
+                % (name, "-", now["median_s"] * 1000, "new", "")
+            )
+            continue
+        time_delta = (now["median_s"] / base["median_s"] - 1) * 100
+        peak_delta = (
+            (now["peak_kib"] / base["peak_kib"] - 1) * 100 if base["peak_kib"] else 0.0
+        )
+        flag = ""
+        if time_delta > threshold or peak_delta > threshold:
+            regressions.append(name)
+            flag = "  <-- regression"
+        lines.append(
+            "%-28s %12.2f %12.2f %+7.1f%% %+7.1f%%%s"
+            % (
+                name,
+                base["median_s"] * 1000,
+                now["median_s"] * 1000,
+                time_delta,
+                peak_delta,
+                flag,
+            )
+        )
+    return lines, regressions
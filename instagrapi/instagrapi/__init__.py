@@ -41,6 +41,8 @@ from instagrapi.mixins.totp import TOTPMixin
 from instagrapi.mixins.track import TrackMixin
 from instagrapi.mixins.user import UserMixin
 from instagrapi.mixins.video import DownloadVideoMixin, UploadVideoMixin
+from instagrapi.pool import ConnectionPoolRegistry
+from instagrapi.transport import Cassette, CassetteAdapter
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -98,6 +100,7 @@ class Client(
         proxy: str | None = None,
         delay_range: list | None = None,
         logger=DEFAULT_LOGGER,
+        pool_registry: ConnectionPoolRegistry | None = None,
         **kwargs,
     ):
 
@@ -108,6 +111,8 @@ class Client(
         self.delay_range = delay_range
 
         self.set_proxy(proxy)
+        if pool_registry is not None:
+            self.set_connection_pool(pool_registry)
 
         self.init()
 
@@ -128,3 +133,98 @@ class Client(
             return True
         self.public.proxies = self.private.proxies = {}
         return False
+
+    def set_transport(self, private=None, public=None):
+        """
+        Mount transport adapters on the private and public sessions
+
+        Parameters
+        ----------
+        private: requests.adapters.BaseAdapter, optional
+            Adapter for ``self.private``
+        public: requests.adapters.BaseAdapter, optional
+            Adapter for ``self.public``
+        """
+        for session, adapter in ((self.private, private), (self.public, public)):
+            if adapter is not None:
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+
+    def set_connection_pool(self, registry: ConnectionPoolRegistry):
+        """
+        Use connection pools shared with other clients
+
+        Cookies, headers and proxies stay on this client's sessions, only
+        the connections are shared.
+
+        Parameters
+        ----------
+        registry: ConnectionPoolRegistry
+        """
+        self.set_transport(
+            private=registry.adapter(
+                "private", self.private.get_adapter("https://").max_retries
+            ),
+            public=registry.adapter(
+                "public", self.public.get_adapter("https://").max_retries
+            ),
+        )
+
+    def use_http2(self, **options):
+        """
+        Send private and public requests over HTTP/2
+
+        Concurrent requests of this client are multiplexed over one
+        connection per proxy and host. Retries keep the sessions' strategy.
+
+        Parameters
+        ----------
+        options:
+            Passed to ``instagrapi.http2.HTTP2Adapter``, e.g. max_connections
+
+        Returns
+        -------
+        Tuple[HTTP2Adapter, HTTP2Adapter]
+            Private and public adapters
+        """
+        from instagrapi.http2 import HTTP2Adapter
+
+        private = HTTP2Adapter(
+            max_retries=self.private.get_adapter("https://").max_retries, **options
+        )
+        public = HTTP2Adapter(
+            max_retries=self.public.get_adapter("https://").max_retries, **options
+        )
+        self.set_transport(private=private, public=public)
+        return private, public
+
+    def use_cassette(
+        self, path, mode: str = "replay", timing: float = 0.0, match_body: bool = False
+    ):
+        """
+        Record or replay the HTTP traffic of both sessions to one cassette
+
+        Parameters
+        ----------
+        path: str | Path
+            Cassette file (gzip compressed JSON lines)
+        mode: str
+            "record", "replay" or "cache" (read-through)
+        timing: float
+            Replay delay as a fraction of the recorded latency, 0 by default
+
+        Returns
+        -------
+        Cassette
+            Call ``close()`` on it when done recording
+        """
+        cassette = Cassette(path, match_body=match_body)
+        adapters = {}
+        for name in ("private", "public"):
+            network = getattr(self, name).get_adapter("https://")
+            if isinstance(network, CassetteAdapter):
+                network.cassette.close()
+                network = network.adapter
+            adapters[name] = CassetteAdapter(cassette, mode, timing, adapter=network)
+        self.set_transport(**adapters)
+        return cassette
@@ -0,0 +1,115 @@
+"""
+Cooperative cancellation for long running Client calls.
+
+A :class:`CancelToken` is attached to a client with
+:meth:`Client.cancellable`.  Every private and public request checks it
+before it is sent, and the client's waits (request_timeout, delay_range,
+pagination and configure sleeps) wake up as soon as it is cancelled, so a
+paginating loop such as ``user_followers_v1`` stops within one request::
+
+    token = CancelToken(timeout=600)
+    with cl.cancellable(token):
+        cl.user_followers(user_id)   # raises RequestCancelled / DeadlineExceeded
+
+``token.cancel()`` may be called from any thread.
+
+The attached token lives in a :class:`contextvars.ContextVar`, so it only
+applies to the thread or asyncio task that entered the block (and to work
+started from it with ``asyncio.to_thread``); other callers sharing the same
+client are not affected.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from instagrapi.exceptions import DeadlineExceeded, RequestCancelled
+
+
+class CancelToken:
+    """
+    Cancellation flag with an optional deadline
+
+    Parameters
+    ----------
+    timeout: float, optional
+        Seconds from now until the deadline
+    deadline: float, optional
+        Absolute deadline on the ``time.monotonic()`` clock
+    poll_interval: float, optional
+        Longest uninterrupted wait inside :meth:`sleep`; subclasses that
+        learn about cancellation in :meth:`poll` are checked this often
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        poll_interval: float = 1.0,
+    ):
+        if deadline is None and timeout is not None:
+            deadline = time.monotonic() + timeout
+        self.deadline = deadline
+        self.poll_interval = poll_interval
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "Request cancelled"):
+        """Cancel the token; safe to call from any thread"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def poll(self):
+        """Hook for subclasses to pick up cancellation from elsewhere (e.g. a shared store)"""
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, None without a deadline"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        self.poll()
+        remaining = self.remaining()
+        return self._event.is_set() or (remaining is not None and remaining <= 0)
+
+    def check(self):
+        """
+        Raise if the token is cancelled or past its deadline
+
+        Raises
+        ------
+        RequestCancelled
+        DeadlineExceeded
+        """
+        self.poll()
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded()
+
+    def sleep(self, seconds: float):
+        """Sleep, waking up early to raise when the token is cancelled"""
+        self.check()
+        end = time.monotonic() + max(seconds, 0)
+        while True:
+            left = end - time.monotonic()
+            if left <= 0:
+                return
+            remaining = self.remaining()
+            if remaining is not None and remaining < left:
+                # the deadline comes first, no point in sleeping past it
+                self._event.wait(max(remaining, 0))
+                self.check()
+            self._event.wait(min(left, self.poll_interval))
+            self.check()
+
+
+# id(client) -> token attached in the current context
+attached_tokens: ContextVar[Dict[int, CancelToken]] = ContextVar(
+    "instagrapi_cancel_tokens", default={}
+)
@@ -1,4 +1,9 @@
 API_DOMAIN = "i.instagram.com"
+# "http" together with API_DOMAIN = "127.0.0.1:8765" points a Client at a local stand-in
+API_SCHEME = "https"
+# MQTToT realtime gateway (see instagrapi.realtime)
+REALTIME_HOST = "edge-mqtt.facebook.com"
+REALTIME_PORT = 443
 
 # Instagram 134.0.0.26.121
 # Android (26/8.0.0;
@@ -115,6 +115,13 @@ class ChallengeRequired(ChallengeError):
     pass
 
 
+class ChallengeParked(ChallengeRequired):
+    """Raised instead of waiting for a security code when Client.challenge_park
+    is set; ``state`` is what Client.challenge_resume needs to finish it later"""
+
+    state = None
+
+
 class ChallengeSelfieCaptcha(ChallengeError):
     pass
 
@@ -355,3 +362,23 @@ class CaptchaChallengeRequired(ClientError):
         # self.site_key = self.challenge_details.get('site_key')
         # self.challenge_url = self.challenge_details.get('challenge_url') # URL where captcha is presented
         super().__init__(message, **kwargs)
+
+
+class RequestCancelled(Exception):
+    """
+    Raised when the CancelToken attached to the client is cancelled.
+
+    Not a ClientError on purpose: retry loops and gql -> v1 fallbacks catch
+    ClientError and must not swallow a cancellation.
+    """
+
+    def __init__(self, message="Request cancelled"):
+        self.message = message
+        super().__init__(message)
+
+
+class DeadlineExceeded(RequestCancelled):
+    """Raised when the deadline of the attached CancelToken has passed"""
+
+    def __init__(self, message="Deadline exceeded"):
+        super().__init__(message)
@@ -0,0 +1,216 @@
+"""
+HTTP/2 transport for the requests sessions of a Client.
+
+``HTTP2Adapter`` is a requests transport adapter backed by httpx/httpcore,
+mounted with ``Client.use_http2()`` (or shared by many clients through
+``ConnectionPoolRegistry(http2=True)``).  Concurrent requests from threads
+that use one client, e.g. album uploads or parallel pagination, are
+multiplexed as streams over one connection per (proxy, host) instead of
+opening a connection per request.  Sessions still own cookies, headers,
+proxies and redirects, as with the default ``HTTPAdapter``.
+
+Retries follow the adapter's urllib3 ``Retry`` (``Retry(total=3,
+backoff_factor=2)`` on Client sessions): connection and read errors and
+retryable statuses are retried with the same backoff and ``Retry-After``
+handling, and ``response.raw.retries`` carries the history.
+
+Requires ``httpx`` with HTTP/2 support: ``pip install "httpx[http2]"``.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.utils import select_proxy
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    MaxRetryError,
+    ProtocolError,
+    ReadTimeoutError,
+)
+from urllib3.util.retry import Retry
+
+from instagrapi.transport import make_raw_response
+
+try:
+    import httpx
+except ImportError:  # optional dependency, checked when the adapter is created
+    httpx = None
+
+
+def _timeout_extension(timeout) -> Optional[Dict]:
+    if timeout is None:
+        return None
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+    else:
+        connect = read = timeout
+    return {"connect": connect, "read": read, "write": read, "pool": connect}
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    requests adapter that sends over HTTP/2 with httpx
+
+    Parameters
+    ----------
+    max_retries: Retry | int
+        Retry strategy, same meaning as for ``HTTPAdapter``
+    http2: bool
+        Negotiate HTTP/2 (ALPN); False keeps HTTP/1.1 on the httpx pool
+    max_connections: int
+        Connections per proxy, across hosts
+    keepalive_expiry: float
+        Seconds an idle connection is kept open
+    """
+
+    def __init__(
+        self,
+        max_retries=0,
+        http2: bool = True,
+        max_connections: int = 100,
+        keepalive_expiry: float = 120.0,
+    ):
+        if httpx is None:
+            raise Exception(
+                'Please install httpx with HTTP/2 support ("httpx[http2]") and retry'
+            )
+        super().__init__()
+        self.max_retries = (
+            Retry.from_int(max_retries)
+            if not isinstance(max_retries, Retry)
+            else max_retries
+        )
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.transports: Dict[Tuple, "httpx.HTTPTransport"] = {}
+        self.shared = False
+        self._lock = threading.Lock()
+
+    def transport_for(
+        self, proxy: Optional[str], verify, cert
+    ) -> "httpx.HTTPTransport":
+        """One httpx connection pool per proxy (and TLS settings)"""
+        key = (
+            proxy,
+            verify if isinstance(verify, (bool, str)) else True,
+            cert if not isinstance(cert, list) else tuple(cert),
+        )
+        with self._lock:
+            transport = self.transports.get(key)
+            if transport is None:
+                transport = self.transports[key] = httpx.HTTPTransport(
+                    verify=verify,
+                    cert=cert,
+                    http2=self.http2,
+                    proxy=proxy,
+                    limits=self.limits,
+                    retries=0,
+                )
+            return transport
+
+    @staticmethod
+    def _urllib3_error(exc, url):
+        # translated so that Retry counts connect and read errors as urllib3 does
+        if isinstance(
+            exc,
+            (
+                httpx.ConnectError,
+                httpx.ConnectTimeout,
+                httpx.ProxyError,
+                httpx.PoolTimeout,
+            ),
+        ):
+            return ConnectTimeoutError(str(exc))
+        if isinstance(exc, httpx.TimeoutException):
+            return ReadTimeoutError(None, url, str(exc))
+        return ProtocolError(str(exc), exc)
+
+    @staticmethod
+    def _requests_error(exc, request):
+        if isinstance(exc, httpx.ProxyError):
+            return requests.exceptions.ProxyError(exc, request=request)
+        if isinstance(exc, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return requests.exceptions.ConnectTimeout(exc, request=request)
+        if isinstance(exc, httpx.TimeoutException):
+            return requests.exceptions.ReadTimeout(exc, request=request)
+        return requests.exceptions.ConnectionError(exc, request=request)
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        transport = self.transport_for(
+            select_proxy(request.url, proxies or {}), verify, cert
+        )
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        extensions = {}
+        timeouts = _timeout_extension(timeout)
+        if timeouts:
+            extensions["timeout"] = timeouts
+        method, url = request.method, request.url
+        retries = self.max_retries
+        while True:
+            outgoing = httpx.Request(
+                method,
+                url,
+                headers=list(request.headers.items()),
+                content=body,
+                extensions=extensions,
+            )
+            try:
+                response = transport.handle_request(outgoing)
+                try:
+                    content = b"".join(response.iter_raw())
+                finally:
+                    response.close()
+            except httpx.TransportError as exc:
+                try:
+                    retries = retries.increment(
+                        method, url, error=self._urllib3_error(exc, url)
+                    )
+                except Exception:
+                    raise self._requests_error(exc, request) from exc
+                retries.sleep()
+                continue
+            raw = make_raw_response(
+                response.status_code,
+                response.headers.multi_items(),
+                content,
+                reason=response.reason_phrase,
+                retries=retries,
+                version=20 if response.http_version == "HTTP/2" else 11,
+            )
+            has_retry_after = "Retry-After" in response.headers
+            if retries.is_retry(method, response.status_code, has_retry_after):
+                try:
+                    retries = retries.increment(method, url, response=raw)
+                except MaxRetryError as exc:
+                    if retries.raise_on_status:
+                        raise requests.exceptions.RetryError(
+                            exc, request=request
+                        ) from exc
+                    return HTTPAdapter.build_response(self, request, raw)
+                retries.sleep(raw)
+                continue
+            return HTTPAdapter.build_response(self, request, raw)
+
+    def close(self):
+        # shared adapters belong to a ConnectionPoolRegistry, not to one session
+        if not self.shared:
+            self.shutdown()
+
+    def shutdown(self):
+        with self._lock:
+            for transport in self.transports.values():
+                transport.close()
+            self.transports.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"transports": len(self.transports)}
@@ -9,14 +9,20 @@ import re
 import shutil
 import tempfile
 
-try:
-    from PIL import Image
-except ImportError:
-    raise Exception("You don't have PIL installed. Please install PIL or Pillow>=8.1.1")
-
 import requests
 
 
+def pil_image():
+    """PIL.Image, imported on first use to keep ``import instagrapi`` fast"""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise Exception(
+            "You don't have PIL installed. Please install PIL or Pillow>=8.1.1"
+        )
+    return Image
+
+
 def calc_resize(max_size, curr_size, min_size=(0, 0)):
     """
     Calculate if resize is required based on the max size desired
@@ -126,6 +132,7 @@ def prepare_image(
              - **min_size**: tuple of (min_width,  min_height)
     :return:
     """
+    Image = pil_image()
     min_size = kwargs.pop("min_size", (320, 167))
     if is_remote(img):
         res = requests.get(img, timeout=5)
@@ -253,8 +260,7 @@ def prepare_video(
             codec="libx264",
             audio=True,
             audio_codec="aac",
-            verbose=False,
-            progress_bar=progress_bar,
+            logger="bar" if progress_bar else None,
             preset=preset,
             remove_temp=True,
         )
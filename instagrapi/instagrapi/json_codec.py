@@ -0,0 +1,174 @@
+"""
+JSON codec for request bodies and response parsing.
+
+``loads`` and ``dumps`` use orjson when it is installed and the standard
+library otherwise; ``set_codec("json")`` forces the standard library.  Both
+codecs produce the same values and the same compact, ASCII-escaped text the
+private API signatures were computed over, so switching codec does not change
+what is sent: integers orjson cannot hold exactly are decoded by the
+standard library and floats are written the way ``repr`` writes them.
+Decode errors are ``json.JSONDecodeError`` either way.
+"""
+import json
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used instead
+    orjson = None
+
+# orjson turns integers outside int64/uint64 into floats; such payloads are
+# decoded with the standard library, which keeps them exact.  Digits are
+# mapped to "0" and the characters a value can follow (":", ",", "[" and
+# whitespace) to "\x01", so a 20+ digit value, or 19 digits after "-", is a
+# plain substring search -- much cheaper than a regular expression.  Digit
+# runs inside strings ("2154602296692269830_1903424587") follow a quote and
+# do not match.
+WIDE_INT_TABLE = bytes.maketrans(b"123456789:,[ \t\r\n", b"000000000" + b"\x01" * 7)
+WIDE_INT_MARKERS = (b"\x01" + b"0" * 20, b"\x01-" + b"0" * 19)
+
+# orjson writes some floats differently from repr() and so the standard
+# library ("1e20" vs "1e+20", "0.00001" vs "1e-05"), which would change
+# signed bodies.  Float values are found in orjson's output and rewritten
+# with repr(): every float has a digit followed by "." or "e" and starts
+# after ":", "," or "[", which tells it from a string.  Digits are mapped
+# to "0" so the markers are plain substring searches.
+DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+FLOAT_MARKERS = (b"0.0", b"0e0", b"0e-")
+FLOAT_CHARS = b"0.e+-"
+VALUE_PREFIX = b":,["
+
+
+def _has_wide_int(data: bytes) -> bool:
+    marked = data.translate(WIDE_INT_TABLE)
+    return any(marker in marked for marker in WIDE_INT_MARKERS)
+
+
+def _float_spans(raw: bytes) -> Dict[int, int]:
+    """Start and end offsets of the float values in compact JSON"""
+    zeroed = raw.translate(DIGITS_TO_ZERO)
+    size = len(zeroed)
+    spans: Dict[int, int] = {}
+    # orjson writes a digit after "." and a digit or "-" after "e"
+    for marker in FLOAT_MARKERS:
+        pos = zeroed.find(marker)
+        while pos != -1:
+            start = pos
+            while start and zeroed[start - 1] == 0x30:  # "0"
+                start -= 1
+            if start and zeroed[start - 1] == 0x2D:  # "-"
+                start -= 1
+            if start == 0 or zeroed[start - 1] in VALUE_PREFIX:
+                end = pos + 2
+                while end < size and zeroed[end] in FLOAT_CHARS:
+                    end += 1
+                spans[start] = end
+            pos = zeroed.find(marker, pos + 2)
+    return spans
+
+
+def _repr_floats(raw: bytes) -> Optional[bytes]:
+    """
+    orjson output with floats written as repr() writes them, or None when a
+    match turns out to be inside a string and the text cannot be patched
+    """
+    spans = _float_spans(raw)
+    pieces = []
+    last = 0
+    for start in sorted(spans):
+        end = spans[start]
+        token = raw[start:end]
+        try:
+            text = repr(float(token)).encode()
+        except ValueError:
+            return None
+        if text != token:
+            pieces += [raw[last:start], text]
+            last = end
+    if not pieces:
+        return raw
+    patched = b"".join(pieces) + raw[last:]
+    # a changed "number" in a string (e.g. JSON text stored as a string)
+    # would change the string; rewriting only values leaves the data equal
+    return patched if orjson.loads(patched) == orjson.loads(raw) else None
+
+
+def _std_loads(data) -> Any:
+    return json.loads(data)
+
+
+def _std_dumps(
+    obj, default: Optional[Callable] = None, ensure_ascii: bool = True
+) -> str:
+    return json.dumps(
+        obj, separators=(",", ":"), default=default, ensure_ascii=ensure_ascii
+    )
+
+
+def _orjson_loads(data) -> Any:
+    if isinstance(data, str):
+        data = data.encode("utf-8", "surrogatepass")
+    if _has_wide_int(data):
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def _orjson_dumps(
+    obj, default: Optional[Callable] = None, ensure_ascii: bool = True
+) -> str:
+    try:
+        raw = orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    except (TypeError, orjson.JSONEncodeError):
+        # e.g. integers wider than 64 bits or subclasses orjson refuses
+        return _std_dumps(obj, default, ensure_ascii)
+    if ensure_ascii and not raw.isascii():
+        # escaping non-ASCII text afterwards costs more than the standard
+        # library's own encoder
+        return _std_dumps(obj, default, ensure_ascii)
+    raw = _repr_floats(raw)
+    if raw is None:
+        return _std_dumps(obj, default, ensure_ascii)
+    return raw.decode("utf-8")
+
+
+CODECS: Dict[str, tuple] = {"json": (_std_loads, _std_dumps)}
+if orjson is not None:
+    # dates go through ``default`` like they do with the standard library
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    CODECS["orjson"] = (_orjson_loads, _orjson_dumps)
+
+_codec = "orjson" if orjson is not None else "json"
+
+
+def set_codec(name: str) -> str:
+    """
+    Select the codec, "json", "orjson" or "auto"
+
+    Returns
+    -------
+    str
+        Name of the codec in use
+    """
+    global _codec
+    if name == "auto":
+        name = "orjson" if "orjson" in CODECS else "json"
+    if name not in CODECS:
+        raise ValueError(
+            f'JSON codec "{name}" is not available, use one of {sorted(CODECS)}'
+        )
+    _codec = name
+    return _codec
+
+
+def codec_name() -> str:
+    return _codec
+
+
+def loads(data) -> Any:
+    """Decode str or bytes"""
+    return CODECS[_codec][0](data)
+
+
+def dumps(obj, default: Optional[Callable] = None, ensure_ascii: bool = True) -> str:
+    """Encode compactly, separators (",", ":"), non-ASCII escaped by default"""
+    return CODECS[_codec][1](obj, default, ensure_ascii)
@@ -152,6 +152,49 @@ class UploadAlbumMixin:
         Media
             An object of Media class
         """
+        children = self.album_rupload(paths)
+        for attempt in range(50):
+            self.logger.debug(f"Attempt #{attempt} to configure Album: {paths}")
+            self.sleep(configure_timeout)
+            try:
+                configured = (configure_handler or self.album_configure)(
+                    children, caption, usertags, location, extra_data=extra_data
+                )
+            except Exception as e:
+                if "Transcode not finished yet" in str(e):
+                    """
+                    Response 202 status:
+                    {"message": "Transcode not finished yet.", "status": "fail"}
+                    """
+                    self.sleep(configure_timeout)
+                    continue
+                raise e
+            else:
+                if configured:
+                    media = configured.get("media")
+                    self.expose()
+                    return extract_media_v1(media)
+        raise (configure_exception or AlbumConfigureError)(
+            response=self.last_response, **self.last_json
+        )
+
+    def album_rupload(self, paths: List[Path]) -> List[Dict]:
+        """
+        Upload the photos and videos of an album without configuring it
+
+        The result can be passed to ``album_configure`` later, e.g. to publish
+        a prepared album at a scheduled time.
+
+        Parameters
+        ----------
+        paths: List[Path]
+            List of paths for media to upload
+
+        Returns
+        -------
+        List[Dict]
+            Children descriptions for ``album_configure``
+        """
         children = []
         for path in paths:
             path = Path(path)
@@ -196,31 +239,7 @@ class UploadAlbumMixin:
                 self.photo_rupload(thumbnail, upload_id)
             else:
                 raise AlbumUnknownFormat()
-
-        for attempt in range(50):
-            self.logger.debug(f"Attempt #{attempt} to configure Album: {paths}")
-            time.sleep(configure_timeout)
-            try:
-                configured = (configure_handler or self.album_configure)(
-                    children, caption, usertags, location, extra_data=extra_data
-                )
-            except Exception as e:
-                if "Transcode not finished yet" in str(e):
-                    """
-                    Response 202 status:
-                    {"message": "Transcode not finished yet.", "status": "fail"}
-                    """
-                    time.sleep(configure_timeout)
-                    continue
-                raise e
-            else:
-                if configured:
-                    media = configured.get("media")
-                    self.expose()
-                    return extract_media_v1(media)
-        raise (configure_exception or AlbumConfigureError)(
-            response=self.last_response, **self.last_json
-        )
+        return children
 
     def album_configure(
         self,
@@ -7,8 +7,10 @@ from typing import Dict
 
 import requests
 
+from instagrapi import config
 from instagrapi.exceptions import (
     ChallengeError,
+    ChallengeParked,
     ChallengeRedirection,
     ChallengeRequired,
     ChallengeSelfieCaptcha,
@@ -109,7 +111,11 @@ class ChallengeResolveMixin:
             A boolean value
         """
         result = self.last_json
-        challenge_url = "https://i.instagram.com%s" % challenge_url
+        challenge_url = "%s://%s%s" % (
+            config.API_SCHEME,
+            config.API_DOMAIN,
+            challenge_url,
+        )
         enc_password = "#PWD_INSTAGRAM_BROWSER:0:%s:" % str(int(time.time()))
         instagram_ajax = hashlib.sha256(enc_password.encode()).hexdigest()[:12]
         session = requests.Session()
@@ -140,7 +146,7 @@ class ChallengeResolveMixin:
         for key, value in self.private.cookies.items():
             if key in ["mid", "csrftoken"]:
                 session.cookies.set(key, value)
-        time.sleep(WAIT_SECONDS)
+        self.sleep(WAIT_SECONDS)
         result = session.get(challenge_url)  # render html form
         session.headers.update(
             {
@@ -157,12 +163,12 @@ class ChallengeResolveMixin:
                 "referer": challenge_url,
             }
         )
-        time.sleep(WAIT_SECONDS)
+        self.sleep(WAIT_SECONDS)
         choice = ChallengeChoice.EMAIL
         result = session.post(challenge_url, {"choice": choice})
         result = result.json()
         for retry in range(8):
-            time.sleep(WAIT_SECONDS)
+            self.sleep(WAIT_SECONDS)
             try:
                 # FORM TO ENTER CODE
                 result = self.handle_challenge_result(result)
@@ -192,13 +198,25 @@ class ChallengeResolveMixin:
             "VerifySMSCodeFormForSMSCaptcha",
         ), result
         for retry_code in range(5):
+            if self.challenge_park:
+                raise ChallengeParked(
+                    f"Challenge code required for {self.username} (contact form)",
+                    state={
+                        "flow": "contact_form",
+                        "challenge_url": challenge_url,
+                        "choice": choice.name,
+                        "enc_password": enc_password,
+                        "headers": dict(session.headers),
+                        "cookies": session.cookies.get_dict(),
+                    },
+                )
             for attempt in range(1, 11):
                 code = self.challenge_code_handler(self.username, choice)
                 if code:
                     break
-                time.sleep(WAIT_SECONDS * attempt)
+                self.sleep(WAIT_SECONDS * attempt)
             # SEND CODE
-            time.sleep(WAIT_SECONDS)
+            self.sleep(WAIT_SECONDS)
             result = session.post(challenge_url, {"security_code": code}).json()
             result = result.get("challenge", result)
             if (
@@ -206,6 +224,19 @@ class ChallengeResolveMixin:
                 not in (result.get("errors") or [""])[0]
             ):
                 break
+        return self._challenge_contact_form_finish(session, result, enc_password)
+
+    def _challenge_contact_form_finish(
+        self, session: requests.Session, result: Dict, enc_password: str
+    ) -> bool:
+        """
+        Approve contact data after the code of the contact form was accepted
+
+        Returns
+        -------
+        bool
+            A boolean value
+        """
         # FORM TO APPROVE CONTACT DATA
         challenge_type = result.get("challengeType")
         if challenge_type == "LegacyForceSetNewPasswordForm":
@@ -223,9 +254,14 @@ class ChallengeResolveMixin:
             assert (
                 not detail or detail in details
             ), 'ChallengeResolve: Data invalid: "%s" not in %s' % (detail, details)
-        time.sleep(WAIT_SECONDS)
+        self.sleep(WAIT_SECONDS)
         result = session.post(
-            "https://i.instagram.com%s" % result.get("navigation").get("forward"),
+            "%s://%s%s"
+            % (
+                config.API_SCHEME,
+                config.API_DOMAIN,
+                result.get("navigation").get("forward"),
+            ),
             {
                 "choice": 0,  # I AGREE
                 "enc_new_password1": enc_password,
@@ -415,20 +451,8 @@ class ChallengeResolveMixin:
                         f'ChallengeResolve: Choice "email" or "phone_number" '
                         f"(sms) not available to this account {self.last_json}"
                     )
-            wait_seconds = 5
-            for attempt in range(24):
-                code = self.challenge_code_handler(self.username, ChallengeChoice.EMAIL)
-                if code:
-                    break
-                time.sleep(wait_seconds)
-            print(
-                f'Code entered "{code}" for {self.username} ({attempt} attempts by {wait_seconds} seconds)'
-            )
-            self._send_private_request(challenge_url, {"security_code": code})
-            # assert 'logged_in_user' in client.last_json
-            assert self.last_json.get("action", "") == "close"
-            assert self.last_json.get("status", "") == "ok"
-            return True
+            code = self._challenge_wait_code(challenge_url, step_name)
+            return self._challenge_submit_code(challenge_url, step_name, code)
         elif step_name == "":
             assert self.last_json.get("action", "") == "close"
             assert self.last_json.get("status", "") == "ok"
@@ -444,12 +468,22 @@ class ChallengeResolveMixin:
             #      "challenge_type_enum": "PASSWORD_RESET"}',
             #  'challenge_type_enum_str': 'PASSWORD_RESET',
             #  'status': 'ok'}
+            if self.challenge_park:
+                raise ChallengeParked(
+                    f"New password required for {self.username} ({step_name})",
+                    state={
+                        "flow": "private",
+                        "challenge_url": challenge_url,
+                        "step_name": step_name,
+                        "challenge_context": self.last_json["challenge_context"],
+                    },
+                )
             wait_seconds = 5
             for attempt in range(24):
                 pwd = self.change_password_handler(self.username)
                 if pwd:
                     break
-                time.sleep(wait_seconds)
+                self.sleep(wait_seconds)
             print(
                 f'Password entered "{pwd}" for {self.username} ({attempt} attempts by {wait_seconds} seconds)'
             )
@@ -493,47 +527,139 @@ class ChallengeResolveMixin:
                     f'ChallengeResolve: Choice "email" or "phone_number" (sms) '
                     f"not available to this account {self.last_json}"
                 )
-            wait_seconds = 5
-            for attempt in range(24):
-                code = self.challenge_code_handler(self.username, ChallengeChoice.EMAIL)
-                if code:
-                    break
-                time.sleep(wait_seconds)
-            print(
-                f'Code entered "{code}" for {self.username} ({attempt} attempts by {wait_seconds} seconds)'
-            )
-            self._send_private_request(challenge_url, {"security_code": code})
-
-            if self.last_json.get("action", "") == "close":
-                assert self.last_json.get("status", "") == "ok"
-                return True
-
-            # last form to verify account details
-            assert (
-                self.last_json["step_name"] == "review_contact_point_change"
-            ), f"Unexpected step_name {self.last_json['step_name']}"
-
-            # details = self.last_json["step_data"]
-
-            # TODO: add validation of account details
-            # assert self.username == details['username'], \
-            #     f"Data invalid: {self.username} does not match {details['username']}"
-            # assert self.email == details['email'], \
-            #     f"Data invalid: {self.email} does not match {details['email']}"
-            # assert self.phone_number == details['phone_number'], \
-            #     f"Data invalid: {self.phone_number} does not match {details['phone_number']}"
-
-            # "choice": 0 ==> details look good
-            self._send_private_request(challenge_url, {"choice": 0})
-
-            # TODO: assert that the user is now logged in.
-            # # assert 'logged_in_user' in client.last_json
-            # assert self.last_json.get("action", "") == "close"
-            # assert self.last_json.get("status", "") == "ok"
-            return True
+            code = self._challenge_wait_code(challenge_url, step_name)
+            return self._challenge_submit_code(challenge_url, step_name, code)
         else:
             raise ChallengeUnknownStep(
                 f'ChallengeResolve: Unknown step_name "{step_name}" for '
                 f'"{self.username}" in challenge resolver: {self.last_json}'
             )
         return True
+
+    def _challenge_wait_code(self, challenge_url: str, step_name: str) -> str:
+        """
+        Get the security code from challenge_code_handler, or park the
+        challenge when challenge_park is set
+
+        Raises
+        ------
+        ChallengeParked
+        """
+        if self.challenge_park:
+            raise ChallengeParked(
+                f"Challenge code required for {self.username} ({step_name})",
+                state={
+                    "flow": "private",
+                    "challenge_url": challenge_url,
+                    "step_name": step_name,
+                    "choice": ChallengeChoice.EMAIL.name,
+                },
+            )
+        wait_seconds = 5
+        for attempt in range(24):
+            code = self.challenge_code_handler(self.username, ChallengeChoice.EMAIL)
+            if code:
+                break
+            self.sleep(wait_seconds)
+        print(
+            f'Code entered "{code}" for {self.username} ({attempt} attempts by {wait_seconds} seconds)'
+        )
+        return code
+
+    def _challenge_submit_code(
+        self, challenge_url: str, step_name: str, code: str
+    ) -> bool:
+        """
+        Send the security code of a private api challenge
+
+        Returns
+        -------
+        bool
+            A boolean value
+        """
+        self._send_private_request(challenge_url, {"security_code": code})
+        if step_name != "select_contact_point_recovery":
+            # assert 'logged_in_user' in client.last_json
+            assert self.last_json.get("action", "") == "close"
+            assert self.last_json.get("status", "") == "ok"
+            return True
+
+        if self.last_json.get("action", "") == "close":
+            assert self.last_json.get("status", "") == "ok"
+            return True
+
+        # last form to verify account details
+        assert (
+            self.last_json["step_name"] == "review_contact_point_change"
+        ), f"Unexpected step_name {self.last_json['step_name']}"
+
+        # details = self.last_json["step_data"]
+
+        # TODO: add validation of account details
+        # assert self.username == details['username'], \
+        #     f"Data invalid: {self.username} does not match {details['username']}"
+        # assert self.email == details['email'], \
+        #     f"Data invalid: {self.email} does not match {details['email']}"
+        # assert self.phone_number == details['phone_number'], \
+        #     f"Data invalid: {self.phone_number} does not match {details['phone_number']}"
+
+        # "choice": 0 ==> details look good
+        self._send_private_request(challenge_url, {"choice": 0})
+
+        # TODO: assert that the user is now logged in.
+        # # assert 'logged_in_user' in client.last_json
+        # assert self.last_json.get("action", "") == "close"
+        # assert self.last_json.get("status", "") == "ok"
+        return True
+
+    def challenge_resume(self, state: Dict, code: str) -> bool:
+        """
+        Finish a challenge parked by ChallengeParked
+
+        The client must carry the same session (settings and proxy) as when
+        the challenge was parked.
+
+        Parameters
+        ----------
+        state: Dict
+            ChallengeParked.state
+        code: str
+            Security code, or the new password for the change_password step
+
+        Returns
+        -------
+        bool
+            A boolean value
+
+        Raises
+        ------
+        ChallengeParked
+            The contact form rejected the code; submit another one
+        """
+        if state.get("flow") == "contact_form":
+            session = requests.Session()
+            session.verify = False
+            session.proxies = self.private.proxies
+            session.headers.update(state["headers"])
+            for key, value in state["cookies"].items():
+                session.cookies.set(key, value)
+            result = session.post(
+                state["challenge_url"], {"security_code": code}
+            ).json()
+            result = result.get("challenge", result)
+            if (
+                "Please check the code we sent you and try again"
+                in (result.get("errors") or [""])[0]
+            ):
+                raise ChallengeParked(
+                    f"Wrong challenge code for {self.username} (contact form)",
+                    state=state,
+                )
+            return self._challenge_contact_form_finish(
+                session, result, state["enc_password"]
+            )
+        if state["step_name"] == "change_password":
+            return self.bloks_change_password(code, state["challenge_context"])
+        return self._challenge_submit_code(
+            state["challenge_url"], state["step_name"], code
+        )
@@ -9,13 +9,10 @@ from uuid import uuid4
 from instagrapi import config
 from instagrapi.exceptions import ClientError, ClipConfigureError, ClipNotUpload
 from instagrapi.extractors import extract_media_v1
+from instagrapi.image_util import pil_image
 from instagrapi.types import Location, Media, Track, Usertag
 from instagrapi.utils import date_time_original
-
-try:
-    from PIL import Image
-except ImportError:
-    raise Exception("You don't have PIL installed. Please install PIL or Pillow>=8.1.1")
+from instagrapi.video_probe import video_metadata
 
 
 class DownloadClipMixin:
@@ -134,8 +131,10 @@ class UploadClipMixin:
             "X-Entity-Type": "video/mp4",
         }
         response = self.private.get(
-            "https://{domain}/rupload_igvideo/{name}".format(
-                domain=config.API_DOMAIN, name=upload_name
+            "{scheme}://{domain}/rupload_igvideo/{name}".format(
+                scheme=config.API_SCHEME,
+                domain=config.API_DOMAIN,
+                name=upload_name,
             ),
             headers=headers,
         )
@@ -154,8 +153,10 @@ class UploadClipMixin:
             **headers,
         }
         response = self.private.post(
-            "https://{domain}/rupload_igvideo/{name}".format(
-                domain=config.API_DOMAIN, name=upload_name
+            "{scheme}://{domain}/rupload_igvideo/{name}".format(
+                scheme=config.API_SCHEME,
+                domain=config.API_DOMAIN,
+                name=upload_name,
             ),
             data=clip_data,
             headers=headers,
@@ -167,7 +168,7 @@ class UploadClipMixin:
         # self.igtv_composer_session_id = self.generate_uuid()  #issue
         for attempt in range(50):
             self.logger.debug(f"Attempt #{attempt} to configure CLIP: {path}")
-            time.sleep(configure_timeout)
+            self.sleep(configure_timeout)
             try:
                 configured = self.clip_configure(
                     upload_id,
@@ -187,7 +188,7 @@ class UploadClipMixin:
                     Response 202 status:
                     {"message": "Transcode not finished yet.", "status": "fail"}
                     """
-                    time.sleep(configure_timeout)
+                    self.sleep(configure_timeout)
                     continue
                 raise e
             else:
@@ -388,23 +389,12 @@ def analyze_video(path: Path, thumbnail: Path = None) -> tuple:
     Tuple
         A tuple with (thumbail path, width, height, duration)
     """
-    try:
-        import moviepy.editor as mp
-    except ImportError:
-        try:
-            import moviepy as mp
-        except ImportError:
-            raise Exception("Please install moviepy>=1.0.3 and retry")
-
     print(f'Analyzing CLIP file "{path}"')
-    video = mp.VideoFileClip(str(path))
-    width, height = video.size
-    if not thumbnail:
-        thumbnail = f"{path}.jpg"
-        print(f'Generating thumbnail "{thumbnail}"...')
-        video.save_frame(thumbnail, t=(video.duration / 2))
+    generate = not thumbnail
+    width, height, duration, thumbnail = video_metadata(path, thumbnail)
+    if generate:
         crop_thumbnail(thumbnail)
-    return thumbnail, width, height, video.duration
+    return thumbnail, width, height, duration
 
 
 def crop_thumbnail(path: Path) -> bool:
@@ -421,7 +411,7 @@ def crop_thumbnail(path: Path) -> bool:
     bool
         A boolean value
     """
-    im = Image.open(str(path))
+    im = pil_image().open(str(path))
     width, height = im.size
     offset = (height / 1.78) / 2
     center = width / 2
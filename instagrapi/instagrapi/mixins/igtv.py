@@ -1,4 +1,3 @@
-import contextlib
 import json
 import random
 import time
@@ -9,13 +8,10 @@ from uuid import uuid4
 from instagrapi import config
 from instagrapi.exceptions import ClientError, IGTVConfigureError, IGTVNotUpload
 from instagrapi.extractors import extract_media_v1
+from instagrapi.image_util import pil_image
 from instagrapi.types import Location, Media, Usertag
 from instagrapi.utils import date_time_original
-
-try:
-    from PIL import Image
-except ImportError:
-    raise Exception("You don't have PIL installed. Please install PIL or Pillow>=8.1.1")
+from instagrapi.video_probe import video_metadata
 
 
 class DownloadIGTVMixin:
@@ -136,8 +132,10 @@ class UploadIGTVMixin:
             "X-Entity-Type": "video/mp4",
         }
         response = self.private.get(
-            "https://{domain}/rupload_igvideo/{name}".format(
-                domain=config.API_DOMAIN, name=upload_name
+            "{scheme}://{domain}/rupload_igvideo/{name}".format(
+                scheme=config.API_SCHEME,
+                domain=config.API_DOMAIN,
+                name=upload_name,
             ),
             headers=headers,
         )
@@ -156,8 +154,10 @@ class UploadIGTVMixin:
             **headers,
         }
         response = self.private.post(
-            "https://{domain}/rupload_igvideo/{name}".format(
-                domain=config.API_DOMAIN, name=upload_name
+            "{scheme}://{domain}/rupload_igvideo/{name}".format(
+                scheme=config.API_SCHEME,
+                domain=config.API_DOMAIN,
+                name=upload_name,
             ),
             data=igtv_data,
             headers=headers,
@@ -169,7 +169,7 @@ class UploadIGTVMixin:
         self.igtv_composer_session_id = self.generate_uuid()
         for attempt in range(50):
             self.logger.debug(f"Attempt #{attempt} to configure IGTV: {path}")
-            time.sleep(configure_timeout)
+            self.sleep(configure_timeout)
             try:
                 configured = self.igtv_configure(
                     upload_id,
@@ -189,7 +189,7 @@ class UploadIGTVMixin:
                     Response 202 status:
                     {"message": "Transcode not finished yet.", "status": "fail"}
                     """
-                    time.sleep(configure_timeout)
+                    self.sleep(configure_timeout)
                     continue
                 raise e
             else:
@@ -292,25 +292,12 @@ def analyze_video(path: Path, thumbnail: Path = None) -> tuple:
     Tuple
         A tuple with (thumbail path, width, height, duration)
     """
-    try:
-        import moviepy.editor as mp
-    except ImportError:
-        try:
-            import moviepy as mp
-        except ImportError:
-            raise Exception("Please install moviepy>=1.0.3 and retry")
-
     print(f'Analyzing IGTV file "{path}"')
-    with contextlib.ExitStack() as stack:
-        video = mp.VideoFileClip(str(path))
-        width, height = video.size
-        if not thumbnail:
-            thumbnail = f"{path}.jpg"
-            print(f'Generating thumbnail "{thumbnail}"...')
-            video.save_frame(thumbnail, t=(video.duration / 2))
-            crop_thumbnail(thumbnail)
-        stack.enter_context(contextlib.closing(video))
-    return thumbnail, width, height, video.duration
+    generate = not thumbnail
+    width, height, duration, thumbnail = video_metadata(path, thumbnail)
+    if generate:
+        crop_thumbnail(thumbnail)
+    return thumbnail, width, height, duration
 
 
 def crop_thumbnail(path: Path) -> bool:
@@ -327,7 +314,7 @@ def crop_thumbnail(path: Path) -> bool:
     bool
         A boolean value
     """
-    im = Image.open(str(path))
+    im = pil_image().open(str(path))
     width, height = im.size
     offset = (height / 1.78) / 2
     center = width / 2
@@ -1,4 +1,3 @@
-import time
 from typing import Dict, List
 
 from instagrapi.exceptions import ClientError, MediaError, UserError
@@ -131,7 +130,7 @@ class InsightsMixin:
                 break
             if count and len(medias) >= count:
                 break
-            time.sleep(sleep)
+            self.sleep(sleep)
         if count:
             medias = medias[:count]
         return medias
@@ -1,6 +1,5 @@
 import json
 import random
-import time
 from copy import deepcopy
 from datetime import datetime
 from typing import Dict, List, Tuple
@@ -525,7 +524,7 @@ class MediaMixin:
                 break
             if amount and len(medias) >= amount:
                 break
-            time.sleep(sleep)
+            self.sleep(sleep)
         if amount:
             medias = medias[:amount]
         return medias
@@ -1051,7 +1050,7 @@ class MediaMixin:
                 break
             if amount and len(medias) >= amount:
                 break
-            time.sleep(sleep)
+            self.sleep(sleep)
         if amount:
             medias = medias[:amount]
         return [extract_media_gql(media) for media in medias]
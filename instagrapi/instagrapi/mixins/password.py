@@ -5,6 +5,8 @@ from Cryptodome.Cipher import AES, PKCS1_v1_5
 from Cryptodome.PublicKey import RSA
 from Cryptodome.Random import get_random_bytes
 
+from instagrapi import config
+
 
 class PasswordMixin:
     def password_encrypt(self, password):
@@ -36,7 +38,9 @@ class PasswordMixin:
         return f"#PWD_INSTAGRAM:4:{timestamp}:{payload.decode()}"
 
     def password_publickeys(self):
-        resp = self.public.get("https://i.instagram.com/api/v1/qe/sync/")
+        resp = self.public.get(
+            f"{config.API_SCHEME}://{config.API_DOMAIN}/api/v1/qe/sync/"
+        )
         publickeyid = int(resp.headers.get("ig-set-password-encryption-key-id"))
         publickey = resp.headers.get("ig-set-password-encryption-pub-key")
         return publickeyid, publickey
@@ -16,7 +16,7 @@ from instagrapi.exceptions import (
     PhotoNotUpload,
 )
 from instagrapi.extractors import extract_media_v1
-from instagrapi.image_util import prepare_image
+from instagrapi.image_util import pil_image, prepare_image
 from instagrapi.types import (
     Location,
     Media,
@@ -32,11 +32,6 @@ from instagrapi.types import (
 )
 from instagrapi.utils import date_time_original, dumps
 
-try:
-    from PIL import Image
-except ImportError:
-    raise Exception("You don't have PIL installed. Please install PIL or Pillow>=8.1.1")
-
 
 class DownloadPhotoMixin:
     """
@@ -203,8 +198,10 @@ class UploadPhotoMixin:
             "Content-Length": photo_len,
         }
         response = self.private.post(
-            "https://{domain}/rupload_igphoto/{name}".format(
-                domain=config.API_DOMAIN, name=upload_name
+            "{scheme}://{domain}/rupload_igphoto/{name}".format(
+                scheme=config.API_SCHEME,
+                domain=config.API_DOMAIN,
+                name=upload_name,
             ),
             data=photo_data,
             headers=headers,
@@ -216,7 +213,7 @@ class UploadPhotoMixin:
             )
             last_json = self.last_json  # local variable for read in sentry
             raise PhotoNotUpload(response.text, response=response, **last_json)
-        with Image.open(path) as im:
+        with pil_image().open(path) as im:
             width, height = im.size
         return upload_id, width, height
 
@@ -262,7 +259,7 @@ class UploadPhotoMixin:
         upload_id, width, height = self.photo_rupload(path, upload_id)
         for attempt in range(10):
             self.logger.debug(f"Attempt #{attempt} to configure Photo: {path}")
-            time.sleep(3)
+            self.sleep(3)
             if self.photo_configure(
                 upload_id,
                 width,
@@ -402,7 +399,7 @@ class UploadPhotoMixin:
         upload_id, width, height = self.photo_rupload(path, upload_id, for_story=True)
         for attempt in range(10):
             self.logger.debug(f"Attempt #{attempt} to configure Photo: {path}")
-            time.sleep(3)
+            self.sleep(3)
             if self.photo_configure_to_story(
                 upload_id,
                 width,
@@ -1,14 +1,16 @@
-import json
 import logging
 import random
 import time
+from contextlib import contextmanager
 from json.decoder import JSONDecodeError
+from typing import Optional
 
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
-from instagrapi import config
+from instagrapi import config, json_codec
+from instagrapi.cancellation import CancelToken, attached_tokens
 from instagrapi.exceptions import (
     BadPassword,
     ChallengeRequired,
@@ -29,13 +31,20 @@ from instagrapi.exceptions import (
     PrivateAccount,
     ProxyAddressIsBlocked,
     RateLimitError,
+    RequestCancelled,
     SentryBlock,
     TwoFactorRequired,
     UnknownError,
     UserNotFound,
     VideoTooLongException,
 )
-from instagrapi.utils import dumps, generate_signature, random_delay
+from instagrapi.metrics import (
+    RequestEvent,
+    RequestMetrics,
+    mask_proxy,
+    normalize_endpoint,
+)
+from instagrapi.utils import dumps, generate_signature
 
 
 def manual_input_code(self, username: str, choice=None):
@@ -83,6 +92,7 @@ class PrivateRequestMixin:
     domain = config.API_DOMAIN
     last_response = None
     last_json = {}
+    challenge_park = False
 
     def __init__(self, *args, **kwargs):
         # setup request session with retries
@@ -109,8 +119,144 @@ class PrivateRequestMixin:
         self.email = kwargs.pop("email", None)
         self.phone_number = kwargs.pop("phone_number", None)
         self.request_timeout = kwargs.pop("request_timeout", self.request_timeout)
+        self.before_request_hooks = []
+        self.after_response_hooks = []
+        self.request_metrics = RequestMetrics()
         super().__init__(*args, **kwargs)
 
+    def add_request_hook(self, before=None, after=None):
+        """
+        Register request lifecycle callbacks
+
+        Parameters
+        ----------
+        before: callable, optional
+            Called as before(client, event) right before the HTTP call
+        after: callable, optional
+            Called as after(client, event) once the response (or a transport
+            error) is known; event carries status_code, bytes, latency,
+            retries and proxy
+
+        Returns
+        -------
+        bool
+            A boolean value
+        """
+        if before:
+            self.before_request_hooks.append(before)
+        if after:
+            self.after_response_hooks.append(after)
+        return True
+
+    def remove_request_hook(self, hook) -> bool:
+        """
+        Unregister a callback added by add_request_hook
+
+        Parameters
+        ----------
+        hook: callable
+
+        Returns
+        -------
+        bool
+            True if the callback was registered
+        """
+        removed = False
+        for hooks in (self.before_request_hooks, self.after_response_hooks):
+            if hook in hooks:
+                hooks.remove(hook)
+                removed = True
+        return removed
+
+    def endpoint_stats(self, template: str = None) -> dict:
+        """
+        Rolling per-endpoint latency (seconds) and error statistics
+
+        Parameters
+        ----------
+        template: str, optional
+            Endpoint template, e.g. "/v1/users/{id}/info/"
+
+        Returns
+        -------
+        dict
+            {template: {"count", "errors", "error_rate", "p50", "p95", "p99", ...}}
+        """
+        return self.request_metrics.stats(template)
+
+    def _run_request_hooks(self, hooks, event: RequestEvent):
+        for hook in list(hooks):
+            try:
+                hook(self, event)
+            except Exception as e:
+                self.logger.warning("Request hook %r failed: %s", hook, e)
+
+    def _finish_request_event(self, event: RequestEvent, response, started: float):
+        event.latency = time.perf_counter() - started
+        if response is not None:
+            event.status_code = response.status_code
+            body = response.request.body if response.request else None
+            event.bytes_sent = len(body) if body else 0
+            event.bytes_received = len(response.content or b"")
+            retries = getattr(getattr(response, "raw", None), "retries", None)
+            event.retries = len(getattr(retries, "history", None) or ())
+        self.request_metrics.record(event)
+        self._run_request_hooks(self.after_response_hooks, event)
+
+    @contextmanager
+    def cancellable(self, token: CancelToken):
+        """
+        Attach a CancelToken for the duration of the block
+
+        Every request and client side wait inside the block checks the token
+        and raises RequestCancelled (or DeadlineExceeded) once it is cancelled.
+        The token only applies to the current thread or asyncio task, other
+        callers sharing this client keep running.
+
+        Parameters
+        ----------
+        token: CancelToken
+            Token to check
+        """
+        tokens = dict(attached_tokens.get())
+        tokens[id(self)] = token
+        reset = attached_tokens.set(tokens)
+        try:
+            yield token
+        finally:
+            attached_tokens.reset(reset)
+
+    @property
+    def cancel_token(self) -> Optional[CancelToken]:
+        """
+        CancelToken attached to this client in the current thread or task
+        """
+        return attached_tokens.get().get(id(self))
+
+    def check_cancelled(self):
+        """
+        Raise if the attached CancelToken is cancelled or past its deadline
+
+        Returns
+        -------
+        Void
+        """
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def sleep(self, seconds: float):
+        """
+        Sleep that wakes up when the attached CancelToken is cancelled
+
+        Returns
+        -------
+        Void
+        """
+        if self.cancel_token is not None:
+            self.cancel_token.sleep(seconds)
+        elif seconds > 0:
+            time.sleep(seconds)
+
     def small_delay(self):
         """
         Small Delay
@@ -119,7 +265,7 @@ class PrivateRequestMixin:
         -------
         Void
         """
-        time.sleep(random.uniform(0.75, 3.75))
+        self.sleep(random.uniform(0.75, 3.75))
 
     def very_small_delay(self):
         """
@@ -129,7 +275,7 @@ class PrivateRequestMixin:
         -------
         Void
         """
-        time.sleep(random.uniform(0.175, 0.875))
+        self.sleep(random.uniform(0.175, 0.875))
 
     @property
     def base_headers(self):
@@ -295,7 +441,7 @@ class PrivateRequestMixin:
 
     @staticmethod
     def with_query_params(data, params):
-        return dict(data, **{"query_params": json.dumps(params, separators=(",", ":"))})
+        return dict(data, **{"query_params": json_codec.dumps(params)})
 
     def _send_private_request(
         self,
@@ -308,13 +454,15 @@ class PrivateRequestMixin:
         extra_sig=None,
         domain: str = None,
     ):
+        self.check_cancelled()
         self.last_response = None
         self.last_json = last_json = {}  # for Sentry context in traceback
         self.private.headers.update(self.base_headers)
         if headers:
             self.private.headers.update(headers)
         if not login:
-            time.sleep(self.request_timeout)
+            self.sleep(self.request_timeout)
+            self.check_cancelled()
         # if self.user_id and login:
         #     raise Exception(f"User already logged ({self.user_id})")
         try:
@@ -324,27 +472,45 @@ class PrivateRequestMixin:
             if endpoint == "/challenge/":  # wow so hard, is it safe tho?
                 endpoint = "/v1/challenge/"
 
-            api_url = f"https://{domain or config.API_DOMAIN}/api{endpoint}"
+            api_url = (
+                f"{config.API_SCHEME}://{domain or config.API_DOMAIN}/api{endpoint}"
+            )
             self.logger.info(api_url)
-            if data:  # POST
-                # Client.direct_answer raw dict
-                # data = json.dumps(data)
-                self.private.headers[
-                    "Content-Type"
-                ] = "application/x-www-form-urlencoded; charset=UTF-8"
-                if with_signature:
-                    # Client.direct_answer doesn't need a signature
-                    data = generate_signature(dumps(data))
-                    if extra_sig:
-                        data += "&".join(extra_sig)
-                response = self.private.post(
-                    api_url, data=data, params=params, proxies=self.private.proxies
-                )
-            else:  # GET
-                self.private.headers.pop("Content-Type", None)
-                response = self.private.get(
-                    api_url, params=params, proxies=self.private.proxies
-                )
+            event = RequestEvent(
+                method="POST" if data else "GET",
+                endpoint=endpoint,
+                template=normalize_endpoint(endpoint),
+                url=api_url,
+                proxy=mask_proxy((self.private.proxies or {}).get("https")),
+            )
+            self._run_request_hooks(self.before_request_hooks, event)
+            response = None
+            started = time.perf_counter()
+            try:
+                if data:  # POST
+                    # Client.direct_answer raw dict
+                    # data = json.dumps(data)
+                    self.private.headers[
+                        "Content-Type"
+                    ] = "application/x-www-form-urlencoded; charset=UTF-8"
+                    if with_signature:
+                        # Client.direct_answer doesn't need a signature
+                        data = generate_signature(dumps(data))
+                        if extra_sig:
+                            data += "&".join(extra_sig)
+                    response = self.private.post(
+                        api_url, data=data, params=params, proxies=self.private.proxies
+                    )
+                else:  # GET
+                    self.private.headers.pop("Content-Type", None)
+                    response = self.private.get(
+                        api_url, params=params, proxies=self.private.proxies
+                    )
+            except requests.RequestException as e:
+                event.error = e.__class__.__name__
+                raise
+            finally:
+                self._finish_request_event(event, response, started)
             self.logger.debug(
                 "private_request %s: %s (%s)",
                 response.status_code,
@@ -358,7 +524,7 @@ class PrivateRequestMixin:
             self.last_response = response
             response.raise_for_status()
             # last_json - for Sentry context in traceback
-            self.last_json = last_json = response.json()
+            self.last_json = last_json = json_codec.loads(response.content)
             self.logger.debug("last_json %s", last_json)
         except JSONDecodeError as e:
             self.logger.error(
@@ -374,7 +540,7 @@ class PrivateRequestMixin:
             )
         except requests.HTTPError as e:
             try:
-                self.last_json = last_json = response.json()
+                self.last_json = last_json = json_codec.loads(response.content)
             except JSONDecodeError:
                 pass
             message = last_json.get("message", "")
@@ -530,17 +696,19 @@ class PrivateRequestMixin:
         )
         try:
             if self.delay_range:
-                random_delay(delay_range=self.delay_range)
+                self.sleep(random.uniform(self.delay_range[0], self.delay_range[1]))
             self.private_requests_count += 1
             self._send_private_request(endpoint, **kwargs)
         except ClientRequestTimeout:
             self.logger.info(
                 "Wait 60 seconds and try one more time (ClientRequestTimeout)"
             )
-            time.sleep(60)
+            self.sleep(60)
             return self._send_private_request(endpoint, **kwargs)
         # except BadPassword as e:
         #     raise e
+        except RequestCancelled:
+            raise
         except Exception as e:
             if self.handle_exception:
                 self.handle_exception(self, e)
@@ -1,16 +1,13 @@
-import json
 import logging
+import random
 import time
-
-try:
-    from simplejson.errors import JSONDecodeError
-except ImportError:
-    from json.decoder import JSONDecodeError
+from json.decoder import JSONDecodeError
 
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+from instagrapi import json_codec
 from instagrapi.exceptions import (
     ClientBadRequestError,
     ClientConnectionError,
@@ -24,7 +21,6 @@ from instagrapi.exceptions import (
     ClientThrottledError,
     ClientUnauthorizedError,
 )
-from instagrapi.utils import random_delay
 
 
 class PublicRequestMixin:
@@ -96,7 +92,7 @@ class PublicRequestMixin:
         for iteration in range(retries_count):
             try:
                 if self.delay_range:
-                    random_delay(delay_range=self.delay_range)
+                    self.sleep(random.uniform(self.delay_range[0], self.delay_range[1]))
                 return self._send_public_request(url, update_headers=update_headers, **kwargs)
             except (
                 ClientLoginRequired,
@@ -118,7 +114,7 @@ class PublicRequestMixin:
                 ):
                     raise e
                 if retries_count > iteration + 1:
-                    time.sleep(retries_timeout)
+                    self.sleep(retries_timeout)
                 else:
                     raise e
                 continue
@@ -126,6 +122,7 @@ class PublicRequestMixin:
     def _send_public_request(
         self, url, data=None, params=None, headers=None, return_json=False, stream=None, timeout=None, update_headers=None
     ):
+        self.check_cancelled()
         self.public_requests_count += 1
         if headers:
             if update_headers in [None, True] :
@@ -133,9 +130,10 @@ class PublicRequestMixin:
             elif update_headers == False :
                 pass
         if self.last_response_ts and (time.time() - self.last_response_ts) < 1.0:
-            time.sleep(1.0)
+            self.sleep(1.0)
         if self.request_timeout:
-            time.sleep(self.request_timeout)
+            self.sleep(self.request_timeout)
+        self.check_cancelled()
         try:
             if data is not None:  # POST
                 response = self.public.data(
@@ -181,7 +179,7 @@ class PublicRequestMixin:
             self.last_public_response = response
             response.raise_for_status()
             if return_json:
-                self.last_public_json = response.json()
+                self.last_public_json = json_codec.loads(response.content)
                 return self.last_public_json
             return response.text
 
@@ -249,7 +247,7 @@ class PublicRequestMixin:
         headers=None,
     ):
         assert query_id or query_hash, "Must provide valid one of: query_id, query_hash"
-        default_params = {"variables": json.dumps(variables, separators=(",", ":"))}
+        default_params = {"variables": json_codec.dumps(variables)}
         if query_id:
             default_params["query_id"] = query_id
 
@@ -283,7 +281,7 @@ class PublicRequestMixin:
         except ClientBadRequestError as e:
             message = None
             try:
-                body_json = e.response.json()
+                body_json = json_codec.loads(e.response.content)
                 message = body_json.get("message", None)
             except JSONDecodeError:
                 pass
@@ -171,7 +171,7 @@ class UserMixin:
         data = extract_user_gql(
             json.loads(
                 self.public_request(
-                    f"https://www.instagram.com/api/v1/users/web_profile_info/?username={username}",
+                    f"{self.PUBLIC_API_URL}api/v1/users/web_profile_info/?username={username}",
                     headers=temporary_public_headers,
                     update_headers=False,
                 )
@@ -30,6 +30,7 @@ from instagrapi.types import (
     Usertag,
 )
 from instagrapi.utils import date_time_original, dumps
+from instagrapi.video_probe import video_metadata
 
 
 class DownloadVideoMixin:
@@ -207,8 +208,10 @@ class UploadVideoMixin:
         if to_album:
             headers = {"Segment-Start-Offset": "0", "Segment-Type": "3", **headers}
         response = self.private.get(
-            "https://{domain}/rupload_igvideo/{name}".format(
-                domain=config.API_DOMAIN, name=upload_name
+            "{scheme}://{domain}/rupload_igvideo/{name}".format(
+                scheme=config.API_SCHEME,
+                domain=config.API_DOMAIN,
+                name=upload_name,
             ),
             headers=headers,
         )
@@ -228,8 +231,10 @@ class UploadVideoMixin:
             **headers,
         }
         response = self.private.post(
-            "https://{domain}/rupload_igvideo/{name}".format(
-                domain=config.API_DOMAIN, name=upload_name
+            "{scheme}://{domain}/rupload_igvideo/{name}".format(
+                scheme=config.API_SCHEME,
+                domain=config.API_DOMAIN,
+                name=upload_name,
             ),
             data=video_data,
             headers=headers,
@@ -279,7 +284,7 @@ class UploadVideoMixin:
         )
         for attempt in range(50):
             self.logger.debug(f"Attempt #{attempt} to configure Video: {path}")
-            time.sleep(3)
+            self.sleep(3)
             try:
                 configured = self.video_configure(
                     upload_id,
@@ -298,7 +303,7 @@ class UploadVideoMixin:
                     Response 202 status:
                     {"message": "Transcode not finished yet.", "status": "fail"}
                     """
-                    time.sleep(10)
+                    self.sleep(10)
                     continue
                 raise e
             else:
@@ -431,7 +436,7 @@ class UploadVideoMixin:
         )
         for attempt in range(50):
             self.logger.debug(f"Attempt #{attempt} to configure Video: {path}")
-            time.sleep(3)
+            self.sleep(3)
             try:
                 configured = self.video_configure_to_story(
                     upload_id,
@@ -455,7 +460,7 @@ class UploadVideoMixin:
                     Response 202 status:
                     {"message": "Transcode not finished yet.", "status": "fail"}
                     """
-                    time.sleep(10)
+                    self.sleep(10)
                     continue
                 raise e
             if configured:
@@ -890,7 +895,7 @@ class UploadVideoMixin:
         )
         for attempt in range(50):
             self.logger.debug(f"Attempt #{attempt} to configure Video: {path}")
-            time.sleep(3)
+            self.sleep(3)
             try:
                 configured = self.video_configure_to_story(
                     upload_id,
@@ -910,7 +915,7 @@ class UploadVideoMixin:
                     Response 202 status:
                     {"message": "Transcode not finished yet.", "status": "fail"}
                     """
-                    time.sleep(10)
+                    self.sleep(10)
                     continue
                 raise e
             if configured and thread_ids:
@@ -935,24 +940,5 @@ def analyze_video(path: Path, thumbnail: Path = None) -> tuple:
         (width, height, duration, thumbnail)
     """
 
-    try:
-        import moviepy.editor as mp
-    except ImportError:
-        try:
-            import moviepy as mp
-        except ImportError:
-            raise Exception("Please install moviepy>=1.0.3 and retry")
-
     print(f'Analyzing video file "{path}"')
-    video = mp.VideoFileClip(str(path))
-    width, height = video.size
-    if not thumbnail:
-        thumbnail = f"{path}.jpg"
-        print(f'Generating thumbnail "{thumbnail}"...')
-        video.save_frame(thumbnail, t=(video.duration / 2))
-    # duration = round(video.duration + 0.001, 3)
-    try:
-        video.close()
-    except AttributeError:
-        pass
-    return width, height, video.duration, thumbnail
+    return video_metadata(path, thumbnail)
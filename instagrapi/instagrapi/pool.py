@@ -0,0 +1,236 @@
+"""
+Connection pools shared between Client instances.
+
+Every Client owns two ``requests.Session`` objects, ``private`` and
+``public``.  Cookies, headers and proxies live on the session, while TCP/TLS
+connections live on the transport adapter.  Mounting one
+``PooledHTTPAdapter`` on the sessions of many clients therefore keeps their
+cookies and headers apart but lets them reuse connections: urllib3 keeps one
+pool per host for direct connections and one ``ProxyManager`` (again with a
+pool per host) per proxy URL, i.e. pools are keyed by (proxy, host).
+
+    pools = ConnectionPoolRegistry(pool_maxsize=32, idle_timeout=120)
+    cl = Client(pool_registry=pools)
+
+Pools unused for ``idle_timeout`` seconds are closed on the next request
+that goes through the registry (or by ``evict_idle()``), which returns their
+file descriptors.  With ``http2=True`` the shared adapters are
+``instagrapi.http2.HTTP2Adapter``: requests are multiplexed over one
+connection per (proxy, host) and idle connections expire after
+``idle_timeout``.
+"""
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from requests.adapters import DEFAULT_POOLBLOCK, HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+def keepalive_socket_options(
+    idle: int = 60, interval: int = 15, count: int = 4
+) -> List[tuple]:
+    """
+    TCP keep-alive socket options, where the platform supports them
+
+    Parameters
+    ----------
+    idle: int
+        Seconds of inactivity before the first probe
+    interval: int
+        Seconds between probes
+    count: int
+        Unanswered probes before the connection is dropped
+    """
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    for name, value in (
+        ("TCP_KEEPIDLE", idle),
+        ("TCP_KEEPALIVE", idle),  # macOS name of TCP_KEEPIDLE
+        ("TCP_KEEPINTVL", interval),
+        ("TCP_KEEPCNT", count),
+    ):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter meant to be mounted on many sessions
+
+    Tracks when each connection pool was last used so idle ones can be
+    closed, and ignores ``close()`` from a single session: the registry
+    owns the pools.
+    """
+
+    def __init__(self, registry: "ConnectionPoolRegistry", **kwargs):
+        self.registry = registry
+        self.last_used: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        super().__init__(
+            pool_connections=registry.pool_connections,
+            pool_maxsize=registry.pool_maxsize,
+            pool_block=registry.pool_block,
+            **kwargs,
+        )
+
+    def init_poolmanager(
+        self, connections, maxsize, block=DEFAULT_POOLBLOCK, **pool_kwargs
+    ):
+        if self.registry.socket_options:
+            pool_kwargs.setdefault("socket_options", self.registry.socket_options)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if proxy not in self.proxy_manager and self.registry.socket_options:
+            proxy_kwargs.setdefault("socket_options", self.registry.socket_options)
+        with self._lock:
+            # two sessions racing on a new proxy must not both create a manager
+            return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    def _touch(self, pool):
+        self.last_used[id(pool)] = time.monotonic()
+        self.registry.maybe_evict()
+        return pool
+
+    def get_connection_with_tls_context(self, *args, **kwargs):
+        return self._touch(super().get_connection_with_tls_context(*args, **kwargs))
+
+    def get_connection(self, *args, **kwargs):
+        # requests < 2.32
+        return self._touch(super().get_connection(*args, **kwargs))
+
+    def evict_idle(self, idle_timeout: float) -> int:
+        """Close pools unused for ``idle_timeout`` seconds, return how many"""
+        deadline = time.monotonic() - idle_timeout
+        evicted = 0
+        with self._lock:
+            managers = [(None, self.poolmanager)] + list(self.proxy_manager.items())
+            for proxy, manager in managers:
+                for key in list(manager.pools.keys()):
+                    try:
+                        pool = manager.pools[key]
+                    except KeyError:
+                        continue
+                    if self.last_used.get(id(pool), 0) < deadline:
+                        # RecentlyUsedContainer closes the pool on removal
+                        del manager.pools[key]
+                        self.last_used.pop(id(pool), None)
+                        evicted += 1
+                if proxy is not None and not len(manager.pools):
+                    manager.clear()
+                    del self.proxy_manager[proxy]
+        return evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            proxies = {}
+            for proxy, manager in self.proxy_manager.items():
+                proxies[proxy] = len(manager.pools)
+            return {"direct_pools": len(self.poolmanager.pools), "proxy_pools": proxies}
+
+    def close(self):
+        # Session.close() of one client must not drop connections of the others
+        pass
+
+    def shutdown(self):
+        super().close()
+        self.last_used.clear()
+
+
+class ConnectionPoolRegistry:
+    """
+    Transport adapters shared by Clients, one per kind of session
+
+    Parameters
+    ----------
+    pool_connections: int
+        Host pools kept per proxy (and for direct connections)
+    pool_maxsize: int
+        Connections kept per host pool; size it to the number of threads
+        that use one proxy concurrently
+    pool_block: bool
+        Wait for a free connection instead of opening a throw-away one
+        when a pool is exhausted
+    idle_timeout: float
+        Seconds after which unused pools are closed, 0 disables eviction
+    keepalive: bool | dict
+        Enable TCP keep-alive; a dict is passed to ``keepalive_socket_options``
+    http2: bool
+        Share ``HTTP2Adapter`` instances instead of HTTP/1.1 pools
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        idle_timeout: float = 300.0,
+        keepalive=True,
+        http2: bool = False,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.idle_timeout = idle_timeout
+        self.http2 = http2
+        if keepalive:
+            self.socket_options = keepalive_socket_options(
+                **(keepalive if isinstance(keepalive, dict) else {})
+            )
+        else:
+            self.socket_options = None
+        self.adapters: Dict[str, HTTPAdapter] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def adapter(self, name: str, max_retries=0):
+        """
+        Shared adapter for one kind of session, e.g. "private" or "public"
+
+        ``max_retries`` is only used when the adapter is created.
+        """
+        with self._lock:
+            if name not in self.adapters:
+                if self.http2:
+                    from instagrapi.http2 import HTTP2Adapter
+
+                    adapter = HTTP2Adapter(
+                        max_retries=max_retries,
+                        max_connections=self.pool_connections * self.pool_maxsize,
+                        keepalive_expiry=self.idle_timeout or 120.0,
+                    )
+                    adapter.shared = True
+                else:
+                    adapter = PooledHTTPAdapter(self, max_retries=max_retries)
+                self.adapters[name] = adapter
+            return self.adapters[name]
+
+    def maybe_evict(self):
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        if now - self._last_sweep < self.idle_timeout / 2:
+            return
+        self._last_sweep = now
+        self.evict_idle()
+
+    def evict_idle(self, idle_timeout: Optional[float] = None) -> int:
+        """Close pools idle for longer than ``idle_timeout``, return how many"""
+        timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        return sum(
+            adapter.evict_idle(timeout)
+            for adapter in list(self.adapters.values())
+            if isinstance(adapter, PooledHTTPAdapter)
+        )
+
+    def stats(self) -> Dict:
+        return {name: adapter.stats() for name, adapter in self.adapters.items()}
+
+    def close(self):
+        """Close every pool of every adapter"""
+        with self._lock:
+            for adapter in self.adapters.values():
+                adapter.shutdown()
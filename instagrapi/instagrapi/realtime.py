@@ -0,0 +1,588 @@
+"""
+Realtime direct messages over MQTToT.
+
+Instagram apps receive direct messages from a long-lived MQTT 3.1 connection
+to ``config.REALTIME_HOST`` instead of polling the inbox.  The CONNECT packet
+carries a zlib-compressed Thrift (compact protocol) struct with the session
+cookie, topics are numeric ids and payloads are zlib-compressed JSON.  After
+CONNECT the client subscribes to the Iris message sync with the inbox
+``seq_id``/``snapshot_at_ms`` and then gets one ``/ig_message_sync`` patch per
+new item.
+
+``RealtimeClient`` is asyncio based; everything below it (packet and Thrift
+encoding, sync decoding) is plain functions so it can be tested against a
+local broker stand-in (``instagrapi.realtime_broker``).
+"""
+
+import asyncio
+import datetime
+import inspect
+import json
+import logging
+import random
+import ssl
+import struct
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from instagrapi import config
+from instagrapi.extractors import extract_direct_message
+from instagrapi.types import DirectMessage
+
+logger = logging.getLogger("instagrapi.realtime")
+
+# MQTT packet types (upper nibble of the fixed header)
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+TOPICS = {
+    "/pubsub": "88",
+    "/ig_send_message": "132",
+    "/ig_send_message_response": "133",
+    "/ig_sub_iris": "134",
+    "/ig_sub_iris_response": "135",
+    "/ig_message_sync": "146",
+    "/ig_realtime_sub": "149",
+    "/t_region_hint": "150",
+}
+SUBSCRIBE_TOPICS = [88, 135, 149, 150, 133, 146]
+APP_ID = 567067343352427
+CLIENT_CAPABILITIES = 183
+
+# Thrift compact protocol types
+T_BOOL_TRUE, T_BOOL_FALSE, T_BYTE, T_I16, T_I32, T_I64 = 1, 2, 3, 4, 5, 6
+T_DOUBLE, T_BINARY, T_LIST, T_SET, T_MAP, T_STRUCT = 7, 8, 9, 10, 11, 12
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def thrift_struct(fields: List[Tuple[int, int, object]]) -> bytes:
+    """
+    Encode a struct with the Thrift compact protocol
+
+    Parameters
+    ----------
+    fields: List[Tuple[int, int, object]]
+        (field id, type, value) in field id order; lists are (element type,
+        items), maps are (key type, value type, dict), structs are nested
+        field lists.  Fields whose value is None are skipped.
+    """
+    out = bytearray()
+    last = 0
+    for fid, ftype, value in fields:
+        if value is None:
+            continue
+        wire_type = ftype
+        if ftype == T_BOOL_TRUE:
+            wire_type = T_BOOL_TRUE if value else T_BOOL_FALSE
+        delta = fid - last
+        if 0 < delta <= 15:
+            out.append((delta << 4) | wire_type)
+        else:
+            out.append(wire_type)
+            out += _varint(_zigzag(fid))
+        last = fid
+        if ftype != T_BOOL_TRUE:
+            out += _thrift_value(ftype, value)
+    out.append(0)
+    return bytes(out)
+
+
+def _thrift_value(ftype: int, value) -> bytes:
+    if ftype == T_BYTE:
+        return struct.pack(">b", value)
+    if ftype in (T_I16, T_I32, T_I64):
+        return _varint(_zigzag(int(value)))
+    if ftype == T_BINARY:
+        data = value.encode() if isinstance(value, str) else bytes(value)
+        return _varint(len(data)) + data
+    if ftype == T_LIST:
+        element_type, items = value
+        size = len(items)
+        head = (
+            bytes([(size << 4) | element_type])
+            if size < 15
+            else bytes([0xF0 | element_type]) + _varint(size)
+        )
+        return head + b"".join(_thrift_value(element_type, item) for item in items)
+    if ftype == T_MAP:
+        key_type, value_type, mapping = value
+        if not mapping:
+            return b"\x00"
+        out = bytearray(_varint(len(mapping)))
+        out.append((key_type << 4) | value_type)
+        for key, item in mapping.items():
+            out += _thrift_value(key_type, key) + _thrift_value(value_type, item)
+        return bytes(out)
+    if ftype == T_STRUCT:
+        return thrift_struct(value)
+    raise ValueError("Unsupported thrift type %s" % ftype)
+
+
+def thrift_read(data: bytes) -> Dict[int, object]:
+    """Decode a compact protocol struct into {field id: value} (nested structs become dicts)"""
+    value, _ = _read_struct(memoryview(data), 0)
+    return value
+
+
+def _read_varint(data, pos: int) -> Tuple[int, int]:
+    shift = result = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _read_struct(data, pos: int) -> Tuple[Dict[int, object], int]:
+    fields = {}
+    last = 0
+    while True:
+        head = data[pos]
+        pos += 1
+        if head == 0:
+            return fields, pos
+        ftype = head & 0x0F
+        delta = head >> 4
+        if delta:
+            fid = last + delta
+        else:
+            raw, pos = _read_varint(data, pos)
+            fid = _unzigzag(raw)
+        last = fid
+        if ftype in (T_BOOL_TRUE, T_BOOL_FALSE):
+            fields[fid] = ftype == T_BOOL_TRUE
+        else:
+            fields[fid], pos = _read_value(data, pos, ftype)
+
+
+def _read_value(data, pos: int, ftype: int):
+    if ftype in (T_BOOL_TRUE, T_BOOL_FALSE):
+        return data[pos] == T_BOOL_TRUE, pos + 1
+    if ftype == T_BYTE:
+        return struct.unpack(">b", data[pos : pos + 1])[0], pos + 1
+    if ftype in (T_I16, T_I32, T_I64):
+        raw, pos = _read_varint(data, pos)
+        return _unzigzag(raw), pos
+    if ftype == T_BINARY:
+        size, pos = _read_varint(data, pos)
+        return bytes(data[pos : pos + size]), pos + size
+    if ftype in (T_LIST, T_SET):
+        head = data[pos]
+        pos += 1
+        size, element_type = head >> 4, head & 0x0F
+        if size == 15:
+            size, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(size):
+            item, pos = _read_value(data, pos, element_type)
+            items.append(item)
+        return items, pos
+    if ftype == T_MAP:
+        size, pos = _read_varint(data, pos)
+        mapping = {}
+        if size:
+            types = data[pos]
+            pos += 1
+            for _ in range(size):
+                key, pos = _read_value(data, pos, types >> 4)
+                mapping[key], pos = _read_value(data, pos, types & 0x0F)
+        return mapping, pos
+    if ftype == T_STRUCT:
+        return _read_struct(data, pos)
+    raise ValueError("Unsupported thrift type %s" % ftype)
+
+
+def mqtt_packet(packet_type: int, body: bytes, flags: int = 0) -> bytes:
+    """Fixed header (type, flags, remaining length) followed by ``body``"""
+    length = bytearray()
+    remaining = len(body)
+    while True:
+        byte = remaining % 128
+        remaining //= 128
+        length.append(byte | 0x80 if remaining else byte)
+        if not remaining:
+            break
+    return bytes([(packet_type << 4) | flags]) + bytes(length) + body
+
+
+def _mqtt_string(value: str) -> bytes:
+    data = value.encode()
+    return struct.pack(">H", len(data)) + data
+
+
+def connect_packet(payload: bytes, keepalive: int = 60) -> bytes:
+    """CONNECT with protocol name MQTToT; the payload is the compressed Thrift connect struct"""
+    header = _mqtt_string("MQTToT") + bytes([3, 0xC2]) + struct.pack(">H", keepalive)
+    return mqtt_packet(CONNECT, header + payload)
+
+
+def publish_packet(
+    topic: str, payload: bytes, qos: int = 0, packet_id: int = 0
+) -> bytes:
+    body = _mqtt_string(topic)
+    if qos:
+        body += struct.pack(">H", packet_id)
+    return mqtt_packet(PUBLISH, body + payload, flags=qos << 1)
+
+
+def parse_publish(flags: int, body: bytes) -> Tuple[str, Optional[int], bytes]:
+    """(topic, packet id or None, payload) of a PUBLISH body"""
+    (size,) = struct.unpack(">H", body[:2])
+    topic = body[2 : 2 + size].decode()
+    pos = 2 + size
+    packet_id = None
+    if (flags >> 1) & 0x03:
+        (packet_id,) = struct.unpack(">H", body[pos : pos + 2])
+        pos += 2
+    return topic, packet_id, body[pos:]
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """Read one packet, returns (type, flags, body)"""
+    head = (await reader.readexactly(1))[0]
+    multiplier = 1
+    length = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    body = await reader.readexactly(length) if length else b""
+    return head >> 4, head & 0x0F, body
+
+
+def decompress(payload: bytes) -> bytes:
+    try:
+        return zlib.decompress(payload)
+    except zlib.error:
+        return payload
+
+
+def parse_message_sync(
+    payload: bytes,
+) -> Tuple[List[Tuple[str, DirectMessage]], Optional[int]]:
+    """
+    Decode a ``/ig_message_sync`` payload
+
+    Returns
+    -------
+    Tuple[List[Tuple[str, DirectMessage]], Optional[int]]
+        (thread id, message) for every added item and the highest seq_id
+    """
+    messages = []
+    seq_id = None
+    for event in json.loads(decompress(payload)):
+        if event.get("seq_id") is not None:
+            seq_id = max(seq_id or 0, int(event["seq_id"]))
+        for op in event.get("data", []):
+            parts = op.get("path", "").strip("/").split("/")
+            # /direct_v2/threads/<thread id>/items/<item id>
+            if (
+                op.get("op") != "add"
+                or len(parts) != 5
+                or parts[:2] != ["direct_v2", "threads"]
+                or parts[3] != "items"
+            ):
+                continue
+            value = op.get("value")
+            item = json.loads(value) if isinstance(value, str) else value
+            if not isinstance(item, dict) or "timestamp" not in item:
+                continue
+            item.setdefault("item_id", parts[4])
+            item["thread_id"] = parts[2]
+            # keep the microseconds, they are the item cursor of direct_v2 threads
+            timestamp = int(item["timestamp"])
+            message = extract_direct_message(item)
+            message.timestamp = datetime.datetime.fromtimestamp(timestamp / 1_000_000)
+            messages.append((parts[2], message))
+    return messages, seq_id
+
+
+class RealtimeClient:
+    """
+    Direct message push receiver for a logged in Client
+
+    Parameters
+    ----------
+    client: Client
+        Logged in client; its session cookie, device and user agent are used
+    on_message: Callable, optional
+        Called (or awaited) with (thread_id, DirectMessage) for every new item
+    host, port, use_ssl: optional
+        Broker address, default ``config.REALTIME_HOST``:``config.REALTIME_PORT`` over TLS
+    keepalive: int
+        MQTT keepalive in seconds; a PINGREQ is the only idle traffic
+    """
+
+    def __init__(
+        self,
+        client,
+        on_message: Callable = None,
+        host: str = None,
+        port: int = None,
+        use_ssl: bool = True,
+        keepalive: int = 60,
+    ):
+        self.client = client
+        self.on_message = on_message
+        self.host = host or config.REALTIME_HOST
+        self.port = port or config.REALTIME_PORT
+        self.use_ssl = use_ssl
+        self.keepalive = keepalive
+        self.seq_id = None
+        self.snapshot_at_ms = None
+        self.connected = asyncio.Event()
+        self._reader = None
+        self._writer = None
+        self._tasks: List[asyncio.Task] = []
+        self._packet_id = 0
+        self._iris: Optional[asyncio.Future] = None
+        self._closing = False
+
+    def connect_payload(self) -> bytes:
+        """zlib-compressed Thrift connect struct authenticating with the session cookie"""
+        client = self.client
+        device = client.device_settings or {}
+        user_agent = client.user_agent or ""
+        app_info = {
+            "app_version": device.get("app_version", ""),
+            "X-IG-Capabilities": "3brTvx0=",
+            "everclear_subscriptions": json.dumps(
+                {
+                    "inapp_notification_subscribe_comment": "17899377895239777",
+                    "inapp_notification_subscribe_comment_mention_and_reply": "17899377895239777",
+                    "video_call_participant_state_delivery": "17977239895057311",
+                    "presence_subscribe": "17846944882223835",
+                },
+                separators=(",", ":"),
+            ),
+            "User-Agent": user_agent,
+            "Accept-Language": (
+                client.locale.replace("_", "-") if client.locale else "en-US"
+            ),
+            "platform": "android",
+            "ig_mqtt_route": "django",
+            "pubsub_msg_type_blacklist": "direct, typing_type",
+            "auth_cache_enabled": "0",
+        }
+        client_info = [
+            (1, T_I64, int(client.user_id)),
+            (2, T_BINARY, user_agent),
+            (3, T_I64, CLIENT_CAPABILITIES),
+            (4, T_I64, 0),
+            (5, T_I32, 1),
+            (6, T_BOOL_TRUE, False),
+            (7, T_BOOL_TRUE, True),
+            (8, T_BINARY, client.uuid),
+            (9, T_BOOL_TRUE, True),
+            (10, T_I32, 1),
+            (11, T_I32, 0),
+            (12, T_I64, int(time.time() * 1000) & 0xFFFFFFFF),
+            (14, T_LIST, (T_I32, SUBSCRIBE_TOPICS)),
+            (15, T_BINARY, "cookie_auth"),
+            (16, T_I64, APP_ID),
+            (20, T_BINARY, ""),
+            (21, T_BYTE, 3),
+        ]
+        connect = [
+            (1, T_BINARY, (client.uuid or "")[:20]),
+            (4, T_STRUCT, client_info),
+            (5, T_BINARY, "sessionid=%s" % client.sessionid),
+            (10, T_MAP, (T_BINARY, T_BINARY, app_info)),
+        ]
+        return zlib.compress(thrift_struct(connect), 9)
+
+    def iris_state(self) -> Tuple[int, int]:
+        """seq_id and snapshot_at_ms of the inbox, one request"""
+        result = self.client.private_request(
+            "direct_v2/inbox/",
+            params={
+                "visual_message_return_type": "unseen",
+                "persistentBadging": "true",
+                "limit": "1",
+            },
+        )
+        return int(result["seq_id"]), int(result["snapshot_at_ms"])
+
+    async def connect(
+        self, seq_id: int = None, snapshot_at_ms: int = None, timeout: float = 15
+    ):
+        """
+        Connect and subscribe to the message sync
+
+        Resumes from ``seq_id``/``snapshot_at_ms`` (e.g. stored by an inbox
+        sync), else from the current inbox.
+        """
+        if seq_id is None or snapshot_at_ms is None:
+            if self.seq_id is None:
+                self.seq_id, self.snapshot_at_ms = await asyncio.to_thread(
+                    self.iris_state
+                )
+        else:
+            self.seq_id, self.snapshot_at_ms = seq_id, snapshot_at_ms
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=context,
+                server_hostname=self.host if context else None,
+            ),
+            timeout,
+        )
+        self._writer.write(connect_packet(self.connect_payload(), self.keepalive))
+        await self._writer.drain()
+        packet_type, _, body = await asyncio.wait_for(
+            read_packet(self._reader), timeout
+        )
+        if packet_type != CONNACK or len(body) < 2 or body[1] != 0:
+            await self._disconnect()
+            raise ConnectionError("MQTT connection refused: %r" % body[:2])
+        self._tasks = [
+            asyncio.ensure_future(self._read_loop()),
+            asyncio.ensure_future(self._ping_loop()),
+        ]
+        if not await asyncio.wait_for(self.subscribe_iris(), timeout):
+            # seq_id too old, start over from the current inbox
+            self.seq_id, self.snapshot_at_ms = await asyncio.to_thread(self.iris_state)
+            if not await asyncio.wait_for(self.subscribe_iris(), timeout):
+                await self.close()
+                raise ConnectionError("Iris subscription failed")
+        self.connected.set()
+
+    async def subscribe_iris(self) -> bool:
+        self._iris = asyncio.get_running_loop().create_future()
+        await self.publish(
+            "/ig_sub_iris",
+            {
+                "seq_id": self.seq_id,
+                "snapshot_at_ms": self.snapshot_at_ms,
+                "snapshot_app_version": "message",
+                "timezone_offset": 0,
+                "subscription_type": "message",
+            },
+            qos=1,
+        )
+        response = await self._iris
+        return bool(response.get("succeeded"))
+
+    async def publish(self, topic: str, data: Dict, qos: int = 0):
+        self._packet_id = self._packet_id % 0xFFFF + 1
+        payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 9)
+        self._writer.write(
+            publish_packet(TOPICS.get(topic, topic), payload, qos, self._packet_id)
+        )
+        await self._writer.drain()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                packet_type, flags, body = await read_packet(self._reader)
+                if packet_type == PUBLISH:
+                    topic, packet_id, payload = parse_publish(flags, body)
+                    if packet_id is not None:
+                        self._writer.write(
+                            mqtt_packet(PUBACK, struct.pack(">H", packet_id))
+                        )
+                    await self._handle(topic, payload)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            if not self._closing:
+                logger.warning("Realtime connection lost: %s", e)
+        finally:
+            self.connected.clear()
+            if self._iris is not None and not self._iris.done():
+                self._iris.set_exception(ConnectionError("Realtime connection lost"))
+
+    async def _handle(self, topic: str, payload: bytes):
+        if topic == TOPICS["/ig_sub_iris_response"]:
+            if self._iris is not None and not self._iris.done():
+                self._iris.set_result(json.loads(decompress(payload)))
+        elif topic == TOPICS["/ig_message_sync"]:
+            messages, seq_id = parse_message_sync(payload)
+            if seq_id is not None:
+                self.seq_id = max(self.seq_id or 0, seq_id)
+            for thread_id, message in messages:
+                if self.on_message is None:
+                    continue
+                try:
+                    result = self.on_message(thread_id, message)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    logger.exception("Realtime on_message handler failed")
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive * 0.8)
+            self._writer.write(mqtt_packet(PINGREQ, b""))
+            await self._writer.drain()
+
+    async def wait_closed(self):
+        """Wait until the connection drops"""
+        if self._tasks:
+            await asyncio.wait([self._tasks[0]])
+
+    async def run_forever(
+        self, seq_id: int = None, snapshot_at_ms: int = None, max_backoff: float = 300
+    ):
+        """Stay connected, reconnecting with exponential backoff and resuming from the last seq_id"""
+        backoff = 1.0
+        while not self._closing:
+            try:
+                await self.connect(seq_id, snapshot_at_ms)
+                seq_id = snapshot_at_ms = None
+                backoff = 1.0
+                await self.wait_closed()
+            except (
+                OSError,
+                ConnectionError,
+                asyncio.TimeoutError,
+                asyncio.IncompleteReadError,
+            ) as e:
+                logger.warning("Realtime connect failed: %s", e)
+            await self._disconnect()
+            if self._closing:
+                break
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, max_backoff)
+
+    async def _disconnect(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._writer is not None:
+            try:
+                self._writer.write(mqtt_packet(DISCONNECT, b""))
+                self._writer.close()
+                await self._writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+            self._writer = None
+        self.connected.clear()
+
+    async def close(self):
+        self._closing = True
+        await self._disconnect()
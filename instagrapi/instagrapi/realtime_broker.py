@@ -0,0 +1,151 @@
+"""
+Local stand-in for the MQTToT realtime gateway.
+
+It accepts plain TCP connections, decodes the Thrift CONNECT payload,
+answers CONNACK, PUBACK, PINGRESP and the Iris subscription, and pushes
+``/ig_message_sync`` patches on demand, so a :class:`RealtimeClient` can be
+exercised end to end without Instagram (``tests.py`` and
+``python -m benchmarks.mqtt_broker``).  A client is pointed at it with
+``RealtimeClient(cl, host="127.0.0.1", port=broker.port, use_ssl=False)``.
+"""
+
+import asyncio
+import json
+import struct
+import time
+import zlib
+
+from instagrapi.realtime import (
+    CONNACK,
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBACK,
+    PUBLISH,
+    TOPICS,
+    mqtt_packet,
+    parse_publish,
+    publish_packet,
+    read_packet,
+    thrift_read,
+)
+
+
+def sync_payload(thread_id, item, seq_id):
+    """A compressed ``/ig_message_sync`` patch adding ``item`` to ``thread_id``"""
+    event = {
+        "event": "patch",
+        "seq_id": seq_id,
+        "data": [
+            {
+                "op": "add",
+                "path": "/direct_v2/threads/%s/items/%s" % (thread_id, item["item_id"]),
+                "value": json.dumps(item),
+            }
+        ],
+    }
+    return zlib.compress(json.dumps([event]).encode())
+
+
+def text_item(item_id, user_id, text):
+    return {
+        "item_id": str(item_id),
+        "user_id": int(user_id),
+        "timestamp": str(int(time.time() * 1_000_000)),
+        "item_type": "text",
+        "text": text,
+    }
+
+
+class MqttStandIn:
+    """
+    Minimal MQTToT broker
+
+    Attributes
+    ----------
+    connects: list
+        Decoded Thrift connect structs, one per CONNECT
+    iris: list
+        Iris subscription requests
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, iris_succeeds=True):
+        self.host = host
+        self.port = port
+        self.iris_succeeds = iris_succeeds
+        self.connects = []
+        self.iris = []
+        self.pings = 0
+        self.seq_id = 0
+        self.writers = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def push(self, thread_id, item):
+        """Send one message sync patch to every connected client"""
+        self.seq_id += 1
+        packet = publish_packet(
+            TOPICS["/ig_message_sync"], sync_payload(thread_id, item, self.seq_id)
+        )
+        for writer in list(self.writers):
+            writer.write(packet)
+            await writer.drain()
+
+    async def drop_connections(self):
+        """Close every client connection, e.g. to test reconnects"""
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+    async def _serve(self, reader, writer):
+        try:
+            packet_type, _, body = await read_packet(reader)
+            if packet_type != CONNECT:
+                return
+            (size,) = struct.unpack(">H", body[:2])
+            payload = body[2 + size + 4 :]
+            self.connects.append(thrift_read(zlib.decompress(payload)))
+            writer.write(mqtt_packet(CONNACK, b"\x00\x00"))
+            self.writers.append(writer)
+            while True:
+                packet_type, flags, body = await read_packet(reader)
+                if packet_type == PINGREQ:
+                    self.pings += 1
+                    writer.write(mqtt_packet(PINGRESP, b""))
+                elif packet_type == PUBLISH:
+                    topic, packet_id, payload = parse_publish(flags, body)
+                    if packet_id is not None:
+                        writer.write(mqtt_packet(PUBACK, struct.pack(">H", packet_id)))
+                    if topic == TOPICS["/ig_sub_iris"]:
+                        request = json.loads(zlib.decompress(payload))
+                        self.iris.append(request)
+                        response = {
+                            "succeeded": self.iris_succeeds,
+                            "seq_id": request.get("seq_id"),
+                        }
+                        writer.write(
+                            publish_packet(
+                                TOPICS["/ig_sub_iris_response"],
+                                zlib.compress(json.dumps(response).encode()),
+                            )
+                        )
+                elif packet_type == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if writer in self.writers:
+                self.writers.remove(writer)
+            writer.close()
@@ -3,25 +3,32 @@ from pathlib import Path
 from typing import List
 from urllib.parse import urlparse
 
+from .image_util import pil_image
 from .types import StoryBuild, StoryMention, StorySticker
 
-try:
-    from moviepy import CompositeVideoClip, ImageClip, TextClip, VideoFileClip
-except ImportError:
+
+def moviepy_clips():
+    """
+    moviepy clip classes, imported on first use
+
+    Returns
+    -------
+    tuple
+        CompositeVideoClip, ImageClip, TextClip, VideoFileClip
+    """
     try:
-        from moviepy.editor import (
-            CompositeVideoClip,
-            ImageClip,
-            TextClip,
-            VideoFileClip,
-        )
+        from moviepy import CompositeVideoClip, ImageClip, TextClip, VideoFileClip
     except ImportError:
-        raise Exception("Please install moviepy>=1.0.3 and retry")
-
-try:
-    from PIL import Image
-except ImportError:
-    raise Exception("You don't have PIL installed. Please install PIL or Pillow>=8.1.1")
+        try:
+            from moviepy.editor import (
+                CompositeVideoClip,
+                ImageClip,
+                TextClip,
+                VideoFileClip,
+            )
+        except ImportError:
+            raise Exception("Please install moviepy>=1.0.3 and retry")
+    return CompositeVideoClip, ImageClip, TextClip, VideoFileClip
 
 
 class StoryBuilder:
@@ -92,6 +99,7 @@ class StoryBuilder:
         StoryBuild
             An object of StoryBuild
         """
+        CompositeVideoClip, ImageClip, TextClip, _ = moviepy_clips()
         clips = []
         stickers = []
         # Background
@@ -231,6 +239,7 @@ class StoryBuilder:
         StoryBuild
             An object of StoryBuild
         """
+        VideoFileClip = moviepy_clips()[3]
         clip = VideoFileClip(str(self.path), has_mask=True)
         build = self.build_main(clip, max_duration, font, fontsize, color, link)
         clip.close()
@@ -263,8 +272,8 @@ class StoryBuilder:
         StoryBuild
             An object of StoryBuild
         """
-
-        with Image.open(self.path) as im:
+        ImageClip = moviepy_clips()[1]
+        with pil_image().open(self.path) as im:
             image_width, image_height = im.size
 
         width_reduction_percent = self.width / float(image_width)
@@ -0,0 +1,322 @@
+"""
+Record/replay transport for the requests sessions of a Client.
+
+A ``CassetteAdapter`` is mounted in place of the ``HTTPAdapter`` of
+``Client.private`` and ``Client.public`` (see ``Client.use_cassette``):
+
+* ``record``  - every request goes to the network and the response is
+  appended to the cassette;
+* ``replay``  - responses are served from the cassette only, a request
+  without a recorded interaction raises ``CassetteMiss``;
+* ``cache``   - read-through: recorded responses are served, misses go
+  to the network and are recorded.
+
+Cassettes are gzip compressed JSON lines, one interaction per line, so a
+recording interrupted half way is still readable.  Responses are stored
+decoded, with ``Set-Cookie`` and the other headers, which means a
+cassette holds session cookies: keep recordings of real accounts out of
+version control.
+"""
+import base64
+import gzip
+import hashlib
+import http.client
+import io
+import json
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+CASSETTE_VERSION = 1
+MODES = ("record", "replay", "cache")
+
+# Query parameters that differ between two runs of the same call
+VOLATILE_PARAMS = {
+    "_",
+    "__d",
+    "_uuid",
+    "device_id",
+    "rank_token",
+    "timestamp",
+    "seq_id",
+}
+
+# Headers that describe the wire encoding rather than the stored body
+WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """Request has no recorded interaction in a replay-only cassette"""
+
+
+def request_key(
+    method: str, url: str, body: Optional[bytes] = None, match_body: bool = False
+) -> str:
+    """
+    Key an interaction is matched by
+
+    Method, host, path and query without ``VOLATILE_PARAMS`` (sorted).  The
+    body is only part of the key when ``match_body`` is set: signed bodies
+    carry timestamps and uuids, so repeated calls of one endpoint are told
+    apart by their order in the cassette instead.
+    """
+    parsed = urlparse(url)
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if k not in VOLATILE_PARAMS
+    )
+    key = f"{method.upper()} {parsed.netloc}{parsed.path}"
+    if query:
+        key += "?" + urlencode(query)
+    if match_body and body:
+        if isinstance(body, str):
+            body = body.encode()
+        key += " #" + hashlib.sha1(body).hexdigest()[:16]
+    return key
+
+
+class Cassette:
+    """
+    Recorded interactions of one cassette file
+
+    Interactions of one key are replayed in the order they were recorded;
+    once exhausted, the last one is repeated.  Recording keeps one gzip
+    stream open and sync-flushes it after every interaction, so the file
+    can be read while it is being written; ``close`` ends the stream.
+    """
+
+    def __init__(self, path, match_body: bool = False):
+        self.path = Path(path)
+        self.match_body = match_body
+        self.interactions: Dict[str, List[dict]] = defaultdict(list)
+        self.positions: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+        self._writer = None
+        if self.path.exists():
+            self.load()
+
+    def __len__(self):
+        return sum(len(items) for items in self.interactions.values())
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as fp:
+            try:
+                for line in fp:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    if "version" in item:
+                        continue
+                    self.interactions[item["key"]].append(item)
+            except EOFError:
+                # still being recorded: every flushed line is complete
+                pass
+
+    def find(self, key: str) -> Optional[dict]:
+        with self.lock:
+            items = self.interactions.get(key)
+            if not items:
+                return None
+            position = self.positions[key]
+            self.positions[key] = position + 1
+            return items[min(position, len(items) - 1)]
+
+    def append(self, item: dict):
+        with self.lock:
+            self.interactions[item["key"]].append(item)
+            if self._writer is None:
+                # the header line is written by whoever creates the file
+                new = not self.path.exists()
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = gzip.open(self.path, "at", encoding="utf-8")
+                if new:
+                    self._writer.write(json.dumps({"version": CASSETTE_VERSION}) + "\n")
+            self._writer.write(json.dumps(item, separators=(",", ":")) + "\n")
+            self._writer.flush()
+
+    def close(self):
+        with self.lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def rewind(self):
+        with self.lock:
+            self.positions.clear()
+
+
+def _header_items(headers) -> Iterable:
+    # urllib3 keeps repeated headers (Set-Cookie) apart, requests merges them
+    if hasattr(headers, "iteritems"):
+        return headers.iteritems()
+    return headers.items()
+
+
+def serialize_response(key: str, response: requests.Response, elapsed: float) -> dict:
+    content = response.content or b""
+    item = {
+        "key": key,
+        "method": response.request.method,
+        "url": response.request.url,
+        "status": response.status_code,
+        "reason": response.reason,
+        "headers": [
+            [name, value]
+            for name, value in _header_items(
+                getattr(response.raw, "headers", None) or response.headers
+            )
+            if name.lower() not in WIRE_HEADERS
+        ],
+        "elapsed": round(elapsed, 4),
+        "recorded_at": int(time.time()),
+    }
+    try:
+        item["text"] = content.decode("utf-8")
+    except UnicodeDecodeError:
+        item["base64"] = base64.b64encode(content).decode()
+    return item
+
+
+class _RecordedMessage:
+    """What requests.cookies.extract_cookies_to_jar and urllib3 read of http.client.HTTPResponse"""
+
+    def __init__(self, msg: http.client.HTTPMessage):
+        self.msg = msg
+
+    def isclosed(self):
+        return False
+
+    def close(self):
+        pass
+
+
+def make_raw_response(
+    status: int, header_items: Iterable, body: bytes, reason=None, **kwargs
+) -> HTTPResponse:
+    """
+    urllib3 response over an in-memory body, for adapters that do not use urllib3
+
+    Repeated headers (Set-Cookie) are kept apart and exposed the way
+    requests reads cookies from a real response, so they reach the session.
+    """
+    headers = HTTPHeaderDict()
+    message = http.client.HTTPMessage()
+    for name, value in header_items:
+        headers.add(name, value)
+        message[name] = value
+    return HTTPResponse(
+        body=io.BytesIO(body),
+        headers=headers,
+        status=status,
+        reason=reason,
+        preload_content=False,
+        original_response=_RecordedMessage(message),
+        **kwargs,
+    )
+
+
+def build_raw_response(item: dict) -> HTTPResponse:
+    """urllib3 response for a recorded interaction"""
+    if "base64" in item:
+        body = base64.b64decode(item["base64"])
+    else:
+        body = item.get("text", "").encode("utf-8")
+    header_items = [(name, value) for name, value in item["headers"]]
+    header_items.append(("Content-Length", str(len(body))))
+    return make_raw_response(
+        item["status"],
+        header_items,
+        body,
+        reason=item.get("reason"),
+        decode_content=False,
+    )
+
+
+class CassetteAdapter(BaseAdapter):
+    """
+    Transport adapter that records to or replays from a ``Cassette``
+
+    Parameters
+    ----------
+    cassette: str | Path | Cassette
+        Cassette file, created on first record, or a ``Cassette`` shared
+        with another adapter
+    mode: str
+        "record", "replay" or "cache" (read-through)
+    timing: float
+        Replay delay as a fraction of the recorded latency: 0 replays
+        instantly, 1 in real time
+    match_body: bool
+        Match interactions on the request body as well
+    adapter: BaseAdapter
+        Adapter used for network requests, the session's current one by default
+    """
+
+    def __init__(
+        self,
+        cassette,
+        mode: str = "replay",
+        timing: float = 0.0,
+        match_body: bool = False,
+        adapter: Optional[BaseAdapter] = None,
+    ):
+        super().__init__()
+        assert mode in MODES, f'Unsupported cassette mode "{mode}", use one of {MODES}'
+        self.mode = mode
+        self.timing = timing
+        if not isinstance(cassette, Cassette):
+            cassette = Cassette(cassette, match_body=match_body)
+        self.cassette = cassette
+        self.adapter = adapter or HTTPAdapter()
+        self.hits = 0
+        self.misses = 0
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        key = request_key(
+            request.method, request.url, request.body, self.cassette.match_body
+        )
+        if self.mode != "record":
+            item = self.cassette.find(key)
+            if item is not None:
+                self.hits += 1
+                return self.replay(request, item)
+            self.misses += 1
+            if self.mode == "replay":
+                raise CassetteMiss(
+                    f"No recorded interaction for {key} in {self.cassette.path}",
+                    request=request,
+                )
+        started = time.perf_counter()
+        response = self.adapter.send(
+            request,
+            stream=stream,
+            timeout=timeout,
+            verify=verify,
+            cert=cert,
+            proxies=proxies,
+        )
+        # Session.send sets response.elapsed only after the adapter returns
+        elapsed = time.perf_counter() - started
+        self.cassette.append(serialize_response(key, response, elapsed))
+        return response
+
+    def replay(self, request, item: dict) -> requests.Response:
+        if self.timing:
+            time.sleep(item.get("elapsed", 0) * self.timing)
+        return HTTPAdapter.build_response(self, request, build_raw_response(item))
+
+    def close(self):
+        self.cassette.close()
+        self.adapter.close()
@@ -12,8 +12,9 @@ from pydantic import (
 
 
 class TypesBaseModel(BaseModel):
+    # validators are built on first use of each model, not at import time
     model_config = ConfigDict(
-        coerce_numbers_to_str=True
+        coerce_numbers_to_str=True, defer_build=True
     )  # (jarrodnorwell) fixed city_id issue
 
 
@@ -7,6 +7,7 @@ import time
 import urllib.parse
 from typing import Any, TypeVar, Union, overload
 
+from . import json_codec
 from .exceptions import ValidationError
 
 
@@ -42,17 +43,22 @@ class InstagramIdCodec:
         return num
 
 
+def json_default(obj):
+    """Serialize values JSON has no type for, as Instagram expects them"""
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    elif isinstance(obj, datetime.time):
+        return obj.strftime("%H:%M")
+    elif isinstance(obj, (datetime.datetime, datetime.date)):
+        return int(obj.strftime("%s"))
+    elif isinstance(obj, set):
+        return list(obj)
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
 class InstagrapiJSONEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, enum.Enum):
-            return obj.value
-        elif isinstance(obj, datetime.time):
-            return obj.strftime("%H:%M")
-        elif isinstance(obj, (datetime.datetime, datetime.date)):
-            return int(obj.strftime("%s"))
-        elif isinstance(obj, set):
-            return list(obj)
-        return json.JSONEncoder.default(self, obj)
+        return json_default(obj)
 
 
 def generate_signature(data):
@@ -121,7 +127,7 @@ def gen_password(size=10):
 
 def dumps(data):
     """Json dumps format as required Instagram"""
-    return InstagrapiJSONEncoder(separators=(",", ":")).encode(data)
+    return json_codec.dumps(data, default=json_default)
 
 
 def generate_jazoest(symbols: str) -> str:
@@ -0,0 +1,220 @@
+"""
+Video metadata without decoding.
+
+``probe_mp4`` reads width, height and duration from the MP4/MOV box tree
+(``moov/mvhd``, ``trak/tkhd``, ``mdia/mdhd``, ``mdia/hdlr``), seeking over
+``mdat`` instead of reading it, so it costs a few small reads whatever the
+size of the file.  ``extract_frame`` writes one thumbnail with a single
+ffmpeg call that seeks to the nearest keyframe before decoding.  Both fall
+back to moviepy, which decodes through ffmpeg, for files they cannot handle.
+"""
+import math
+import shutil
+import struct
+import subprocess
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+
+def _iter_boxes(fp: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload start, box end) for the boxes between start and end"""
+    offset = start
+    while offset + 8 <= end:
+        fp.seek(offset)
+        header = fp.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", fp.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield kind, offset + header_size, offset + size
+        offset += size
+
+
+def _read_timing(fp: BinaryIO, start: int) -> Tuple[int, int]:
+    """(timescale, duration) of a mvhd or mdhd box"""
+    fp.seek(start)
+    version = fp.read(4)[0]
+    if version == 1:
+        _, _, timescale, duration = struct.unpack(">QQIQ", fp.read(28))
+    else:
+        _, _, timescale, duration = struct.unpack(">IIII", fp.read(16))
+    return timescale, duration
+
+
+def _read_tkhd(fp: BinaryIO, start: int) -> Tuple[float, float, int]:
+    """(width, height, rotation in degrees) of a tkhd box"""
+    fp.seek(start)
+    version = fp.read(4)[0]
+    fp.seek(32 if version == 1 else 20, 1)  # times, track id, duration
+    fp.seek(16, 1)  # reserved, layer, alternate group, volume
+    a, b = struct.unpack(">2i", fp.read(36)[:8])
+    width, height = struct.unpack(">II", fp.read(8))
+    rotation = round(math.degrees(math.atan2(b, a))) % 360 if (a or b) else 0
+    return width / 65536.0, height / 65536.0, rotation
+
+
+def _video_track(
+    fp: BinaryIO, start: int, end: int
+) -> Optional[Tuple[float, float, int, float]]:
+    tkhd = timing = None
+    is_video = False
+    stack = [(start, end)]
+    while stack:
+        box_start, box_end = stack.pop()
+        for kind, payload, box_stop in _iter_boxes(fp, box_start, box_end):
+            if kind == b"tkhd":
+                tkhd = _read_tkhd(fp, payload)
+            elif kind == b"mdhd":
+                timing = _read_timing(fp, payload)
+            elif kind == b"hdlr":
+                fp.seek(payload + 8)
+                is_video = fp.read(4) == b"vide"
+            elif kind == b"mdia":
+                stack.append((payload, box_stop))
+    if not (is_video and tkhd and timing and timing[0]):
+        return None
+    width, height, rotation = tkhd
+    return width, height, rotation, timing[1] / timing[0]
+
+
+def probe_mp4(path: Path) -> Optional[Tuple[int, int, float]]:
+    """
+    Width, height and duration of an MP4/MOV file, read from its boxes
+
+    Parameters
+    ----------
+    path: Path
+        Path to the video
+
+    Returns
+    -------
+    Tuple
+        (width, height, duration) as displayed, i.e. swapped for rotated
+        video, or None when the file is not a plain MP4/MOV (e.g. fragmented)
+    """
+    try:
+        with open(path, "rb") as fp:
+            fp.seek(0, 2)
+            size = fp.tell()
+            moov = next(
+                (
+                    (start, end)
+                    for kind, start, end in _iter_boxes(fp, 0, size)
+                    if kind == b"moov"
+                ),
+                None,
+            )
+            if moov is None:
+                return None
+            duration = None
+            track = None
+            for kind, start, end in _iter_boxes(fp, *moov):
+                if kind == b"mvhd":
+                    timescale, units = _read_timing(fp, start)
+                    duration = units / timescale if timescale else None
+                elif kind == b"trak" and track is None:
+                    track = _video_track(fp, start, end)
+    except (OSError, struct.error, IndexError):
+        return None
+    if track is None:
+        return None
+    width, height, rotation, track_duration = track
+    duration = duration or track_duration
+    if not width or not height or not duration:
+        return None
+    if rotation in (90, 270):
+        width, height = height, width
+    return int(round(width)), int(round(height)), duration
+
+
+def ffmpeg_exe() -> str:
+    """The ffmpeg moviepy uses (bundled by imageio-ffmpeg), else the one on PATH"""
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def extract_frame(path: Path, thumbnail: Path, t: float = 0.0) -> bool:
+    """
+    Save the frame at ``t`` seconds as a JPEG with one keyframe seek
+
+    Returns
+    -------
+    bool
+        False if ffmpeg is missing or failed
+    """
+    try:
+        subprocess.run(
+            [
+                ffmpeg_exe(),
+                "-v",
+                "error",
+                "-y",
+                "-ss",
+                "%.3f" % t,
+                "-i",
+                str(path),
+                "-frames:v",
+                "1",
+                "-q:v",
+                "2",
+                str(thumbnail),
+            ],
+            check=True,
+            capture_output=True,
+            timeout=60,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return Path(thumbnail).exists()
+
+
+def video_metadata(
+    path: Path, thumbnail: Path = None
+) -> Tuple[int, int, float, Optional[Path]]:
+    """
+    Width, height, duration and a thumbnail for an upload
+
+    When ``thumbnail`` is None a frame from the middle of the video is saved
+    as ``<path>.jpg``.
+
+    Returns
+    -------
+    Tuple
+        (width, height, duration, thumbnail)
+    """
+    probed = probe_mp4(path)
+    if probed:
+        width, height, duration = probed
+        if thumbnail:
+            return width, height, duration, thumbnail
+        target = f"{path}.jpg"
+        if extract_frame(path, target, duration / 2):
+            return width, height, duration, target
+    try:
+        import moviepy.editor as mp
+    except ImportError:
+        try:
+            import moviepy as mp
+        except ImportError:
+            raise Exception("Please install moviepy>=1.0.3 and retry")
+    video = mp.VideoFileClip(str(path))
+    try:
+        width, height = video.size
+        duration = video.duration
+        if not thumbnail:
+            thumbnail = f"{path}.jpg"
+            video.save_frame(thumbnail, t=(duration / 2))
+    finally:
+        video.close()
+    return width, height, duration, thumbnail
@@ -1,8 +1,15 @@
+import asyncio
 import json
 import logging
 import os
 import os.path
 import random
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 from datetime import datetime, timedelta
 from json.decoder import JSONDecodeError
@@ -11,8 +18,29 @@ from pathlib import Path
 import requests
 
 from instagrapi import Client
-from instagrapi.exceptions import DirectThreadNotFound
+from instagrapi import json_codec
+from instagrapi.cancellation import CancelToken
+from instagrapi.exceptions import (
+    ChallengeParked,
+    DeadlineExceeded,
+    DirectThreadNotFound,
+    RequestCancelled,
+)
+from instagrapi.metrics import RequestEvent, RequestMetrics, normalize_endpoint
+from instagrapi.realtime import (
+    T_BINARY,
+    T_I32,
+    T_I64,
+    T_LIST,
+    T_MAP,
+    T_STRUCT,
+    RealtimeClient,
+    thrift_read,
+    thrift_struct,
+)
+from instagrapi.realtime_broker import MqttStandIn, text_item
 from instagrapi.story import StoryBuilder
+from instagrapi.transport import Cassette, CassetteAdapter, request_key
 from instagrapi.types import (
     Account,
     Collection,
@@ -35,6 +63,7 @@ from instagrapi.types import (
     Usertag,
 )
 from instagrapi.utils import gen_password, generate_jazoest
+from instagrapi.video_probe import probe_mp4
 from instagrapi.zones import UTC
 
 logger = logging.getLogger("instagrapi.tests")
@@ -1791,5 +1820,308 @@ class ClientShareTestCase(ClientPrivateTestCase):
         self.assertEqual(share.type, "highlight")
 
 
+class RequestMetricsTestCase(unittest.TestCase):
+    def test_normalize_endpoint(self):
+        self.assertEqual(
+            normalize_endpoint("/v1/users/1903424587/info/"), "/v1/users/{id}/info/"
+        )
+        self.assertEqual(
+            normalize_endpoint(
+                "https://i.instagram.com/api/v1/media/2154602296692269830_1903424587/info/?a=1"
+            ),
+            "/v1/media/{id}/info/",
+        )
+        self.assertEqual(
+            normalize_endpoint("/v1/feed/tag/python/"), "/v1/feed/tag/{tag}/"
+        )
+        self.assertEqual(
+            normalize_endpoint("users/example/usernameinfo/"),
+            "users/{name}/usernameinfo/",
+        )
+        self.assertEqual(
+            normalize_endpoint("tags/python/sections/"), "tags/{tag}/sections/"
+        )
+        self.assertEqual(normalize_endpoint("users/search/"), "users/search/")
+        self.assertEqual(normalize_endpoint("tags/search/"), "tags/search/")
+
+    def test_rolling_stats(self):
+        metrics = RequestMetrics(window=10)
+        for i in range(20):
+            event = RequestEvent(
+                method="GET",
+                endpoint="/v1/users/1/info/",
+                template="/v1/users/{id}/info/",
+                url="",
+                status_code=500 if i >= 15 else 200,
+                latency=float(i),
+            )
+            metrics.record(event)
+        stats = metrics.stats()["/v1/users/{id}/info/"]
+        self.assertEqual(stats["count"], 20)
+        self.assertEqual(stats["errors"], 5)
+        self.assertEqual(stats["error_rate"], 0.5)
+        self.assertEqual(stats["p50"], 14.0)
+        self.assertEqual(stats["p99"], 19.0)
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def test_import_does_not_load_media_libraries(self):
+        code = (
+            "import sys, instagrapi, instagrapi.story\n"
+            "print(','.join(sorted({m.split('.')[0] for m in sys.modules} & {'PIL', 'moviepy', 'numpy'})))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+
+class JsonCodecTestCase(unittest.TestCase):
+    def test_wide_int_after_whitespace(self):
+        data = b'{"pk": 1,\n  "id":\n    123456789012345678901234}'
+        self.assertEqual(json_codec.loads(data)["id"], 123456789012345678901234)
+        self.assertEqual(
+            json_codec.loads(b"[ 12345678901234567890123]"), [12345678901234567890123]
+        )
+
+    def test_negative_wide_int(self):
+        self.assertEqual(
+            json_codec.loads(b'{"a":-9999999999999999999}'), {"a": -9999999999999999999}
+        )
+        self.assertIsInstance(json_codec.loads(b'{"a":-9999999999999999999}')["a"], int)
+
+    def test_floats_match_standard_library(self):
+        for value in (
+            {"a": 1e20},
+            {"a": [0.00001, -2.5e-9, 1e16, 0.1, 3.0]},
+            {"s": "8.0.0", "t": '{"a":1e-05}', "u": "x:1e5"},
+        ):
+            self.assertEqual(
+                json_codec.dumps(value), json.dumps(value, separators=(",", ":"))
+            )
+
+
+class VideoProbeTestCase(unittest.TestCase):
+    @staticmethod
+    def box(kind, payload):
+        return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+    def mp4(self, width, height, matrix=(1, 0, 0, 1)):
+        a, b, c, d = (value * 65536 for value in matrix)
+        tkhd = (
+            bytes(4)
+            + bytes(20)
+            + bytes(16)
+            + struct.pack(">9i", a, b, 0, c, d, 0, 0, 0, 1 << 30)
+            + struct.pack(">II", width << 16, height << 16)
+        )
+        mdia = self.box(
+            b"mdia",
+            self.box(b"mdhd", bytes(4) + struct.pack(">IIII", 0, 0, 90000, 900000))
+            + self.box(b"hdlr", bytes(8) + b"vide" + bytes(12)),
+        )
+        moov = self.box(
+            b"moov",
+            self.box(b"mvhd", bytes(4) + struct.pack(">IIII", 0, 0, 1000, 12500))
+            + self.box(b"trak", self.box(b"tkhd", tkhd) + mdia),
+        )
+        # mdat before moov, as written without faststart
+        return (
+            self.box(b"ftyp", b"isom" + bytes(4)) + self.box(b"mdat", bytes(64)) + moov
+        )
+
+    def probe(self, data):
+        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as fp:
+            fp.write(data)
+        try:
+            return probe_mp4(fp.name)
+        finally:
+            os.unlink(fp.name)
+
+    def test_probe_mp4(self):
+        self.assertEqual(self.probe(self.mp4(1080, 1920)), (1080, 1920, 12.5))
+
+    def test_probe_mp4_rotated(self):
+        self.assertEqual(
+            self.probe(self.mp4(1920, 1080, matrix=(0, 1, -1, 0))), (1080, 1920, 12.5)
+        )
+
+    def test_probe_not_mp4(self):
+        self.assertIsNone(self.probe(b"not a video at all"))
+
+
+class CassetteTestCase(unittest.TestCase):
+    def test_request_key_ignores_volatile_params(self):
+        self.assertEqual(
+            request_key(
+                "get",
+                "https://i.instagram.com/api/v1/feed/user/1/?rank_token=1_ab&max_id=x&count=12",
+            ),
+            request_key(
+                "GET",
+                "https://i.instagram.com/api/v1/feed/user/1/?count=12&max_id=x&rank_token=1_cd",
+            ),
+        )
+
+    def test_replay_sets_cookies(self):
+        path = Path(tempfile.mkdtemp()) / "session.jsonl.gz"
+        url = "https://i.instagram.com/api/v1/users/1/info/"
+        cassette = Cassette(path)
+        for pk in (1, 2):
+            cassette.append(
+                {
+                    "key": request_key("GET", url),
+                    "status": 200,
+                    "reason": "OK",
+                    "headers": [
+                        ["Content-Type", "application/json"],
+                        ["Set-Cookie", "ds_user_id=1; Path=/; Domain=.instagram.com"],
+                        ["Set-Cookie", "csrftoken=abc; Path=/; Domain=.instagram.com"],
+                    ],
+                    "elapsed": 0.5,
+                    "text": json.dumps({"user": {"pk": pk}}),
+                }
+            )
+        session = requests.Session()
+        session.mount("https://", CassetteAdapter(path, "replay"))
+        self.assertEqual(session.get(url).json(), {"user": {"pk": 1}})
+        self.assertEqual(session.get(url).json(), {"user": {"pk": 2}})
+        # exhausted interactions repeat the last one
+        self.assertEqual(session.get(url).json(), {"user": {"pk": 2}})
+        self.assertEqual(session.cookies.get("ds_user_id"), "1")
+        self.assertEqual(session.cookies.get("csrftoken"), "abc")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            session.get(url + "?other=1")
+
+
+class RealtimeTestCase(unittest.TestCase):
+    def test_thrift_roundtrip(self):
+        data = thrift_struct(
+            [
+                (1, T_BINARY, "client"),
+                (4, T_STRUCT, [(1, T_I64, 25025320), (14, T_LIST, (T_I32, [88, 146]))]),
+                (5, T_BINARY, "sessionid=1"),
+                (10, T_MAP, (T_BINARY, T_BINARY, {"platform": "android"})),
+            ]
+        )
+        self.assertEqual(
+            thrift_read(data),
+            {
+                1: b"client",
+                4: {1: 25025320, 14: [88, 146]},
+                5: b"sessionid=1",
+                10: {b"platform": b"android"},
+            },
+        )
+
+    def test_receive_pushed_message(self):
+        async def scenario():
+            broker = await MqttStandIn().start()
+            cl = Client()
+            cl.authorization_data = {
+                "ds_user_id": "25025320",
+                "sessionid": "25025320%3Aabc",
+            }
+            received = asyncio.Queue()
+            realtime = RealtimeClient(
+                cl,
+                on_message=lambda thread_id, message: received.put_nowait(
+                    (thread_id, message)
+                ),
+                host="127.0.0.1",
+                port=broker.port,
+                use_ssl=False,
+            )
+            try:
+                await realtime.connect(seq_id=100, snapshot_at_ms=1700000000000)
+                await broker.push("340282366841710300949128", text_item(1, 42, "hello"))
+                return broker, await asyncio.wait_for(received.get(), 5)
+            finally:
+                await realtime.close()
+                await broker.stop()
+
+        broker, (thread_id, message) = asyncio.run(scenario())
+        self.assertEqual(broker.connects[0][5], b"sessionid=25025320%3Aabc")
+        self.assertEqual(broker.connects[0][4][1], 25025320)
+        self.assertEqual(broker.iris[0]["seq_id"], 100)
+        self.assertEqual(thread_id, "340282366841710300949128")
+        self.assertIsInstance(message, DirectMessage)
+        self.assertEqual(
+            (message.id, message.user_id, message.text), ("1", "42", "hello")
+        )
+
+
+class CancellationTestCase(unittest.TestCase):
+    def test_cancelled_before_request(self):
+        cl = Client()
+        token = CancelToken()
+        token.cancel("stop")
+        with cl.cancellable(token):
+            with self.assertRaises(RequestCancelled):
+                cl.private_request("users/1/info/")
+        self.assertIsNone(cl.cancel_token)
+        self.assertIsNone(cl.last_response)
+
+    def test_sleep_wakes_on_cancel(self):
+        cl = Client()
+        token = CancelToken(poll_interval=0.05)
+        threading.Timer(0.1, token.cancel).start()
+        started = time.monotonic()
+        with cl.cancellable(token):
+            with self.assertRaises(RequestCancelled):
+                cl.sleep(5)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_deadline(self):
+        cl = Client()
+        with cl.cancellable(CancelToken(timeout=0.1, poll_interval=0.05)):
+            with self.assertRaises(DeadlineExceeded):
+                cl.sleep(5)
+
+    def test_token_is_per_thread(self):
+        cl = Client()
+        token = CancelToken()
+        token.cancel("stop")
+        seen = []
+        with cl.cancellable(token):
+            thread = threading.Thread(target=lambda: seen.append(cl.cancel_token))
+            thread.start()
+            thread.join()
+            self.assertIs(cl.cancel_token, token)
+            self.assertIsNone(Client().cancel_token)
+        self.assertEqual(seen, [None])
+
+
+class ChallengeParkTestCase(unittest.TestCase):
+    def test_park_code_step(self):
+        cl = Client()
+        cl.challenge_park = True
+        cl.challenge_code_handler = lambda username, choice: self.fail("handler called")
+        cl.last_json = {"step_name": "verify_email"}
+        with self.assertRaises(ChallengeParked) as ctx:
+            cl.challenge_resolve_simple("/challenge/1/abc/")
+        state = ctx.exception.state
+        self.assertEqual(state["step_name"], "verify_email")
+        self.assertEqual(state["challenge_url"], "/challenge/1/abc/")
+        self.assertEqual(state["choice"], "EMAIL")
+
+    def test_resume_code_step(self):
+        cl = Client()
+        sent = []
+
+        def send(endpoint, data=None, **kwargs):
+            sent.append((endpoint, data))
+            cl.last_json = {"action": "close", "status": "ok"}
+
+        cl._send_private_request = send
+        state = {
+            "flow": "private",
+            "challenge_url": "challenge/1/abc/",
+            "step_name": "verify_email",
+        }
+        self.assertTrue(cl.challenge_resume(state, "123456"))
+        self.assertEqual(sent, [("challenge/1/abc/", {"security_code": "123456"})])
+
+
 if __name__ == "__main__":
     unittest.main()
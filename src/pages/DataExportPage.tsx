@@ -180,7 +180,7 @@ const DataExportPage: React.FC = () => {
 
   const getCompletedTasks = () => searchTasks.filter(task => task.status === 'completed');
   const totalCollectedUsers = searchTasks.reduce((sum, task) => {
-    return sum + (task.results?.length || 0);
+    return sum + (task.users_collected || 0);
   }, 0);
 
   return (
@@ -318,7 +318,7 @@ const DataExportPage: React.FC = () => {
                     </TableCell>
                     <TableCell>
                       <Typography variant="body2">
-                        {task.results?.length || 0} 条
+                        {task.users_collected || 0} 条
                       </Typography>
                     </TableCell>
                     <TableCell>
@@ -25,6 +25,10 @@ interface SearchTask {
   started_at?: string;
   completed_at?: string;
   results?: any;
+  query_count?: number;
+  users_collected?: number;
+  media_items?: number;
+  error_count?: number;
   analysis?: any;
 }
 
@@ -42,6 +46,30 @@ const initialState: SchedulerState = {
   error: null,
 };
 
+// 列表接口按游标分页（下一页游标在响应头 X-Next-Cursor），逐页取完
+const PAGE_SIZE = 500;
+
+const fetchAllPages = async (url: string, token: string, errorMessage: string) => {
+  const items: any[] = [];
+  let cursor: string | null = null;
+  do {
+    const pageUrl: string = `${url}?limit=${PAGE_SIZE}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+    const response: Response = await fetch(pageUrl, {
+      headers: {
+        'Authorization': `Bearer ${token}`,
+      },
+    });
+
+    if (!response.ok) {
+      throw new Error(errorMessage);
+    }
+
+    items.push(...(await response.json()));
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return items;
+};
+
 // 异步actions
 export const fetchSchedules = createAsyncThunk(
   'scheduler/fetchSchedules',
@@ -52,17 +80,7 @@ export const fetchSchedules = createAsyncThunk(
     }
 
     try {
-      const response = await fetch('http://localhost:8000/api/v1/scheduler/schedules', {
-        headers: {
-          'Authorization': `Bearer ${token}`,
-        },
-      });
-
-      if (!response.ok) {
-        throw new Error('获取发帖计划失败');
-      }
-
-      return await response.json();
+      return await fetchAllPages('http://localhost:8000/api/v1/scheduler/schedules', token, '获取发帖计划失败');
     } catch (error: any) {
       return rejectWithValue(error.message);
     }
@@ -142,17 +160,7 @@ export const fetchSearchTasks = createAsyncThunk(
     }
 
     try {
-      const response = await fetch('http://localhost:8000/api/v1/scheduler/search-tasks', {
-        headers: {
-          'Authorization': `Bearer ${token}`,
-        },
-      });
-
-      if (!response.ok) {
-        throw new Error('获取搜索任务失败');
-      }
-
-      return await response.json();
+      return await fetchAllPages('http://localhost:8000/api/v1/scheduler/search-tasks', token, '获取搜索任务失败');
     } catch (error: any) {
       return rejectWithValue(error.message);
     }